@@ -1,16 +1,20 @@
 from __future__ import unicode_literals
 
+import json
 import os
 import shutil
 import tempfile
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
 from django.forms import ValidationError
 from djblets.siteconfig.models import SiteConfiguration
 
 from reviewboard.admin import checks
 from reviewboard.ssh.client import SSHClient
 from reviewboard.admin.validation import validate_bug_tracker
+from reviewboard.scmtools import instrumentation
 from reviewboard.site.urlresolvers import local_site_reverse
 from reviewboard.testing.testcase import TestCase
 
@@ -159,3 +163,72 @@ class SSHSettingsFormTestCase(TestCase):
 
         # Check whether the key has been deleted.
         self.assertEqual(self.ssh_client.get_user_key(), None)
+
+
+class SCMStatsViewTests(TestCase):
+    """Unit tests for the repository statistics views."""
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(SCMStatsViewTests, self).setUp()
+
+        instrumentation.flush_stats()
+        cache.clear()
+
+        self.slow_repository = self.create_repository(name='Slow')
+        self.fast_repository = self.create_repository(name='Fast')
+        self.unused_repository = self.create_repository(name='Unused')
+
+        instrumentation.record_latency(
+            instrumentation.get_repository_target(self.slow_repository),
+            'get_file', 2)
+        instrumentation.record_latency(
+            instrumentation.get_repository_target(self.fast_repository),
+            'get_file', 0.01, error=True)
+
+        self.client.login(username='admin', password='admin')
+
+    def tearDown(self):
+        super(SCMStatsViewTests, self).tearDown()
+
+        cache.clear()
+
+    def test_scm_stats(self):
+        """Testing scm_stats view"""
+        rsp = self.client.get(reverse('admin-scm-stats'))
+        self.assertEqual(rsp.status_code, 200)
+
+        rows = rsp.context['rows']
+        self.assertEqual([row['name'] for row in rows], ['Slow', 'Fast'])
+        self.assertContains(rsp, 'Slow')
+
+    def test_scm_stats_json(self):
+        """Testing scm_stats_json view"""
+        rsp = self.client.get(reverse('admin-scm-stats-json'))
+        self.assertEqual(rsp.status_code, 200)
+
+        data = json.loads(rsp.content.decode('utf-8'))
+        self.assertEqual([row['name'] for row in data['targets']],
+                         ['Slow', 'Fast'])
+        self.assertEqual(data['targets'][0]['operations']['get_file']['count'],
+                         1)
+        self.assertEqual(
+            data['targets'][1]['operations']['get_file']['errors'], 1)
+
+    def test_scm_stats_other_date(self):
+        """Testing scm_stats view with a date without statistics"""
+        day = instrumentation.get_stats_days()[-1]
+        rsp = self.client.get(reverse('admin-scm-stats'),
+                              {'date': day.strftime('%Y-%m-%d')})
+        self.assertEqual(rsp.status_code, 200)
+        self.assertEqual(rsp.context['day'], day)
+        self.assertEqual(rsp.context['rows'], [])
+
+    def test_scm_stats_requires_staff(self):
+        """Testing scm_stats_json view requires a staff member"""
+        self.client.login(username='doc', password='doc')
+
+        # Non-staff users are shown the admin login page instead.
+        rsp = self.client.get(reverse('admin-scm-stats-json'))
+        self.assertEqual(rsp.status_code, 200)
+        self.assertNotEqual(rsp['Content-Type'], 'application/json')
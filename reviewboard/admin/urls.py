@@ -74,6 +74,8 @@ urlpatterns = patterns(
 
     (r'^$', 'dashboard'),
     url(r'^cache/$', 'cache_stats', name='admin-server-cache'),
+    url(r'^scm-stats/$', 'scm_stats', name='admin-scm-stats'),
+    url(r'^scm-stats/json/$', 'scm_stats_json', name='admin-scm-stats-json'),
     (r'^settings/', include(settings_urlpatterns)),
     (r'^widget-toggle/', 'widget_toggle'),
     (r'^widget-move/', 'widget_move'),
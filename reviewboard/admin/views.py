@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 import json
 import logging
+from datetime import datetime
 
 from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
@@ -22,6 +23,9 @@ from reviewboard.admin.support import get_support_url
 from reviewboard.admin.widgets import (dynamic_activity_data,
                                        primary_widgets,
                                        secondary_widgets)
+from reviewboard.hostingsvcs.models import HostingServiceAccount
+from reviewboard.scmtools import instrumentation
+from reviewboard.scmtools.models import Repository
 from reviewboard.ssh.client import SSHClient
 from reviewboard.ssh.utils import humanize_key
 
@@ -105,6 +109,120 @@ def cache_stats(request, template_name="admin/cache_stats.html"):
     }))
 
 
+@staff_member_required
+def scm_stats(request, template_name='admin/scm_stats.html'):
+    """Displays statistics on operations sent to repositories.
+
+    This lists the repositories and hosting service accounts used on the
+    selected day, slowest first, along with the latency, error rate and
+    cache hit ratio of each kind of operation.
+    """
+    day = _get_scm_stats_day(request)
+
+    return render_to_response(template_name, RequestContext(request, {
+        'day': day,
+        'days': instrumentation.get_stats_days(),
+        'latency_buckets': instrumentation.LATENCY_BUCKETS,
+        'rows': _get_scm_stats_rows(day),
+        'title': _('Repository Statistics'),
+    }))
+
+
+@staff_member_required
+def scm_stats_json(request):
+    """Returns the statistics shown by scm_stats as JSON."""
+    day = _get_scm_stats_day(request)
+    rows = [
+        {
+            'target': row['target'],
+            'name': row['name'],
+            'total_ms': row['total_ms'],
+            'operations': dict(
+                (operation, stats)
+                for operation, label, stats in row['operations']
+            ),
+        }
+        for row in _get_scm_stats_rows(day)
+    ]
+
+    data = {
+        'date': day.isoformat(),
+        'latency_buckets': instrumentation.LATENCY_BUCKETS,
+        'targets': rows,
+    }
+
+    return HttpResponse(json.dumps(data), content_type='application/json')
+
+
+def _get_scm_stats_day(request):
+    """Returns the day of statistics requested in ?date=YYYY-MM-DD.
+
+    If the date is missing or not one statistics are kept for, this returns
+    the current day.
+    """
+    days = instrumentation.get_stats_days()
+
+    try:
+        day = datetime.strptime(request.GET.get('date', ''),
+                                '%Y-%m-%d').date()
+    except ValueError:
+        return days[0]
+
+    if day in days:
+        return day
+    else:
+        return days[0]
+
+
+def _get_scm_stats_rows(day):
+    """Returns the statistics for repositories and hosting accounts.
+
+    Only those with statistics recorded on the day are returned, sorted by
+    the total time spent on their operations.
+    """
+    targets = instrumentation.get_active_targets(day)
+    pks = {
+        'repository': [],
+        'hosting-account': [],
+    }
+
+    for target in targets:
+        target_type, pk = instrumentation.parse_target(target)
+        pks[target_type].append(pk)
+
+    names = {}
+
+    for repository in Repository.objects.filter(pk__in=pks['repository']):
+        names[instrumentation.get_repository_target(repository)] = \
+            repository.name
+
+    for account in HostingServiceAccount.objects.filter(
+            pk__in=pks['hosting-account']):
+        names[instrumentation.get_hosting_account_target(account)] = \
+            '%s (%s)' % (account.username, account.service_name)
+
+    rows = []
+
+    for target, stats in instrumentation.get_stats(list(names.keys()),
+                                                   day).items():
+        if stats:
+            rows.append({
+                'target': target,
+                'name': names[target],
+                'total_ms': sum(op_stats['total_ms']
+                                for op_stats in stats.values()),
+                'operations': [
+                    (operation, label, stats[operation])
+                    for operation, label in instrumentation.OPERATIONS
+                    if operation in stats
+                ],
+            })
+
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+
+    return rows
+
+
 @staff_member_required
 def security(request, template_name="admin/security.html"):
     runner = SecurityCheckRunner()
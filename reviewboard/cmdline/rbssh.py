@@ -36,6 +36,7 @@ import getpass
 import logging
 import os
 import select
+import socket
 import sys
 from optparse import OptionParser
 
@@ -47,7 +48,9 @@ import paramiko
 
 from reviewboard import get_version_string
 from reviewboard.scmtools.core import SCMTool
+from reviewboard.ssh import multiplex
 from reviewboard.ssh.client import SSHClient
+from reviewboard.ssh.errors import SSHMultiplexError
 
 
 DEBUG = os.getenv('DEBUG_RBSSH')
@@ -226,6 +229,18 @@ def parse_options(args):
                       default=os.getenv('RB_LOCAL_SITE'),
                       help='the local site name containing the SSH keys to '
                            'use')
+    parser.add_option('--rb-multiplex',
+                      action='store_true', dest='multiplex',
+                      default=os.getenv('RBSSH_MULTIPLEX') == '1',
+                      help='share one connection between rbssh processes '
+                           'for the same local site, user, host and port')
+    parser.add_option('--rb-multiplex-idle-timeout',
+                      type='int', dest='multiplex_idle_timeout',
+                      metavar='SECONDS',
+                      default=int(os.getenv('RBSSH_MULTIPLEX_IDLE_TIMEOUT',
+                                            multiplex.DEFAULT_IDLE_TIMEOUT)),
+                      help='the number of seconds a shared connection is '
+                           'kept open while unused')
 
     (options, args) = parser.parse_args(args)
 
@@ -253,6 +268,48 @@ def parse_options(args):
     return hostname, port, args
 
 
+def run_multiplexed(hostname, port, username, command, subsystem):
+    """Runs a command or subsystem on a shared connection.
+
+    This returns the exit status, or None if the connection couldn't be
+    shared, in which case the caller should connect directly.
+    """
+    if not multiplex.can_multiplex():
+        return None
+
+    def connect():
+        # This is called in the background server's process, so it can't
+        # prompt for a password. If a password is needed, the server won't
+        # start, and we'll connect directly instead.
+        client = SSHClient(namespace=options.local_site_name)
+        client.set_missing_host_key_policy(paramiko.WarningPolicy())
+        client.connect(hostname, port, username=username,
+                       pkey=client.get_user_key(),
+                       allow_agent=options.allow_agent)
+
+        return client
+
+    try:
+        control_path = multiplex.get_control_path(
+            hostname, port, username,
+            namespace=options.local_site_name,
+            allow_agent=options.allow_agent)
+        sock = multiplex.open_session(
+            control_path, connect,
+            command=' '.join(command) or None,
+            subsystem=subsystem,
+            idle_timeout=options.multiplex_idle_timeout)
+    except (SSHMultiplexError, EnvironmentError, socket.error) as e:
+        logging.debug('!!! Not multiplexing: %s' % e)
+        return None
+
+    try:
+        return multiplex.run_session(sock, sys.stdin.fileno(), sys.stdout,
+                                     sys.stderr)
+    finally:
+        sock.close()
+
+
 def main():
     if DEBUG:
         pid = os.getpid()
@@ -291,6 +348,19 @@ def main():
 
     logging.debug('!!! %s, %s, %s' % (hostname, username, command))
 
+    if options.subsystem == 'sftp':
+        subsystem = 'sftp'
+    else:
+        subsystem = None
+
+    if options.multiplex and (subsystem or command):
+        status = run_multiplexed(hostname, port, username, command,
+                                 subsystem)
+
+        if status is not None:
+            logging.debug('!!! Done (multiplexed)')
+            return status
+
     client = SSHClient(namespace=options.local_site_name)
     client.set_missing_host_key_policy(paramiko.WarningPolicy())
 
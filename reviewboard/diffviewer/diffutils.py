@@ -6,9 +6,11 @@ import subprocess
 import tempfile
 from difflib import SequenceMatcher
 
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import six
 from django.utils.translation import ugettext as _
+from djblets.cache.backend import make_cache_key
 from djblets.log import log_timed
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.contextmanagers import controlled_subprocess
@@ -364,6 +366,66 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
     return get_sorted_filediffs(files, key=lambda f: f['filediff'])
 
 
+def prefetch_original_files(filediffs, request=None):
+    """Fetches the original files for several FileDiffs into the cache.
+
+    The files are fetched in batches (one per repository and base commit
+    ID), so that get_original_file won't have to go to the repository for
+    each one individually.
+    """
+    batches = {}
+
+    for filediff in filediffs:
+        if filediff.is_new or filediff.binary:
+            continue
+
+        diffset = filediff.diffset
+        key = (diffset.repository_id, diffset.base_commit_id)
+
+        if key not in batches:
+            batches[key] = (diffset.repository, [])
+
+        batches[key][1].append((filediff.source_file,
+                                filediff.source_revision))
+
+    for (repository_id, base_commit_id), (repository, files) in \
+            six.iteritems(batches):
+        repository.prefetch_files(files, base_commit_id=base_commit_id,
+                                  request=request)
+
+
+def prefetch_diff_files(files, enable_syntax_highlighting=True,
+                        request=None):
+    """Fetches the original files for a list of diff files into the cache.
+
+    This accepts a list of files (generated by get_diff_files), such as
+    a page of the diff viewer. The original files for any of them that
+    don't already have cached chunks are prefetched from the repository in
+    one batch, so that rendering each file afterward doesn't have to go to
+    the repository on its own.
+    """
+    from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
+
+    filediffs = []
+
+    for diff_file in files:
+        generator = get_diff_chunk_generator(request,
+                                             diff_file['filediff'],
+                                             diff_file['interfilediff'],
+                                             diff_file['force_interdiff'],
+                                             enable_syntax_highlighting)
+
+        if make_cache_key(generator.make_cache_key()) not in cache:
+            filediffs += [
+                filediff
+                for filediff in (generator.filediff, generator.interfilediff)
+                if filediff
+            ]
+
+    if filediffs:
+        prefetch_original_files(filediffs, request=request)
+
+
 def populate_diff_chunks(files, enable_syntax_highlighting=True,
                          request=None):
     """Populates a list of diff files with chunk data.
@@ -14,6 +14,7 @@ from djblets.siteconfig.models import SiteConfiguration
 
 from reviewboard.diffviewer.diffutils import (get_diff_files,
                                               populate_diff_chunks,
+                                              prefetch_diff_files,
                                               get_enable_highlighting)
 from reviewboard.diffviewer.errors import UserVisibleError
 from reviewboard.diffviewer.models import DiffSet, FileDiff
@@ -153,6 +154,13 @@ class DiffViewerView(TemplateView):
 
         page = paginator.page(page_num)
 
+        # The files on this page are rendered through separate diff fragment
+        # requests. Fetch their original files in one batch now, so that
+        # those requests can build their chunks from the cache.
+        prefetch_diff_files(page.object_list,
+                            get_enable_highlighting(self.request.user),
+                            request=self.request)
+
         diff_context = {
             'revision': {
                 'revision': diffset.revision,
@@ -17,7 +17,9 @@ from django.views.decorators.http import require_POST
 from reviewboard.admin.server import get_server_url
 from reviewboard.hostingsvcs.forms import HostingServiceForm
 from reviewboard.hostingsvcs.hook_utils import (close_all_review_requests,
-                                                get_review_request_id)
+                                                get_repository_for_hook,
+                                                get_review_request_id,
+                                                get_review_request_ids)
 from reviewboard.hostingsvcs.service import HostingService
 from reviewboard.scmtools.crypto_utils import (decrypt_password,
                                                encrypt_password)
@@ -71,7 +73,8 @@ class Beanstalk(HostingService):
     repository_url_patterns = patterns(
         '',
         url(r'^hooks/post-receive/$',
-            'reviewboard.hostingsvcs.beanstalk.process_post_receive_hook'),
+            'reviewboard.hostingsvcs.beanstalk.process_post_receive_hook',
+            name='beanstalk-hooks-post-receive'),
     )
 
     def check_repository(self, beanstalk_account_domain=None,
@@ -214,18 +217,34 @@ class Beanstalk(HostingService):
 
 
 @require_POST
-def process_post_receive_hook(request, *args, **kwargs):
+def process_post_receive_hook(request, local_site_name=None,
+                              repository_id=None, hosting_service_id=None):
     """Closes review requests as submitted automatically after a push."""
+    repository = get_repository_for_hook(repository_id, hosting_service_id,
+                                         local_site_name)
+
     try:
         server_url = get_server_url(request=request)
 
         # Check if it's a git or an SVN repository and close accordingly.
         if 'payload' in request.POST:
             payload = json.loads(request.POST['payload'])
-            close_git_review_requests(payload, server_url)
+            branch_name = payload.get('branch')
+
+            # The push may have added files and commits that are cached as
+            # missing or out of date.
+            if branch_name:
+                repository.invalidate_cached_lookups(branches=[branch_name])
+            else:
+                repository.invalidate_cached_lookups()
+
+            close_git_review_requests(payload, server_url, local_site_name,
+                                      repository, hosting_service_id)
         else:
             payload = json.loads(request.POST['commit'])
-            close_svn_review_request(payload, server_url)
+            repository.invalidate_cached_lookups()
+            close_svn_review_request(payload, server_url, local_site_name,
+                                     repository, hosting_service_id)
 
     except KeyError as e:
         logging.error('There is no JSON payload in the POST request.: %s', e)
@@ -238,7 +257,8 @@ def process_post_receive_hook(request, *args, **kwargs):
     return HttpResponse()
 
 
-def close_git_review_requests(payload, server_url):
+def close_git_review_requests(payload, server_url, local_site_name,
+                              repository, hosting_service_id):
     """Closes all review requests for the git repository.
 
     A git payload may contain multiple commits. If a commit's commit
@@ -252,19 +272,23 @@ def close_git_review_requests(payload, server_url):
         return review_id_to_commits_map
 
     commits = payload.get('commits', [])
-
-    for commit in commits:
-        commit_hash = commit.get('id')
-        commit_message = commit.get('message')
-        review_request_id = get_review_request_id(commit_message, server_url,
-                                                  commit_hash)
-        commit_entry = '%s (%s)' % (branch_name, commit_hash[:7])
+    review_request_ids = get_review_request_ids(
+        [
+            (commit.get('message'), commit.get('id'))
+            for commit in commits
+        ],
+        server_url)
+
+    for commit, review_request_id in zip(commits, review_request_ids):
+        commit_entry = '%s (%s)' % (branch_name, commit.get('id')[:7])
         review_id_to_commits_map[review_request_id].append(commit_entry)
 
-    close_all_review_requests(review_id_to_commits_map)
+    close_all_review_requests(review_id_to_commits_map, local_site_name,
+                              repository, hosting_service_id)
 
 
-def close_svn_review_request(payload, server_url):
+def close_svn_review_request(payload, server_url, local_site_name,
+                             repository, hosting_service_id):
     """Closes the review request for an SVN repository.
 
     The SVN payload may contains one commit. If a commit's commit
@@ -279,4 +303,5 @@ def close_svn_review_request(payload, server_url):
                                               None)
     commit_entry = '%s (%s)' % (branch_name, revision)
     review_id_to_commits_map[review_request_id].append(commit_entry)
-    close_all_review_requests(review_id_to_commits_map)
+    close_all_review_requests(review_id_to_commits_map, local_site_name,
+                              repository, hosting_service_id)
@@ -23,7 +23,7 @@ from reviewboard.hostingsvcs.errors import (AuthorizationError,
 from reviewboard.hostingsvcs.forms import HostingServiceForm
 from reviewboard.hostingsvcs.hook_utils import (close_all_review_requests,
                                                 get_repository_for_hook,
-                                                get_review_request_id)
+                                                get_review_request_ids)
 from reviewboard.hostingsvcs.service import HostingService
 from reviewboard.scmtools.crypto_utils import (decrypt_password,
                                                encrypt_password)
@@ -377,6 +377,14 @@ def post_receive_hook_close_submitted(request, local_site_name=None,
         logging.error('The payload is not in JSON format: %s', e)
         return HttpResponseBadRequest('Invalid payload format')
 
+    # The push may have added files and commits that are cached as missing
+    # or out of date.
+    repository.invalidate_cached_lookups(branches=set(
+        commit['branch']
+        for commit in payload.get('commits', [])
+        if commit.get('branch')
+    ))
+
     server_url = get_server_url(request=request)
     review_request_id_to_commits = \
         _get_review_request_id_to_commits_map(payload, server_url)
@@ -396,17 +404,20 @@ def _get_review_request_id_to_commits_map(payload, server_url):
     append the commit to the key None.
     """
     review_request_id_to_commits_map = defaultdict(list)
-    commits = payload.get('commits', [])
-
-    for commit in commits:
-        commit_hash = commit.get('raw_node')
-        commit_message = commit.get('message')
-        branch_name = commit.get('branch')
-
-        if branch_name:
-            review_request_id = get_review_request_id(
-                commit_message, server_url, commit_hash)
-            review_request_id_to_commits_map[review_request_id].append(
-                '%s (%s)' % (branch_name, commit_hash[:7]))
+    commits = [
+        commit
+        for commit in payload.get('commits', [])
+        if commit.get('branch')
+    ]
+    review_request_ids = get_review_request_ids(
+        [
+            (commit.get('message'), commit.get('raw_node'))
+            for commit in commits
+        ],
+        server_url)
+
+    for commit, review_request_id in zip(commits, review_request_ids):
+        review_request_id_to_commits_map[review_request_id].append(
+            '%s (%s)' % (commit['branch'], commit.get('raw_node')[:7]))
 
     return review_request_id_to_commits_map
@@ -1,6 +1,19 @@
 from __future__ import unicode_literals
 
-from djblets.cache.backend import cache_memoize
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.utils import six
+from djblets.cache.backend import make_cache_key
+
+from reviewboard.reviews.signals import review_request_published
+
+
+#: The number of seconds during which a bug won't be prefetched again.
+PREFETCH_LOCK_EXPIRATION = 60
 
 
 class BugTracker(object):
@@ -9,6 +22,14 @@ class BugTracker(object):
     BugTracker subclasses are used to enable interaction with different
     bug trackers.
     """
+    #: The number of seconds fetched bug information is cached for.
+    bug_info_cache_expiration = 60
+
+    #: The number of seconds prefetched bug information is cached for (see
+    #: prefetch_bug_infos). Once it's older than bug_info_cache_expiration,
+    #: it's still used, but is refreshed in the background.
+    prefetched_bug_info_cache_expiration = 60 * 60
+
     def get_bug_info(self, repository, bug_id):
         """Get the information for the specified bug.
 
@@ -19,10 +40,68 @@ class BugTracker(object):
         bug trackers and make things seem fast after the first infobox load,
         but is still a short enough time to give relatively fresh data.
         """
-        return cache_memoize(self.make_bug_cache_key(repository, bug_id),
-                             lambda: self.get_bug_info_uncached(repository,
-                                                                bug_id),
-                             expiration=60)
+        bug_id = six.text_type(bug_id)
+        entry = self._get_cached_bug_infos(repository, [bug_id]).get(bug_id)
+
+        if entry is None:
+            bug_info = self.get_bug_info_uncached(repository, bug_id)
+            self._cache_bug_infos(repository, {bug_id: bug_info},
+                                  self.bug_info_cache_expiration)
+
+            return bug_info
+
+        self._refresh_stale_bug_infos(repository, {bug_id: entry})
+
+        return entry['bug_info']
+
+    def get_bug_infos(self, repository, bug_ids, expiration=None):
+        """Get the information for several bugs.
+
+        This returns a dictionary mapping each bug ID to a dictionary like
+        the one returned by :py:meth:`get_bug_info`, and shares its cache.
+        Only the bugs that aren't cached are fetched from the bug tracker,
+        through :py:meth:`get_bug_infos_uncached`.
+
+        Fetched bugs are cached for ``expiration`` seconds, defaulting to
+        ``bug_info_cache_expiration``.
+        """
+        bug_ids = [six.text_type(bug_id) for bug_id in bug_ids]
+        cached = self._get_cached_bug_infos(repository, bug_ids)
+        uncached_bug_ids = [
+            bug_id
+            for bug_id in bug_ids
+            if bug_id not in cached
+        ]
+
+        self._refresh_stale_bug_infos(repository, cached)
+
+        result = dict(
+            (bug_id, entry['bug_info'])
+            for bug_id, entry in six.iteritems(cached)
+        )
+
+        if uncached_bug_ids:
+            fetched = self.get_bug_infos_uncached(repository,
+                                                  uncached_bug_ids)
+            self._cache_bug_infos(
+                repository, fetched,
+                expiration or self.bug_info_cache_expiration)
+            result.update(fetched)
+
+        return result
+
+    def refresh_bug_infos(self, repository, bug_ids):
+        """Fetch information for several bugs into the cache.
+
+        The bugs are fetched from the bug tracker, whether or not they're
+        cached, and are kept for ``prefetched_bug_info_cache_expiration``
+        seconds.
+        """
+        bug_ids = [six.text_type(bug_id) for bug_id in bug_ids]
+        self._cache_bug_infos(repository,
+                              self.get_bug_infos_uncached(repository,
+                                                          bug_ids),
+                              self.prefetched_bug_info_cache_expiration)
 
     def get_bug_info_uncached(self, repository, bug_id):
         """Get the information for the specified bug (implementation).
@@ -38,6 +117,153 @@ class BugTracker(object):
             'status': '',
         }
 
+    def get_bug_infos_uncached(self, repository, bug_ids):
+        """Get the information for several bugs (implementation).
+
+        This returns a dictionary mapping each bug ID to the result of
+        :py:meth:`get_bug_info_uncached`. By default, the bugs are fetched
+        one at a time. Subclasses for bug trackers that can look up several
+        bugs at once should override this.
+        """
+        return dict(
+            (bug_id, self.get_bug_info_uncached(repository, bug_id))
+            for bug_id in bug_ids
+        )
+
     def make_bug_cache_key(self, repository, bug_id):
         """Returns a key to use when caching fetched bug information."""
         return 'repository-%s-bug-%s' % (repository.pk, bug_id)
+
+    def _get_cached_bug_infos(self, repository, bug_ids):
+        """Returns the cache entries for the bugs that are cached.
+
+        Each entry is a dictionary with the bug information (``bug_info``)
+        and the time it was fetched (``timestamp``).
+        """
+        cache_keys = dict(
+            (make_cache_key(self.make_bug_cache_key(repository, bug_id)),
+             bug_id)
+            for bug_id in bug_ids
+        )
+
+        try:
+            cached = cache.get_many(list(cache_keys.keys()))
+        except Exception as e:
+            logging.warning('Unable to load cached bug information: %s', e)
+            cached = {}
+
+        return dict(
+            (cache_keys[cache_key], entry)
+            for cache_key, entry in six.iteritems(cached)
+        )
+
+    def _cache_bug_infos(self, repository, bug_infos, expiration):
+        """Caches information for several bugs."""
+        timestamp = time.time()
+
+        try:
+            cache.set_many(
+                dict(
+                    (make_cache_key(self.make_bug_cache_key(repository,
+                                                            bug_id)),
+                     {
+                         'bug_info': bug_info,
+                         'timestamp': timestamp,
+                     })
+                    for bug_id, bug_info in six.iteritems(bug_infos)
+                ),
+                expiration)
+        except Exception as e:
+            logging.warning('Unable to cache bug information: %s', e)
+
+    def _refresh_stale_bug_infos(self, repository, entries):
+        """Refreshes cached bugs in the background, if they've gone stale.
+
+        Prefetched bugs are kept for longer than bug_info_cache_expiration.
+        They're still used once they're older than that, but are refetched
+        in the background.
+        """
+        cutoff = time.time() - self.bug_info_cache_expiration
+        stale_bug_ids = [
+            bug_id
+            for bug_id, entry in six.iteritems(entries)
+            if entry['timestamp'] < cutoff
+        ]
+
+        if stale_bug_ids:
+            prefetch_bug_infos(repository, sorted(stale_bug_ids),
+                               refresh=True)
+
+
+def prefetch_bug_infos(repository, bug_ids, refresh=False):
+    """Fetches information on bugs into the cache, in the background.
+
+    This is used to make sure bug infoboxes can be shown straight from the
+    cache. The bugs are fetched in a single batch, in a new thread, which is
+    returned, and are cached for the bug tracker's
+    ``prefetched_bug_info_cache_expiration``. Bugs that are already cached
+    are only fetched if ``refresh`` is set.
+
+    Each bug is prefetched at most once every ``PREFETCH_LOCK_EXPIRATION``
+    seconds, no matter how many requests ask for it. If the repository's
+    bug tracker doesn't support fetching bug information, or there are no
+    bugs left to prefetch, this returns None.
+    """
+    bug_tracker = repository.bug_tracker_service
+
+    if not bug_ids or not isinstance(bug_tracker, BugTracker):
+        return None
+
+    bug_ids = [
+        bug_id
+        for bug_id in bug_ids
+        if _acquire_prefetch_lock(bug_tracker, repository, bug_id)
+    ]
+
+    if not bug_ids:
+        return None
+
+    def _prefetch():
+        try:
+            if refresh:
+                bug_tracker.refresh_bug_infos(repository, bug_ids)
+            else:
+                bug_tracker.get_bug_infos(
+                    repository, bug_ids,
+                    bug_tracker.prefetched_bug_info_cache_expiration)
+        except Exception as e:
+            logging.warning('Unable to prefetch bugs %s for repository %s: '
+                            '%s',
+                            ', '.join(bug_ids), repository.pk, e,
+                            exc_info=1)
+
+    thread = threading.Thread(target=_prefetch)
+    thread.daemon = True
+    thread.start()
+
+    return thread
+
+
+def _acquire_prefetch_lock(bug_tracker, repository, bug_id):
+    """Returns whether a bug can be prefetched now.
+
+    The lock is held until it expires, so that a bug isn't prefetched again
+    by other requests in the meantime.
+    """
+    key = make_cache_key('%s-prefetch'
+                         % bug_tracker.make_bug_cache_key(repository, bug_id))
+
+    try:
+        return cache.add(key, True, PREFETCH_LOCK_EXPIRATION)
+    except Exception as e:
+        logging.warning('Unable to lock bug %s for prefetching: %s',
+                        bug_id, e)
+        return True
+
+
+@receiver(review_request_published, dispatch_uid='prefetch_bug_infos')
+def _prefetch_published_bug_infos(sender, review_request, **kwargs):
+    if review_request.repository_id:
+        prefetch_bug_infos(review_request.repository,
+                           review_request.get_bug_list(),
+                           refresh=True)
@@ -4,6 +4,7 @@ import logging
 
 from django import forms
 from django.utils import six
+from django.utils.six.moves.urllib.parse import urlencode
 from django.utils.translation import ugettext_lazy as _
 
 from reviewboard.hostingsvcs.bugtracker import BugTracker
@@ -47,8 +48,8 @@ class Bugzilla(HostingService, BugTracker):
                 repository.extra_data['bug_tracker-bugzilla_url'],
                 bug_id)
             rsp, headers = self.client.json_get(url)
-            result['summary'] = rsp['bugs'][0]['summary'],
-            result['status'] = rsp['bugs'][0]['status'],
+            result['summary'] = rsp['bugs'][0]['summary']
+            result['status'] = rsp['bugs'][0]['status']
         except Exception as e:
             logging.warning('Unable to fetch bugzilla data from %s: %s',
                             url, e, exc_info=1)
@@ -62,3 +63,65 @@ class Bugzilla(HostingService, BugTracker):
                             url, e, exc_info=1)
 
         return result
+
+    def get_bug_infos_uncached(self, repository, bug_ids):
+        """Get the info for several bugs from the server.
+
+        Bugzilla can look up any number of bugs in one request, so this
+        takes two HTTP requests in total, no matter how many bugs there are.
+        """
+        bug_ids = [six.text_type(bug_id) for bug_id in bug_ids]
+
+        results = dict(
+            (bug_id, {
+                'summary': '',
+                'description': '',
+                'status': '',
+            })
+            for bug_id in bug_ids
+        )
+
+        if not bug_ids:
+            return results
+
+        base_url = repository.extra_data['bug_tracker-bugzilla_url']
+
+        url = '%s/rest/bug?%s' % (
+            base_url,
+            urlencode({
+                'id': ','.join(bug_ids),
+                'include_fields': 'id,summary,status',
+            }))
+
+        try:
+            rsp, headers = self.client.json_get(url)
+
+            for bug in rsp['bugs']:
+                bug_id = six.text_type(bug['id'])
+
+                if bug_id in results:
+                    results[bug_id]['summary'] = bug['summary']
+                    results[bug_id]['status'] = bug['status']
+        except Exception as e:
+            logging.warning('Unable to fetch bugzilla data from %s: %s',
+                            url, e, exc_info=1)
+
+        # The comments for any set of bugs can be fetched through the
+        # comment URL of any one of them.
+        url = '%s/rest/bug/%s/comment?%s' % (
+            base_url,
+            bug_ids[0],
+            urlencode([('ids', other_id) for other_id in bug_ids[1:]]))
+
+        try:
+            rsp, headers = self.client.json_get(url)
+
+            for bug_id, bug in six.iteritems(rsp['bugs']):
+                if bug_id in results and bug['comments']:
+                    results[bug_id]['description'] = \
+                        bug['comments'][0]['text']
+        except Exception as e:
+            logging.warning('Unable to fetch bugzilla data from %s: %s',
+                            url, e, exc_info=1)
+
+        return results
@@ -37,5 +37,17 @@ class InvalidPlanError(HostingServiceError):
             '%s is not a valid plan for this hosting service' % plan)
 
 
+class RateLimitExceededError(HostingServiceError):
+    """Indicates a request was refused due to the account's rate limit.
+
+    ``reset_time`` is the time (in seconds since the epoch) when the rate
+    limit resets, if known.
+    """
+    def __init__(self, message, reset_time=None, **kwargs):
+        super(RateLimitExceededError, self).__init__(message, **kwargs)
+
+        self.reset_time = reset_time
+
+
 class SSHKeyAssociationError(HostingServiceError):
     pass
@@ -5,6 +5,7 @@ import hmac
 import json
 import logging
 import re
+import threading
 import uuid
 from collections import defaultdict
 
@@ -22,6 +23,7 @@ from django.utils.six.moves.urllib.error import HTTPError, URLError
 from django.utils.six.moves.urllib.parse import urljoin
 from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.http import require_POST
+from djblets.cache.backend import cache_memoize
 from djblets.siteconfig.models import SiteConfiguration
 
 from reviewboard.admin.server import build_server_url, get_server_url
@@ -29,13 +31,15 @@ from reviewboard.hostingsvcs.bugtracker import BugTracker
 from reviewboard.hostingsvcs.errors import (AuthorizationError,
                                             HostingServiceError,
                                             InvalidPlanError,
+                                            RateLimitExceededError,
                                             RepositoryError,
                                             TwoFactorAuthCodeRequiredError)
 from reviewboard.hostingsvcs.forms import HostingServiceForm
 from reviewboard.hostingsvcs.hook_utils import (close_all_review_requests,
                                                 get_git_branch_name,
                                                 get_repository_for_hook,
-                                                get_review_request_id)
+                                                get_review_request_ids)
+from reviewboard.hostingsvcs.rate_limits import RateLimitScheduler
 from reviewboard.hostingsvcs.repository import RemoteRepository
 from reviewboard.hostingsvcs.service import (HostingService,
                                              HostingServiceClient)
@@ -120,9 +124,16 @@ class GitHubAPIPaginator(APIPaginator):
 
     LINK_RE = re.compile(r'\<(?P<url>[^>]+)\>; rel="(?P<rel>[^"]+)",? *')
 
+    def __init__(self, *args, **kwargs):
+        self.priority = kwargs.pop('priority',
+                                   RateLimitScheduler.PRIORITY_NORMAL)
+
+        super(GitHubAPIPaginator, self).__init__(*args, **kwargs)
+
     def fetch_url(self, url):
         """Fetches the page data from a URL."""
-        data, headers = self.client.api_get(url, return_headers=True)
+        data, headers = self.client.api_get(url, return_headers=True,
+                                            priority=self.priority)
 
         # Find all the links in the Link header and key off by the link
         # name ('prev', 'next', etc.).
@@ -131,17 +142,53 @@ class GitHubAPIPaginator(APIPaginator):
             for m in self.LINK_RE.finditer(headers.get('Link', ''))
         )
 
+        # The "last" link tells us how many pages there are, which allows
+        # for reading ahead.
+        page_count = None
+
+        if 'last' in links:
+            page_count = self._get_page_number(links['last'])
+
         return {
             'data': data,
             'headers': headers,
+            'page_count': page_count,
             'prev_url': links.get('prev'),
             'next_url': links.get('next'),
         }
 
 
 class GitHubClient(HostingServiceClient):
+    """Client for the GitHub API.
+
+    Requests are scheduled against the account's rate limits through a
+    RateLimitScheduler. The HTTP and API methods take an optional
+    ``priority`` keyword argument (one of the
+    ``RateLimitScheduler.PRIORITY_*`` values), which defaults to
+    ``PRIORITY_NORMAL``.
+    """
     RAW_MIMETYPE = 'application/vnd.github.v3.raw'
 
+    #: The maximum number of trees fetched at once by api_get_blob_shas.
+    max_tree_workers = 4
+
+    #: The maximum number of issues fetched at once by
+    #: GitHub.get_bug_infos_uncached.
+    max_issue_workers = 4
+
+    #: The number of pages read ahead when paging through all the results
+    #: of a list resource (see api_get_heads).
+    max_prefetch_pages = 4
+
+    #: The number of results requested per page when paging through all the
+    #: results of a list resource. This is the maximum GitHub allows.
+    max_per_page = 100
+
+    #: The cache expiration for data keyed by commit or tree SHAs. This data
+    #: never changes, so it's kept for as long as the cache will keep it.
+    #: (Not all cache backends support entries without an expiration.)
+    IMMUTABLE_CACHE_EXPIRATION = 365 * 24 * 60 * 60
+
     def __init__(self, hosting_service):
         super(GitHubClient, self).__init__(hosting_service)
         self.account = hosting_service.account
@@ -151,22 +198,16 @@ class GitHubClient(HostingServiceClient):
     #
 
     def http_delete(self, url, *args, **kwargs):
-        data, headers = super(GitHubClient, self).http_delete(
-            url, *args, **kwargs)
-        self._check_rate_limits(headers)
-        return data, headers
+        return self._http_scheduled(super(GitHubClient, self).http_delete,
+                                    url, *args, **kwargs)
 
     def http_get(self, url, *args, **kwargs):
-        data, headers = super(GitHubClient, self).http_get(
-            url, *args, **kwargs)
-        self._check_rate_limits(headers)
-        return data, headers
+        return self._http_scheduled(super(GitHubClient, self).http_get,
+                                    url, *args, **kwargs)
 
     def http_post(self, url, *args, **kwargs):
-        data, headers = super(GitHubClient, self).http_post(
-            url, *args, **kwargs)
-        self._check_rate_limits(headers)
-        return data, headers
+        return self._http_scheduled(super(GitHubClient, self).http_post,
+                                    url, *args, **kwargs)
 
     #
     # API wrappers around HTTP/JSON methods
@@ -196,7 +237,9 @@ class GitHubClient(HostingServiceClient):
         except (URLError, HTTPError) as e:
             self._check_api_error(e)
 
-    def api_get_list(self, url, start=None, per_page=None, *args, **kwargs):
+    def api_get_list(self, url, start=None, per_page=None,
+                     priority=RateLimitScheduler.PRIORITY_NORMAL,
+                     prefetch_pages=0, *args, **kwargs):
         """Performs an HTTP GET to a GitHub API and returns a paginator.
 
         This returns a GitHubAPIPaginator that's used to iterate over the
@@ -206,12 +249,17 @@ class GitHubClient(HostingServiceClient):
         The ``start`` and ``per_page`` parameters can be used to control
         where pagination begins and how many results are returned per page.
         ``start`` is a 0-based index representing a page number.
+
+        If ``prefetch_pages`` is set, up to that many pages past the current
+        one are fetched ahead of time.
         """
         if start is not None:
             # GitHub uses 1-based indexing, so add one.
             start += 1
 
-        return GitHubAPIPaginator(self, url, start=start, per_page=per_page)
+        return GitHubAPIPaginator(self, url, start=start, per_page=per_page,
+                                  priority=priority,
+                                  prefetch_pages=prefetch_pages)
 
     def api_post(self, url, *args, **kwargs):
         try:
@@ -228,55 +276,149 @@ class GitHubClient(HostingServiceClient):
         url = self._build_api_url(repo_api_url, 'git/blobs/%s' % sha)
 
         try:
-            return self.http_get(url, headers={
-                'Accept': self.RAW_MIMETYPE,
-            })[0]
+            return self.http_get(
+                url,
+                headers={
+                    'Accept': self.RAW_MIMETYPE,
+                },
+                priority=RateLimitScheduler.PRIORITY_INTERACTIVE)[0]
         except (URLError, HTTPError):
             raise FileNotFoundError(path, sha)
+        except RateLimitExceededError as e:
+            raise SCMError(six.text_type(e))
 
-    def api_get_commits(self, repo_api_url, start=None):
+    def api_get_commits(self, repo_api_url, start=None,
+                        priority=RateLimitScheduler.PRIORITY_BACKGROUND):
         url = self._build_api_url(repo_api_url, 'commits')
         if start:
             url += '&sha=%s' % start
 
         try:
-            return self.api_get(url)
+            return self.api_get(url, priority=priority)
         except Exception as e:
             logging.warning('Failed to fetch commits from %s: %s',
                             url, e, exc_info=1)
             raise SCMError(six.text_type(e))
 
     def api_get_compare_commits(self, repo_api_url, parent_revision, revision):
-        # If the commit has a parent commit, use GitHub's "compare two commits"
-        # API to get the diff. Otherwise, fetch the commit itself.
-        if parent_revision:
-            url = self._build_api_url(
-                repo_api_url,
-                'compare/%s...%s' % (parent_revision, revision))
-        else:
-            url = self._build_api_url(repo_api_url, 'commits/%s' % revision)
+        """Returns the files changed between two commits.
 
-        try:
-            comparison = self.api_get(url)
-        except Exception as e:
-            logging.warning('Failed to fetch commit comparison from %s: %s',
-                            url, e, exc_info=1)
-            raise SCMError(six.text_type(e))
+        This returns a tuple of the list of changed files and the SHA of
+        the tree of ``parent_revision`` (or of ``revision``, if there's no
+        parent). As both commits are identified by SHA, the results never
+        change, and are cached indefinitely.
+        """
+        def _get_compare_commits():
+            # If the commit has a parent commit, use GitHub's "compare two
+            # commits" API to get the diff. Otherwise, fetch the commit
+            # itself.
+            if parent_revision:
+                url = self._build_api_url(
+                    repo_api_url,
+                    'compare/%s...%s' % (parent_revision, revision))
+            else:
+                url = self._build_api_url(repo_api_url,
+                                          'commits/%s' % revision)
 
-        if parent_revision:
-            tree_sha = comparison['base_commit']['commit']['tree']['sha']
-        else:
-            tree_sha = comparison['commit']['tree']['sha']
+            try:
+                comparison = self.api_get(url)
+            except Exception as e:
+                logging.warning('Failed to fetch commit comparison from %s: '
+                                '%s',
+                                url, e, exc_info=1)
+                raise SCMError(six.text_type(e))
+
+            if parent_revision:
+                tree_sha = comparison['base_commit']['commit']['tree']['sha']
+            else:
+                tree_sha = comparison['commit']['tree']['sha']
+
+            # Only keep what's needed to build the diff, as the rest of the
+            # comparison can be large.
+            files = [
+                dict((key, file[key])
+                     for key in ('filename', 'status', 'sha', 'patch')
+                     if key in file)
+                for file in comparison['files']
+            ]
+
+            return files, tree_sha
+
+        return cache_memoize(
+            'github-compare:%s:%s:%s' % (repo_api_url, parent_revision,
+                                         revision),
+            _get_compare_commits,
+            expiration=self.IMMUTABLE_CACHE_EXPIRATION,
+            large_data=True)
+
+    def api_get_blob_shas(self, repo_api_url, tree_sha, paths):
+        """Returns the SHAs of the blobs at the given paths in a tree.
+
+        Rather than fetching the entire tree recursively, this only fetches
+        the trees along the given paths, one level at a time. The trees at
+        each level are fetched concurrently.
+
+        This returns a dictionary mapping paths to blob SHAs. Paths that
+        aren't blobs in the tree are left out.
+        """
+        result = {}
 
-        return comparison['files'], tree_sha
+        if not paths:
+            return result
 
+        # A mapping of tree SHAs to the lookups to perform in them. Each
+        # lookup is the list of path components left to look up, and the
+        # full path.
+        pending = {
+            tree_sha: [(path.split('/'), path) for path in paths],
+        }
 
-    def api_get_heads(self, repo_api_url):
+        while pending:
+            tree_shas = list(pending)
+            trees = self._run_concurrently(
+                lambda sha: self.api_get_tree_entries(repo_api_url, sha),
+                tree_shas,
+                self.max_tree_workers)
+            next_pending = defaultdict(list)
+
+            for sha, entries in zip(tree_shas, trees):
+                for components, path in pending[sha]:
+                    try:
+                        entry_type, entry_sha = entries[components[0]]
+                    except KeyError:
+                        continue
+
+                    if len(components) == 1:
+                        if entry_type == 'blob':
+                            result[path] = entry_sha
+                    elif entry_type == 'tree':
+                        next_pending[entry_sha].append((components[1:],
+                                                        path))
+
+            pending = next_pending
+
+        return result
+
+
+    def api_get_heads(self, repo_api_url,
+                      priority=RateLimitScheduler.PRIORITY_INTERACTIVE):
         url = self._build_api_url(repo_api_url, 'git/refs/heads')
 
         try:
-            rsp = self.api_get(url)
-            return [ref for ref in rsp if ref['ref'].startswith('refs/heads/')]
+            # Repositories can have more branches than fit on one page, so
+            # page through all of them, reading ahead once the number of
+            # pages is known.
+            paginator = self.api_get_list(
+                url,
+                per_page=self.max_per_page,
+                priority=priority,
+                prefetch_pages=self.max_prefetch_pages)
+
+            return [
+                ref
+                for ref in paginator.iter_items()
+                if ref['ref'].startswith('refs/heads/')
+            ]
         except Exception as e:
             logging.warning('Failed to fetch commits from %s: %s',
                             url, e, exc_info=1)
@@ -292,9 +434,10 @@ class GitHubClient(HostingServiceClient):
                             url, e, exc_info=1)
             raise SCMError(six.text_type(e))
 
-    def api_get_remote_repositories(self, api_url, owner, owner_type,
-                                    filter_type=None, start=None,
-                                    per_page=None):
+    def api_get_remote_repositories(
+            self, api_url, owner, owner_type, filter_type=None, start=None,
+            per_page=None, priority=RateLimitScheduler.PRIORITY_BACKGROUND,
+            prefetch_pages=0):
         url = api_url
 
         if owner_type == 'organization':
@@ -314,19 +457,46 @@ class GitHubClient(HostingServiceClient):
         if filter_type:
             url += '?type=%s' % (filter_type or 'all')
 
-        return self.api_get_list(self._build_api_url(url),
-                                 start=start, per_page=per_page)
+        return self.api_get_list(
+            self._build_api_url(url),
+            start=start,
+            per_page=per_page,
+            priority=priority,
+            prefetch_pages=prefetch_pages)
 
-    def api_get_remote_repository(self, api_url, owner, repository_id):
+    def api_get_remote_repository(
+            self, api_url, owner, repository_id,
+            priority=RateLimitScheduler.PRIORITY_INTERACTIVE):
         try:
-            return self.api_get(self._build_api_url(
-                '%srepos/%s/%s' % (api_url, owner, repository_id)))
+            return self.api_get(
+                self._build_api_url('%srepos/%s/%s'
+                                    % (api_url, owner, repository_id)),
+                priority=priority)
         except HostingServiceError as e:
             if e.http_code == 404:
                 return None
             else:
                 raise
 
+    def api_get_tree_entries(self, repo_api_url, sha):
+        """Returns the entries of a single tree.
+
+        This returns a dictionary mapping the names of the entries to
+        tuples of their type and SHA. As trees are identified by SHA, the
+        results never change, and are cached indefinitely.
+        """
+        def _get_tree_entries():
+            tree = self.api_get_tree(repo_api_url, sha)
+
+            return dict(
+                (entry['path'], (entry['type'], entry['sha']))
+                for entry in tree['tree']
+            )
+
+        return cache_memoize('github-tree:%s:%s' % (repo_api_url, sha),
+                             _get_tree_entries,
+                             expiration=self.IMMUTABLE_CACHE_EXPIRATION)
+
     def api_get_tree(self, repo_api_url, sha, recursive=False):
         url = self._build_api_url(repo_api_url, 'git/trees/%s' % sha)
 
@@ -356,7 +526,87 @@ class GitHubClient(HostingServiceClient):
 
         return url
 
+    def _run_concurrently(self, func, items, max_workers):
+        """Calls a function for each item, in several threads at once.
+
+        This returns the results in the order of the items. If any call
+        raises an exception, the first such exception is raised once all
+        calls have finished.
+        """
+        if len(items) == 1:
+            return [func(items[0])]
+
+        results = [None] * len(items)
+        errors = [None] * len(items)
+        next_index = [0]
+        index_lock = threading.Lock()
+
+        def _worker():
+            while True:
+                with index_lock:
+                    i = next_index[0]
+
+                    if i >= len(items):
+                        return
+
+                    next_index[0] += 1
+
+                try:
+                    results[i] = func(items[i])
+                except Exception as e:
+                    errors[i] = e
+
+        workers = [
+            threading.Thread(target=_worker)
+            for i in range(min(max_workers, len(items)))
+        ]
+
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        for error in errors:
+            if error is not None:
+                raise error
+
+        return results
+
+    def _http_scheduled(self, method, url, *args, **kwargs):
+        """Performs an HTTP request once the rate limits allow it.
+
+        The rate limits are updated from the response, whether or not the
+        request succeeded.
+        """
+        priority = kwargs.pop('priority', RateLimitScheduler.PRIORITY_NORMAL)
+
+        self._get_rate_limit_scheduler().acquire(priority)
+
+        try:
+            data, headers = method(url, *args, **kwargs)
+        except HTTPError as e:
+            if e.info():
+                self._check_rate_limits(e.info())
+
+            raise
+
+        self._check_rate_limits(headers)
+
+        return data, headers
+
+    def _get_rate_limit_scheduler(self):
+        if self.account.pk:
+            key = 'github:%s' % self.account.pk
+        else:
+            key = 'github:%s' % self.account.username
+
+        return RateLimitScheduler.get_scheduler(key)
+
     def _check_rate_limits(self, headers):
+        self._get_rate_limit_scheduler().update(headers)
+
         rate_limit_remaining = headers.get('X-RateLimit-Remaining', None)
 
         try:
@@ -751,7 +1001,9 @@ class GitHub(HostingService, BugTracker):
             parent_revision = commit.parent
             message = commit.message
         else:
-            commit = self.client.api_get_commits(repo_api_url, revision)[0]
+            commit = self.client.api_get_commits(
+                repo_api_url, revision,
+                priority=RateLimitScheduler.PRIORITY_NORMAL)[0]
 
             author_name = commit['commit']['author']['name']
             date = commit['commit']['committer']['date'],
@@ -762,13 +1014,17 @@ class GitHub(HostingService, BugTracker):
         files, tree_sha = self.client.api_get_compare_commits(
             repo_api_url, parent_revision, revision)
 
-        # Step 3: fetch the tree for the original commit, so that we can get
-        # full blob SHAs for each of the files in the diff.
-        tree = self.client.api_get_tree(repo_api_url, tree_sha, recursive=True)
-
-        file_shas = {}
-        for file in tree['tree']:
-            file_shas[file['path']] = file['sha']
+        # Step 3: look up the original blob SHAs of the modified and removed
+        # files in the original commit's tree. Only the trees along those
+        # paths are fetched.
+        file_shas = self.client.api_get_blob_shas(
+            repo_api_url, tree_sha,
+            [
+                file['filename']
+                for file in files
+                if (file['status'] in ('modified', 'removed') and
+                    'patch' in file)
+            ])
 
         diff = []
 
@@ -815,7 +1071,8 @@ class GitHub(HostingService, BugTracker):
                       diff=diff)
 
     def get_remote_repositories(self, owner=None, owner_type='user',
-                                filter_type=None, start=None, per_page=None):
+                                filter_type=None, start=None, per_page=None,
+                                prefetch_pages=0):
         """Return a list of remote repositories matching the given criteria.
 
         This will look up each remote repository on GitHub that the given
@@ -844,7 +1101,8 @@ class GitHub(HostingService, BugTracker):
 
         url = self.get_api_url(self.account.hosting_url)
         paginator = self.client.api_get_remote_repositories(
-            url, owner, owner_type, filter_type, start, per_page)
+            url, owner, owner_type, filter_type, start, per_page,
+            prefetch_pages=prefetch_pages)
 
         return ProxyPaginator(
             paginator,
@@ -912,6 +1170,24 @@ class GitHub(HostingService, BugTracker):
 
         return result
 
+    def get_bug_infos_uncached(self, repository, bug_ids):
+        """Get the info for several bugs from the server.
+
+        GitHub's API can't look up several issues by number in one request,
+        so the issues are fetched concurrently instead.
+        """
+        bug_ids = list(bug_ids)
+
+        if not bug_ids:
+            return {}
+
+        bug_infos = self.client._run_concurrently(
+            lambda bug_id: self.get_bug_info_uncached(repository, bug_id),
+            bug_ids,
+            self.client.max_issue_workers)
+
+        return dict(zip(bug_ids, bug_infos))
+
     def get_repository_hook_instructions(self, request, repository):
         """Returns instructions for setting up incoming webhooks."""
         plan = repository.extra_data['repository_plan']
@@ -1055,6 +1331,15 @@ def post_receive_hook_close_submitted(request, local_site_name=None,
         logging.error('The payload is not in JSON format: %s', e)
         return HttpResponseBadRequest('Invalid payload format')
 
+    # The push may have added files and commits that are cached as missing
+    # or out of date.
+    branch_name = get_git_branch_name(payload.get('ref') or '')
+
+    if branch_name:
+        repository.invalidate_cached_lookups(branches=[branch_name])
+    else:
+        repository.invalidate_cached_lookups()
+
     server_url = get_server_url(request=request)
     review_request_id_to_commits = \
         _get_review_request_id_to_commits_map(payload, server_url)
@@ -1084,14 +1369,15 @@ def _get_review_request_id_to_commits_map(payload, server_url):
         return None
 
     commits = payload.get('commits', [])
-
-    for commit in commits:
-        commit_hash = commit.get('id')
-        commit_message = commit.get('message')
-        review_request_id = get_review_request_id(commit_message, server_url,
-                                                  commit_hash)
-
+    review_request_ids = get_review_request_ids(
+        [
+            (commit.get('message'), commit.get('id'))
+            for commit in commits
+        ],
+        server_url)
+
+    for commit, review_request_id in zip(commits, review_request_ids):
         review_request_id_to_commits_map[review_request_id].append(
-            '%s (%s)' % (branch_name, commit_hash[:7]))
+            '%s (%s)' % (branch_name, commit.get('id')[:7]))
 
     return review_request_id_to_commits_map
@@ -16,7 +16,7 @@ from reviewboard.admin.server import build_server_url, get_server_url
 from reviewboard.hostingsvcs.forms import HostingServiceForm
 from reviewboard.hostingsvcs.hook_utils import (close_all_review_requests,
                                                 get_repository_for_hook,
-                                                get_review_request_id)
+                                                get_review_request_ids)
 from reviewboard.hostingsvcs.service import HostingService
 from reviewboard.site.urlresolvers import local_site_reverse
 
@@ -113,6 +113,10 @@ def post_receive_hook_close_submitted(request, local_site_name=None,
         logging.error('The payload is not in JSON format: %s', e, exc_info=1)
         return HttpResponseBadRequest('Invalid payload format')
 
+    # The push may have added files and commits that are cached as missing
+    # or out of date. Google Code doesn't say which branch was pushed to.
+    repository.invalidate_cached_lookups()
+
     server_url = get_server_url(request=request)
     review_request_id_to_commits_map = \
         close_review_requests(payload, server_url)
@@ -139,16 +143,19 @@ def close_review_requests(payload, server_url):
         return review_request_id_to_commits_map
 
     revisions = payload.get('revisions', [])
-
-    for revision in revisions:
+    review_request_ids = get_review_request_ids(
+        [
+            (revision.get('message'), None)
+            for revision in revisions
+        ],
+        server_url)
+
+    for revision, review_request_id in zip(revisions, review_request_ids):
         revision_id = revision.get('revision')
 
         if len(revision_id) > 7:
             revision_id = revision_id[:7]
 
-        commit_message = revision.get('message')
-        review_request_id = get_review_request_id(commit_message, server_url,
-                                                  None)
         review_request_id_to_commits_map[review_request_id].append(
             '%s (%s)' % (branch_name, revision_id))
 
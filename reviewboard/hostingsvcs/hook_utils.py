@@ -4,6 +4,7 @@ import logging
 import re
 
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import six
@@ -38,6 +39,29 @@ def get_repository_for_hook(repository_id, hosting_service_id,
     return get_object_or_404(Repository, q)
 
 
+_hook_patterns = {}
+
+
+def _get_hook_pattern(server_url):
+    """Returns the compiled regex for finding review request IDs.
+
+    The regex only depends on the settings and the server URL, so compiled
+    regexes are kept around for later pushes.
+    """
+    regex = settings.HOSTINGSVCS_HOOK_REGEX % {
+        'server_url': server_url,
+    }
+    key = (regex, settings.HOSTINGSVCS_HOOK_REGEX_FLAGS)
+
+    try:
+        return _hook_patterns[key]
+    except KeyError:
+        pattern = re.compile(regex, settings.HOSTINGSVCS_HOOK_REGEX_FLAGS)
+        _hook_patterns[key] = pattern
+
+        return pattern
+
+
 def get_review_request_id(commit_message, server_url, commit_id):
     """Returns the review request ID matching the pushed commit.
 
@@ -48,29 +72,61 @@ def get_review_request_id(commit_message, server_url, commit_id):
 
     We assume there is at most one review request associated with each commit.
     If a matching review request cannot be found, we return None.
+
+    When looking up several commits, use :py:func:`get_review_request_ids`.
     """
-    regex = settings.HOSTINGSVCS_HOOK_REGEX % {
-        'server_url': server_url,
-    }
+    return get_review_request_ids([(commit_message, commit_id)],
+                                  server_url)[0]
 
-    pattern = re.compile(regex, settings.HOSTINGSVCS_HOOK_REGEX_FLAGS)
-    match = pattern.search(commit_message)
 
-    if match:
-        try:
-            review_request_id = int(match.group('id'))
-        except ValueError:
-            logging.error('The review request ID must be an integer.')
-            review_request_id = None
-    else:
-        try:
-            review_request = ReviewRequest.objects.get(
-                commit_id=six.text_type(commit_id))
-            review_request_id = review_request.display_id
-        except ReviewRequest.DoesNotExist:
+def get_review_request_ids(commits, server_url):
+    """Returns the review request IDs matching a list of pushed commits.
+
+    ``commits`` is a list of ``(commit_message, commit_id)`` tuples. This
+    returns a list of review request IDs (or None, where no review request
+    matches) in the same order.
+
+    This works like :py:func:`get_review_request_id`, but the commit IDs
+    of all commits without a review request ID in their messages are looked
+    up in a single query.
+    """
+    pattern = _get_hook_pattern(server_url)
+    review_request_ids = []
+    unmatched_commit_ids = set()
+
+    for commit_message, commit_id in commits:
+        match = pattern.search(commit_message or '')
+
+        if match:
+            try:
+                review_request_id = int(match.group('id'))
+            except ValueError:
+                logging.error('The review request ID must be an integer.')
+                review_request_id = None
+        else:
             review_request_id = None
 
-    return review_request_id
+            if commit_id:
+                unmatched_commit_ids.add(six.text_type(commit_id))
+
+        review_request_ids.append(review_request_id)
+
+    if unmatched_commit_ids:
+        commit_id_to_review_request_id = {}
+
+        for review_request in ReviewRequest.objects.filter(
+                commit_id__in=unmatched_commit_ids).only('pk', 'local_id',
+                                                         'local_site',
+                                                         'commit_id'):
+            commit_id_to_review_request_id[review_request.commit_id] = \
+                review_request.display_id
+
+        for i, (commit_message, commit_id) in enumerate(commits):
+            if review_request_ids[i] is None and commit_id:
+                review_request_ids[i] = commit_id_to_review_request_id.get(
+                    six.text_type(commit_id))
+
+    return review_request_ids
 
 
 def close_review_request(review_request, review_request_id, description):
@@ -128,10 +184,10 @@ def close_all_review_requests(review_request_id_to_commits, local_site_name,
 
     # Check if there are any listed that we couldn't find, and log them.
     if len(review_request_ids) != len(review_requests):
-        id_to_review_request = dict(*[
+        id_to_review_request = dict(
             (review_request.display_id, review_request)
             for review_request in review_requests
-        ])
+        )
 
         for review_request_id in review_request_ids:
             if review_request_id not in id_to_review_request:
@@ -139,12 +195,24 @@ def close_all_review_requests(review_request_id_to_commits, local_site_name,
                               'does not exist.',
                               review_request_id)
 
-    # Close any review requests we did find.
-    for review_request in review_requests:
-        review_request_id = review_request.display_id
+    # Close any review requests we did find. This is done in a single
+    # transaction, rather than committing after each review request. Each
+    # close gets its own savepoint, so that a failure only rolls back that
+    # review request, and not the ones already closed (whose e-mails and
+    # WebHooks have already been sent).
+    with transaction.atomic():
+        for review_request in review_requests:
+            review_request_id = review_request.display_id
 
-        close_review_request(
-            review_request,
-            review_request_id,
-            ('Pushed to ' +
-             ', '.join(review_request_id_to_commits[review_request_id])))
+            try:
+                with transaction.atomic():
+                    close_review_request(
+                        review_request,
+                        review_request_id,
+                        ('Pushed to ' +
+                         ', '.join(
+                             review_request_id_to_commits[review_request_id])))
+            except Exception as e:
+                logging.error('close_all_review_requests: Unable to close '
+                              'review request #%s: %s',
+                              review_request_id, e, exc_info=1)
@@ -0,0 +1,204 @@
+"""A cache of HTTP responses from hosting service APIs.
+
+Most hosting service APIs (GitHub, GitLab and Bitbucket among them) return
+an ETag or Last-Modified header with their responses. A client that
+remembers those can send a conditional request the next time, and if
+nothing has changed, the service responds with a small 304 Not Modified
+instead of the full response. GitHub doesn't count 304 responses against
+the rate limit at all.
+
+HTTPResponseCache stores responses for HostingServiceClient, along with the
+validators needed to revalidate them. Responses are stored through a
+storage backend, either the main cache (usually memcached) or a
+byte-budgeted cache on local disk.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.six.moves import cPickle as pickle
+from djblets.cache.backend import make_cache_key
+
+from reviewboard.scmtools.file_cache import FileCache
+
+
+class CacheBackendStorage(object):
+    """Stores cached responses in the main cache.
+
+    Responses too large for the cache backend are silently dropped.
+    """
+    expiration = 7 * 24 * 60 * 60
+
+    def get(self, key):
+        try:
+            return cache.get(make_cache_key(key))
+        except Exception:
+            return None
+
+    def set(self, key, entry):
+        try:
+            cache.set(make_cache_key(key), entry, self.expiration)
+        except Exception:
+            # The response may be too large for the cache, which is fine.
+            # It'll just be fetched in full next time.
+            pass
+
+    def delete(self, key):
+        cache.delete(make_cache_key(key))
+
+
+class FileStorage(object):
+    """Stores cached responses on local disk.
+
+    This is backed by a FileCache, so the least recently used responses
+    are removed once they take up more than ``max_size`` bytes.
+    """
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.file_cache = FileCache(path, max_size)
+
+    def get(self, key):
+        data = self.file_cache.get(key)
+
+        if data is None:
+            return None
+
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            logging.warning('Unable to load cached HTTP response %s from %s: '
+                            '%s',
+                            key, self.path, e)
+            return None
+
+    def set(self, key, entry):
+        self.file_cache.set(key, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+    def delete(self, key):
+        self.file_cache.delete(key)
+
+
+class HTTPResponseCache(object):
+    """A cache of HTTP responses, revalidated through conditional requests.
+
+    Each entry is a dictionary containing the ``data`` and ``headers`` of
+    the response, and the ``etag`` and ``last_modified`` validators used to
+    revalidate it.
+
+    Counts of cache lookups, conditional requests sent, 304 responses and
+    stored responses for this process are available through
+    :py:meth:`get_stats`.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'conditional_requests': 0,
+            'not_modified': 0,
+            'stores': 0,
+        }
+
+    def get(self, key):
+        """Returns the cached response for a key, or None."""
+        self._record('lookups')
+
+        return self.storage.get(key)
+
+    def set(self, key, data, headers, etag=None, last_modified=None):
+        """Stores a response, if it can be revalidated later.
+
+        Responses without an ETag or Last-Modified header are not stored.
+        """
+        if not etag and not last_modified:
+            return
+
+        self.storage.set(key, {
+            'data': data,
+            'headers': headers,
+            'etag': etag,
+            'last_modified': last_modified,
+        })
+        self._record('stores')
+
+    def delete(self, key):
+        """Removes a cached response."""
+        self.storage.delete(key)
+
+    def get_conditional_headers(self, entry):
+        """Returns the request headers for revalidating a cached response."""
+        headers = {}
+
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        if headers:
+            self._record('conditional_requests')
+
+        return headers
+
+    def record_not_modified(self):
+        """Records that a cached response was confirmed as current."""
+        self._record('not_modified')
+
+    def get_stats(self):
+        """Returns the lookup, conditional request, 304 and store counts.
+
+        These only cover this process.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _record(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+
+_http_cache = None
+_http_cache_config = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    """Returns the process-wide HTTPResponseCache.
+
+    The storage backend is chosen through the
+    ``HOSTINGSVCS_HTTP_CACHE_BACKEND`` setting, which is either ``'cache'``
+    (the main cache) or ``'file'`` (the directory in
+    ``HOSTINGSVCS_HTTP_CACHE_DIR``, limited to
+    ``HOSTINGSVCS_HTTP_CACHE_MAX_SIZE`` bytes). This returns None if the
+    cache is disabled.
+    """
+    global _http_cache, _http_cache_config
+
+    backend = getattr(settings, 'HOSTINGSVCS_HTTP_CACHE_BACKEND', None)
+    path = getattr(settings, 'HOSTINGSVCS_HTTP_CACHE_DIR', None)
+    max_size = getattr(settings, 'HOSTINGSVCS_HTTP_CACHE_MAX_SIZE', 0)
+
+    if backend == 'cache':
+        config = (backend,)
+    elif backend == 'file' and path and max_size:
+        config = (backend, path, max_size)
+    else:
+        return None
+
+    with _http_cache_lock:
+        if _http_cache is None or _http_cache_config != config:
+            if backend == 'file':
+                storage = FileStorage(path, max_size)
+            else:
+                storage = CacheBackendStorage()
+
+            _http_cache = HTTPResponseCache(storage)
+            _http_cache_config = config
+
+        return _http_cache
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals, absolute_import
 
 import logging
+import re
 
 from django import forms
 from django.utils.translation import ugettext_lazy as _
@@ -16,6 +17,9 @@ from reviewboard.hostingsvcs.forms import HostingServiceForm
 from reviewboard.hostingsvcs.service import HostingService
 
 
+JIRA_ISSUE_KEY_RE = re.compile(r'^[A-Za-z][A-Za-z0-9_]*-\d+$')
+
+
 class JIRAForm(HostingServiceForm):
     jira_url = forms.CharField(
         label=_('JIRA URL'),
@@ -47,10 +51,7 @@ class JIRA(HostingService, BugTracker):
         }
 
         if has_jira:
-            if not self.jira_client:
-                self.jira_client = JIRAClient(options={
-                    'server': repository.extra_data['bug_tracker-jira_url'],
-                })
+            self._init_jira_client(repository)
 
             try:
                 jira_issue = self.jira_client.issue(bug_id)
@@ -64,3 +65,70 @@ class JIRA(HostingService, BugTracker):
                                 bug_id, e, exc_info=1)
 
         return result
+
+    def get_bug_infos_uncached(self, repository, bug_ids):
+        """Get the info for several bugs from the server.
+
+        The issues are looked up through a single JQL search. The search
+        isn't validated, so that an issue that doesn't exist is left out of
+        the results instead of failing the whole search. Only the issues
+        the search didn't return (along with any bug IDs that aren't valid
+        issue keys) are then looked up one at a time.
+        """
+        issue_keys = [
+            bug_id
+            for bug_id in bug_ids
+            if JIRA_ISSUE_KEY_RE.match(bug_id)
+        ]
+
+        results = {}
+
+        if has_jira and issue_keys:
+            self._init_jira_client(repository)
+
+            try:
+                jira_issues = self.jira_client.search_issues(
+                    'key in (%s)' % ', '.join(issue_keys),
+                    maxResults=len(issue_keys),
+                    fields='summary,description,status',
+                    validate_query=False)
+            except JIRAError as e:
+                logging.warning('Unable to search JIRA for issues %s: %s',
+                                ', '.join(issue_keys), e, exc_info=1)
+                jira_issues = []
+        else:
+            jira_issues = []
+
+        # Issue keys are matched case-insensitively by JIRA.
+        bug_ids_by_key = dict(
+            (bug_id.upper(), bug_id)
+            for bug_id in bug_ids
+        )
+
+        for jira_issue in jira_issues:
+            try:
+                bug_id = bug_ids_by_key[jira_issue.key.upper()]
+            except KeyError:
+                continue
+
+            results[bug_id] = {
+                'description': jira_issue.fields.description,
+                'summary': jira_issue.fields.summary,
+                'status': jira_issue.fields.status
+            }
+
+        # Look up anything the search didn't find individually. This also
+        # covers issues moved to another project, which the search returns
+        # under their new keys.
+        for bug_id in bug_ids:
+            if bug_id not in results:
+                results[bug_id] = self.get_bug_info_uncached(repository,
+                                                             bug_id)
+
+        return results
+
+    def _init_jira_client(self, repository):
+        if not self.jira_client:
+            self.jira_client = JIRAClient(options={
+                'server': repository.extra_data['bug_tracker-jira_url'],
+            })
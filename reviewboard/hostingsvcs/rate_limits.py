@@ -0,0 +1,170 @@
+"""Scheduling of API requests against a hosting service's rate limits.
+
+Hosting services like GitHub limit the number of API requests an account
+can make in a window of time, and report the limit, the requests remaining
+and the time the window resets in the headers of each response. Once the
+limit is hit, every request fails until the window resets.
+
+RateLimitScheduler tracks those headers per account and treats the
+remaining requests as a token bucket that refills when the window resets.
+Each request takes a token, at one of several priorities. Lower priorities
+can't dip into a reserve kept for higher priorities, so that interactive
+requests (such as fetching files for the diff viewer) keep working when
+background work (such as listing commits or remote repositories) has used
+up most of the limit. Requests that can't be made yet are queued until the
+window resets, if that's soon enough for their priority, and otherwise are
+shed by raising RateLimitExceededError. Interactive requests are never
+queued, so they don't hold up a web worker.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from django.utils.translation import ugettext as _
+
+from reviewboard.hostingsvcs.errors import RateLimitExceededError
+
+
+class RateLimitScheduler(object):
+    """Schedules the API requests made for one hosting service account.
+
+    ``reserved_fractions`` maps each priority to the fraction of the rate
+    limit it must leave for higher priorities. Requests that would dip into
+    their reserve wait for up to ``max_waits[priority]`` seconds for the
+    limit to reset before being shed.
+    """
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_BACKGROUND = 2
+
+    reserved_fractions = {
+        PRIORITY_INTERACTIVE: 0,
+        PRIORITY_NORMAL: 0.05,
+        PRIORITY_BACKGROUND: 0.2,
+    }
+
+    # Requests are made from web workers, so only lower priorities wait for
+    # the limit to reset. Interactive requests fail fast instead of holding
+    # up the worker.
+    max_waits = {
+        PRIORITY_INTERACTIVE: 0,
+        PRIORITY_NORMAL: 2,
+        PRIORITY_BACKGROUND: 10,
+    }
+
+    _schedulers = {}
+    _schedulers_lock = threading.Lock()
+
+    @classmethod
+    def get_scheduler(cls, key):
+        """Returns the process-wide scheduler for an account's key."""
+        with cls._schedulers_lock:
+            try:
+                return cls._schedulers[key]
+            except KeyError:
+                scheduler = cls(key)
+                cls._schedulers[key] = scheduler
+
+                return scheduler
+
+    @classmethod
+    def reset_all(cls):
+        """Discards the state of all schedulers."""
+        with cls._schedulers_lock:
+            cls._schedulers = {}
+
+    def __init__(self, key):
+        self.key = key
+        self.limit = None
+        self.remaining = None
+        self.reset_time = None
+
+        self._cond = threading.Condition()
+        self._num_waiting = dict(
+            (priority, 0)
+            for priority in self.reserved_fractions
+        )
+
+    def acquire(self, priority=PRIORITY_NORMAL):
+        """Takes a token for a request at the given priority.
+
+        This blocks until the request can be made, or raises
+        RateLimitExceededError if it can't be made in time.
+        """
+        deadline = time.time() + self.max_waits[priority]
+
+        with self._cond:
+            while True:
+                now = time.time()
+
+                if self.reset_time is not None and now >= self.reset_time:
+                    # The window has reset. Until we hear otherwise from the
+                    # next response, assume the full limit is available.
+                    self.remaining = self.limit
+                    self.reset_time = None
+
+                if self._has_capacity(priority):
+                    if self.remaining is not None:
+                        self.remaining -= 1
+
+                    return
+
+                if self.reset_time is None or self.reset_time > deadline:
+                    logging.warning('Shedding API request for %s at priority '
+                                    '%s: %s of %s requests remaining',
+                                    self.key, priority, self.remaining,
+                                    self.limit)
+                    raise RateLimitExceededError(
+                        _('The API rate limit for this account has been '
+                          'reached. Try again later.'),
+                        reset_time=self.reset_time)
+
+                self._num_waiting[priority] += 1
+
+                try:
+                    self._cond.wait(self.reset_time - now)
+                finally:
+                    self._num_waiting[priority] -= 1
+
+    def update(self, headers):
+        """Updates the rate limit state from the headers of a response.
+
+        This looks for the ``X-RateLimit-Limit``, ``X-RateLimit-Remaining``
+        and ``X-RateLimit-Reset`` headers.
+        """
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_time = int(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self._cond:
+            if (self.remaining is None or
+                self.reset_time is None or
+                reset_time > self.reset_time):
+                self.remaining = remaining
+            else:
+                # Responses to concurrent requests may come back out of
+                # order, so within a window, only count down.
+                self.remaining = min(self.remaining, remaining)
+
+            self.limit = limit
+            self.reset_time = reset_time
+            self._cond.notify_all()
+
+    def _has_capacity(self, priority):
+        if any(self._num_waiting[higher_priority]
+               for higher_priority in self._num_waiting
+               if higher_priority < priority):
+            return False
+
+        if self.remaining is None:
+            return True
+
+        reserved = int((self.limit or 0) * self.reserved_fractions[priority])
+
+        return self.remaining > reserved
@@ -1,13 +1,17 @@
 from __future__ import unicode_literals
 
 import base64
+import hashlib
 import json
 import logging
 import mimetools
+import time
 
 from django.conf.urls import include, patterns, url
 from django.dispatch import receiver
 from django.utils import six
+from django.utils.six.moves import cStringIO as StringIO, http_client
+from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.parse import urlparse
 from django.utils.six.moves.urllib.request import (Request as BaseURLRequest,
                                                    HTTPBasicAuthHandler,
@@ -16,6 +20,8 @@ from django.utils.translation import ugettext_lazy as _
 from pkg_resources import iter_entry_points
 
 import reviewboard.hostingsvcs.urls as hostingsvcs_urls
+from reviewboard.hostingsvcs.http_cache import get_http_cache
+from reviewboard.scmtools import instrumentation
 from reviewboard.signals import initializing
 
 
@@ -37,9 +43,14 @@ class HostingServiceClient(object):
     HostingService subclasses can also include an override of this class to add
     additional checking (such as GitHub's checking of rate limit headers), or
     add higher-level API functionality.
+
+    Responses to GET requests that include an ETag or Last-Modified header
+    are cached per account (see :py:mod:`reviewboard.hostingsvcs.http_cache`),
+    and revalidated with a conditional request the next time they're
+    requested.
     """
     def __init__(self, hosting_service):
-        pass
+        self.hosting_service = hosting_service
 
     #
     # HTTP utility methods
@@ -74,11 +85,67 @@ class HostingServiceClient(object):
                                  method='POST', **kwargs)
 
     def http_request(self, url, body=None, headers={}, method='GET', **kwargs):
-        """Perform some HTTP operation on a given URL."""
-        r = self._build_request(url, body, headers, method=method, **kwargs)
-        u = urlopen(r)
+        """Perform some HTTP operation on a given URL.
 
-        return u.read(), u.headers
+        GET requests are served from the HTTP response cache, if the
+        hosting service confirms that the cached response is still current.
+        """
+        http_cache = get_http_cache()
+        stats_target = self._stats_target
+
+        if (method != 'GET' or
+            http_cache is None or
+            'If-None-Match' in headers or
+            'If-Modified-Since' in headers):
+            with instrumentation.record_operation(stats_target,
+                                                  'http_request'):
+                return self._http_request(url, body, headers, method,
+                                          **kwargs)
+
+        cache_key = self._make_http_cache_key(url, headers, **kwargs)
+        cached = http_cache.get(cache_key)
+
+        if cached:
+            headers = dict(headers,
+                           **http_cache.get_conditional_headers(cached))
+
+        start = time.time()
+
+        try:
+            data, rsp_headers = self._http_request(url, body, headers, method,
+                                                   **kwargs)
+        except HTTPError as e:
+            not_modified = (e.code == 304 and cached)
+            instrumentation.record_latency(stats_target, 'http_request',
+                                           time.time() - start,
+                                           error=not not_modified)
+
+            if not not_modified:
+                raise
+
+            instrumentation.record_cache_lookup(stats_target, 'http_request',
+                                                True)
+            http_cache.record_not_modified()
+
+            # The 304 response carries the current values of headers like
+            # GitHub's rate limits, which override those that were cached.
+            rsp_headers = self._parse_headers(cached['headers'])
+
+            for name in e.info().keys():
+                rsp_headers[name] = e.info()[name]
+
+            return cached['data'], rsp_headers
+
+        instrumentation.record_latency(stats_target, 'http_request',
+                                       time.time() - start)
+        instrumentation.record_cache_lookup(stats_target, 'http_request',
+                                            False)
+
+        http_cache.set(cache_key, data, str(rsp_headers),
+                       etag=rsp_headers.get('ETag'),
+                       last_modified=rsp_headers.get('Last-Modified'))
+
+        return data, rsp_headers
 
     #
     # JSON utility methods
@@ -109,6 +176,55 @@ class HostingServiceClient(object):
     # Internal utilities
     #
 
+    @property
+    def _stats_target(self):
+        """The name request statistics are recorded under.
+
+        See :py:mod:`reviewboard.scmtools.instrumentation`.
+        """
+        hosting_service = getattr(self, 'hosting_service', None)
+
+        if hosting_service is None:
+            return None
+
+        return instrumentation.get_hosting_account_target(
+            hosting_service.account)
+
+    def _http_request(self, url, body=None, headers={}, method='GET',
+                      **kwargs):
+        """Performs an HTTP request, bypassing the HTTP response cache."""
+        r = self._build_request(url, body, headers, method=method, **kwargs)
+        u = urlopen(r)
+
+        return u.read(), u.headers
+
+    def _make_http_cache_key(self, url, headers, username=None,
+                             password=None, **kwargs):
+        """Builds the HTTP response cache key for a request.
+
+        Keys are specific to the hosting service account, and to the
+        credentials and headers the request is made with, as these can
+        change the response.
+        """
+        account = self.hosting_service.account
+
+        if account.pk:
+            account_key = six.text_type(account.pk)
+        else:
+            account_key = '%s@%s' % (account.username,
+                                     account.hosting_url or '')
+
+        request_key = hashlib.sha1(json.dumps(
+            [url, username, password, sorted(six.iteritems(headers))]
+        )).hexdigest()
+
+        return 'hostingsvcs-http:%s:%s:%s' % (account.service_name,
+                                              account_key, request_key)
+
+    def _parse_headers(self, headers):
+        """Parses headers stored in the HTTP response cache."""
+        return http_client.HTTPMessage(StringIO(headers))
+
     def _build_request(self, url, body=None, headers={}, username=None,
                        password=None, method='GET'):
         """Build a URLRequest object, including HTTP Basic auth"""
@@ -298,7 +414,8 @@ class HostingService(object):
         raise NotImplementedError
 
     def get_remote_repositories(self, owner=None, owner_type=None,
-                                filter_type=None, start=None, per_page=None):
+                                filter_type=None, start=None, per_page=None,
+                                prefetch_pages=0):
         """Get a list of remote repositories for the owner.
 
         This should be implemented by subclasses, and is expected to return an
@@ -306,7 +423,9 @@ class HostingService(object):
 
         The ``start`` and ``per_page`` parameters can be used to control
         where pagination begins and how many results are returned per page,
-        if the subclass supports it.
+        if the subclass supports it. Callers that will page through all the
+        results can pass ``prefetch_pages`` to have that many pages fetched
+        ahead of time, if the subclass supports it.
 
         ``owner`` is expected to default to a reasonable value (typically
         the linked account's username). The hosting service may also require
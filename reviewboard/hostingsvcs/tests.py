@@ -3,29 +3,44 @@ from __future__ import print_function, unicode_literals
 import hashlib
 import hmac
 import json
+import os
+import re
+import shutil
+import tempfile
+import time
 from hashlib import md5
 from textwrap import dedent
 
+from django.conf import settings
 from django.conf.urls import patterns, url
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import NoReverseMatch
 from django.http import HttpResponse
 from django.utils import six
-from django.utils.six.moves import cStringIO as StringIO
+from django.utils.six.moves import cStringIO as StringIO, http_client
 from django.utils.six.moves.urllib.error import HTTPError
 from django.utils.six.moves.urllib.parse import urlparse
+from djblets.cache.backend import make_cache_key
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
 
+from reviewboard.hostingsvcs.bugtracker import prefetch_bug_infos
 from reviewboard.hostingsvcs.errors import (AuthorizationError,
+                                            RateLimitExceededError,
                                             RepositoryError)
+from reviewboard.hostingsvcs.hook_utils import (close_all_review_requests,
+                                                get_review_request_ids)
+from reviewboard.hostingsvcs.http_cache import get_http_cache
 from reviewboard.hostingsvcs.models import HostingServiceAccount
+from reviewboard.hostingsvcs.rate_limits import RateLimitScheduler
 from reviewboard.hostingsvcs.repository import RemoteRepository
 from reviewboard.hostingsvcs.service import (get_hosting_service,
                                              HostingService,
                                              register_hosting_service,
                                              unregister_hosting_service)
 from reviewboard.reviews.models import ReviewRequest
+from reviewboard.reviews.signals import review_request_closed
 from reviewboard.scmtools.core import Branch
 from reviewboard.scmtools.crypto_utils import encrypt_password
 from reviewboard.scmtools.errors import FileNotFoundError, SCMError
@@ -237,6 +252,88 @@ class BeanstalkTests(ServiceTests):
             expected_revision='123',
             expected_found=True)
 
+    @add_fixtures(['test_users', 'test_scmtools'])
+    def test_post_receive_hook_git(self):
+        """Testing Beanstalk post-receive hook with a Git push"""
+        repository, review_request = self._create_hook_review_request('Git')
+        self.spy_on(Repository.invalidate_cached_lookups,
+                    call_fake=lambda repository, branches=None: None)
+
+        response = self.client.post(
+            self._get_hook_url(repository),
+            data={
+                'payload': json.dumps({
+                    # NOTE: This payload only contains the content we make
+                    #       use of in the hook.
+                    'branch': 'master',
+                    'commits': [
+                        {
+                            'id': '1c44b461cebe5874a857c51a4a13a849a4d1e52d',
+                            'message': 'This is my fancy commit\n'
+                                       '\n'
+                                       'Reviewed at http://example.com%s'
+                                       % review_request.get_absolute_url(),
+                        },
+                    ],
+                }),
+            })
+        self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(Repository.invalidate_cached_lookups.called)
+        self.assertEqual(
+            Repository.invalidate_cached_lookups.last_call.kwargs,
+            {'branches': ['master']})
+
+        review_request = ReviewRequest.objects.get(pk=review_request.pk)
+        self.assertEqual(review_request.status, review_request.SUBMITTED)
+        self.assertEqual(review_request.changedescs.get().text,
+                         'Pushed to master (1c44b46)')
+
+    @add_fixtures(['test_users', 'test_scmtools'])
+    def test_post_receive_hook_svn(self):
+        """Testing Beanstalk post-receive hook with a Subversion commit"""
+        repository, review_request = \
+            self._create_hook_review_request('Subversion')
+        self.spy_on(Repository.invalidate_cached_lookups,
+                    call_fake=lambda repository, branches=None: None)
+
+        response = self.client.post(
+            self._get_hook_url(repository),
+            data={
+                'commit': json.dumps({
+                    # NOTE: This payload only contains the content we make
+                    #       use of in the hook.
+                    'changeset_url': 'https://mydomain.beanstalkapp.com/'
+                                     'myrepo/changesets/42',
+                    'revision': 42,
+                    'message': 'This is my fancy commit\n'
+                               '\n'
+                               'Reviewed at http://example.com%s'
+                               % review_request.get_absolute_url(),
+                }),
+            })
+        self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(Repository.invalidate_cached_lookups.called)
+
+        review_request = ReviewRequest.objects.get(pk=review_request.pk)
+        self.assertEqual(review_request.status, review_request.SUBMITTED)
+
+    @add_fixtures(['test_users', 'test_scmtools'])
+    def test_post_receive_hook_with_invalid_service_id(self):
+        """Testing Beanstalk post-receive hook with invalid hosting service
+        ID
+        """
+        # We'll test against GitHub for this test.
+        account = self._get_hosting_account()
+        account.service_name = 'github'
+        account.save()
+        repository = self.create_repository(hosting_account=account)
+
+        response = self.client.post(self._get_hook_url(repository),
+                                    data={'payload': '{}'})
+        self.assertEqual(response.status_code, 404)
+
     def _test_get_file(self, tool_name, revision, base_commit_id,
                        expected_revision):
         def _http_get(service, url, *args, **kwargs):
@@ -312,6 +409,25 @@ class BeanstalkTests(ServiceTests):
         self.assertTrue(service.client.http_get.called)
         self.assertEqual(result, expected_found)
 
+    def _create_hook_review_request(self, tool_name):
+        account = self._get_hosting_account()
+        account.save()
+
+        repository = self.create_repository(hosting_account=account,
+                                            tool_name=tool_name)
+        review_request = self.create_review_request(repository=repository,
+                                                    publish=True)
+
+        return repository, review_request
+
+    def _get_hook_url(self, repository):
+        return local_site_reverse(
+            'beanstalk-hooks-post-receive',
+            kwargs={
+                'repository_id': repository.pk,
+                'hosting_service_id': 'beanstalk',
+            })
+
 
 class BitbucketTests(ServiceTests):
     """Unit tests for the Bitbucket hosting service."""
@@ -811,6 +927,177 @@ class BugzillaTests(ServiceTests):
             }),
             'http://bugzilla.example.com/show_bug.cgi?id=%s')
 
+    def test_get_bug_infos(self):
+        """Testing Bugzilla.get_bug_infos fetches all bugs in one batch"""
+        def _http_get(service, url, *args, **kwargs):
+            if '/comment' in url:
+                self.assertEqual(
+                    url,
+                    'http://bugzilla.example.com/rest/bug/1/comment?ids=2')
+                data = {
+                    'bugs': {
+                        '1': {'comments': [{'text': 'Description 1'}]},
+                        '2': {'comments': [{'text': 'Description 2'}]},
+                    },
+                }
+            else:
+                self.assertTrue(url.startswith(
+                    'http://bugzilla.example.com/rest/bug?'))
+                self.assertIn('id=1%2C2', url)
+                data = {
+                    'bugs': [
+                        {'id': 1, 'summary': 'Summary 1', 'status': 'NEW'},
+                        {'id': 2, 'summary': 'Summary 2',
+                         'status': 'RESOLVED'},
+                    ],
+                }
+
+            return json.dumps(data), {}
+
+        repository = self.create_repository()
+        repository.extra_data['bug_tracker-bugzilla_url'] = \
+            'http://bugzilla.example.com'
+        service = self._get_service()
+        self.spy_on(service.client.http_get, call_fake=_http_get)
+
+        expected = {
+            '1': {
+                'summary': 'Summary 1',
+                'description': 'Description 1',
+                'status': 'NEW',
+            },
+            '2': {
+                'summary': 'Summary 2',
+                'description': 'Description 2',
+                'status': 'RESOLVED',
+            },
+        }
+
+        self.assertEqual(service.get_bug_infos(repository, [1, 2]), expected)
+        self.assertEqual(len(service.client.http_get.calls), 2)
+
+        # The bugs should now be cached, individually and as a batch.
+        self.assertEqual(service.get_bug_info(repository, '2'),
+                         expected['2'])
+        self.assertEqual(service.get_bug_infos(repository, ['1', '2']),
+                         expected)
+        self.assertEqual(len(service.client.http_get.calls), 2)
+
+    @add_fixtures(['test_users'])
+    def test_bug_infos_prefetched_on_publish(self):
+        """Testing bug information is prefetched when publishing a review
+        request
+        """
+        def _get_bug_infos_uncached(service, repository, bug_ids):
+            return dict(
+                (bug_id, {
+                    'summary': 'Summary %s' % bug_id,
+                    'description': '',
+                    'status': 'NEW',
+                })
+                for bug_id in bug_ids
+            )
+
+        self.spy_on(self.service_class.get_bug_infos_uncached,
+                    call_fake=_get_bug_infos_uncached)
+
+        repository = self.create_repository()
+        repository.extra_data.update({
+            'bug_tracker_type': 'bugzilla',
+            'bug_tracker-bugzilla_url': 'http://bugzilla.example.com',
+        })
+        repository.save()
+        review_request = self.create_review_request(repository=repository)
+        review_request.bugs_closed = '1, 2'
+        review_request.save()
+
+        self.spy_on(prefetch_bug_infos)
+
+        review_request.publish(review_request.submitter)
+
+        self.assertTrue(prefetch_bug_infos.spy.called)
+        prefetch_bug_infos.spy.last_call.return_value.join()
+
+        self.assertEqual(
+            len(self.service_class.get_bug_infos_uncached.calls), 1)
+        self.assertEqual(
+            self.service_class.get_bug_infos_uncached.last_call.args[1],
+            ['1', '2'])
+
+        self.assertEqual(
+            repository.bug_tracker_service.get_bug_info(repository,
+                                                        '1')['summary'],
+            'Summary 1')
+        self.assertEqual(
+            len(self.service_class.get_bug_infos_uncached.calls), 1)
+
+
+    def test_prefetched_bug_infos_refreshed_when_stale(self):
+        """Testing prefetched bug information is kept past the normal
+        expiration and refreshed in the background
+        """
+        summaries = {}
+
+        def _get_bug_infos_uncached(service, repository, bug_ids):
+            return dict(
+                (bug_id, {
+                    'summary': summaries[bug_id],
+                    'description': '',
+                    'status': 'NEW',
+                })
+                for bug_id in bug_ids
+            )
+
+        self.spy_on(self.service_class.get_bug_infos_uncached,
+                    call_fake=_get_bug_infos_uncached)
+
+        repository = self.create_repository()
+        repository.extra_data['bug_tracker_type'] = 'bugzilla'
+        service = repository.bug_tracker_service
+
+        summaries['1'] = 'Old summary'
+        prefetch_bug_infos(repository, ['1']).join()
+
+        # Age the prefetched bug past the normal expiration, and let the
+        # prefetch lock expire.
+        key = make_cache_key(service.make_bug_cache_key(repository, '1'))
+        entry = cache.get(key)
+        entry['timestamp'] -= service.bug_info_cache_expiration + 1
+        cache.set(key, entry)
+        cache.delete(make_cache_key(
+            '%s-prefetch' % service.make_bug_cache_key(repository, '1')))
+
+        summaries['1'] = 'New summary'
+        self.spy_on(prefetch_bug_infos)
+
+        self.assertEqual(service.get_bug_info(repository, '1')['summary'],
+                         'Old summary')
+        self.assertTrue(prefetch_bug_infos.spy.called)
+        prefetch_bug_infos.spy.last_call.return_value.join()
+
+        self.assertEqual(
+            len(self.service_class.get_bug_infos_uncached.calls), 2)
+        self.assertEqual(service.get_bug_info(repository, '1')['summary'],
+                         'New summary')
+
+    def test_prefetch_bug_infos_deduplicated(self):
+        """Testing prefetch_bug_infos only prefetches each bug once at a
+        time
+        """
+        self.spy_on(self.service_class.get_bug_infos_uncached,
+                    call_fake=lambda service, repository, bug_ids: {})
+
+        repository = self.create_repository()
+        repository.extra_data['bug_tracker_type'] = 'bugzilla'
+
+        prefetch_bug_infos(repository, ['1', '2']).join()
+        self.assertIsNone(prefetch_bug_infos(repository, ['1', '2']))
+
+        prefetch_bug_infos(repository, ['2', '3']).join()
+        self.assertEqual(
+            self.service_class.get_bug_infos_uncached.last_call.args[1],
+            ['3'])
+
 
 class CodebaseHQTests(ServiceTests):
     """Unit tests for the Codebase HQ hosting service."""
@@ -1234,7 +1521,7 @@ class GitHubTests(ServiceTests):
         ])
 
         def _http_get(self, *args, **kwargs):
-            return branches_api_response, None
+            return branches_api_response, {}
 
         account = self._get_hosting_account()
         account.data['authorization'] = {'token': 'abc123'}
@@ -1251,6 +1538,8 @@ class GitHubTests(ServiceTests):
         branches = service.get_branches(repository)
 
         self.assertTrue(service.client.http_get.called)
+        self.assertEqual(service.client.http_get.last_call.kwargs['priority'],
+                         RateLimitScheduler.PRIORITY_INTERACTIVE)
 
         self.assertEqual(len(branches), 3)
         self.assertEqual(
@@ -1267,6 +1556,101 @@ class GitHubTests(ServiceTests):
                        default=False),
             ])
 
+    def test_get_branches_with_multiple_pages(self):
+        """Testing GitHub get_branches with branches across several pages"""
+        base_url = ('https://api.github.com/repos/myuser/myrepo/git/refs/'
+                    'heads?access_token=abc123&per_page=100')
+        pages = {
+            1: ['master', 'branch1'],
+            2: ['branch2', 'branch3'],
+            3: ['branch4'],
+        }
+
+        def _http_get(client, url, *args, **kwargs):
+            m = re.search(r'[?&]page=(\d+)', url)
+            page = int(m.group(1)) if m else 1
+            links = ['<%s&page=3>; rel="last"' % base_url]
+
+            if page < 3:
+                links.append('<%s&page=%d>; rel="next"' % (base_url, page + 1))
+
+            return (
+                json.dumps([
+                    {
+                        'ref': 'refs/heads/%s' % name,
+                        'object': {
+                            'sha': '%040d' % i,
+                        },
+                    }
+                    for i, name in enumerate(pages[page])
+                ]),
+                {
+                    'Link': ', '.join(links),
+                })
+
+        account = self._get_hosting_account()
+        account.data['authorization'] = {'token': 'abc123'}
+
+        repository = Repository(hosting_account=account)
+        repository.extra_data = {
+            'repository_plan': 'public',
+            'github_public_repo_name': 'myrepo',
+        }
+
+        service = account.service
+        self.spy_on(service.client.http_get, call_fake=_http_get)
+
+        branches = service.get_branches(repository)
+
+        self.assertEqual(len(service.client.http_get.calls), 3)
+        self.assertEqual(
+            [branch.id for branch in branches],
+            ['master', 'branch1', 'branch2', 'branch3', 'branch4'])
+
+    def test_rate_limits_shed_background_requests(self):
+        """Testing GitHub sheds background requests near the rate limit"""
+        def _http_request(client, url, *args, **kwargs):
+            headers = http_client.HTTPMessage(StringIO(
+                'X-RateLimit-Limit: 5000\r\n'
+                'X-RateLimit-Remaining: 500\r\n'
+                'X-RateLimit-Reset: %d\r\n' % (time.time() + 3600)))
+
+            return 'file data', headers
+
+        account = self._get_hosting_account()
+        account.data['authorization'] = {'token': 'abc123'}
+
+        repository = Repository(hosting_account=account)
+        repository.extra_data = {
+            'repository_plan': 'public',
+            'github_public_repo_name': 'myrepo',
+        }
+
+        service = account.service
+        self.spy_on(service.client._http_request, call_fake=_http_request)
+
+        RateLimitScheduler.reset_all()
+
+        try:
+            self.assertEqual(
+                service.get_file(repository, 'README', 'abc123'),
+                'file data')
+            self.assertEqual(len(service.client._http_request.calls), 1)
+
+            # Listing commits is background work, which must leave a
+            # fifth of the limit for other requests.
+            self.assertRaises(SCMError,
+                              lambda: service.get_commits(repository))
+            self.assertEqual(len(service.client._http_request.calls), 1)
+
+            # Fetching files may use up the rest of the limit.
+            self.assertEqual(
+                service.get_file(repository, 'README', 'abc123'),
+                'file data')
+            self.assertEqual(len(service.client._http_request.calls), 2)
+        finally:
+            RateLimitScheduler.reset_all()
+
     def test_get_commits(self):
         """Testing GitHub get_commits implementation"""
         commits_api_response = json.dumps([
@@ -1424,18 +1808,16 @@ class GitHubTests(ServiceTests):
             ]
         })
 
-        trees_api_response = json.dumps({
-            'tree': [
-                {
-                    'path': 'reviewboard/static/rb/css/defs.less',
-                    'sha': '830a40c3197223c6a0abb3355ea48891a1857bfd',
-                },
-                {
-                    'path': 'reviewboard/static/rb/css/reviews.less',
-                    'sha': '535cd2c4211038d1bb8ab6beaed504e0db9d7e62',
-                },
-            ],
+        trees_api_responses = self._build_trees_api_responses(tree_sha, {
+            'reviewboard/static/rb/css/defs.less':
+                '830a40c3197223c6a0abb3355ea48891a1857bfd',
+            'reviewboard/static/rb/css/reviews.less':
+                '535cd2c4211038d1bb8ab6beaed504e0db9d7e62',
+            'reviewboard/static/rb/js/views.js':
+                '4b8e0b7f2c7e1d8c28c5a6b6a1a0e8f9c3d2b1a0',
+            'README': 'bcd1a5fbb4a2f5e0ad3b0d6c5e04a3c5b3e2d1f0',
         })
+        fetched_trees = []
 
         # This has to be a list to avoid python's hinky treatment of scope of
         # variables assigned within a closure.
@@ -1462,11 +1844,12 @@ class GitHubTests(ServiceTests):
                 return compare_api_response, None
             elif parsed.path.startswith('/repos/myuser/myrepo/git/trees/'):
                 self.assertEqual(step[0], 3)
-                step[0] += 1
+                self.assertNotIn('recursive=1', parsed.query.split('&'))
 
-                self.assertEqual(parsed.path.split('/')[-1], tree_sha)
+                sha = parsed.path.split('/')[-1]
+                fetched_trees.append(sha)
 
-                return trees_api_response, None
+                return trees_api_responses[sha], None
             else:
                 print(parsed)
                 self.fail('Got an unexpected GET request')
@@ -1491,6 +1874,23 @@ class GitHubTests(ServiceTests):
         self.assertEqual(md5(change.diff.encode('utf-8')).hexdigest(),
                          '5f63bd4f1cd8c4d8b46f2f72ea8d33bc')
 
+        # Only the trees along the changed paths should have been fetched.
+        self.assertEqual(len(fetched_trees), 5)
+        self.assertEqual(fetched_trees[0], tree_sha)
+        self.assertNotIn(
+            trees_api_responses.get_sha('reviewboard/static/rb/js'),
+            fetched_trees)
+
+        # The comparison and trees are cached by SHA, so fetching the change
+        # again only needs the commit.
+        num_calls = len(service.client.http_get.calls)
+        step[0] = 1
+        change = service.get_change(repository, commit_sha)
+
+        self.assertEqual(len(service.client.http_get.calls), num_calls + 1)
+        self.assertEqual(md5(change.diff.encode('utf-8')).hexdigest(),
+                         '5f63bd4f1cd8c4d8b46f2f72ea8d33bc')
+
     def test_get_change_exception(self):
         """Testing GitHub get_change exception types"""
         def _http_get(service, url, *args, **kwargs):
@@ -1567,6 +1967,9 @@ class GitHubTests(ServiceTests):
 
         paginator = service.get_remote_repositories('myuser')
 
+        self.assertEqual(service.client.http_get.last_call.kwargs['priority'],
+                         RateLimitScheduler.PRIORITY_BACKGROUND)
+
         # Check the first result.
         self.assertEqual(len(paginator.page_data), 1)
         self.assertFalse(paginator.has_prev)
@@ -1776,6 +2179,8 @@ class GitHubTests(ServiceTests):
 
         remote_repository = service.get_remote_repository('myuser/myrepo')
 
+        self.assertEqual(service.client.http_get.last_call.kwargs['priority'],
+                         RateLimitScheduler.PRIORITY_INTERACTIVE)
         self.assertIsInstance(remote_repository, RemoteRepository)
         self.assertEqual(remote_repository.id, 'myuser/myrepo')
         self.assertEqual(remote_repository.owner, 'myuser')
@@ -2092,6 +2497,55 @@ class GitHubTests(ServiceTests):
 
         self.assertTrue(saw_exception)
 
+    def _build_trees_api_responses(self, root_sha, blob_shas):
+        """Builds the trees API responses for a set of blobs.
+
+        This returns a dictionary mapping tree SHAs to their API responses,
+        with a ``get_sha`` function for looking up a tree's SHA by path.
+        """
+        trees = {'': {}}
+
+        for path, blob_sha in six.iteritems(blob_shas):
+            dirname = ''
+
+            for name in path.split('/')[:-1]:
+                subdir = '/'.join(filter(None, [dirname, name]))
+
+                if subdir not in trees:
+                    trees[subdir] = {}
+                    trees[dirname][name] = ('tree', subdir)
+
+                dirname = subdir
+
+            trees[dirname][path.split('/')[-1]] = ('blob', blob_sha)
+
+        tree_shas = dict(
+            (dirname, md5(dirname.encode('utf-8')).hexdigest())
+            for dirname in trees
+        )
+        tree_shas[''] = root_sha
+
+        class TreesAPIResponses(dict):
+            def get_sha(self, dirname):
+                return tree_shas[dirname]
+
+        responses = TreesAPIResponses()
+
+        for dirname, entries in six.iteritems(trees):
+            responses[tree_shas[dirname]] = json.dumps({
+                'tree': [
+                    {
+                        'path': name,
+                        'type': entry_type,
+                        'sha': (entry_type == 'tree' and tree_shas[value] or
+                                value),
+                    }
+                    for name, (entry_type, value) in six.iteritems(entries)
+                ],
+            })
+
+        return responses
+
     def _get_repo_api_url(self, plan, fields):
         account = self._get_hosting_account()
         service = account.service
@@ -3015,3 +3469,356 @@ class HostingServiceRegistrationTests(TestCase):
         # Once unregistered, should not be able to unregister again
         with self.assertRaises(KeyError):
             unregister_hosting_service('dummy-service')
+
+
+class HookUtilsTests(TestCase):
+    """Unit tests for reviewboard.hostingsvcs.hook_utils."""
+    fixtures = ['test_users', 'test_scmtools']
+
+    def test_get_review_request_ids(self):
+        """Testing get_review_request_ids"""
+        repository = self.create_repository()
+        review_request1 = self.create_review_request(repository=repository,
+                                                     commit_id='abc123')
+        review_request2 = self.create_review_request(repository=repository,
+                                                     commit_id='def456')
+
+        with self.assertNumQueries(1):
+            review_request_ids = get_review_request_ids(
+                [
+                    ('Reviewed at http://example.com/r/42/', 'fff000'),
+                    ('Fixed a bug.', 'abc123'),
+                    ('Fixed another bug.', 'def456'),
+                    ('Fixed a third bug.', '123456'),
+                    ('No commit ID.', None),
+                ],
+                'http://example.com/')
+
+        self.assertEqual(review_request_ids,
+                         [42, review_request1.pk, review_request2.pk, None,
+                          None])
+
+    def test_get_review_request_ids_without_commit_ids(self):
+        """Testing get_review_request_ids without commit IDs to look up"""
+        with self.assertNumQueries(0):
+            review_request_ids = get_review_request_ids(
+                [
+                    ('Review request #12', 'abc123'),
+                    ('Fixed a bug.', None),
+                ],
+                'http://example.com/')
+
+        self.assertEqual(review_request_ids, [12, None])
+
+    def test_close_all_review_requests(self):
+        """Testing close_all_review_requests"""
+        account = HostingServiceAccount.objects.create(service_name='github',
+                                                       username='myuser')
+        repository = self.create_repository(hosting_account=account)
+        review_requests = [
+            self.create_review_request(repository=repository, publish=True)
+            for i in range(3)
+        ]
+        closed = []
+
+        def _on_closed(review_request, **kwargs):
+            closed.append(review_request.pk)
+
+        review_request_closed.connect(_on_closed)
+
+        try:
+            close_all_review_requests(
+                dict(
+                    (review_request.pk, ['master (abc%d)' % i])
+                    for i, review_request in enumerate(review_requests[:2])
+                ),
+                None, repository, 'github')
+        finally:
+            review_request_closed.disconnect(_on_closed)
+
+        self.assertEqual(sorted(closed),
+                         [review_requests[0].pk, review_requests[1].pk])
+
+        for i, review_request in enumerate(review_requests):
+            review_request = ReviewRequest.objects.get(pk=review_request.pk)
+
+            if i < 2:
+                self.assertEqual(review_request.status,
+                                 ReviewRequest.SUBMITTED)
+                self.assertEqual(review_request.changedescs.get().text,
+                                 'Pushed to master (abc%d)' % i)
+            else:
+                self.assertEqual(review_request.status,
+                                 ReviewRequest.PENDING_REVIEW)
+
+    def test_close_all_review_requests_with_failure(self):
+        """Testing close_all_review_requests with a review request that
+        fails to close
+        """
+        account = HostingServiceAccount.objects.create(service_name='github',
+                                                       username='myuser')
+        repository = self.create_repository(hosting_account=account)
+        review_requests = [
+            self.create_review_request(repository=repository, publish=True)
+            for i in range(3)
+        ]
+        closed = []
+
+        def _on_closed(review_request, **kwargs):
+            if review_request.pk == review_requests[1].pk:
+                raise Exception('Oh no')
+
+            closed.append(review_request.pk)
+
+        review_request_closed.connect(_on_closed)
+
+        try:
+            close_all_review_requests(
+                dict(
+                    (review_request.pk, ['master (abc%d)' % i])
+                    for i, review_request in enumerate(review_requests)
+                ),
+                None, repository, 'github')
+        finally:
+            review_request_closed.disconnect(_on_closed)
+
+        self.assertEqual(sorted(closed),
+                         [review_requests[0].pk, review_requests[2].pk])
+
+        for i, review_request in enumerate(review_requests):
+            review_request = ReviewRequest.objects.get(pk=review_request.pk)
+
+            if i == 1:
+                # Only the review request that failed is rolled back.
+                self.assertEqual(review_request.status,
+                                 ReviewRequest.PENDING_REVIEW)
+                self.assertFalse(review_request.changedescs.exists())
+            else:
+                self.assertEqual(review_request.status,
+                                 ReviewRequest.SUBMITTED)
+
+
+class HostingServiceClientHTTPCacheTests(SpyAgency, TestCase):
+    """Unit tests for the HostingServiceClient HTTP response cache."""
+    def setUp(self):
+        super(HostingServiceClientHTTPCacheTests, self).setUp()
+
+        cache.clear()
+        self.cache_dir = None
+        self._old_backend = settings.HOSTINGSVCS_HTTP_CACHE_BACKEND
+        settings.HOSTINGSVCS_HTTP_CACHE_BACKEND = 'cache'
+
+    def tearDown(self):
+        super(HostingServiceClientHTTPCacheTests, self).tearDown()
+
+        settings.HOSTINGSVCS_HTTP_CACHE_BACKEND = self._old_backend
+
+        if self.cache_dir:
+            shutil.rmtree(self.cache_dir)
+
+    def test_http_get_revalidates_cached_response(self):
+        """Testing HostingServiceClient.http_get revalidates cached responses
+        """
+        client = self._get_client()
+        self._spy_on_requests(client, etag='"abc123"')
+
+        data, headers = client.http_get('https://api.example.com/repos')
+        self.assertEqual(data, '{"name": "myrepo"}')
+        self.assertEqual(self.requests[0].get('If-None-Match'), None)
+
+        stats = get_http_cache().get_stats()
+
+        data, headers = client.http_get('https://api.example.com/repos')
+        self.assertEqual(data, '{"name": "myrepo"}')
+        self.assertEqual(self.requests[1]['If-None-Match'], '"abc123"')
+        self.assertEqual(headers['ETag'], '"abc123"')
+        self.assertEqual(headers['X-RateLimit-Remaining'], '4999')
+
+        new_stats = get_http_cache().get_stats()
+        self.assertEqual(new_stats['not_modified'],
+                         stats['not_modified'] + 1)
+
+    def test_http_get_with_changed_response(self):
+        """Testing HostingServiceClient.http_get with a changed response"""
+        client = self._get_client()
+        self._spy_on_requests(client, etag='"abc123"', modified=True)
+
+        client.http_get('https://api.example.com/repos')
+        data, headers = client.http_get('https://api.example.com/repos')
+
+        self.assertEqual(self.requests[1]['If-None-Match'], '"abc123"')
+        self.assertEqual(data, '{"name": "myrepo-2"}')
+
+    def test_http_get_without_validators(self):
+        """Testing HostingServiceClient.http_get with responses that can't be
+        revalidated
+        """
+        client = self._get_client()
+        self._spy_on_requests(client)
+
+        client.http_get('https://api.example.com/repos')
+        client.http_get('https://api.example.com/repos')
+
+        self.assertEqual(self.requests[1].get('If-None-Match'), None)
+
+    def test_http_get_cache_per_account(self):
+        """Testing HostingServiceClient.http_get caches responses per account
+        """
+        client = self._get_client()
+        self._spy_on_requests(client, etag='"abc123"')
+        client.http_get('https://api.example.com/repos')
+
+        client = self._get_client(username='otheruser')
+        self._spy_on_requests(client, etag='"abc123"')
+        client.http_get('https://api.example.com/repos')
+
+        self.assertEqual(self.requests[0].get('If-None-Match'), None)
+
+    def test_http_post_not_cached(self):
+        """Testing HostingServiceClient.http_post bypasses the cache"""
+        client = self._get_client()
+        self._spy_on_requests(client, etag='"abc123"')
+
+        client.http_post('https://api.example.com/repos', body='')
+        client.http_post('https://api.example.com/repos', body='')
+
+        self.assertEqual(self.requests[1].get('If-None-Match'), None)
+
+    def test_http_get_with_file_storage(self):
+        """Testing HostingServiceClient.http_get with the on-disk cache"""
+        self.cache_dir = tempfile.mkdtemp(prefix='rb-tests.')
+        settings.HOSTINGSVCS_HTTP_CACHE_BACKEND = 'file'
+        old_dir = settings.HOSTINGSVCS_HTTP_CACHE_DIR
+        settings.HOSTINGSVCS_HTTP_CACHE_DIR = self.cache_dir
+
+        try:
+            client = self._get_client()
+            self._spy_on_requests(client, etag='"abc123"')
+
+            client.http_get('https://api.example.com/repos')
+            data, headers = client.http_get('https://api.example.com/repos')
+        finally:
+            settings.HOSTINGSVCS_HTTP_CACHE_DIR = old_dir
+
+        self.assertEqual(self.requests[1]['If-None-Match'], '"abc123"')
+        self.assertEqual(data, '{"name": "myrepo"}')
+        self.assertTrue(os.listdir(self.cache_dir))
+
+    def _get_client(self, username='myuser'):
+        account = HostingServiceAccount(service_name='github',
+                                        username=username)
+
+        return account.service.client
+
+    def _spy_on_requests(self, client, etag=None, modified=False):
+        self.requests = []
+        responses = [
+            '{"name": "myrepo"}',
+            '{"name": "myrepo-2"}',
+        ]
+
+        def _http_request(client, url, body=None, headers={}, method='GET',
+                          **kwargs):
+            self.requests.append(headers)
+
+            if (etag and not modified and
+                headers.get('If-None-Match') == etag):
+                raise HTTPError(url, 304, 'Not Modified',
+                                self._make_headers(
+                                    'X-RateLimit-Remaining: 4999\r\n'),
+                                None)
+
+            rsp_headers = 'X-RateLimit-Remaining: 5000\r\n'
+
+            if etag:
+                rsp_headers += 'ETag: %s\r\n' % etag
+
+            return (responses[min(len(self.requests) - 1, 1)],
+                    self._make_headers(rsp_headers))
+
+        self.spy_on(client._http_request, call_fake=_http_request)
+
+    def _make_headers(self, headers):
+        return http_client.HTTPMessage(StringIO(headers))
+
+
+class RateLimitSchedulerTests(TestCase):
+    """Unit tests for RateLimitScheduler."""
+    def setUp(self):
+        super(RateLimitSchedulerTests, self).setUp()
+
+        self.scheduler = RateLimitScheduler('test')
+
+    def test_acquire_with_unknown_limits(self):
+        """Testing RateLimitScheduler.acquire with unknown rate limits"""
+        self.scheduler.acquire(RateLimitScheduler.PRIORITY_BACKGROUND)
+        self.assertEqual(self.scheduler.remaining, None)
+
+    def test_acquire_keeps_reserve(self):
+        """Testing RateLimitScheduler.acquire keeps a reserve for higher
+        priorities
+        """
+        self._update(remaining=500, reset_time=time.time() + 3600)
+
+        self.scheduler.acquire(RateLimitScheduler.PRIORITY_INTERACTIVE)
+        self.scheduler.acquire(RateLimitScheduler.PRIORITY_NORMAL)
+        self.assertEqual(self.scheduler.remaining, 498)
+
+        self.assertRaises(
+            RateLimitExceededError,
+            lambda: self.scheduler.acquire(
+                RateLimitScheduler.PRIORITY_BACKGROUND))
+        self.assertEqual(self.scheduler.remaining, 498)
+
+    def test_acquire_sheds_at_limit(self):
+        """Testing RateLimitScheduler.acquire sheds interactive requests once
+        the rate limit is reached
+        """
+        self._update(remaining=0, reset_time=time.time() + 3600)
+
+        self.assertRaises(
+            RateLimitExceededError,
+            lambda: self.scheduler.acquire(
+                RateLimitScheduler.PRIORITY_INTERACTIVE))
+
+    def test_acquire_interactive_fails_fast(self):
+        """Testing RateLimitScheduler.acquire sheds interactive requests
+        instead of waiting for the rate limit to reset
+        """
+        self._update(remaining=0, reset_time=time.time() + 1)
+
+        start = time.time()
+        self.assertRaises(
+            RateLimitExceededError,
+            lambda: self.scheduler.acquire(
+                RateLimitScheduler.PRIORITY_INTERACTIVE))
+        self.assertTrue(time.time() - start < 1)
+
+    def test_acquire_queues_until_reset(self):
+        """Testing RateLimitScheduler.acquire queues requests until the rate
+        limit resets
+        """
+        self._update(remaining=0, reset_time=time.time() + 1)
+
+        self.scheduler.acquire(RateLimitScheduler.PRIORITY_BACKGROUND)
+        self.assertEqual(self.scheduler.remaining, 4999)
+
+    def test_update_out_of_order(self):
+        """Testing RateLimitScheduler.update with responses arriving out of
+        order
+        """
+        reset_time = time.time() + 3600
+
+        self._update(remaining=400, reset_time=reset_time)
+        self._update(remaining=450, reset_time=reset_time)
+        self.assertEqual(self.scheduler.remaining, 400)
+
+        self._update(remaining=4999, reset_time=reset_time + 3600)
+        self.assertEqual(self.scheduler.remaining, 4999)
+
+    def _update(self, remaining, reset_time, limit=5000):
+        self.scheduler.update({
+            'X-RateLimit-Limit': '%d' % limit,
+            'X-RateLimit-Remaining': '%d' % remaining,
+            'X-RateLimit-Reset': '%d' % reset_time,
+        })
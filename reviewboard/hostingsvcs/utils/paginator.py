@@ -1,5 +1,8 @@
 from __future__ import unicode_literals
 
+import logging
+import threading
+
 from django.utils import six
 from django.utils.six.moves.urllib.parse import (parse_qs, urlencode,
                                                  urlsplit, urlunsplit)
@@ -63,6 +66,41 @@ class BasePaginator(object):
         """
         raise NotImplementedError
 
+    def close(self):
+        """Stops any background work for the paginator.
+
+        This should be called when the caller stops paging through results
+        early. Subclasses that fetch pages ahead of time can override this.
+        """
+        pass
+
+    def iter_items(self):
+        """Iterates over the items on this page and all following pages.
+
+        Pages are fetched as the items on the previous one are consumed.
+        The paginator is closed once iteration finishes, or if the caller
+        stops iterating early.
+        """
+        try:
+            while True:
+                for item in self.page_data:
+                    yield item
+
+                if not self.has_next:
+                    break
+
+                self.next()
+        finally:
+            self.close()
+
+
+class _PrefetchedPage(object):
+    """A page being fetched ahead of time by an APIPaginator."""
+    def __init__(self):
+        self.page_info = None
+        self.error = None
+        self.done = threading.Event()
+
 
 class APIPaginator(BasePaginator):
     """Handles pagination for API requests to a hosting service.
@@ -79,6 +117,13 @@ class APIPaginator(BasePaginator):
     Subclasses can access the HostingServiceClient through the ``client``
     member of the paginator in order to perform requests against the
     HostingService.
+
+    Paginators can optionally read ahead, fetching up to ``prefetch_pages``
+    pages past the current one concurrently. This requires
+    ``start_query_param`` to be a page number, and ``fetch_url`` to return
+    the total number of pages (as ``page_count``). Callers that stop paging
+    early should call :py:meth:`close`, so that pages fetched ahead of time
+    aren't kept around.
     """
     #: The optional query parameter name used to specify the start page in
     #: a request.
@@ -88,13 +133,24 @@ class APIPaginator(BasePaginator):
     #: of results per page.
     per_page_query_param = None
 
+    #: The number of the first page, for paginators whose start query
+    #: parameter is a page number.
+    first_page = 1
+
     def __init__(self, client, url, query_params={}, *args, **kwargs):
+        prefetch_pages = kwargs.pop('prefetch_pages', 0)
+
         super(APIPaginator, self).__init__(*args, **kwargs)
 
         self.client = client
         self.prev_url = None
         self.next_url = None
         self.page_headers = None
+        self.page_count = None
+        self.prefetch_pages = prefetch_pages
+
+        self._prefetched = {}
+        self._prefetch_lock = threading.Lock()
 
         # Augment the URL with the provided query parameters.
         query_params = query_params.copy()
@@ -154,14 +210,30 @@ class APIPaginator(BasePaginator):
         * total_count - The optional total number of items across all pages.
         * per_page    - The optional limit on the number of items fetched
                         on each page.
+        * page_count  - The optional total number of pages.
         * prev_url    - The optional URL to the previous page.
         * next_url    - The optional URL to the next page.
+
+        This may be called from several threads at once, when reading
+        ahead.
         """
         raise NotImplementedError
 
+    def close(self):
+        """Stops reading ahead and discards any pages fetched ahead of time.
+
+        Pages still being fetched are discarded once their requests finish.
+        """
+        with self._prefetch_lock:
+            self.prefetch_pages = 0
+            self._prefetched = {}
+
     def _fetch_page(self):
         """Fetches a page and extracts the information from it."""
-        page_info = self.fetch_url(self.url)
+        page_info = self._get_prefetched_page(self.url)
+
+        if page_info is None:
+            page_info = self.fetch_url(self.url)
 
         self.prev_url = page_info.get('prev_url')
         self.next_url = page_info.get('next_url')
@@ -169,9 +241,96 @@ class APIPaginator(BasePaginator):
         self.page_data = page_info.get('data')
         self.page_headers = page_info.get('headers')
         self.total_count = page_info.get('total_count')
+        self.page_count = page_info.get('page_count') or self.page_count
+
+        self._prefetch_next_pages()
 
         return self.page_data
 
+    def _get_page_number(self, url):
+        """Returns the page number for a URL, if it can be determined."""
+        if not self.start_query_param:
+            return None
+
+        values = parse_qs(urlsplit(url)[3]).get(self.start_query_param)
+
+        if not values:
+            return self.first_page
+
+        try:
+            return int(values[0])
+        except ValueError:
+            return None
+
+    def _get_prefetched_page(self, url):
+        """Returns the page info for a URL, if it was fetched ahead of time.
+
+        If the page is still being fetched, this waits for it. If it failed,
+        None is returned, and the page should be fetched again.
+        """
+        page = self._get_page_number(url)
+
+        with self._prefetch_lock:
+            prefetched = self._prefetched.pop(page, None)
+
+        if prefetched is None:
+            return None
+
+        prefetched.done.wait()
+
+        if prefetched.error is not None:
+            logging.warning('Unable to fetch %s ahead of time: %s',
+                            url, prefetched.error)
+
+        return prefetched.page_info
+
+    def _prefetch_next_pages(self):
+        """Starts fetching the pages following the current one.
+
+        Up to ``prefetch_pages`` pages past the current one are fetched or
+        kept at a time. Pages outside of that range are discarded.
+        """
+        if not self.prefetch_pages or not self.page_count:
+            return
+
+        page = self._get_page_number(self.url)
+
+        if page is None:
+            return
+
+        last_page = min(page + self.prefetch_pages,
+                        self.page_count + self.first_page - 1)
+        to_fetch = []
+
+        with self._prefetch_lock:
+            for prefetched_page in list(self._prefetched):
+                if not page < prefetched_page <= last_page:
+                    del self._prefetched[prefetched_page]
+
+            for next_page in range(page + 1, last_page + 1):
+                if next_page not in self._prefetched:
+                    prefetched = _PrefetchedPage()
+                    self._prefetched[next_page] = prefetched
+                    to_fetch.append((
+                        self._add_query_params(
+                            self.url, {self.start_query_param: next_page}),
+                        prefetched))
+
+        for url, prefetched in to_fetch:
+            thread = threading.Thread(target=self._prefetch_page,
+                                      args=(url, prefetched))
+            thread.daemon = True
+            thread.start()
+
+    def _prefetch_page(self, url, prefetched):
+        """Fetches a page ahead of time, in a background thread."""
+        try:
+            prefetched.page_info = self.fetch_url(url)
+        except Exception as e:
+            prefetched.error = e
+        finally:
+            prefetched.done.set()
+
     def _add_query_params(self, url, new_query_params):
         """Adds query parameters onto the given URL."""
         scheme, netloc, path, query_string, fragment = urlsplit(url)
@@ -228,6 +387,10 @@ class ProxyPaginator(BasePaginator):
         """Returns the number of items across all pages, if known."""
         return self.paginator.total_count
 
+    def close(self):
+        """Stops any background work for the proxied paginator."""
+        self.paginator.close()
+
     def prev(self):
         """Fetches the previous page, returning the page data.
 
@@ -1,7 +1,14 @@
 from __future__ import unicode_literals
 
+import json
+import threading
+import time
+
+from django.utils.six.moves import BaseHTTPServer, socketserver
 from django.utils.six.moves.urllib.parse import parse_qs, urlsplit
+from django.utils.six.moves.urllib.request import urlopen
 
+from reviewboard.hostingsvcs.github import GitHubAPIPaginator
 from reviewboard.hostingsvcs.utils.paginator import (APIPaginator,
                                                      InvalidPageError,
                                                      ProxyPaginator)
@@ -208,3 +215,189 @@ class ProxyPaginatorTests(TestCase):
         data = proxy.next()
 
         self.assertEqual(data, [3, 2, 1])
+
+
+class FakePagedAPIServer(socketserver.ThreadingMixIn,
+                         BaseHTTPServer.HTTPServer):
+    """A local HTTP server serving a paginated list, like GitHub's API.
+
+    Each page contains the page number, and has a Link header pointing to
+    the previous, next and last pages. Pages listed in ``failing_pages``
+    fail once with an HTTP 500.
+    """
+    daemon_threads = True
+
+    def __init__(self, num_pages):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakePagedAPIRequestHandler)
+
+        self.num_pages = num_pages
+        self.failing_pages = set()
+        self.requested_pages = []
+        self.requests_cond = threading.Condition()
+        self.url = 'http://127.0.0.1:%d/items' % self.server_address[1]
+
+    def wait_for_requests(self, count, timeout=5):
+        """Waits until at least the given number of requests were made."""
+        deadline = time.time() + timeout
+
+        with self.requests_cond:
+            while (len(self.requested_pages) < count and
+                   time.time() < deadline):
+                self.requests_cond.wait(deadline - time.time())
+
+            return list(self.requested_pages)
+
+
+class FakePagedAPIRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        page = int(parse_qs(urlsplit(self.path)[3]).get('page', ['1'])[0])
+
+        with server.requests_cond:
+            server.requested_pages.append(page)
+            server.requests_cond.notify_all()
+
+        if page in server.failing_pages:
+            server.failing_pages.remove(page)
+            self.send_error(500)
+            return
+
+        links = ['<%s?page=%d>; rel="last"' % (server.url, server.num_pages)]
+
+        if page > 1:
+            links.append('<%s?page=%d>; rel="prev"' % (server.url, page - 1))
+
+        if page < server.num_pages:
+            links.append('<%s?page=%d>; rel="next"' % (server.url, page + 1))
+
+        data = json.dumps([page])
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '%d' % len(data))
+        self.send_header('Link', ', '.join(links))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+
+class FakeAPIClient(object):
+    """A minimal client for GitHubAPIPaginator, talking to a fake server."""
+    def api_get(self, url, return_headers=False, **kwargs):
+        u = urlopen(url)
+
+        return json.loads(u.read()), u.headers
+
+
+class APIPaginatorPrefetchTests(TestCase):
+    """Tests for APIPaginator reading ahead."""
+    def setUp(self):
+        super(APIPaginatorPrefetchTests, self).setUp()
+
+        self.server = FakePagedAPIServer(num_pages=5)
+
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        super(APIPaginatorPrefetchTests, self).tearDown()
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_without_prefetch(self):
+        """Testing APIPaginator without reading ahead"""
+        paginator = self._get_paginator()
+
+        self.assertEqual(paginator.page_data, [1])
+        self.assertEqual(paginator.page_count, 5)
+        self.assertEqual(self.server.wait_for_requests(2, timeout=0.5), [1])
+
+    def test_prefetch(self):
+        """Testing APIPaginator reading ahead"""
+        paginator = self._get_paginator(prefetch_pages=2)
+
+        self.assertEqual(sorted(self.server.wait_for_requests(3)),
+                         [1, 2, 3])
+
+        pages = [paginator.page_data]
+
+        while paginator.has_next:
+            pages.append(paginator.next())
+
+        self.assertEqual(pages, [[1], [2], [3], [4], [5]])
+        self.assertEqual(sorted(self.server.requested_pages),
+                         [1, 2, 3, 4, 5])
+
+    def test_prefetch_bounded(self):
+        """Testing APIPaginator only reads ahead the given number of pages"""
+        paginator = self._get_paginator(prefetch_pages=2)
+
+        self.assertEqual(paginator.page_data, [1])
+        self.assertEqual(sorted(self.server.wait_for_requests(4, timeout=0.5)),
+                         [1, 2, 3])
+
+        self.assertEqual(paginator.next(), [2])
+        self.assertEqual(sorted(self.server.wait_for_requests(5, timeout=0.5)),
+                         [1, 2, 3, 4])
+
+    def test_prefetch_with_failed_page(self):
+        """Testing APIPaginator reading ahead with a page that fails to load
+        """
+        self.server.failing_pages.add(2)
+        paginator = self._get_paginator(prefetch_pages=1)
+        self.server.wait_for_requests(2)
+
+        self.assertEqual(paginator.next(), [2])
+        self.assertEqual(self.server.requested_pages.count(2), 2)
+
+    def test_close(self):
+        """Testing APIPaginator.close discards pages read ahead"""
+        paginator = self._get_paginator(prefetch_pages=2)
+        self.server.wait_for_requests(3)
+
+        paginator.close()
+
+        # The next page is fetched again, as it was discarded.
+        self.assertEqual(paginator.next(), [2])
+        self.assertEqual(self.server.requested_pages.count(2), 2)
+
+    def test_close_with_proxy_paginator(self):
+        """Testing ProxyPaginator.close discards pages read ahead"""
+        paginator = self._get_paginator(prefetch_pages=2)
+        proxy = ProxyPaginator(paginator)
+        self.server.wait_for_requests(3)
+
+        proxy.close()
+
+        self.assertEqual(proxy.next(), [2])
+        self.assertEqual(self.server.requested_pages.count(2), 2)
+
+    def test_iter_items(self):
+        """Testing APIPaginator.iter_items reading ahead"""
+        paginator = self._get_paginator(prefetch_pages=2)
+
+        self.assertEqual(list(paginator.iter_items()), [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(self.server.requested_pages),
+                         [1, 2, 3, 4, 5])
+
+    def test_iter_items_stopped_early(self):
+        """Testing APIPaginator.iter_items closes the paginator when
+        stopped early
+        """
+        paginator = self._get_paginator(prefetch_pages=2)
+        items = paginator.iter_items()
+
+        self.assertEqual(next(items), 1)
+        self.assertEqual(next(items), 2)
+        items.close()
+
+        self.assertEqual(paginator.prefetch_pages, 0)
+        self.assertEqual(paginator._prefetched, {})
+
+    def _get_paginator(self, **kwargs):
+        return GitHubAPIPaginator(FakeAPIClient(), self.server.url, **kwargs)
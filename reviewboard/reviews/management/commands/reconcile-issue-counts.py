@@ -0,0 +1,146 @@
+from __future__ import unicode_literals
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import six
+
+from reviewboard.reviews.models import BaseComment, ReviewRequest
+from reviewboard.reviews.models.review_request import fetch_issue_counts
+
+
+class Command(BaseCommand):
+    help = ('Compares the issue counts stored on review requests against '
+            'freshly calculated counts, and reports any differences.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('-a', '--all',
+                    action='store_true',
+                    default=False,
+                    dest='all',
+                    help='Check issue counts for all review requests.'),
+        make_option('--fix',
+                    action='store_true',
+                    default=False,
+                    dest='fix',
+                    help='Recalculates the stored issue counts for any '
+                         'review requests that differ.'),
+    )
+
+    def handle(self, *args, **options):
+        if options.get('all'):
+            q = ReviewRequest.objects.all()
+        else:
+            pks = []
+
+            for arg in args:
+                try:
+                    pks.append(int(arg))
+                except ValueError:
+                    raise CommandError('%s is not a valid review request ID'
+                                       % arg)
+
+            if not pks:
+                raise CommandError(
+                    'One or more review request IDs must be provided, or '
+                    '--all.')
+
+            q = ReviewRequest.objects.filter(pk__in=pks)
+
+        num_checked = 0
+        mismatched = []
+
+        for review_request in q.order_by('pk').iterator():
+            num_checked += 1
+
+            stored_counts = dict(
+                (issue_status, getattr(review_request, field))
+                for issue_status, field in six.iteritems(
+                    ReviewRequest.ISSUE_COUNTER_FIELDS)
+            )
+            issue_counts = fetch_issue_counts(review_request)
+            joined_issue_counts = _fetch_issue_counts_joined(review_request)
+
+            if issue_counts != joined_issue_counts:
+                raise CommandError(
+                    'Issue counts for review request %s differ between the '
+                    'per-type queries (%s) and the joined query (%s)'
+                    % (review_request.pk, _format_counts(issue_counts),
+                       _format_counts(joined_issue_counts)))
+
+            if issue_counts != stored_counts:
+                mismatched.append((review_request.pk, issue_counts))
+                self.stdout.write(
+                    'Review request %s: stored issue counts (%s) differ '
+                    'from calculated issue counts (%s)'
+                    % (review_request.pk, _format_counts(stored_counts),
+                       _format_counts(issue_counts)))
+
+        if mismatched and options.get('fix'):
+            # Store the counts calculated above, rather than resetting the
+            # counters and relying on them being recalculated on load.
+            for pk, issue_counts in mismatched:
+                ReviewRequest.objects.filter(pk=pk).update(**dict(
+                    (field, issue_counts[issue_status])
+                    for issue_status, field in six.iteritems(
+                        ReviewRequest.ISSUE_COUNTER_FIELDS)
+                ))
+
+            self.stdout.write('Issue counts for %d review request(s) fixed.'
+                              % len(mismatched))
+        else:
+            self.stdout.write('Checked %d review request(s); %d had '
+                              'different issue counts.'
+                              % (num_checked, len(mismatched)))
+
+
+def _fetch_issue_counts_joined(review_request):
+    """Calculates issue counts the way fetch_issue_counts used to.
+
+    This joins all three types of comments in one query, and removes the
+    resulting duplicates in Python. It's slow on review requests with many
+    comments, and is only used to check the results of fetch_issue_counts.
+    """
+    issue_counts = {
+        BaseComment.OPEN: 0,
+        BaseComment.RESOLVED: 0,
+        BaseComment.DROPPED: 0
+    }
+
+    issue_statuses = review_request.reviews.filter(
+        Q(public=True) & Q(base_reply_to__isnull=True)).values(
+            'comments__pk',
+            'comments__issue_status',
+            'file_attachment_comments__pk',
+            'file_attachment_comments__issue_status',
+            'screenshot_comments__pk',
+            'screenshot_comments__issue_status')
+
+    comment_fields = {
+        'comments': set(),
+        'file_attachment_comments': set(),
+        'screenshot_comments': set(),
+    }
+
+    for issue_fields in issue_statuses:
+        for key, comments in six.iteritems(comment_fields):
+            comment_pk = issue_fields[key + '__pk']
+
+            if comment_pk not in comments:
+                comments.add(comment_pk)
+                issue_status = issue_fields[key + '__issue_status']
+
+                if issue_status:
+                    issue_counts[issue_status] += 1
+
+    return issue_counts
+
+
+def _format_counts(issue_counts):
+    return ', '.join(
+        '%s=%s' % (BaseComment.issue_status_to_string(issue_status),
+                   issue_counts[issue_status])
+        for issue_status in (BaseComment.OPEN, BaseComment.RESOLVED,
+                             BaseComment.DROPPED)
+    )
@@ -47,37 +47,28 @@ def fetch_issue_counts(review_request, extra_query=None):
     if extra_query:
         q = q & extra_query
 
-    issue_statuses = review_request.reviews.filter(q).values(
-        'comments__pk',
-        'comments__issue_status',
-        'file_attachment_comments__pk',
-        'file_attachment_comments__issue_status',
-        'screenshot_comments__pk',
-        'screenshot_comments__issue_status')
-
-    if issue_statuses:
-        comment_fields = {
-            'comments': set(),
-            'file_attachment_comments': set(),
-            'screenshot_comments': set(),
-        }
-
-        for issue_fields in issue_statuses:
-            for key, comments in six.iteritems(comment_fields):
-                comment_pk = issue_fields[key + '__pk']
-
-                if comment_pk not in comments:
-                    comments.add(comment_pk)
-                    issue_status = issue_fields[key + '__issue_status']
-
-                    if issue_status:
-                        issue_counts[issue_status] += 1
-
-        logging.debug('Calculated issue counts for review request ID %s '
-                      'across %s review(s): Resulting counts = %r; '
-                      'DB values = %r; Field IDs = %r',
-                      review_request.pk, len(issue_statuses), issue_counts,
-                      issue_statuses, comment_fields)
+    reviews = review_request.reviews.filter(q)
+
+    # Count each type of comment with its own aggregate query. Joining all
+    # three comment types in one query would return a row for every
+    # combination of comments on a review.
+    for field in ('comments', 'file_attachment_comments',
+                  'screenshot_comments'):
+        status_field = field + '__issue_status'
+        status_counts = list(
+            reviews.values(status_field)
+            .annotate(count=Count(field, distinct=True))
+            .order_by())
+
+        for status_count in status_counts:
+            issue_status = status_count[status_field]
+
+            if issue_status:
+                issue_counts[issue_status] += status_count['count']
+
+        logging.debug('Calculated issue counts for %s on review request ID '
+                      '%s: DB values = %r',
+                      field, review_request.pk, status_counts)
 
     return issue_counts
 
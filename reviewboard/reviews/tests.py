@@ -5,26 +5,34 @@ import logging
 import os
 
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.models import AnonymousUser, User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.template import Context, Template
 from django.utils import six
+from django.utils.six.moves import cStringIO as StringIO
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
 from kgb import SpyAgency
 
 from reviewboard.accounts.models import Profile, LocalSiteProfile
 from reviewboard.attachments.models import FileAttachment
+from reviewboard.hostingsvcs.bugtracker import prefetch_bug_infos
+from reviewboard.hostingsvcs.service import get_hosting_service
 from reviewboard.reviews.forms import DefaultReviewerForm, GroupForm
+from reviewboard.reviews import timeline
 from reviewboard.reviews.markdown_utils import (markdown_escape,
                                                 markdown_unescape)
-from reviewboard.reviews.models import (Comment,
+from reviewboard.reviews.models import (BaseComment,
+                                        Comment,
                                         DefaultReviewer,
                                         Group,
                                         ReviewRequest,
                                         ReviewRequestDraft,
                                         Review,
                                         Screenshot)
+from reviewboard.reviews.models.review_request import fetch_issue_counts
 from reviewboard.scmtools.core import Commit
 from reviewboard.scmtools.errors import ChangeNumberInUseError
 from reviewboard.scmtools.models import Repository, Tool
@@ -678,7 +686,7 @@ class ReviewRequestTests(TestCase):
         self.assertEqual(six.text_type(review_request), '\u203e\u203e')
 
 
-class ViewTests(TestCase):
+class ViewTests(SpyAgency, TestCase):
     """Tests for views in reviewboard.reviews.views"""
     fixtures = ['test_users', 'test_scmtools', 'test_site']
 
@@ -807,6 +815,31 @@ class ViewTests(TestCase):
         self.assertEqual(replies[0].text, comment_text_3)
         self.assertEqual(replies[1].text, comment_text_2)
 
+    def test_review_detail_draft_reply(self):
+        """Testing review_detail shows draft replies only to their owner"""
+        review_request = self.create_review_request(publish=True)
+        screenshot = self.create_screenshot(review_request)
+        review = self.create_review(review_request)
+        comment = self.create_screenshot_comment(review, screenshot)
+        review.publish()
+
+        reply = self.create_reply(review, user='doc')
+        self.create_screenshot_comment(reply, screenshot, text='Draft reply',
+                                       reply_to=comment)
+
+        for username, num_replies in (('grumpy', 0), ('doc', 1),
+                                      ('grumpy', 0)):
+            self.client.login(username=username, password=username)
+
+            response = self.client.get('/r/%d/' % review_request.pk)
+            self.assertEqual(response.status_code, 200)
+
+            entries = response.context['entries']
+            self.assertEqual(len(entries), 1)
+            comments = entries[0]['comments']['screenshot_comments']
+            self.assertEqual(len(comments), 1)
+            self.assertEqual(len(comments[0]._replies), num_replies)
+
     def test_review_detail_file_attachment_visibility(self):
         """Testing visibility of file attachments on review requests."""
         caption_1 = 'File Attachment 1'
@@ -1182,6 +1215,42 @@ class ViewTests(TestCase):
         self.assertEqual(files[0]['depot_filename'], '/newfile')
         self.assertIn('interfilediff', files[0])
 
+    def test_diff_viewer_prefetches_page_files(self):
+        """Testing the diff viewer prefetches the original files on the page
+        """
+        def _prefetch_files(repository, files, base_commit_id=None,
+                            request=None):
+            pass
+
+        self.spy_on(Repository.prefetch_files, call_fake=_prefetch_files)
+
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        self.create_filediff(diffset,
+                             source_file='/diffutils.py',
+                             dest_file='/diffutils.py',
+                             source_revision='6bba278',
+                             dest_detail='465d217')
+        self.create_filediff(diffset,
+                             source_file='/readme',
+                             dest_file='/readme',
+                             source_revision='d6613f5',
+                             dest_detail='5b50866')
+        self.create_filediff(diffset,
+                             source_file='/newfile',
+                             dest_file='/newfile',
+                             source_revision='PRE-CREATION',
+                             dest_detail='')
+
+        response = self.client.get('/r/%d/diff/1/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(Repository.prefetch_files.calls), 1)
+        self.assertEqual(
+            sorted(Repository.prefetch_files.last_call.args[0]),
+            [('/diffutils.py', '6bba278'), ('/readme', 'd6613f5')])
+
     def test_review_request_etag_with_issues(self):
         """Testing review request ETags with issue status toggling"""
         self.client.login(username='doc', password='doc')
@@ -1219,6 +1288,34 @@ class ViewTests(TestCase):
         # Make sure they're not equal
         self.assertNotEqual(etag1, etag2)
 
+    def test_review_detail_not_modified_skips_timeline(self):
+        """Testing review_detail doesn't load the review timeline when
+        returning Not Modified
+        """
+        self.client.login(username='doc', password='doc')
+
+        review_request = self.create_review_request(publish=True)
+        self.create_review(review_request, publish=True)
+
+        response = self.client.get(review_request.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.spy_on(timeline.get_review_timeline)
+
+        response = self.client.get(review_request.get_absolute_url(),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(timeline.get_review_timeline.spy.called)
+
+        # A new review changes the ETag, so the page is rendered again.
+        self.create_review(review_request, publish=True)
+
+        response = self.client.get(review_request.get_absolute_url(),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(timeline.get_review_timeline.spy.called)
+
     # Bug #3384
     def test_diff_raw_content_disposition_attachment(self):
         """Testing /diff/raw/ Content-Disposition: attachment; ..."""
@@ -1232,6 +1329,46 @@ class ViewTests(TestCase):
         self.assertEqual(response['Content-Disposition'],
                          'attachment; filename=diffset')
 
+    def test_bug_infobox(self):
+        """Testing bug_infobox view fetches only the requested bug and
+        prefetches the rest
+        """
+        def _get_bug_info_uncached(service, repository, bug_id):
+            return {
+                'summary': 'Summary %s' % bug_id,
+                'description': 'Description %s' % bug_id,
+                'status': 'NEW',
+            }
+
+        bug_tracker_cls = get_hosting_service('bugzilla')
+        self.spy_on(bug_tracker_cls.get_bug_info_uncached,
+                    call_fake=_get_bug_info_uncached)
+        self.spy_on(prefetch_bug_infos, call_original=False)
+
+        repository = self.create_repository()
+        repository.extra_data.update({
+            'bug_tracker_type': 'bugzilla',
+            'bug_tracker-bugzilla_url': 'http://bugzilla.example.com',
+        })
+        repository.save()
+        review_request = self.create_review_request(repository=repository,
+                                                    publish=True)
+        review_request.bugs_closed = '1, 2, 3'
+        review_request.save()
+
+        response = self.client.get('/r/%d/bugs/2/infobox/'
+                                   % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['bug_summary'], 'Summary 2')
+
+        self.assertEqual(len(bug_tracker_cls.get_bug_info_uncached.calls), 1)
+        self.assertEqual(
+            bug_tracker_cls.get_bug_info_uncached.last_call.args[1], '2')
+
+        self.assertTrue(prefetch_bug_infos.spy.called)
+        self.assertEqual(prefetch_bug_infos.spy.last_call.args[1],
+                         ['1', '3'])
+
 class DraftTests(TestCase):
     fixtures = ['test_users', 'test_scmtools']
 
@@ -2390,11 +2527,84 @@ class IssueCounterTests(TestCase):
         self.assertEqual(self.review_request.issue_dropped_count, 2)
         self.assertEqual(self.review_request.issue_resolved_count, 1)
 
+    @add_fixtures(['test_scmtools'])
+    def test_fetch_issue_counts(self):
+        """Testing fetch_issue_counts with multiple types of comments"""
+        self.review_request.repository = self.create_repository()
+        diffset = self.create_diffset(self.review_request)
+        filediff = self.create_filediff(diffset)
+        file_attachment = self.create_file_attachment(self.review_request)
+        screenshot = self.create_screenshot(self.review_request)
+
+        for i in range(2):
+            review = self.create_review(self.review_request)
+
+            for j in range(3):
+                self.create_diff_comment(review, filediff, issue_opened=True)
+                self.create_file_attachment_comment(review, file_attachment)
+                self.create_screenshot_comment(review, screenshot,
+                                               issue_opened=True)
+
+            review.publish()
+
+        comment = review.screenshot_comments.all()[0]
+        comment.issue_status = Comment.DROPPED
+        comment.save()
+
+        # One query for each type of comment, regardless of the number of
+        # comments.
+        with self.assertNumQueries(3):
+            issue_counts = fetch_issue_counts(self.review_request)
+
+        self.assertEqual(issue_counts, {
+            Comment.OPEN: 11,
+            Comment.RESOLVED: 0,
+            Comment.DROPPED: 1,
+        })
+
+    def test_reconcile_issue_counts(self):
+        """Testing the reconcile-issue-counts management command"""
+        screenshot = self.create_screenshot(self.review_request)
+        review = self.create_review(self.review_request)
+        self.create_screenshot_comment(review, screenshot, issue_opened=True)
+        comment2 = self.create_screenshot_comment(review, screenshot,
+                                                  issue_opened=True)
+        comment3 = self.create_screenshot_comment(review, screenshot,
+                                                  issue_opened=True)
+        review.publish()
+
+        comment2.issue_status = BaseComment.RESOLVED
+        comment2.save()
+        comment3.issue_status = BaseComment.DROPPED
+        comment3.save()
+
+        ReviewRequest.objects.filter(pk=self.review_request.pk).update(
+            issue_open_count=5,
+            issue_resolved_count=0,
+            issue_dropped_count=2)
+
+        output = StringIO()
+        call_command('reconcile-issue-counts', self.review_request.pk,
+                     stdout=output)
+        self.assertIn('stored issue counts (open=5, resolved=0, dropped=2) '
+                      'differ from calculated issue counts (open=1, '
+                      'resolved=1, dropped=1)',
+                      output.getvalue())
+
+        call_command('reconcile-issue-counts', self.review_request.pk,
+                     fix=True, stdout=StringIO())
+
+        self._reload_object()
+        self.assertEqual(self.review_request.issue_open_count, 1)
+        self.assertEqual(self.review_request.issue_resolved_count, 1)
+        self.assertEqual(self.review_request.issue_dropped_count, 1)
+
     def _reload_object(self, clear_counters=False):
         if clear_counters:
-            # 3 queries: One for the review request fetch, one for
-            # the issue status load, and one for updating the issue counts.
-            expected_query_count = 3
+            # 5 queries: One for the review request fetch, one for each
+            # comment type's issue status counts, and one for updating the
+            # issue counts.
+            expected_query_count = 5
             self._reset_counts()
         else:
             # One query for the review request fetch.
@@ -2411,6 +2621,87 @@ class IssueCounterTests(TestCase):
         self.review_request.save()
 
 
+class ReviewTimelineTests(TestCase):
+    """Unit tests for reviewboard.reviews.timeline."""
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(ReviewTimelineTests, self).setUp()
+
+        cache.clear()
+
+        self.review_request = self.create_review_request(publish=True)
+        self.screenshot = self.create_screenshot(self.review_request)
+        self.review = self.create_review(self.review_request)
+        self.comment = self.create_screenshot_comment(self.review,
+                                                      self.screenshot,
+                                                      issue_opened=True)
+        self.review.publish()
+
+    def tearDown(self):
+        super(ReviewTimelineTests, self).tearDown()
+
+        cache.clear()
+
+    def test_get_review_timeline(self):
+        """Testing get_review_timeline"""
+        self.create_review(self.review_request)
+
+        review_timeline = timeline.get_review_timeline(self._reload())
+
+        self.assertEqual(review_timeline['reviews'], [self.review])
+        self.assertEqual(review_timeline['comments']['screenshot_comments'],
+                         [(self.review.pk, self.comment)])
+        self.assertEqual(review_timeline['comments']['diff_comments'], [])
+
+    def test_get_review_timeline_cached(self):
+        """Testing get_review_timeline uses the cached timeline"""
+        timeline.get_review_timeline(self._reload())
+        review_request = self._reload()
+
+        with self.assertNumQueries(1):
+            review_timeline = timeline.get_review_timeline(review_request)
+
+        self.assertEqual(review_timeline['reviews'], [self.review])
+
+    def test_reply_published(self):
+        """Testing the cached timeline is updated when a reply is published"""
+        timeline.get_review_timeline(self._reload())
+
+        reply = self.create_reply(self.review)
+        reply_comment = self.create_screenshot_comment(
+            reply, self.screenshot, reply_to=self.comment)
+        reply.publish()
+
+        review_request = self._reload()
+
+        with self.assertNumQueries(1):
+            review_timeline = timeline.get_review_timeline(review_request)
+
+        self.assertEqual(review_timeline['reviews'], [self.review, reply])
+        self.assertEqual(review_timeline['comments']['screenshot_comments'],
+                         [(self.review.pk, self.comment),
+                          (reply.pk, reply_comment)])
+
+    def test_issue_status_changed(self):
+        """Testing the cached timeline is rebuilt when an issue's status
+        changes
+        """
+        timeline.get_review_timeline(self._reload())
+
+        self.comment.issue_status = BaseComment.RESOLVED
+        self.comment.save()
+
+        review_timeline = timeline.get_review_timeline(self._reload())
+        review_id, comment = \
+            review_timeline['comments']['screenshot_comments'][0]
+
+        self.assertEqual(comment.issue_status, BaseComment.RESOLVED)
+
+    def _reload(self):
+        return ReviewRequest.objects.get(pk=self.review_request.pk)
+
+
 class PolicyTests(TestCase):
     fixtures = ['test_users']
 
@@ -0,0 +1,198 @@
+"""A cache of the public reviews and comments on a review request.
+
+The review request page shows every public review, reply and comment on the
+review request. Loading those takes a query per comment type over the
+comments' through tables, along with a lot of model construction, which adds
+up on review requests with hundreds of reviews.
+
+The public part of that data is the same for every user, so it's stored in
+the cache as a "timeline", and kept up to date as reviews and replies are
+published, rather than being rebuilt from scratch. Anything specific to the
+user viewing the page (their draft reviews and replies) is loaded separately
+and merged in by the view.
+
+The cached timeline is checked against the review request's list of public
+reviews and its last review activity timestamp (which also changes when an
+issue's status changes) whenever it's used, and rebuilt if it's out of date.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.utils import six
+from djblets.cache.backend import cache_memoize, make_cache_key
+
+from reviewboard.reviews.models import (Comment, FileAttachmentComment,
+                                        Review, ReviewRequest,
+                                        ScreenshotComment)
+from reviewboard.reviews.signals import reply_published, review_published
+
+
+#: The types of comments stored in the timeline, and their keys.
+COMMENT_TYPES = (
+    (Comment, 'diff_comments'),
+    (ScreenshotComment, 'screenshot_comments'),
+    (FileAttachmentComment, 'file_attachment_comments'),
+)
+
+
+def get_review_timeline(review_request):
+    """Returns the public reviews and comments on a review request.
+
+    This returns a dictionary with the public ``reviews`` (and replies), in
+    order of timestamp, and the ``comments`` on them, as a dictionary
+    mapping each comment key in COMMENT_TYPES to a list of
+    ``(review_id, comment)`` tuples.
+
+    The objects aren't shared with other callers, so they can be annotated
+    by the caller.
+    """
+    key = _make_timeline_cache_key(review_request)
+    review_ids = set(
+        review_request.reviews.filter(public=True).values_list('pk',
+                                                               flat=True))
+
+    def _fetch():
+        return _fetch_review_timeline(review_request)
+
+    timeline = cache_memoize(key, _fetch, large_data=True)
+
+    if (timeline['review_ids'] != review_ids or
+        timeline['timestamp'] !=
+            review_request.last_review_activity_timestamp):
+        timeline = cache_memoize(key, _fetch, large_data=True,
+                                 force_overwrite=True)
+
+    return timeline
+
+
+def fetch_review_comments(review_ids):
+    """Fetches the comments on a list of reviews.
+
+    This returns a dictionary mapping each comment key in COMMENT_TYPES to
+    a list of ``(review_id, comment)`` tuples. Diff comments are sorted by
+    file, line and timestamp.
+    """
+    comments = {}
+
+    for model, key in COMMENT_TYPES:
+        # Due to how we initially made the schema, we have a ManyToManyField
+        # inbetween comments and reviews, instead of comments having a
+        # ForeignKey to the review. This makes it difficult to easily go
+        # from a comment to a review ID.
+        #
+        # The solution to this is to not query the comment objects, but
+        # rather the through table. This will let us grab the review ID and
+        # comment in one go, using select_related.
+        related_field = model.review.related.field
+        comment_field_name = related_field.m2m_reverse_field_name()
+        through = related_field.rel.through
+        q = through.objects.filter(review__in=review_ids).select_related()
+
+        comments[key] = [
+            (obj.review_id, getattr(obj, comment_field_name))
+            for obj in q
+        ]
+
+    sort_review_comments(comments)
+
+    return comments
+
+
+def sort_review_comments(comments):
+    """Sorts the comments from fetch_review_comments in place.
+
+    This is used when merging lists of comments.
+    """
+    comments['diff_comments'].sort(
+        key=lambda item: (item[1].filediff_id, item[1].first_line,
+                          item[1].timestamp))
+
+
+def _fetch_review_timeline(review_request):
+    """Fetches the timeline for a review request from the database."""
+    reviews = list(
+        review_request.reviews.filter(public=True).select_related('user'))
+
+    # Fetch the timestamp before the comments, so that if there's any
+    # activity in the meantime, the timeline will be seen as out of date
+    # on the next use.
+    timestamp = _get_last_review_activity_timestamp(review_request)
+
+    return {
+        'timestamp': timestamp,
+        'review_ids': set(review.pk for review in reviews),
+        'reviews': reviews,
+        'comments': fetch_review_comments([review.pk for review in reviews]),
+    }
+
+
+def _add_review_to_timeline(review):
+    """Adds a newly published review or reply to a cached timeline.
+
+    If the review request doesn't have a cached timeline, this does nothing,
+    and the timeline will be built when it's next needed.
+    """
+    review_request = review.review_request
+    key = _make_timeline_cache_key(review_request)
+
+    if make_cache_key(key) not in cache:
+        return
+
+    timeline = cache_memoize(
+        key, lambda: _fetch_review_timeline(review_request), large_data=True)
+
+    if review.pk not in timeline['review_ids']:
+        # Load a new copy of the review, so that nothing cached on the
+        # published instance ends up in the timeline.
+        timeline['reviews'].append(
+            Review.objects.select_related('user').get(pk=review.pk))
+        timeline['reviews'].sort(key=lambda item: item.timestamp)
+        timeline['review_ids'].add(review.pk)
+
+        for comment_key, comments in \
+                six.iteritems(fetch_review_comments([review.pk])):
+            timeline['comments'][comment_key] += comments
+
+        sort_review_comments(timeline['comments'])
+
+    timeline['timestamp'] = _get_last_review_activity_timestamp(
+        review_request)
+
+    cache_memoize(key, lambda: timeline, large_data=True,
+                  force_overwrite=True)
+
+
+def _get_last_review_activity_timestamp(review_request):
+    """Returns the review request's last review activity timestamp.
+
+    This is read from the database, rather than the instance, since the
+    instance may hold a more precise value than the database stores.
+    """
+    return ReviewRequest.objects.filter(pk=review_request.pk).values_list(
+        'last_review_activity_timestamp', flat=True)[0]
+
+
+def _make_timeline_cache_key(review_request):
+    return 'review-request-%s-timeline' % review_request.pk
+
+
+@receiver(review_published, dispatch_uid='review_timeline_add_review')
+def _on_review_published(sender, review, **kwargs):
+    try:
+        _add_review_to_timeline(review)
+    except Exception as e:
+        logging.error('Unable to add review %s to the timeline cache: %s',
+                      review.pk, e, exc_info=1)
+
+
+@receiver(reply_published, dispatch_uid='review_timeline_add_reply')
+def _on_reply_published(sender, reply, **kwargs):
+    try:
+        _add_review_to_timeline(reply)
+    except Exception as e:
+        logging.error('Unable to add reply %s to the timeline cache: %s',
+                      reply.pk, e, exc_info=1)
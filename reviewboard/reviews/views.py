@@ -46,7 +46,7 @@ from reviewboard.diffviewer.diffutils import (convert_to_unicode,
 from reviewboard.diffviewer.models import DiffSet
 from reviewboard.diffviewer.views import (DiffFragmentView, DiffViewerView,
                                           exception_traceback_string)
-from reviewboard.hostingsvcs.bugtracker import BugTracker
+from reviewboard.hostingsvcs.bugtracker import BugTracker, prefetch_bug_infos
 from reviewboard.reviews.ui.screenshot import LegacyScreenshotReviewUI
 from reviewboard.reviews.context import (comment_counts,
                                          diffsets_with_comments,
@@ -58,6 +58,9 @@ from reviewboard.reviews.models import (BaseComment, Comment,
                                         FileAttachmentComment,
                                         ReviewRequest, Review,
                                         Screenshot, ScreenshotComment)
+from reviewboard.reviews.timeline import (fetch_review_comments,
+                                          get_review_timeline,
+                                          sort_review_comments)
 from reviewboard.scmtools.models import Repository
 from reviewboard.site.decorators import check_local_site_access
 from reviewboard.site.urlresolvers import local_site_reverse
@@ -315,65 +318,24 @@ def review_detail(request,
     reviews_id_map = {}
     review_timestamp = 0
 
-    # Start by going through all reviews that point to this review request.
-    # This includes draft reviews. We'll be separating these into a list of
-    # public reviews and a mapping of replies.
-    #
-    # We'll also compute the latest review timestamp early, for the ETag
-    # generation below.
-    #
-    # The second pass will come after the ETag calculation.
-    all_reviews = list(review_request.reviews.select_related('user'))
-
-    for review in all_reviews:
-        review._body_top_replies = []
-        review._body_bottom_replies = []
-
-        if review.public:
-            # This is a review we'll display on the page. Keep track of it
-            # for later display and filtering.
-            public_reviews.append(review)
-            parent_id = review.base_reply_to_id
+    # The user's own draft reviews are fetched first, since the latest
+    # draft's timestamp is needed for the ETag generation below. The
+    # public reviews come from the review request's timeline, which is
+    # only loaded once we know the page has to be rendered.
+    if request.user.is_authenticated():
+        draft_reviews = list(
+            review_request.reviews.filter(public=False, user=request.user)
+            .select_related('user'))
+    else:
+        draft_reviews = []
 
-            if parent_id is not None:
-                # This is a reply to a review. We'll store the reply data
-                # into a map, which associates a review ID with its list of
-                # replies, and also figures out the timestamps.
-                #
-                # Later, we'll use this to associate reviews and replies for
-                # rendering.
-                if parent_id not in replies:
-                    replies[parent_id] = [review]
-                    reply_timestamps[parent_id] = review.timestamp
-                else:
-                    replies[parent_id].append(review)
-                    reply_timestamps[parent_id] = max(
-                        reply_timestamps[parent_id],
-                        review.timestamp)
-        elif (request.user.is_authenticated() and
-              review.user_id == request.user.pk and
-              (review_timestamp == 0 or review.timestamp > review_timestamp)):
+    for review in draft_reviews:
+        if review_timestamp == 0 or review.timestamp > review_timestamp:
             # This is the latest draft so far from the current user, so
             # we'll use this timestamp in the ETag.
             review_timestamp = review.timestamp
 
-        if review.public or (request.user.is_authenticated() and
-                             review.user_id == request.user.pk):
-            reviews_id_map[review.pk] = review
-
-            # If this review is replying to another review's body_top or
-            # body_bottom fields, store that data.
-            for reply_id, reply_list in (
-                (review.body_top_reply_to_id, body_top_replies),
-                (review.body_bottom_reply_to_id, body_bottom_replies)):
-                if reply_id is not None:
-                    if reply_id not in reply_list:
-                        reply_list[reply_id] = [review]
-                    else:
-                        reply_list[reply_id].append(review)
-
     pending_review = review_request.get_pending_review(request.user)
-    review_ids = list(reviews_id_map.keys())
     last_visited = 0
     starred = False
 
@@ -416,7 +378,7 @@ def review_detail(request,
 
     # Find out if we can bail early. Generate an ETag for this.
     last_activity_time, updated_object = \
-        review_request.get_last_activity(diffsets, public_reviews)
+        review_request.get_last_activity(diffsets)
 
     if draft:
         draft_timestamp = draft.last_updated
@@ -435,6 +397,60 @@ def review_detail(request,
     if etag_if_none_match(request, etag):
         return HttpResponseNotModified()
 
+    # Now go through all reviews that point to this review request,
+    # including the user's draft reviews. We'll be separating these into a
+    # list of public reviews and a mapping of replies.
+    #
+    # The public reviews and their comments come from the review request's
+    # timeline, which is cached and shared between users.
+    timeline = get_review_timeline(review_request)
+    all_reviews = timeline['reviews']
+
+    if draft_reviews:
+        all_reviews = sorted(all_reviews + draft_reviews,
+                             key=lambda review: review.timestamp)
+
+    for review in all_reviews:
+        review._body_top_replies = []
+        review._body_bottom_replies = []
+
+        if review.public:
+            # This is a review we'll display on the page. Keep track of it
+            # for later display and filtering.
+            public_reviews.append(review)
+            parent_id = review.base_reply_to_id
+
+            if parent_id is not None:
+                # This is a reply to a review. We'll store the reply data
+                # into a map, which associates a review ID with its list of
+                # replies, and also figures out the timestamps.
+                #
+                # Later, we'll use this to associate reviews and replies for
+                # rendering.
+                if parent_id not in replies:
+                    replies[parent_id] = [review]
+                    reply_timestamps[parent_id] = review.timestamp
+                else:
+                    replies[parent_id].append(review)
+                    reply_timestamps[parent_id] = max(
+                        reply_timestamps[parent_id],
+                        review.timestamp)
+
+        if review.public or (request.user.is_authenticated() and
+                             review.user_id == request.user.pk):
+            reviews_id_map[review.pk] = review
+
+            # If this review is replying to another review's body_top or
+            # body_bottom fields, store that data.
+            for reply_id, reply_list in (
+                (review.body_top_reply_to_id, body_top_replies),
+                (review.body_bottom_reply_to_id, body_bottom_replies)):
+                if reply_id is not None:
+                    if reply_id not in reply_list:
+                        reply_list[reply_id] = [review]
+                    else:
+                        reply_list[reply_id].append(review)
+
     # Get the list of public ChangeDescriptions.
     #
     # We want to get the latest ChangeDescription along with this. This is
@@ -528,46 +544,34 @@ def review_detail(request,
         'dropped': 0
     }
 
-    # Get all the comments and attach them to the reviews.
-    for model, key, ordering in (
-        (Comment, 'diff_comments',
-         ('comment__filediff', 'comment__first_line', 'comment__timestamp')),
-        (ScreenshotComment, 'screenshot_comments', None),
-        (FileAttachmentComment, 'file_attachment_comments', None)):
-        # Due to how we initially made the schema, we have a ManyToManyField
-        # inbetween comments and reviews, instead of comments having a
-        # ForeignKey to the review. This makes it difficult to easily go
-        # from a comment to a review ID.
-        #
-        # The solution to this is to not query the comment objects, but rather
-        # the through table. This will let us grab the review and comment in
-        # one go, using select_related.
-        related_field = model.review.related.field
-        comment_field_name = related_field.m2m_reverse_field_name()
-        through = related_field.rel.through
-        q = through.objects.filter(review__in=review_ids).select_related()
-
-        if ordering:
-            q = q.order_by(*ordering)
-
-        objs = list(q)
+    # Get all the comments and attach them to the reviews. The comments on
+    # public reviews come from the timeline, and we merge in the comments on
+    # the user's drafts.
+    all_comments = timeline['comments']
+
+    if draft_reviews:
+        draft_comments = fetch_review_comments(
+            [review.pk for review in draft_reviews])
 
+        for key, comments in six.iteritems(draft_comments):
+            all_comments[key] = all_comments[key] + comments
+
+        sort_review_comments(all_comments)
+
+    for key, objs in six.iteritems(all_comments):
         # Two passes. One to build a mapping, and one to actually process
         # comments.
         comment_map = {}
 
-        for obj in objs:
-            comment = getattr(obj, comment_field_name)
+        for review_id, comment in objs:
             comment_map[comment.pk] = comment
             comment._replies = []
 
-        for obj in objs:
-            comment = getattr(obj, comment_field_name)
-
+        for review_id, comment in objs:
             # Short-circuit some object fetches for the comment by setting
             # some internal state on them.
-            assert obj.review_id in reviews_id_map
-            parent_review = reviews_id_map[obj.review_id]
+            assert review_id in reviews_id_map
+            parent_review = reviews_id_map[review_id]
             comment._review = parent_review
             comment._review_request = review_request
 
@@ -589,7 +593,7 @@ def review_detail(request,
 
             if parent_review.is_reply():
                 # This is a reply to a comment. Add it to the list of replies.
-                assert obj.review_id not in reviews_entry_map
+                assert review_id not in reviews_entry_map
                 assert parent_review.base_reply_to_id in reviews_entry_map
 
                 # If there's an entry that isn't a reply, then it's
@@ -603,8 +607,8 @@ def review_detail(request,
             elif parent_review.public:
                 # This is a comment on a public review we're going to show.
                 # Add it to the list.
-                assert obj.review_id in reviews_entry_map
-                entry = reviews_entry_map[obj.review_id]
+                assert review_id in reviews_entry_map
+                entry = reviews_entry_map[review_id]
                 entry['comments'][key].append(comment)
 
                 if comment.issue_opened:
@@ -1592,7 +1596,17 @@ def bug_infobox(request, review_request_id, bug_id,
         return HttpResponseNotFound(
             _('Bug tracker %s does not support metadata') % bug_tracker.name)
 
+    bug_id = six.text_type(bug_id)
     bug_info = bug_tracker.get_bug_info(repository, bug_id)
+
+    # Fetch the rest of the review request's bugs in the background, so
+    # that their infoboxes can be served from the cache.
+    prefetch_bug_infos(repository, [
+        other_bug_id
+        for other_bug_id in review_request.get_bug_list()
+        if other_bug_id != bug_id
+    ])
+
     bug_description = bug_info['description']
     bug_summary = bug_info['summary']
     bug_status = bug_info['status']
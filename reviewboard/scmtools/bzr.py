@@ -1,12 +1,15 @@
 from __future__ import unicode_literals
 
 import calendar
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import logging
 import re
+import threading
 import time
 
 try:
-    from bzrlib import bzrdir, revisionspec
+    from bzrlib import bzrdir, revisionspec, urlutils
     from bzrlib.errors import BzrError, NotBranchError
     from bzrlib.transport import register_lazy_transport
     from bzrlib.transport.remote import RemoteSSHTransport
@@ -92,6 +95,217 @@ if has_bzrlib:
                             'RBRemoteSSHTransport')
 
 
+class BZRBranchHandle(object):
+    """A read-locked Bazaar branch, with its recently used revision trees.
+
+    The branch stays read-locked for as long as the handle is open, so
+    revision trees resolved from it can be reused for several files. Callers
+    must hold ``lock`` while using the branch or its trees, as bzrlib
+    objects aren't thread-safe.
+
+    Handles are leased out by BZRBranchCache, and each lease must be ended
+    through :py:meth:`release`. A handle that's closed while leased out is
+    only unlocked once the last lease ends.
+    """
+    max_trees = 16
+
+    def __init__(self, branch):
+        self.branch = branch
+        self.lock = threading.Lock()
+        self.opened = time.time()
+        self._trees = OrderedDict()
+        self._state_lock = threading.Lock()
+        self._num_leases = 0
+        self._closing = False
+        self._closed = False
+
+        branch.lock_read()
+
+    def get_tree(self, revspec):
+        """Returns the revision tree for a revspec.
+
+        The most recently used ``max_trees`` trees are kept.
+        """
+        try:
+            tree = self._trees.pop(revspec)
+        except KeyError:
+            tree = revisionspec.RevisionSpec.from_string(
+                revspec.encode('ascii')).as_tree(self.branch)
+
+            if len(self._trees) >= self.max_trees:
+                self._trees.popitem(last=False)
+
+        self._trees[revspec] = tree
+
+        return tree
+
+    def acquire(self):
+        """Leases the handle, keeping it open until released."""
+        with self._state_lock:
+            self._num_leases += 1
+
+    def release(self):
+        """Ends a lease on the handle.
+
+        If the handle was closed while leased out, and this was the last
+        lease, the branch is unlocked.
+        """
+        with self._state_lock:
+            self._num_leases -= 1
+            unlock = self._closing and self._num_leases == 0
+
+        if unlock:
+            self._unlock()
+
+    def close(self):
+        """Closes the handle.
+
+        The cached trees are dropped and the branch is unlocked, once no
+        leases on the handle remain.
+        """
+        with self._state_lock:
+            self._closing = True
+            unlock = self._num_leases == 0
+
+        if unlock:
+            self._unlock()
+
+    def _unlock(self):
+        with self._state_lock:
+            if self._closed:
+                return
+
+            self._closed = True
+
+        with self.lock:
+            self._trees.clear()
+
+            try:
+                self.branch.unlock()
+            except BzrError as e:
+                logging.warning('Unable to unlock bzr branch %s: %s',
+                                self.branch.base, e)
+
+
+class BZRBranchCache(object):
+    """An LRU cache of open, read-locked Bazaar branches.
+
+    Opening a branch, taking a read lock, and resolving a revision to a
+    tree is expensive (especially over bzr+ssh), and was previously done
+    for every file. Branches are kept open here instead, with up to
+    ``max_branches`` kept at a time.
+
+    A read-locked branch doesn't see revisions committed after it was
+    locked, so branches are reopened once they've been open for longer
+    than ``max_age`` seconds.
+
+    The cache is shared process-wide, through :py:meth:`get_cache`.
+    """
+    max_branches = 8
+    max_age = 60
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_cache(cls):
+        """Returns the shared branch cache."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+
+            return cls._instance
+
+    @classmethod
+    def close_all(cls):
+        """Closes all branches in the shared branch cache."""
+        with cls._instance_lock:
+            instance = cls._instance
+            cls._instance = None
+
+        if instance:
+            instance.close()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()
+
+    def get_handle(self, url):
+        """Returns the branch handle containing a URL, and the relative path.
+
+        The URL may have a query string (such as the LocalSite name used
+        for bzr+ssh), which must match for a cached branch to be used. The
+        relative path is unescaped, as with bzrlib's open_containing.
+
+        The handle is leased to the caller, which must call its
+        :py:meth:`BZRBranchHandle.release` method when done with it.
+        """
+        base_url, sep, query = url.partition('?')
+        cutoff = time.time() - self.max_age
+        expired = []
+
+        try:
+            with self._lock:
+                for key, handle in list(self._handles.items()):
+                    if handle.opened < cutoff:
+                        expired.append(self._handles.pop(key))
+
+                # Branches may be nested, so use the deepest one containing
+                # the URL.
+                matches = [
+                    key
+                    for key in six.iterkeys(self._handles)
+                    if key[1] == query and base_url.startswith(key[0])
+                ]
+
+                if matches:
+                    key = max(matches, key=lambda key: len(key[0]))
+
+                    # Mark this as the most recently used.
+                    handle = self._handles.pop(key)
+                    self._handles[key] = handle
+                    handle.acquire()
+
+                    return handle, urlutils.unescape(base_url[len(key[0]):])
+        finally:
+            for handle in expired:
+                handle.close()
+
+        branch, relpath = bzrdir.BzrDir.open_containing_tree_or_branch(
+            url.encode('ascii'))[1:]
+        handle = BZRBranchHandle(branch)
+        key = (branch.base, query)
+
+        with self._lock:
+            existing = self._handles.get(key)
+
+            if existing:
+                # Another thread opened this branch first.
+                expired.append(handle)
+                handle = existing
+            else:
+                self._handles[key] = handle
+
+                while len(self._handles) > self.max_branches:
+                    expired.append(self._handles.popitem(last=False)[1])
+
+            handle.acquire()
+
+        for old_handle in expired:
+            old_handle.close()
+
+        return handle, relpath
+
+    def close(self):
+        """Closes all branches in the cache."""
+        with self._lock:
+            handles = list(six.itervalues(self._handles))
+            self._handles = OrderedDict()
+
+        for handle in handles:
+            handle.close()
+
+
 class BZRTool(SCMTool):
     """An interface to the Bazaar SCM (http://bazaar-vcs.org/)"""
     name = "Bazaar"
@@ -115,33 +329,50 @@ class BZRTool(SCMTool):
         if revision == BZRTool.PRE_CREATION_TIMESTAMP:
             return ''
 
-        revspec = self._revspec_from_revision(revision)
-        filepath = self._get_full_path(path)
+        return self.get_files([(path, revision)])[(path, revision)]
+
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        Files are read from cached, read-locked branches (see
+        BZRBranchCache), so files at the same revision share a single
+        revision tree. Files that don't exist at the revision have empty
+        contents, as with get_file.
+        """
+        result = {}
+        cache = BZRBranchCache.get_cache()
+
+        for path, revision in files:
+            if revision in (BZRTool.PRE_CREATION_TIMESTAMP, PRE_CREATION):
+                result[(path, revision)] = b''
+                continue
+
+            revspec = self._revspec_from_revision(revision)
 
-        branch = None
-        try:
             try:
-                branch, relpath = bzrdir.BzrDir.open_containing_tree_or_branch(
-                    filepath.encode('ascii'))[1:]
-                branch.lock_read()
-                revtree = revisionspec.RevisionSpec.from_string(
-                    revspec.encode('ascii')).as_tree(branch)
-                fileid = revtree.path2id(relpath)
-                if fileid:
-                    # XXX: get_file_text returns str, which isn't Python 3
-                    # safe. According to the internet they have no immediate
-                    # plans to port to 3, so we may find it hard to support
-                    # that combination.
-                    contents = bytes(revtree.get_file_text(fileid))
-                else:
-                    contents = b''
+                handle, relpath = cache.get_handle(self._get_full_path(path))
+
+                try:
+                    with handle.lock:
+                        revtree = handle.get_tree(revspec)
+                        fileid = revtree.path2id(relpath)
+
+                        if fileid:
+                            # XXX: get_file_text returns str, which isn't
+                            # Python 3 safe. According to the internet they
+                            # have no immediate plans to port to 3, so we may
+                            # find it hard to support that combination.
+                            contents = bytes(revtree.get_file_text(fileid))
+                        else:
+                            contents = b''
+                finally:
+                    handle.release()
             except BzrError as e:
                 raise SCMError(e)
-        finally:
-            if branch:
-                branch.unlock()
 
-        return contents
+            result[(path, revision)] = contents
+
+        return result
 
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         if revision_str == BZRTool.PRE_CREATION_TIMESTAMP:
@@ -3,8 +3,11 @@ from __future__ import unicode_literals
 import logging
 import os
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
 
 from reviewboard.diffviewer.parser import DiffParser
 from reviewboard.scmtools.core import SCMTool, HEAD, PRE_CREATION
@@ -33,6 +36,242 @@ else:
     _popen_shell = False
 
 
+class ClearToolSession(object):
+    """A persistent, interactive cleartool process.
+
+    Starting cleartool takes far longer than most of the commands we run
+    through it, so a single ``cleartool -status`` process is kept running
+    per view, and commands are written to it one line at a time. The
+    ``-status`` flag makes cleartool print the exit status of each command
+    after its output, which marks where that output ends.
+
+    Errors are written to a temporary file rather than a pipe, so that a
+    command writing lots of errors can never block cleartool.
+
+    Sessions are shared process-wide, and should be fetched through
+    :py:meth:`get_session`. Commands on a session are run one at a time.
+    """
+    command = ['cleartool']
+
+    PROMPT = 'cleartool> '
+    STATUS_RE = re.compile(r'Command \d+ returned status (\d+)\s*$')
+
+    # Arguments that can't be safely quoted on a cleartool command line.
+    UNQUOTABLE_RE = re.compile(r'["\r\n]')
+    NEEDS_QUOTING_RE = re.compile(r"[\s']")
+
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls, cwd):
+        """Returns the shared session for a view path."""
+        with cls._sessions_lock:
+            session = cls._sessions.get(cwd)
+
+            if session is None:
+                session = cls(cwd)
+                cls._sessions[cwd] = session
+
+            return session
+
+    @classmethod
+    def close_all(cls):
+        """Stops all shared sessions."""
+        with cls._sessions_lock:
+            sessions = list(cls._sessions.values())
+            cls._sessions = {}
+
+        for session in sessions:
+            session.close()
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        self._process = None
+        self._errors = None
+
+    def can_run(self, args):
+        """Returns whether the arguments can be sent to the session."""
+        return not any(self.UNQUOTABLE_RE.search(arg) for arg in args)
+
+    def run(self, args):
+        """Runs a cleartool command in the session.
+
+        This returns a tuple of ``(status, output, errors)``, with the
+        output and errors decoded as UTF-8. If the cleartool process can't
+        be started or has died, IOError or OSError is raised. If running
+        the command fails for any reason, the process is stopped, and the
+        next command will start a new one.
+        """
+        cmdline = ' '.join(self._quote(arg) for arg in args)
+
+        with self._lock:
+            if not self._is_alive():
+                self._start()
+
+            try:
+                self._process.stdin.write(cmdline.encode('utf-8') + b'\n')
+                self._process.stdin.flush()
+
+                output = []
+
+                while True:
+                    line = self._process.stdout.readline()
+
+                    if not line:
+                        raise IOError('cleartool exited unexpectedly')
+
+                    line = line.decode('utf-8', 'replace')
+
+                    if line.startswith(self.PROMPT):
+                        line = line[len(self.PROMPT):]
+
+                    # Output that doesn't end in a newline (such as from
+                    # "describe -fmt") runs into the status line.
+                    m = self.STATUS_RE.search(line)
+
+                    if m:
+                        output.append(line[:m.start()])
+                        status = int(m.group(1))
+                        break
+
+                    output.append(line)
+
+                errors = self._read_errors()
+            except:
+                # The process may be partway through the command's output,
+                # so it can't be used for another command.
+                self._stop()
+                raise
+
+        return status, ''.join(output), errors
+
+    def close(self):
+        """Stops the cleartool process."""
+        with self._lock:
+            self._stop()
+
+    def _quote(self, arg):
+        if not arg or self.NEEDS_QUOTING_RE.search(arg):
+            return '"%s"' % arg
+
+        return arg
+
+    def _is_alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        self._stop()
+
+        self._errors = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            self.command + ['-status'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._errors,
+            cwd=self.cwd,
+            shell=_popen_shell)
+
+    def _stop(self):
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+                self._process.stdout.close()
+            except IOError:
+                pass
+
+            if self._process.poll() is None:
+                try:
+                    self._process.terminate()
+                except OSError:
+                    # It exited on its own in the meantime.
+                    pass
+
+            self._process.wait()
+            self._process = None
+
+        if self._errors is not None:
+            self._errors.close()
+            self._errors = None
+
+    def _read_errors(self):
+        self._errors.seek(0)
+        errors = self._errors.read()
+        self._errors.seek(0)
+        self._errors.truncate()
+
+        return errors.decode('utf-8', 'replace')
+
+
+def run_cleartool(args, cwd=None):
+    """Runs a cleartool command and returns its output.
+
+    The command is run in the persistent session for ``cwd`` when possible,
+    and falls back on running cleartool directly. Either way, the output is
+    returned decoded as UTF-8. SCMError is raised if the command fails.
+    """
+    if cwd:
+        session = ClearToolSession.get_session(cwd)
+
+        if session.can_run(args):
+            try:
+                status, res, error = session.run(args)
+            except (IOError, OSError) as e:
+                logging.warning('Unable to run "cleartool %s" in a '
+                                'persistent session in %s: %s',
+                                ' '.join(args), cwd, e)
+            else:
+                if status:
+                    raise SCMError(error or res)
+
+                return res
+
+    p = subprocess.Popen(
+        ClearToolSession.command + args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        shell=_popen_shell)
+
+    (res, error) = p.communicate()
+    failure = p.poll()
+
+    if failure:
+        raise SCMError(error.decode('utf-8', 'replace'))
+
+    return res.decode('utf-8', 'replace')
+
+
+# Results of lookups that don't change for a given view (such as view and
+# VOB metadata, or the elements that OIDs refer to), kept for the lifetime
+# of the process.
+_lookups = {}
+_lookups_lock = threading.Lock()
+MAX_LOOKUPS = 10000
+
+
+def cached_lookup(key, lookup_func):
+    """Returns the cached result of a lookup, performing it if needed.
+
+    Failed lookups (those raising an exception) aren't cached.
+    """
+    try:
+        return _lookups[key]
+    except KeyError:
+        pass
+
+    value = lookup_func()
+
+    with _lookups_lock:
+        if len(_lookups) >= MAX_LOOKUPS:
+            _lookups.clear()
+
+        _lookups[key] = value
+
+    return value
+
+
 class ClearCaseTool(SCMTool):
     name = 'ClearCase'
     uses_atomic_revisions = False
@@ -153,19 +392,12 @@ class ClearCaseTool(SCMTool):
         }
 
     def _get_view_type(self, repopath):
-        cmdline = ["cleartool", "lsview", "-full", "-properties", "-cview"]
-        p = subprocess.Popen(
-            cmdline,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=repopath,
-            shell=_popen_shell)
-
-        (res, error) = p.communicate()
-        failure = p.poll()
+        return cached_lookup(('view-type', repopath),
+                             lambda: self._lookup_view_type(repopath))
 
-        if failure:
-            raise SCMError(error)
+    def _lookup_view_type(self, repopath):
+        res = run_cleartool(['lsview', '-full', '-properties', '-cview'],
+                            cwd=repopath)
 
         for line in res.splitlines(True):
             splitted = line.split(' ')
@@ -178,36 +410,17 @@ class ClearCaseTool(SCMTool):
         return self.VIEW_UNKNOWN
 
     def _get_vobs_tag(self, repopath):
-        cmdline = ["cleartool", "describe", "-short", "vob:."]
-        p = subprocess.Popen(
-            cmdline,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=self.repopath,
-            shell=_popen_shell)
-
-        (res, error) = p.communicate()
-        failure = p.poll()
-
-        if failure:
-            raise SCMError(error)
-
-        return res.rstrip()
+        return cached_lookup(
+            ('vobs-tag', self.repopath),
+            lambda: run_cleartool(['describe', '-short', 'vob:.'],
+                                  cwd=self.repopath).rstrip())
 
     def _get_vobs_uuid(self, vobstag):
-        cmdline = ["cleartool", "lsvob", "-long", vobstag]
-        p = subprocess.Popen(
-            cmdline,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=self.repopath,
-            shell=_popen_shell)
-
-        (res, error) = p.communicate()
-        failure = p.poll()
+        return cached_lookup(('vobs-uuid', self.repopath, vobstag),
+                             lambda: self._lookup_vobs_uuid(vobstag))
 
-        if failure:
-            raise SCMError(error)
+    def _lookup_vobs_uuid(self, vobstag):
+        res = run_cleartool(['lsvob', '-long', vobstag], cwd=self.repopath)
 
         for line in res.splitlines(True):
             if line.startswith('Vob family uuid:'):
@@ -216,21 +429,10 @@ class ClearCaseTool(SCMTool):
         raise SCMError("Can't find familly uuid for vob: %s" % vobstag)
 
     def _get_object_kind(self, extended_path):
-        cmdline = ["cleartool", "desc", "-fmt", "%m", extended_path]
-        p = subprocess.Popen(
-            cmdline,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=self.repopath,
-            shell=_popen_shell)
-
-        (res, error) = p.communicate()
-        failure = p.poll()
-
-        if failure:
-            raise SCMError(error)
-
-        return res.strip()
+        return cached_lookup(
+            ('object-kind', self.repopath, extended_path),
+            lambda: run_cleartool(['desc', '-fmt', '%m', extended_path],
+                                  cwd=self.repopath).strip())
 
     def get_file(self, extended_path, revision=HEAD):
         """Return content of file or list content of directory"""
@@ -363,19 +565,11 @@ class ClearCaseDiffParser(DiffParser):
         return linenum
 
     def _oid2filename(self, oid):
-        cmdline = ["cleartool", "describe", "-fmt", "%En@@%Vn", "oid:%s" % oid]
-        p = subprocess.Popen(
-            cmdline,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=self.repopath,
-            shell=_popen_shell)
-
-        (res, error) = p.communicate()
-        failure = p.poll()
-
-        if failure:
-            raise SCMError(error)
+        res = cached_lookup(
+            ('oid', self.repopath, oid),
+            lambda: run_cleartool(['describe', '-fmt', '%En@@%Vn',
+                                   'oid:%s' % oid],
+                                  cwd=self.repopath))
 
         drive = os.path.splitdrive(self.repopath)[0]
         if drive:
@@ -437,27 +631,18 @@ class ClearCaseSnapshotViewClient(object):
         self.path = path
 
     def cat_file(self, extended_path, revision):
-        import tempfile
-        # Use tempfile to generate temporary filename
-        temp = tempfile.NamedTemporaryFile()
-        # Remove the file, so cleartool can write to it
-        temp.close()
-
-        cmdline = ["cleartool", "get", "-to", temp.name, extended_path]
-        p = subprocess.Popen(
-            cmdline,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=_popen_shell)
-
-        (res, error) = p.communicate()
-        failure = p.poll()
-
-        if failure:
-            raise FileNotFoundError(extended_path, revision)
+        # cleartool can only write the file out to a path, which mustn't
+        # exist yet.
+        tempdir = tempfile.mkdtemp(prefix='reviewboard-clearcase.')
+        temp_path = os.path.join(tempdir, 'file')
 
         try:
-            with open(temp.name, 'rb') as f:
+            run_cleartool(['get', '-to', temp_path, extended_path],
+                          cwd=self.path)
+
+            with open(temp_path, 'rb') as f:
                 return f.read()
-        except:
+        except (SCMError, IOError):
             raise FileNotFoundError(extended_path, revision)
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
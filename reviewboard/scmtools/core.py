@@ -18,6 +18,7 @@ import reviewboard.diffviewer.parser as diffparser
 from reviewboard.scmtools.errors import (AuthenticationError,
                                          FileNotFoundError,
                                          SCMError)
+from reviewboard.scmtools.http_pool import can_use_http_pool, get_http_pool
 from reviewboard.ssh import utils as sshutils
 from reviewboard.ssh.errors import SSHAuthenticationError
 
@@ -151,6 +152,26 @@ class SCMTool(object):
     def get_file(self, path, revision=None):
         raise NotImplementedError
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        This takes a list of ``(path, revision)`` tuples and returns a
+        dictionary mapping each tuple to the file's contents. Files that
+        could not be found are left out of the result.
+
+        By default, this calls get_file for each file. Subclasses that can
+        fetch many files in one operation should override this.
+        """
+        result = {}
+
+        for path, revision in files:
+            try:
+                result[(path, revision)] = self.get_file(path, revision)
+            except FileNotFoundError:
+                pass
+
+        return result
+
     def file_exists(self, path, revision=HEAD):
         try:
             self.get_file(path, revision)
@@ -227,12 +248,18 @@ class SCMTool(object):
         return patch
 
     @classmethod
-    def popen(cls, command, local_site_name=None):
+    def popen(cls, command, local_site_name=None, stdin=None, cwd=None):
         """Launches an application, capturing output.
 
         This wraps subprocess.Popen to provide some common parameters and
         to pass environment variables that may be needed by rbssh, if
         indirectly invoked.
+
+        If ``stdin`` is provided, it's passed through to subprocess.Popen,
+        allowing callers to talk to long-lived processes over a pipe.
+
+        If ``cwd`` is provided, the application is run in that directory,
+        without changing the working directory of this process.
         """
         env = os.environ.copy()
 
@@ -243,6 +270,8 @@ class SCMTool(object):
 
         return subprocess.Popen(command,
                                 env=env,
+                                cwd=cwd,
+                                stdin=stdin,
                                 stderr=subprocess.PIPE,
                                 stdout=subprocess.PIPE,
                                 close_fds=(os.name != 'nt'))
@@ -324,8 +353,73 @@ class SCMClient(object):
         self.password = password
 
     def get_file_http(self, url, path, revision):
+        """Fetches a file's contents over HTTP.
+
+        HTTP and HTTPS URLs (that don't need to go through a proxy) are
+        fetched over the shared, keep-alive HTTPConnectionPool.
+
+        A 404 will raise a FileNotFoundError, and any other failure will
+        raise an SCMError.
+        """
         logging.info('Fetching file from %s' % url)
 
+        if not can_use_http_pool(url):
+            return self._get_file_urllib(url, path, revision)
+
+        try:
+            response = get_http_pool().request(url,
+                                               self._build_http_headers())
+        except Exception as e:
+            msg = "Unexpected error fetching file from %s: %s" % (url, e)
+            logging.error(msg)
+            raise SCMError(msg)
+
+        return self._process_http_response(url, response, path, revision)
+
+    def get_files_http(self, files):
+        """Fetches several files' contents over HTTP concurrently.
+
+        This takes a list of ``(url, path, revision)`` tuples, and returns
+        a dictionary mapping each URL to the file's contents. Files that
+        couldn't be fetched are left out of the result (the errors will be
+        logged).
+        """
+        result = {}
+        pooled = []
+
+        for url, path, revision in files:
+            if can_use_http_pool(url):
+                pooled.append((url, path, revision))
+            else:
+                try:
+                    result[url] = self._get_file_urllib(url, path, revision)
+                except (FileNotFoundError, SCMError):
+                    pass
+
+        responses = get_http_pool().fetch_many([
+            (url, self._build_http_headers())
+            for url, path, revision in pooled
+        ])
+
+        for (url, path, revision), response in zip(pooled, responses):
+            if isinstance(response, Exception):
+                logging.error('Unexpected error fetching file from %s: %s',
+                              url, response)
+                continue
+
+            try:
+                result[url] = self._process_http_response(
+                    url, response, path, revision)
+            except (FileNotFoundError, SCMError):
+                pass
+
+        return result
+
+    def _get_file_urllib(self, url, path, revision):
+        """Fetches a file's contents over HTTP using urllib.
+
+        This is used for URLs that can't go through the HTTPConnectionPool.
+        """
         try:
             request = URLRequest(url)
 
@@ -348,3 +442,28 @@ class SCMClient(object):
             msg = "Unexpected error fetching file from %s: %s" % (url, e)
             logging.error(msg)
             raise SCMError(msg)
+
+    def _build_http_headers(self):
+        """Builds the headers for an HTTP request, including authentication.
+        """
+        headers = {}
+
+        if self.username:
+            auth_string = base64.b64encode('%s:%s' % (self.username,
+                                                      self.password))
+            headers['Authorization'] = 'Basic %s' % auth_string
+
+        return headers
+
+    def _process_http_response(self, url, response, path, revision):
+        """Returns the file contents from an HTTP response."""
+        if response.status == 200:
+            return response.data
+        elif response.status == 404:
+            logging.error('404')
+            raise FileNotFoundError(path, revision)
+        else:
+            msg = "HTTP error code %d when fetching file from %s" % \
+                  (response.status, url)
+            logging.error(msg)
+            raise SCMError(msg)
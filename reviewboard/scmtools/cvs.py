@@ -1,10 +1,15 @@
 from __future__ import unicode_literals
 
+import hashlib
 import logging
 import os
 import re
+import shutil
 import tempfile
+import threading
+import time
 
+from django.conf import settings
 from django.utils import six
 from django.utils.six.moves.urllib.parse import urlparse
 from djblets.util.filesystem import is_exe_in_path
@@ -54,7 +59,21 @@ class CVSTool(SCMTool):
         if repository.local_site:
             local_site_name = repository.local_site.name
 
-        self.client = CVSClient(self.cvsroot, self.repopath, local_site_name)
+        # If an rsync URL for the repository is set, files are read from a
+        # local mirror of the repository where possible.
+        rsync_url = (repository.extra_data or {}).get('cvs_rsync_url')
+        mirror = None
+
+        if rsync_url and settings.CVSTOOL_MIRROR_DIR:
+            mirror = CVSMirror(
+                rsync_url,
+                os.path.join(settings.CVSTOOL_MIRROR_DIR,
+                             hashlib.sha1(rsync_url.encode('utf-8'))
+                             .hexdigest()),
+                local_site_name)
+
+        self.client = CVSClient(self.cvsroot, self.repopath, local_site_name,
+                                mirror)
 
     def get_file(self, path, revision=HEAD):
         if not path:
@@ -233,27 +252,167 @@ class CVSDiffParser(DiffParser):
         return filename
 
 
+class CVSMirror(object):
+    """A local copy of a CVS repository, kept up to date with rsync.
+
+    CVS has to log in to a pserver for every file that's fetched. When a
+    repository is mirrored, files can be read straight out of the mirrored
+    RCS (",v") files instead, by using the mirror as a local CVSROOT.
+
+    The mirror is synced by :py:meth:`sync` (from the ``updatecvsmirrors``
+    management command), or in the background once it's more than
+    ``sync_interval`` seconds old. Lookups never wait on a sync. Only one
+    process syncs a mirror at a time.
+    """
+    sync_interval = 5 * 60
+
+    # How long a sync may take before another process assumes it died.
+    sync_lock_timeout = 60 * 60
+
+    def __init__(self, rsync_url, mirror_path, local_site_name=None):
+        self.rsync_url = rsync_url
+        self.mirror_path = mirror_path
+        self.local_site_name = local_site_name
+        self._stamp_path = mirror_path + '.synced'
+        self._lock_path = mirror_path + '.lock'
+
+    def is_ready(self):
+        """Returns whether the mirror has been synced successfully."""
+        return os.path.exists(self._stamp_path)
+
+    def get_cvsroot(self):
+        """Returns the CVSROOT of the mirror.
+
+        If the mirror is out of date, it's synced in the background. This
+        returns None if the mirror hasn't been synced successfully yet.
+        """
+        try:
+            synced = os.path.getmtime(self._stamp_path)
+        except OSError:
+            synced = None
+
+        if synced is None or time.time() - synced >= self.sync_interval:
+            self.sync_in_background()
+
+        if synced is None:
+            return None
+
+        return self.mirror_path
+
+    def sync_in_background(self):
+        """Syncs the mirror in a background thread.
+
+        This returns the thread, or None if the mirror is already being
+        synced.
+        """
+        if self._is_locked():
+            return None
+
+        thread = threading.Thread(target=self.sync)
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+    def sync(self):
+        """Syncs the mirror with rsync.
+
+        If another process is already syncing the mirror, this returns
+        right away. Errors are logged and otherwise ignored, leaving the
+        existing mirror (if any) in place. This returns whether the mirror
+        was synced.
+        """
+        if not is_exe_in_path('rsync'):
+            logging.error('Unable to sync the CVS mirror of %s: rsync is '
+                          'not installed',
+                          self.rsync_url)
+            return False
+
+        if not self._acquire_lock():
+            return False
+
+        try:
+            parent_dir = os.path.dirname(self.mirror_path)
+
+            if not os.path.isdir(parent_dir):
+                os.makedirs(parent_dir)
+
+            p = SCMTool.popen(['rsync', '-a', '--delete',
+                               self.rsync_url.rstrip('/') + '/',
+                               self.mirror_path + '/'],
+                              self.local_site_name)
+            errmsg = p.communicate()[1]
+
+            if p.returncode != 0:
+                logging.error('Unable to sync the CVS mirror of %s: %s',
+                              self.rsync_url, errmsg)
+                return False
+
+            with open(self._stamp_path, 'w'):
+                pass
+
+            os.utime(self._stamp_path, None)
+
+            return True
+        except (IOError, OSError) as e:
+            logging.error('Unable to sync the CVS mirror of %s: %s',
+                          self.rsync_url, e)
+            return False
+        finally:
+            self._release_lock()
+
+    def _acquire_lock(self):
+        try:
+            os.close(os.open(self._lock_path,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except OSError:
+            pass
+
+        try:
+            if (time.time() - os.path.getmtime(self._lock_path) >=
+                self.sync_lock_timeout):
+                # The process holding the lock most likely died. Take it
+                # over.
+                os.utime(self._lock_path, None)
+                return True
+        except OSError:
+            pass
+
+        return False
+
+    def _release_lock(self):
+        try:
+            os.unlink(self._lock_path)
+        except OSError:
+            pass
+
+    def _is_locked(self):
+        try:
+            return (time.time() - os.path.getmtime(self._lock_path) <
+                    self.sync_lock_timeout)
+        except OSError:
+            return False
+
+
 class CVSClient(object):
-    def __init__(self, cvsroot, path, local_site_name):
-        self.tempdir = ""
-        self.currentdir = os.getcwd()
+    # Remembers, for each CVSROOT and path, whether the file was last found
+    # in the Attic or not, so that the right location is tried first.
+    _attic_paths = {}
+    _attic_paths_lock = threading.Lock()
+    MAX_ATTIC_PATHS = 10000
+
+    def __init__(self, cvsroot, path, local_site_name, mirror=None):
         self.cvsroot = cvsroot
         self.path = path
         self.local_site_name = local_site_name
+        self.mirror = mirror
 
         if not is_exe_in_path('cvs'):
             # This is technically not the right kind of error, but it's the
             # pattern we use with all the other tools.
             raise ImportError
 
-    def cleanup(self):
-        if self.currentdir != os.getcwd():
-            # Restore current working directory
-            os.chdir(self.currentdir)
-            # Remove temporary directory
-            if self.tempdir != "":
-                os.rmdir(self.tempdir)
-
     def cat_file(self, filename, revision):
         # We strip the repo off of the fully qualified path as CVS does
         # not like to be given absolute paths.
@@ -269,6 +428,25 @@ class CVSClient(object):
         if filename.endswith(",v"):
             filename = filename[:-2]
 
+        if self.mirror:
+            mirror_cvsroot = self.mirror.get_cvsroot()
+
+            if mirror_cvsroot:
+                try:
+                    return self._cat_file_with_attic(mirror_cvsroot,
+                                                     filename, revision)
+                except FileNotFoundError:
+                    # The mirror may not have caught up with the
+                    # repository yet. Check the repository itself.
+                    pass
+                except SCMError as e:
+                    logging.warning('Unable to read %s from the CVS mirror '
+                                    'at %s: %s',
+                                    filename, mirror_cvsroot, e)
+
+        return self._cat_file_with_attic(self.cvsroot, filename, revision)
+
+    def _cat_file_with_attic(self, cvsroot, filename, revision):
         # We want to try to fetch the files with different permutations of
         # "Attic" and no "Attic". This means there are 4 various permutations
         # that we have to check, based on whether we're using windows- or
@@ -291,26 +469,57 @@ class CVSClient(object):
             # Attic path that makes any kind of sense.
             filenameAttic = None
 
-        try:
-            return self._cat_specific_file(filename, revision)
-        except FileNotFoundError:
-            if filenameAttic:
-                return self._cat_specific_file(filenameAttic, revision)
+        candidates = [filename]
+
+        if filenameAttic:
+            key = (cvsroot, filename)
+
+            if self._attic_paths.get(key):
+                candidates.insert(0, filenameAttic)
             else:
-                raise
+                candidates.append(filenameAttic)
+
+        for i, candidate in enumerate(candidates):
+            try:
+                contents = self._cat_specific_file(cvsroot, candidate,
+                                                   revision)
+            except FileNotFoundError:
+                if i == len(candidates) - 1:
+                    raise
+
+                continue
+
+            if filenameAttic:
+                self._remember_attic_path(key, candidate == filenameAttic)
+
+            return contents
+
+    def _remember_attic_path(self, key, in_attic):
+        with self._attic_paths_lock:
+            if (key not in self._attic_paths and
+                len(self._attic_paths) >= self.MAX_ATTIC_PATHS):
+                self._attic_paths.clear()
+
+            self._attic_paths[key] = in_attic
 
-    def _cat_specific_file(self, filename, revision):
+    def _cat_specific_file(self, cvsroot, filename, revision):
         # Somehow CVS sometimes seems to write .cvsignore files to current
-        # working directory even though we force stdout with -p.
-        self.tempdir = tempfile.mkdtemp()
-        os.chdir(self.tempdir)
+        # working directory even though we force stdout with -p. Run it in
+        # its own directory, rather than changing the working directory of
+        # the whole process (which isn't safe with several threads).
+        tempdir = tempfile.mkdtemp(prefix='reviewboard-cvs.')
 
-        p = SCMTool.popen(['cvs', '-f', '-d', self.cvsroot, 'checkout',
-                           '-r', six.text_type(revision), '-p', filename],
-                          self.local_site_name)
-        contents = p.stdout.read()
-        errmsg = six.text_type(p.stderr.read())
-        failure = p.wait()
+        try:
+            p = SCMTool.popen(['cvs', '-f', '-d', cvsroot, 'checkout',
+                               '-r', six.text_type(revision), '-p',
+                               filename],
+                              self.local_site_name,
+                              cwd=tempdir)
+            contents, errmsg = p.communicate()
+            errmsg = six.text_type(errmsg)
+            failure = p.returncode
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
 
         # Unfortunately, CVS is not consistent about exiting non-zero on
         # errors.  If the file is not found at all, then CVS will print an
@@ -332,7 +541,6 @@ class CVSClient(object):
         if (not errmsg or
                 errmsg.startswith('cvs checkout: cannot find module') or
                 errmsg.startswith('cvs checkout: could not read RCS file')):
-            self.cleanup()
             raise FileNotFoundError(filename, revision)
 
         # Otherwise, if there's an exit code, or errmsg doesn't look like
@@ -342,10 +550,8 @@ class CVSClient(object):
         # stating this. This is safe to ignore.
         if ((failure and not errmsg.startswith('==========')) and
                 not '.cvspass does not exist - creating new file' in errmsg):
-            self.cleanup()
             raise SCMError(errmsg)
 
-        self.cleanup()
         return contents
 
     def check_repository(self):
@@ -0,0 +1,280 @@
+"""An on-disk cache for files fetched from repositories.
+
+Repository.get_file caches file contents in the main cache (usually
+memcached), but large files are split across several cache entries and
+are easily evicted, forcing the file to be fetched from the repository
+again. FileCache keeps a second copy of fetched files on local disk, below
+the main cache and above the SCMTool.
+
+Files are content-addressed. Each cache key maps to a small reference file
+containing the SHA1 of the file's contents, and the contents themselves
+are stored once per SHA1, so the same contents fetched for several
+revisions only take up space once.
+
+All writes are performed by writing to a temporary file and renaming it
+into place, so several worker processes on the same host can share a
+cache directory safely. When the contents take up more than the configured
+number of bytes, the least recently used ones are removed.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+
+class FileCache(object):
+    """A byte-budgeted, content-addressed on-disk file cache.
+
+    ``max_size`` is the number of bytes the cached contents may take up.
+    Once that's exceeded, the least recently used contents are removed
+    until the cache is down to ``EVICT_TO_RATIO`` of ``max_size``.
+
+    Hit, miss, write and eviction counts for this process are available
+    through :py:meth:`get_stats`.
+    """
+    EVICT_TO_RATIO = 0.9
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.refs_path = os.path.join(path, 'refs')
+        self.blobs_path = os.path.join(path, 'blobs')
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+        }
+
+        # The cache's size isn't tracked between processes, so it's only
+        # checked (by scanning the cache directory) once enough new data
+        # has been written to possibly go over the budget.
+        self._bytes_written = max_size
+
+    def get(self, key):
+        """Returns the cached contents for a key.
+
+        This returns None if the key isn't in the cache.
+        """
+        ref_path = self._get_ref_path(key)
+        blob_path = None
+
+        try:
+            with open(ref_path, 'r') as f:
+                blob_path = self._get_blob_path(f.read().strip())
+
+            data = self._read_blob(blob_path)
+        except (IOError, OSError, ValueError):
+            if blob_path:
+                # The contents were evicted. The reference is useless now.
+                self._remove(ref_path)
+
+            self._record('misses')
+            return None
+
+        try:
+            # The modification time of the contents is used to find the
+            # least recently used contents when evicting.
+            os.utime(blob_path, None)
+        except OSError:
+            pass
+
+        self._record('hits')
+        return data
+
+    def set(self, key, data):
+        """Stores the contents for a key in the cache.
+
+        Errors writing to the cache are logged and otherwise ignored.
+        """
+        if len(data) > self.max_size:
+            return
+
+        sha1 = hashlib.sha1(data).hexdigest()
+        blob_path = self._get_blob_path(sha1)
+
+        try:
+            if os.path.exists(blob_path):
+                os.utime(blob_path, None)
+            else:
+                self._write_atomic(blob_path, data)
+
+                with self._lock:
+                    self._bytes_written += len(data)
+
+            self._write_atomic(self._get_ref_path(key),
+                               sha1.encode('ascii'))
+        except (IOError, OSError) as e:
+            logging.warning('Unable to write %s to the file cache in %s: %s',
+                            key, self.path, e)
+            return
+
+        self._record('writes')
+
+        if self._bytes_written >= self.max_size * (1 - self.EVICT_TO_RATIO):
+            self.evict()
+
+    def delete(self, key):
+        """Removes a key from the cache.
+
+        The contents are left for eviction, as other keys may refer to
+        them.
+        """
+        self._remove(self._get_ref_path(key))
+
+    def evict(self):
+        """Removes the least recently used contents over the byte budget.
+
+        References to removed contents are removed lazily, when they're
+        next looked up.
+        """
+        with self._lock:
+            self._bytes_written = 0
+
+        blobs = []
+        total_size = 0
+
+        for dirpath, dirnames, filenames in os.walk(self.blobs_path):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    # A temporary file being written by another process.
+                    continue
+
+                blob_path = os.path.join(dirpath, filename)
+
+                try:
+                    stat = os.stat(blob_path)
+                except OSError:
+                    continue
+
+                blobs.append((stat.st_mtime, stat.st_size, blob_path))
+                total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        target_size = self.max_size * self.EVICT_TO_RATIO
+        num_evicted = 0
+
+        for mtime, size, blob_path in sorted(blobs):
+            if total_size <= target_size:
+                break
+
+            self._remove(blob_path)
+            total_size -= size
+            num_evicted += 1
+
+        self._record('evictions', num_evicted)
+        logging.debug('Evicted %d files from the file cache in %s',
+                      num_evicted, self.path)
+
+    def clear(self):
+        """Removes everything from the cache."""
+        for base_path in (self.refs_path, self.blobs_path):
+            for dirpath, dirnames, filenames in os.walk(base_path):
+                for filename in filenames:
+                    self._remove(os.path.join(dirpath, filename))
+
+    def get_stats(self):
+        """Returns the hit, miss, write and eviction counts.
+
+        These only cover this process.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _record(self, stat, count=1):
+        with self._lock:
+            self._stats[stat] += count
+
+    def _get_ref_path(self, key):
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        return os.path.join(self.refs_path, digest[:2], digest[2:])
+
+    def _get_blob_path(self, sha1):
+        if len(sha1) != 40:
+            raise ValueError('Invalid file cache reference "%s"' % sha1)
+
+        return os.path.join(self.blobs_path, sha1[:2], sha1[2:])
+
+    def _read_blob(self, blob_path):
+        with open(blob_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files can't be memory-mapped.
+                return b''
+
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+                return m[:]
+            finally:
+                m.close()
+
+    def _write_atomic(self, path, data):
+        dirname = os.path.dirname(path)
+
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another process may have created it first.
+                if not os.path.isdir(dirname):
+                    raise
+
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=dirname)
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+
+            os.rename(temp_path, path)
+        except:
+            self._remove(temp_path)
+            raise
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+_file_cache = None
+_file_cache_lock = threading.Lock()
+
+
+def get_file_cache():
+    """Returns the process-wide FileCache.
+
+    The cache is configured through the ``SCMTOOLS_FILE_CACHE_DIR`` and
+    ``SCMTOOLS_FILE_CACHE_MAX_SIZE`` settings. This returns None if the
+    cache is disabled.
+    """
+    global _file_cache
+
+    path = getattr(settings, 'SCMTOOLS_FILE_CACHE_DIR', None)
+    max_size = getattr(settings, 'SCMTOOLS_FILE_CACHE_MAX_SIZE', 0)
+
+    if not path or not max_size:
+        return None
+
+    with _file_cache_lock:
+        if (_file_cache is None or
+            _file_cache.path != path or
+            _file_cache.max_size != max_size):
+            _file_cache = FileCache(path, max_size)
+
+        return _file_cache
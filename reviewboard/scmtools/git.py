@@ -3,14 +3,21 @@ from __future__ import unicode_literals
 import logging
 import os
 import re
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime
 
+from django.conf import settings
 from django.utils import six
 from django.utils.six.moves.urllib.parse import quote as urlquote
 from django.utils.translation import ugettext_lazy as _
 from djblets.util.filesystem import is_exe_in_path
 
 from reviewboard.diffviewer.parser import DiffParser, DiffParserError, File
-from reviewboard.scmtools.core import SCMClient, SCMTool, HEAD, PRE_CREATION
+from reviewboard.scmtools.core import (Branch, Commit, SCMClient, SCMTool,
+                                       HEAD, PRE_CREATION)
 from reviewboard.scmtools.errors import (FileNotFoundError,
                                          InvalidRevisionFormatError,
                                          RepositoryNotFoundError,
@@ -69,6 +76,8 @@ class GitTool(SCMTool):
         'executables': ['git']
     }
 
+    COMMITS_PAGE_LIMIT = 30
+
     def __init__(self, repository):
         super(GitTool, self).__init__(repository)
 
@@ -79,10 +88,36 @@ class GitTool(SCMTool):
 
         credentials = repository.get_credentials()
 
+        # Remote repositories can be mirrored locally, so that lookups
+        # don't need to go over the network.
+        self.mirror = None
+
+        if (repository.extra_data.get('git_use_local_mirror') and
+            repository.pk and settings.GIT_MIRROR_DIR):
+            self.mirror = GitMirror(
+                repository.path,
+                os.path.join(settings.GIT_MIRROR_DIR,
+                             '%s.git' % repository.pk),
+                local_site_name)
+
         self.client = GitClient(repository.path, repository.raw_file_url,
                                 credentials['username'],
                                 credentials['password'],
-                                repository.encoding, local_site_name)
+                                repository.encoding, local_site_name,
+                                mirror=self.mirror)
+
+    @property
+    def supports_post_commit(self):
+        """Whether commits can be listed and fetched from a local mirror."""
+        return self.mirror is not None
+
+    def has_local_mirror(self):
+        """Returns whether lookups can be served from a local mirror.
+
+        This is only the case once the mirror has been fetched at least
+        once.
+        """
+        return self.mirror is not None and self.mirror.is_ready()
 
     def get_file(self, path, revision=HEAD):
         if revision == PRE_CREATION:
@@ -90,6 +125,27 @@ class GitTool(SCMTool):
 
         return self.client.get_file(path, revision)
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        This takes a list of ``(path, revision)`` tuples and returns a
+        dictionary mapping each tuple to the file's contents. Files that
+        could not be found are left out of the result.
+        """
+        result = {}
+        to_fetch = []
+
+        for path, revision in files:
+            if revision == PRE_CREATION:
+                result[(path, revision)] = ''
+            else:
+                to_fetch.append((path, revision))
+
+        if to_fetch:
+            result.update(self.client.get_files(to_fetch))
+
+        return result
+
     def file_exists(self, path, revision=HEAD):
         if revision == PRE_CREATION:
             return False
@@ -99,6 +155,69 @@ class GitTool(SCMTool):
         except (FileNotFoundError, InvalidRevisionFormatError):
             return False
 
+    def get_branches(self):
+        """Returns the branches in the local mirror."""
+        git_dir = self._get_mirror_git_dir()
+
+        default_branch = self.client.run_git_command(
+            git_dir, ['symbolic-ref', '--quiet', 'HEAD'],
+            ignore_errors=True).decode('utf-8').strip()
+        output = self.client.run_git_command(
+            git_dir,
+            ['for-each-ref', '--format=%(objectname) %(refname)',
+             'refs/heads/']).decode('utf-8')
+
+        results = []
+
+        for line in output.splitlines():
+            sha1, ref = line.split(' ', 1)
+
+            results.append(Branch(id=ref[len('refs/heads/'):],
+                                  commit=sha1,
+                                  default=(ref == default_branch)))
+
+        return results
+
+    def get_commits(self, branch=None, start=None):
+        """Returns a page of commits from the local mirror."""
+        return self.client.get_commits(self._get_mirror_git_dir(),
+                                       start or branch or 'HEAD',
+                                       self.COMMITS_PAGE_LIMIT)
+
+    def get_change(self, revision):
+        """Returns a commit, with its diff, from the local mirror."""
+        git_dir = self._get_mirror_git_dir()
+        commits = self.client.get_commits(git_dir, revision, 1)
+
+        if not commits:
+            raise SCMError(_('Unable to find commit %s') % revision)
+
+        commit = commits[0]
+
+        if commit.parent:
+            args = [commit.parent, commit.id]
+        else:
+            args = ['--root', commit.id]
+
+        commit.diff = self.client.run_git_command(
+            git_dir,
+            ['diff-tree', '-p', '--full-index', '--no-color', '--no-renames',
+             '--no-commit-id'] + args)
+
+        return commit
+
+    def _get_mirror_git_dir(self):
+        if not self.mirror:
+            raise NotImplementedError
+
+        git_dir = self.mirror.get_git_dir()
+
+        if not git_dir:
+            raise SCMError(_("The local mirror of this repository hasn't "
+                             "been fetched yet"))
+
+        return git_dir
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, *args, **kwargs):
         revision = revision_str
@@ -362,6 +481,402 @@ class GitDiffParser(DiffParser):
                 setattr(file_info, attr, b'')
 
 
+class GitCatFileProcess(object):
+    """A long-lived ``git cat-file --batch`` process for a repository.
+
+    Object names are written to the process's stdin, one per line, and git
+    responds with a header and (for ``--batch``) the object's contents for
+    each one, without re-opening the repository's packfiles every time.
+
+    Requests are pipelined: all object names are written by a separate
+    thread while the responses are read back, so large batches don't
+    deadlock on full pipe buffers.
+    """
+    def __init__(self, git_dir, batch_option='--batch', local_site_name=None):
+        self.git_dir = git_dir
+        self.batch_option = batch_option
+        self.local_site_name = local_site_name
+        self.last_used = time.time()
+        self._process = None
+
+    def start(self):
+        """Starts the underlying git process."""
+        self._process = SCMTool.popen(
+            ['git', '--git-dir=%s' % self.git_dir, 'cat-file',
+             self.batch_option],
+            local_site_name=self.local_site_name,
+            stdin=subprocess.PIPE)
+
+    def is_alive(self):
+        """Returns whether the git process is still running."""
+        return self._process is not None and self._process.poll() is None
+
+    def close(self):
+        """Shuts down the git process."""
+        process = self._process
+        self._process = None
+
+        if process is not None and process.poll() is None:
+            try:
+                process.stdin.close()
+                process.wait()
+            except (IOError, OSError):
+                pass
+
+    def query(self, object_names):
+        """Looks up a list of objects in the repository.
+
+        This returns a list with one entry per object name, in order. Each
+        entry is a tuple of ``(object_type, contents)``, where ``contents``
+        is ``None`` when running with ``--batch-check``. If an object
+        doesn't exist (or the name is ambiguous), its entry will be ``None``.
+
+        If the process dies mid-request, an IOError will be raised.
+        """
+        if not self.is_alive():
+            self.start()
+
+        self.last_used = time.time()
+
+        process = self._process
+        request = b''.join(
+            object_name.encode('utf-8') + b'\n'
+            for object_name in object_names)
+        write_errors = []
+
+        def _write_request():
+            try:
+                process.stdin.write(request)
+                process.stdin.flush()
+            except (IOError, OSError) as e:
+                write_errors.append(e)
+
+        writer = threading.Thread(target=_write_request)
+        writer.daemon = True
+        writer.start()
+
+        try:
+            results = [
+                self._read_response()
+                for i in range(len(object_names))
+            ]
+        finally:
+            writer.join()
+
+        if write_errors:
+            raise write_errors[0]
+
+        self.last_used = time.time()
+
+        return results
+
+    def _read_response(self):
+        header = self._process.stdout.readline()
+
+        if not header:
+            raise IOError('git cat-file exited unexpectedly')
+
+        parts = header.split()
+
+        if len(parts) != 3 or parts[-1] in (b'missing', b'ambiguous'):
+            return None
+
+        object_type = parts[1].decode('utf-8')
+
+        if self.batch_option == '--batch-check':
+            return object_type, None
+
+        size = int(parts[2])
+        contents = self._process.stdout.read(size)
+
+        # Each object's contents are followed by a newline.
+        self._process.stdout.read(1)
+
+        if len(contents) != size:
+            raise IOError('Short read from git cat-file')
+
+        return object_type, contents
+
+
+class GitCatFilePool(object):
+    """A pool of long-lived ``git cat-file`` processes for a repository.
+
+    Processes are checked out for the duration of a request, so concurrent
+    threads never interleave requests on the same pipe. Up to
+    ``max_processes`` processes are kept per batch option. Processes that
+    die are restarted, and processes left idle for longer than
+    ``idle_timeout`` seconds are shut down the next time the pool is used.
+
+    Pools are shared process-wide, and should be fetched through
+    :py:meth:`get_pool`.
+    """
+    max_processes = 4
+    idle_timeout = 5 * 60
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls, git_dir, local_site_name=None):
+        """Returns the shared pool for a repository."""
+        key = (git_dir, local_site_name)
+
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+
+            if pool is None:
+                pool = cls(git_dir, local_site_name)
+                cls._pools[key] = pool
+
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        """Shuts down all processes in all shared pools."""
+        with cls._pools_lock:
+            pools = list(six.itervalues(cls._pools))
+            cls._pools = {}
+
+        for pool in pools:
+            pool.close()
+
+    def __init__(self, git_dir, local_site_name=None):
+        self.git_dir = git_dir
+        self.local_site_name = local_site_name
+        self._condition = threading.Condition()
+        self._idle = {}
+        self._num_processes = {}
+
+    def query(self, object_names, batch_option='--batch'):
+        """Looks up a list of objects using a pooled process.
+
+        See :py:meth:`GitCatFileProcess.query` for the format of the
+        results. If the process fails while handling the request, it's
+        replaced with a fresh one and the request is retried once.
+        """
+        process = self._checkout(batch_option)
+
+        try:
+            try:
+                results = process.query(object_names)
+            except (IOError, OSError) as e:
+                logging.warning('git cat-file %s process for %s failed '
+                                '(%s); restarting it.',
+                                batch_option, self.git_dir, e)
+                process.close()
+                results = process.query(object_names)
+        except:
+            process.close()
+            raise
+        finally:
+            self._checkin(process)
+
+        return results
+
+    def close(self):
+        """Shuts down all idle processes in the pool."""
+        with self._condition:
+            idle = self._idle
+            self._idle = {}
+
+            for batch_option, processes in six.iteritems(idle):
+                self._num_processes[batch_option] -= len(processes)
+
+        for processes in six.itervalues(idle):
+            for process in processes:
+                process.close()
+
+    def _checkout(self, batch_option):
+        with self._condition:
+            self._reap_idle()
+
+            while True:
+                idle = self._idle.setdefault(batch_option, [])
+
+                if idle:
+                    return idle.pop()
+
+                num_processes = self._num_processes.get(batch_option, 0)
+
+                if num_processes < self.max_processes:
+                    self._num_processes[batch_option] = num_processes + 1
+
+                    return GitCatFileProcess(self.git_dir, batch_option,
+                                             self.local_site_name)
+
+                self._condition.wait()
+
+    def _checkin(self, process):
+        with self._condition:
+            if process.is_alive():
+                self._idle.setdefault(process.batch_option, []).append(
+                    process)
+            else:
+                self._num_processes[process.batch_option] -= 1
+
+            self._condition.notify()
+
+    def _reap_idle(self):
+        cutoff = time.time() - self.idle_timeout
+
+        for batch_option, processes in six.iteritems(self._idle):
+            for process in list(processes):
+                if process.last_used < cutoff or not process.is_alive():
+                    processes.remove(process)
+                    self._num_processes[batch_option] -= 1
+                    process.close()
+
+
+class GitMirror(object):
+    """A local bare mirror of a remote Git repository.
+
+    Files, branches and commits can be read from the mirror instead of
+    being fetched over the network (or through a rate-limited API). The
+    mirror is updated incrementally with ``git fetch``, either by
+    :py:meth:`update` (from the ``updategitmirrors`` management command
+    or a post-receive hook), or in the background once it's more than
+    ``fetch_interval`` seconds old. Only one process updates a mirror at a
+    time.
+
+    Objects that haven't been fetched into the mirror yet must still be
+    looked up on the remote repository.
+    """
+    fetch_interval = 5 * 60
+
+    # How long an update may take before another process assumes it died.
+    fetch_lock_timeout = 60 * 60
+
+    def __init__(self, remote_url, mirror_path, local_site_name=None):
+        self.remote_url = remote_url
+        self.mirror_path = mirror_path
+        self.local_site_name = local_site_name
+        self._stamp_path = mirror_path + '.fetched'
+        self._lock_path = mirror_path + '.lock'
+
+    def is_ready(self):
+        """Returns whether the mirror has been fetched successfully."""
+        return os.path.exists(self._stamp_path)
+
+    def get_git_dir(self):
+        """Returns the path to the mirror.
+
+        If the mirror is out of date, it's updated in the background. This
+        returns None if the mirror hasn't been fetched successfully yet.
+        """
+        try:
+            fetched = os.path.getmtime(self._stamp_path)
+        except OSError:
+            fetched = None
+
+        if fetched is None or time.time() - fetched >= self.fetch_interval:
+            self.update_in_background()
+
+        if fetched is None:
+            return None
+
+        return self.mirror_path
+
+    def update_in_background(self):
+        """Updates the mirror in a background thread.
+
+        This returns the thread, or None if the mirror is already being
+        updated.
+        """
+        if self._is_locked():
+            return None
+
+        thread = threading.Thread(target=self.update)
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+    def update(self):
+        """Updates the mirror, cloning it first if needed.
+
+        If another process is already updating the mirror, this returns
+        right away. Errors are logged and otherwise ignored, leaving the
+        existing mirror (if any) in place. This returns whether the mirror
+        was updated.
+        """
+        if not self._acquire_lock():
+            return False
+
+        try:
+            if os.path.exists(self.mirror_path):
+                args = ['--git-dir=%s' % self.mirror_path, 'fetch', '--quiet',
+                        '--prune', 'origin']
+            else:
+                parent_dir = os.path.dirname(self.mirror_path)
+
+                if not os.path.isdir(parent_dir):
+                    os.makedirs(parent_dir)
+
+                # Clone somewhere else first, so that a failed clone never
+                # leaves a partial mirror behind.
+                clone_path = self.mirror_path + '.clone'
+                shutil.rmtree(clone_path, ignore_errors=True)
+                args = ['clone', '--quiet', '--mirror', self.remote_url,
+                        clone_path]
+
+            p = SCMTool.popen(['git'] + args, self.local_site_name)
+            errmsg = p.communicate()[1]
+
+            if p.returncode != 0:
+                logging.error('Unable to update the Git mirror of %s: %s',
+                              self.remote_url, errmsg)
+                return False
+
+            if not os.path.exists(self.mirror_path):
+                os.rename(clone_path, self.mirror_path)
+
+            with open(self._stamp_path, 'w'):
+                pass
+
+            os.utime(self._stamp_path, None)
+
+            return True
+        except (IOError, OSError) as e:
+            logging.error('Unable to update the Git mirror of %s: %s',
+                          self.remote_url, e)
+            return False
+        finally:
+            self._release_lock()
+
+    def _acquire_lock(self):
+        try:
+            os.close(os.open(self._lock_path,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except OSError:
+            pass
+
+        try:
+            if (time.time() - os.path.getmtime(self._lock_path) >=
+                self.fetch_lock_timeout):
+                # The process holding the lock most likely died. Take it
+                # over.
+                os.utime(self._lock_path, None)
+                return True
+        except OSError:
+            pass
+
+        return False
+
+    def _release_lock(self):
+        try:
+            os.unlink(self._lock_path)
+        except OSError:
+            pass
+
+    def _is_locked(self):
+        try:
+            return (time.time() - os.path.getmtime(self._lock_path) <
+                    self.fetch_lock_timeout)
+        except OSError:
+            return False
+
+
 class GitClient(SCMClient):
     FULL_SHA1_LENGTH = 40
 
@@ -369,8 +884,12 @@ class GitClient(SCMClient):
         r'^(?P<username>[A-Za-z0-9_\.-]+@)?(?P<hostname>[A-Za-z0-9_\.-]+):'
         r'(?P<path>.*)')
 
+    # The format used for reading commits from "git log". Fields are
+    # separated by NUL characters, and commits by record separators.
+    COMMIT_LOG_FORMAT = '%H%x00%P%x00%an%x00%at%x00%B%x1e'
+
     def __init__(self, path, raw_file_url=None, username=None, password=None,
-                 encoding='', local_site_name=None):
+                 encoding='', local_site_name=None, mirror=None):
         super(GitClient, self).__init__(self._normalize_git_url(path),
                                         username=username,
                                         password=password)
@@ -383,6 +902,7 @@ class GitClient(SCMClient):
         self.raw_file_url = raw_file_url
         self.encoding = encoding
         self.local_site_name = local_site_name
+        self.mirror = mirror
         self.git_dir = None
 
         url_parts = urllib_urlparse(self.path)
@@ -417,6 +937,15 @@ class GitClient(SCMClient):
         return True
 
     def get_file(self, path, revision):
+        if self.mirror:
+            obj = self._query_mirror(path, revision, '--batch')
+
+            if obj is not None and obj[0] == 'blob':
+                return obj[1]
+
+            if not self._can_fetch_remotely():
+                raise FileNotFoundError(path, revision)
+
         if self.raw_file_url:
             self.validate_sha1_format(path, revision)
 
@@ -426,6 +955,15 @@ class GitClient(SCMClient):
             return self._cat_file(path, revision, "blob")
 
     def get_file_exists(self, path, revision):
+        if self.mirror:
+            obj = self._query_mirror(path, revision, '--batch-check')
+
+            if obj is not None:
+                return obj[0] == 'blob'
+
+            if not self._can_fetch_remotely():
+                return False
+
         if self.raw_file_url:
             try:
                 # We want to make sure we can access the file successfully,
@@ -451,12 +989,169 @@ class GitClient(SCMClient):
         return SCMTool.popen(['git'] + args,
                              local_site_name=self.local_site_name)
 
+    def run_git_command(self, git_dir, args, ignore_errors=False):
+        """Runs a git command on a repository and returns its output.
+
+        SCMError is raised if the command fails, unless ``ignore_errors``
+        is set.
+        """
+        p = self._run_git(['--git-dir=%s' % git_dir] + args)
+        output, errmsg = p.communicate()
+
+        if p.returncode != 0 and not ignore_errors:
+            raise SCMError(errmsg)
+
+        return output
+
+    def resolve_commit(self, git_dir, revision):
+        """Returns the SHA1 of the commit a SHA1 or ref name points to.
+
+        Revisions come from API callers, so anything that git could read
+        as an option is rejected before it's passed on the command line.
+        SCMError is raised if the revision isn't valid or can't be found.
+        """
+        if not revision or revision.startswith('-'):
+            raise SCMError(_('%s is not a valid revision') % revision)
+
+        sha1 = self.run_git_command(
+            git_dir,
+            ['rev-parse', '--verify', '--quiet', '--end-of-options',
+             '%s^{commit}' % revision],
+            ignore_errors=True).decode('utf-8').strip()
+
+        if not sha1:
+            raise SCMError(_('Unable to find commit %s') % revision)
+
+        return sha1
+
+    def get_commits(self, git_dir, start, limit):
+        """Returns commits from a repository, starting at a revision.
+
+        This returns up to ``limit`` Commit objects, following the first
+        parent of each commit. ``start`` must be a SHA1 or ref name (see
+        :py:meth:`resolve_commit`).
+        """
+        output = self.run_git_command(
+            git_dir,
+            ['log', '--first-parent', '-n', six.text_type(limit),
+             '--format=%s' % self.COMMIT_LOG_FORMAT,
+             self.resolve_commit(git_dir, start), '--'])
+        results = []
+
+        for record in output.split(b'\x1e'):
+            record = record.strip(b'\n')
+
+            if not record:
+                continue
+
+            sha1, parents, author_name, timestamp, message = \
+                record.decode('utf-8', 'replace').split('\x00', 4)
+            date = datetime.utcfromtimestamp(int(timestamp))
+
+            results.append(Commit(author_name=author_name,
+                                  id=sha1,
+                                  date=date.isoformat(),
+                                  message=message.rstrip('\n'),
+                                  parent=(parents.split(' ')[0])))
+
+        return results
+
+    def _can_fetch_remotely(self):
+        """Returns whether files can be fetched without the mirror."""
+        return bool(self.raw_file_url or self.git_dir)
+
+    def _query_mirror(self, path, revision, batch_option):
+        """Looks up a file in the local mirror.
+
+        This returns None if the mirror hasn't been fetched yet, or doesn't
+        have the file.
+        """
+        return self._query_mirror_many([(path, revision)], batch_option)[0]
+
+    def _query_mirror_many(self, files, batch_option):
+        git_dir = self.mirror.get_git_dir()
+
+        if not git_dir:
+            return [None] * len(files)
+
+        return self._query_objects(
+            [self._resolve_head(revision, path) for path, revision in files],
+            batch_option,
+            git_dir=git_dir)
+
     def _build_raw_url(self, path, revision):
         url = self.raw_file_url
         url = url.replace("<revision>", revision)
         url = url.replace("<filename>", urlquote(path))
         return url
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        This takes a list of ``(path, revision)`` tuples and returns a
+        dictionary mapping each tuple to the file's contents. Files that
+        could not be found are left out of the result.
+
+        For local repositories, all the files are fetched in a single
+        round trip to a pooled ``git cat-file --batch`` process. For
+        repositories with a raw file URL, the files are fetched
+        concurrently over pooled HTTP connections.
+        """
+        result = {}
+
+        if self.mirror:
+            files = list(files)
+            remaining = []
+
+            for key, obj in zip(files,
+                                self._query_mirror_many(files, '--batch')):
+                if obj is not None and obj[0] == 'blob':
+                    result[key] = obj[1]
+                else:
+                    remaining.append(key)
+
+            if not remaining or not self._can_fetch_remotely():
+                return result
+
+            files = remaining
+
+        if self.raw_file_url:
+            urls = {}
+
+            for path, revision in files:
+                self.validate_sha1_format(path, revision)
+                urls[(path, revision)] = self._build_raw_url(path, revision)
+
+            contents = self.get_files_http([
+                (url, path, revision)
+                for (path, revision), url in six.iteritems(urls)
+            ])
+
+            for key, url in six.iteritems(urls):
+                if url in contents:
+                    result[key] = contents[url]
+
+            return result
+        elif not self.git_dir:
+            for path, revision in files:
+                try:
+                    result[(path, revision)] = self.get_file(path, revision)
+                except FileNotFoundError:
+                    pass
+
+            return result
+
+        files = list(files)
+        objects = self._query_objects(
+            [self._resolve_head(revision, path) for path, revision in files],
+            '--batch')
+
+        for (path, revision), obj in zip(files, objects):
+            if obj is not None and obj[0] == 'blob':
+                result[(path, revision)] = obj[1]
+
+        return result
+
     def _cat_file(self, path, revision, option):
         """
         Call git-cat-file(1) to get content or type information for a
@@ -467,9 +1162,31 @@ class GitClient(SCMClient):
 
         Otherwise, "option" can be used to pass a switch to git-cat-file,
         e.g. to test or existence or get the type of "commit".
+
+        For local repositories, "blob" and "-t" lookups are served by a
+        pooled, long-lived ``git cat-file`` process (see GitCatFilePool).
         """
         commit = self._resolve_head(revision, path)
 
+        if self.git_dir and option in ('blob', '-t'):
+            if option == 'blob':
+                obj = self._query_objects([commit], '--batch')[0]
+            else:
+                obj = self._query_objects([commit], '--batch-check')[0]
+
+            if obj is None:
+                raise FileNotFoundError(commit)
+
+            object_type, contents = obj
+
+            if option == '-t':
+                return object_type
+            elif object_type != 'blob':
+                raise SCMError('%s is a %s, not a blob'
+                               % (commit, object_type))
+
+            return contents
+
         p = self._run_git(['--git-dir=%s' % self.git_dir, 'cat-file',
                            option, commit])
         contents = p.stdout.read()
@@ -484,6 +1201,33 @@ class GitClient(SCMClient):
 
         return contents
 
+    def _query_objects(self, object_names, batch_option, git_dir=None):
+        """Looks up objects through the repository's cat-file pool.
+
+        ``git_dir`` defaults to the local repository. Object names
+        containing newlines can't be sent over the batch protocol, and are
+        reported as missing.
+        """
+        git_dir = git_dir or self.git_dir
+        pool = GitCatFilePool.get_pool(git_dir, self.local_site_name)
+        valid_names = [
+            object_name
+            for object_name in object_names
+            if '\n' not in object_name
+        ]
+
+        try:
+            found = dict(zip(valid_names,
+                             pool.query(valid_names, batch_option)))
+        except (IOError, OSError) as e:
+            raise SCMError(_('Unable to read from git cat-file for '
+                             '%(git_dir)s: %(error)s') % {
+                'git_dir': git_dir,
+                'error': e,
+            })
+
+        return [found.get(object_name) for object_name in object_names]
+
     def _resolve_head(self, revision, path):
         if revision == HEAD:
             if path == "":
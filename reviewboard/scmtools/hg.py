@@ -1,7 +1,14 @@
 from __future__ import unicode_literals
 
 import logging
+import os
 import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
 
 from django.utils import six
 from django.utils.six.moves.urllib.parse import quote as urllib_quote
@@ -42,6 +49,19 @@ class HgTool(SCMTool):
     def get_file(self, path, revision=HEAD):
         return self.client.cat_file(path, six.text_type(revision))
 
+    def get_files(self, files):
+        files = list(files)
+        contents = self.client.get_files([
+            (path, six.text_type(revision))
+            for path, revision in files
+        ])
+
+        return dict(
+            ((path, revision), contents[(path, six.text_type(revision))])
+            for path, revision in files
+            if (path, six.text_type(revision)) in contents
+        )
+
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         revision = revision_str
         if file_str == "/dev/null":
@@ -215,10 +235,7 @@ class HgWebClient(SCMClient):
                       self.path, self.username)
 
     def cat_file(self, path, rev="tip"):
-        if rev == HEAD or rev == UNKNOWN:
-            rev = "tip"
-        elif rev == PRE_CREATION:
-            rev = ""
+        rev = self._normalize_revision(rev)
 
         for rawpath in ["raw-file", "raw", "hg-history"]:
             try:
@@ -236,8 +253,322 @@ class HgWebClient(SCMClient):
 
         raise FileNotFoundError(path, rev)
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        This takes a list of ``(path, revision)`` tuples and returns a
+        dictionary mapping each tuple to the file's contents. Files that
+        could not be found are left out of the result.
+
+        The files are first fetched concurrently through the "raw-file"
+        URLs. Any that fail are retried one at a time through cat_file,
+        which tries the older URL formats.
+        """
+        urls = {}
+
+        for path, rev in files:
+            urls[(path, rev)] = self.FULL_FILE_URL % {
+                'url': self.path.rstrip('/'),
+                'rawpath': 'raw-file',
+                'revision': self._normalize_revision(rev),
+                'quoted_path': urllib_quote(path.lstrip('/')),
+            }
+
+        contents = self.get_files_http([
+            (url, path, rev)
+            for (path, rev), url in six.iteritems(urls)
+        ])
+        result = {}
+
+        for (path, rev), url in six.iteritems(urls):
+            if url in contents:
+                result[(path, rev)] = contents[url]
+            else:
+                try:
+                    result[(path, rev)] = self.cat_file(path, rev)
+                except FileNotFoundError:
+                    pass
+
+        return result
+
+    def _normalize_revision(self, rev):
+        if rev == HEAD or rev == UNKNOWN:
+            return "tip"
+        elif rev == PRE_CREATION:
+            return ""
+
+        return rev
+
+
+class HgCommandServer(object):
+    """A long-lived Mercurial command server for a repository.
+
+    This runs ``hg serve --cmdserver pipe`` and speaks its protocol over
+    the process's stdin and stdout, so that each command doesn't need to
+    pay for starting up a new Python interpreter and loading Mercurial and
+    its extensions.
+
+    Messages from the server are sent on channels. Each one consists of a
+    one-byte channel identifier and a big-endian 4-byte length, followed by
+    that many bytes of data (except for the input channels, where the
+    length is the amount of data requested).
+    """
+    HEADER_FORMAT = b'>cI'
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+    def __init__(self, args, local_site_name=None):
+        self.args = args
+        self.local_site_name = local_site_name
+        self.last_used = time.time()
+        self._process = None
+
+    def start(self):
+        """Starts the command server.
+
+        This will raise an IOError if the server couldn't be started, or
+        doesn't support running commands.
+        """
+        self._process = SCMTool.popen(
+            ['hg'] + self.args + ['serve', '--cmdserver', 'pipe'],
+            local_site_name=self.local_site_name,
+            stdin=subprocess.PIPE)
+
+        channel, data = self._read_message()
+        capabilities = []
+
+        if channel == b'o':
+            for line in data.splitlines():
+                if line.startswith(b'capabilities:'):
+                    capabilities = line.split(b':', 1)[1].split()
+
+        if b'runcommand' not in capabilities:
+            self.close()
+            raise IOError('hg command server does not support runcommand')
+
+    def is_alive(self):
+        """Returns whether the command server is still running."""
+        return self._process is not None and self._process.poll() is None
+
+    def close(self):
+        """Shuts down the command server."""
+        process = self._process
+        self._process = None
+
+        if process is not None and process.poll() is None:
+            try:
+                process.stdin.close()
+                process.wait()
+            except (IOError, OSError):
+                pass
+
+    def run_command(self, args):
+        """Runs a Mercurial command on the server.
+
+        This returns a tuple of ``(exit_code, output, errors)``, like
+        running ``hg`` directly would produce. If the server dies or sends
+        something unexpected, an IOError will be raised, and the server
+        should no longer be used.
+        """
+        if not self.is_alive():
+            self.start()
+
+        self.last_used = time.time()
+
+        request = b'\0'.join(
+            arg.encode('utf-8')
+            for arg in args)
+
+        self._process.stdin.write(b'runcommand\n' +
+                                  struct.pack(b'>I', len(request)) +
+                                  request)
+        self._process.stdin.flush()
+
+        output = []
+        errors = []
+
+        while True:
+            channel, data = self._read_message()
+
+            if channel == b'o':
+                output.append(data)
+            elif channel == b'e':
+                errors.append(data)
+            elif channel == b'r':
+                exit_code = struct.unpack(b'>i', data)[0]
+                break
+            elif channel in (b'I', b'L'):
+                # We never have any input to give. An empty response tells
+                # Mercurial we're at the end of the input.
+                self._process.stdin.write(struct.pack(b'>I', 0))
+                self._process.stdin.flush()
+            elif channel.isupper():
+                # Upper-case channels are required to be handled.
+                raise IOError('Unexpected channel "%s" from hg command '
+                              'server' % channel)
+
+        self.last_used = time.time()
+
+        return exit_code, b''.join(output), b''.join(errors)
+
+    def _read_message(self):
+        header = self._process.stdout.read(self.HEADER_SIZE)
+
+        if len(header) != self.HEADER_SIZE:
+            raise IOError('hg command server exited unexpectedly')
+
+        channel, length = struct.unpack(self.HEADER_FORMAT, header)
+
+        if channel in (b'I', b'L'):
+            return channel, length
+
+        data = self._process.stdout.read(length)
+
+        if len(data) != length:
+            raise IOError('Short read from hg command server')
+
+        return channel, data
+
+
+class HgCommandServerPool(object):
+    """A pool of Mercurial command servers for a repository.
+
+    Servers are checked out for the duration of a command, so concurrent
+    threads never interleave commands on the same pipe. Up to
+    ``max_servers`` servers are kept per repository. Servers that die are
+    restarted, and servers left idle for longer than ``idle_timeout``
+    seconds are shut down the next time the pool is used.
+
+    If a server can't be started at all (for instance, if the installed
+    version of Mercurial is too old), the pool is disabled for
+    ``retry_interval`` seconds, and callers should fall back on running
+    ``hg`` directly.
+
+    Pools are shared process-wide, and should be fetched through
+    :py:meth:`get_pool`.
+    """
+    max_servers = 4
+    idle_timeout = 5 * 60
+    retry_interval = 60
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls, path, args, local_site_name=None):
+        """Returns the shared pool for a repository."""
+        key = (path, local_site_name)
+
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+
+            if pool is None:
+                pool = cls(args, local_site_name)
+                cls._pools[key] = pool
+
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        """Shuts down all servers in all shared pools."""
+        with cls._pools_lock:
+            pools = list(six.itervalues(cls._pools))
+            cls._pools = {}
+
+        for pool in pools:
+            pool.close()
+
+    def __init__(self, args, local_site_name=None):
+        self.args = args
+        self.local_site_name = local_site_name
+        self.disabled_until = None
+        self._condition = threading.Condition()
+        self._idle = []
+        self._num_servers = 0
+
+    @property
+    def enabled(self):
+        """Whether command servers can currently be used."""
+        return (self.disabled_until is None or
+                time.time() >= self.disabled_until)
+
+    def run_command(self, args):
+        """Runs a Mercurial command on a pooled server.
+
+        See :py:meth:`HgCommandServer.run_command` for the result. If the
+        server fails while running the command, it's replaced with a fresh
+        one and the command is retried once. If that fails as well, the
+        pool is disabled and an IOError is raised.
+        """
+        server = self._checkout()
+
+        try:
+            try:
+                return server.run_command(args)
+            except (IOError, OSError) as e:
+                logging.warning('hg command server for %s failed (%s); '
+                                'restarting it.',
+                                self.args, e)
+                server.close()
+
+                return server.run_command(args)
+        except (IOError, OSError):
+            server.close()
+            self.disabled_until = time.time() + self.retry_interval
+            raise
+        except:
+            server.close()
+            raise
+        finally:
+            self._checkin(server)
+
+    def close(self):
+        """Shuts down all idle servers in the pool."""
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+            self._num_servers -= len(idle)
+
+        for server in idle:
+            server.close()
+
+    def _checkout(self):
+        with self._condition:
+            self._reap_idle()
+
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._num_servers < self.max_servers:
+                    self._num_servers += 1
+
+                    return HgCommandServer(self.args, self.local_site_name)
+
+                self._condition.wait()
+
+    def _checkin(self, server):
+        with self._condition:
+            if server.is_alive():
+                self._idle.append(server)
+            else:
+                self._num_servers -= 1
+
+            self._condition.notify()
+
+    def _reap_idle(self):
+        cutoff = time.time() - self.idle_timeout
+
+        for server in list(self._idle):
+            if server.last_used < cutoff or not server.is_alive():
+                self._idle.remove(server)
+                self._num_servers -= 1
+                server.close()
+
 
 class HgClient(SCMClient):
+    #: Whether to run commands on a pooled Mercurial command server.
+    use_command_server = True
+
     def __init__(self, path, local_site):
         super(HgClient, self).__init__(path)
         self.default_args = None
@@ -254,15 +585,63 @@ class HgClient(SCMClient):
             rev = ""
 
         if path:
-            p = self._run_hg(['cat', '--rev', rev, path])
-            contents = p.stdout.read()
-            failure = p.wait()
+            failure, contents, errors = self._run_hg_command(
+                ['cat', '--rev', rev, path])
 
             if not failure:
                 return contents
 
         raise FileNotFoundError(path, rev)
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        This takes a list of ``(path, revision)`` tuples and returns a
+        dictionary mapping each tuple to the file's contents. Files that
+        could not be found are left out of the result.
+
+        Files are grouped by revision, and each group is fetched with a
+        single ``hg cat``, which writes each file out to a temporary
+        directory.
+        """
+        paths_by_rev = {}
+
+        for path, rev in files:
+            if path:
+                paths_by_rev.setdefault(rev, []).append(path)
+
+        result = {}
+
+        for rev, paths in six.iteritems(paths_by_rev):
+            if rev == HEAD:
+                hg_rev = "tip"
+            elif rev == PRE_CREATION:
+                hg_rev = ""
+            else:
+                hg_rev = rev
+
+            tempdir = tempfile.mkdtemp(prefix='reviewboard-hg.')
+
+            try:
+                self._run_hg_command(['cat', '--rev', hg_rev,
+                                      '--output', os.path.join(tempdir, '%p'),
+                                      '--'] + paths)
+
+                # hg cat exits with an error if any of the files weren't
+                # found, but still writes out the ones it did find.
+                for path in paths:
+                    filename = os.path.normpath(
+                        os.path.join(tempdir, path.lstrip('/')))
+
+                    if (filename.startswith(tempdir + os.sep) and
+                        os.path.isfile(filename)):
+                        with open(filename, 'rb') as f:
+                            result[(path, rev)] = f.read()
+            finally:
+                shutil.rmtree(tempdir, ignore_errors=True)
+
+        return result
+
     def _calculate_default_args(self):
         self.default_args = [
             '--noninteractive',
@@ -302,6 +681,34 @@ class HgClient(SCMClient):
 
         return contents.strip()
 
+    def _run_hg_command(self, args):
+        """Runs a Mercurial command, returning its exit code and output.
+
+        This returns a tuple of ``(exit_code, output, errors)``. The command
+        is run on a pooled command server if possible, falling back on
+        running ``hg`` directly if the command server isn't available.
+        """
+        if not self.default_args:
+            self._calculate_default_args()
+
+        if self.use_command_server:
+            pool = HgCommandServerPool.get_pool(self.path, self.default_args,
+                                                self.local_site_name)
+
+            if pool.enabled:
+                try:
+                    return pool.run_command(args)
+                except (IOError, OSError) as e:
+                    logging.warning('Unable to use the hg command server '
+                                    'for %s; falling back on running hg '
+                                    'directly: %s',
+                                    self.path, e)
+
+        p = self._run_hg(args)
+        output, errors = p.communicate()
+
+        return p.returncode, output, errors
+
     def _run_hg(self, args):
         """Runs the Mercurial command, returning a subprocess.Popen."""
         if not self.default_args:
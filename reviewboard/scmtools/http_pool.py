@@ -0,0 +1,237 @@
+"""Shared, pooled HTTP access for SCMClients.
+
+SCMClients that fetch file contents over HTTP (such as Git repositories
+with a raw file URL, or hgweb-backed Mercurial repositories) often fetch
+many files from the same host in a row. Opening a new connection (and
+performing a new TLS handshake) for each one quickly dominates the time
+spent rendering a diff.
+
+HTTPConnectionPool keeps persistent keep-alive connections per host, and
+can fetch several URLs concurrently over a bounded number of connections.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from django.utils import six
+from django.utils.six.moves import http_client
+from django.utils.six.moves.urllib.parse import urljoin, urlparse
+from django.utils.six.moves.urllib.request import getproxies
+
+
+class HTTPResponse(object):
+    """A fully-read response from an HTTP request.
+
+    ``headers`` is a dictionary with lower-case header names.
+    """
+    def __init__(self, url, status, headers, data):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+
+class HTTPConnectionPool(object):
+    """A pool of persistent HTTP connections, shared across SCMClients.
+
+    Idle connections are kept per ``(scheme, host, port)``, up to
+    ``max_connections_per_host`` at a time. Connections left idle for
+    longer than ``idle_timeout`` seconds are closed rather than reused.
+
+    Only plain GET requests are supported, as that's all SCMClients need
+    for fetching file contents. Redirects are followed.
+    """
+    max_connections_per_host = 4
+    idle_timeout = 60
+    timeout = 60
+    max_redirects = 5
+
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def request(self, url, headers={}):
+        """Performs an HTTP GET on the given URL.
+
+        This returns an HTTPResponse, regardless of the HTTP status code.
+        Connection errors are raised as IOError (or a subclass), or
+        http_client.HTTPException.
+        """
+        for i in range(self.max_redirects + 1):
+            response = self._request(url, headers)
+
+            if (response.status in self.REDIRECT_STATUSES and
+                'location' in response.headers):
+                url = urljoin(url, response.headers['location'])
+            else:
+                return response
+
+        raise IOError('Too many redirects fetching %s' % url)
+
+    def fetch_many(self, requests, max_workers=None):
+        """Performs several HTTP GETs concurrently.
+
+        This takes a list of ``(url, headers)`` tuples, and returns a list
+        of the same length, in the same order. Each entry is either an
+        HTTPResponse, or the exception raised while fetching that URL.
+
+        At most ``max_workers`` requests (defaulting to
+        ``max_connections_per_host``) are in flight at once.
+        """
+        requests = list(requests)
+        results = [None] * len(requests)
+
+        if not requests:
+            return results
+
+        if max_workers is None:
+            max_workers = self.max_connections_per_host
+
+        next_index = [0]
+        index_lock = threading.Lock()
+
+        def _worker():
+            while True:
+                with index_lock:
+                    i = next_index[0]
+
+                    if i >= len(requests):
+                        return
+
+                    next_index[0] += 1
+
+                url, headers = requests[i]
+
+                try:
+                    results[i] = self.request(url, headers)
+                except Exception as e:
+                    results[i] = e
+
+        workers = [
+            threading.Thread(target=_worker)
+            for i in range(min(max_workers, len(requests)))
+        ]
+
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        return results
+
+    def close(self):
+        """Closes all idle connections in the pool."""
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+
+        for connections in six.itervalues(idle):
+            for conn, last_used in connections:
+                conn.close()
+
+    def _request(self, url, headers):
+        url_parts = urlparse(url)
+        key = (url_parts.scheme, url_parts.hostname, url_parts.port)
+        path = url_parts.path or '/'
+
+        if url_parts.query:
+            path += '?' + url_parts.query
+
+        conn = self._checkout(key, url_parts)
+        reused = conn.sock is not None
+
+        try:
+            response = self._send(conn, path, headers)
+        except (IOError, http_client.HTTPException):
+            conn.close()
+
+            if not reused:
+                raise
+
+            # The server may have closed the kept-alive connection while it
+            # was idle. Retry once on a fresh connection.
+            logging.debug('Retrying request for %s on a new connection',
+                          url)
+            response = self._send(conn, path, headers)
+
+        data = response.read()
+        response_headers = dict(
+            (name.lower(), value)
+            for name, value in response.getheaders()
+        )
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+        return HTTPResponse(url, response.status, response_headers, data)
+
+    def _send(self, conn, path, headers):
+        conn.request('GET', path, headers=headers)
+
+        return conn.getresponse()
+
+    def _checkout(self, key, url_parts):
+        cutoff = time.time() - self.idle_timeout
+
+        with self._lock:
+            connections = self._idle.get(key, [])
+
+            while connections:
+                conn, last_used = connections.pop()
+
+                if last_used >= cutoff:
+                    return conn
+
+                conn.close()
+
+        if url_parts.scheme == 'https':
+            conn_cls = http_client.HTTPSConnection
+        else:
+            conn_cls = http_client.HTTPConnection
+
+        return conn_cls(url_parts.hostname, url_parts.port,
+                        timeout=self.timeout)
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+
+            if len(connections) < self.max_connections_per_host:
+                connections.append((conn, time.time()))
+                return
+
+        conn.close()
+
+
+_http_pool = None
+
+
+def get_http_pool():
+    """Returns the process-wide HTTPConnectionPool."""
+    global _http_pool
+
+    if _http_pool is None:
+        _http_pool = HTTPConnectionPool()
+
+    return _http_pool
+
+
+def can_use_http_pool(url):
+    """Returns whether a URL can be fetched through the HTTPConnectionPool.
+
+    The pool talks to servers directly, so URLs that would need to go
+    through a configured proxy (or that aren't HTTP URLs at all) must be
+    fetched through urllib instead.
+    """
+    scheme = urlparse(url).scheme
+
+    return scheme in ('http', 'https') and scheme not in getproxies()
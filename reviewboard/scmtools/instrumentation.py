@@ -0,0 +1,413 @@
+"""Instrumentation of SCM operations.
+
+Fetching files, checking for their existence, and listing branches and
+commits can be slow, and how slow depends a lot on the repository's backend.
+This records, per repository and per day, the number of each kind of
+operation sent to the backend, how many failed, a histogram of how long they
+took, and how often they were answered from the cache instead. Requests made
+by hosting service clients are recorded the same way, per hosting service
+account.
+
+The statistics are stored as counters in the main cache, so that they're
+shared between all processes (when using memcached), and kept for
+STATS_DAYS days. Recording an operation only updates counters held by the
+process. They're added to the cache in one batch at the end of each request,
+or every FLUSH_INTERVAL seconds outside of requests, so that the cache isn't
+hit on every operation. Each day's statistics also keep an index of the
+targets they were recorded for, so that reading them doesn't need to check
+every repository and hosting service account.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.dispatch import receiver
+from django.utils import six, timezone
+from django.utils.translation import ugettext_lazy as _
+from djblets.cache.backend import make_cache_key
+
+
+#: The operations that are recorded, and their descriptions.
+OPERATIONS = (
+    ('get_file', _('Fetch file')),
+    ('get_files', _('Prefetch files')),
+    ('file_exists', _('Check file exists')),
+    ('get_branches', _('List branches')),
+    ('get_commits', _('List commits')),
+    ('get_change', _('Fetch commit')),
+    ('http_request', _('HTTP request')),
+)
+
+#: The upper bounds of the latency histogram buckets, in milliseconds. A
+#: final bucket counts anything slower.
+LATENCY_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+#: The number of days statistics are kept for.
+STATS_DAYS = 7
+
+#: The longest time, in seconds, counters are held by a process outside of
+#: a request before being added to the cache.
+FLUSH_INTERVAL = 10
+
+_COUNTER_FIELDS = (
+    ['count', 'errors', 'total_ms', 'cache_hits', 'cache_misses'] +
+    ['bucket-%d' % i for i in range(len(LATENCY_BUCKETS) + 1)]
+)
+
+_EXPIRATION = (STATS_DAYS + 1) * 24 * 60 * 60
+
+_pending_counters = {}
+_pending_lock = threading.Lock()
+_last_flush = time.time()
+
+
+def get_repository_target(repository):
+    """Returns the name statistics for a repository are recorded under."""
+    if repository.pk is None:
+        return None
+
+    return 'repository:%s' % repository.pk
+
+
+def get_hosting_account_target(account):
+    """Returns the name statistics for a hosting service account are
+    recorded under.
+    """
+    if account is None or account.pk is None:
+        return None
+
+    return 'hosting-account:%s' % account.pk
+
+
+@contextmanager
+def record_operation(target, operation):
+    """Records the latency, and any failure, of an operation.
+
+    This is used as a context manager around a call to the backend. If the
+    block raises an exception, the operation is recorded as an error. If
+    ``target`` is None, nothing is recorded.
+    """
+    start = time.time()
+
+    try:
+        yield
+    except Exception:
+        if target:
+            record_latency(target, operation, time.time() - start,
+                           error=True)
+
+        raise
+
+    if target:
+        record_latency(target, operation, time.time() - start)
+
+
+def instrument(target, operation, func):
+    """Returns a callable calling ``func`` through record_operation."""
+    def _call(*args, **kwargs):
+        with record_operation(target, operation):
+            return func(*args, **kwargs)
+
+    return _call
+
+
+def record_latency(target, operation, seconds, error=False):
+    """Records the latency of an operation, and whether it failed.
+
+    This is for operations that can't be wrapped in record_operation.
+    """
+    ms = int(seconds * 1000)
+    bucket = len(LATENCY_BUCKETS)
+
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if ms <= bound:
+            bucket = i
+            break
+
+    counters = {
+        'count': 1,
+        'total_ms': ms,
+        'bucket-%d' % bucket: 1,
+    }
+
+    if error:
+        counters['errors'] = 1
+
+    _increment(target, operation, counters)
+
+
+def record_cache_lookup(target, operation, hit):
+    """Records whether an operation was answered from the cache."""
+    if target:
+        if hit:
+            _increment(target, operation, {'cache_hits': 1})
+        else:
+            _increment(target, operation, {'cache_misses': 1})
+
+
+def get_stats(targets=None, day=None):
+    """Returns the statistics recorded for a list of targets on a day.
+
+    ``day`` is a date, and defaults to the current day (in UTC). If
+    ``targets`` is None, the targets with statistics recorded on the day
+    are used. This returns a dictionary mapping each target to a dictionary
+    of its operations' statistics (see :py:func:`_build_operation_stats`).
+    Operations that weren't recorded are left out.
+    """
+    day = day or _get_today()
+    flush_stats()
+
+    if targets is None:
+        targets = get_active_targets(day)
+
+    keys = {}
+
+    for target in targets:
+        for operation, label in OPERATIONS:
+            for field in _COUNTER_FIELDS:
+                keys[make_cache_key(_make_key(day, target, operation,
+                                              field))] = \
+                    (target, operation, field)
+
+    try:
+        values = cache.get_many(list(keys))
+    except Exception as e:
+        logging.warning('Unable to load SCM statistics: %s', e)
+        values = {}
+
+    counters = {}
+
+    for key, value in values.items():
+        target, operation, field = keys[key]
+        counters.setdefault(target, {}).setdefault(operation, {})[field] = \
+            int(value)
+
+    result = {}
+
+    for target in targets:
+        target_counters = counters.get(target, {})
+        result[target] = {}
+
+        for operation, label in OPERATIONS:
+            if operation in target_counters:
+                result[target][operation] = _build_operation_stats(
+                    target_counters[operation])
+
+    return result
+
+
+def get_active_targets(day=None):
+    """Returns the targets that statistics were recorded for on a day.
+
+    ``day`` is a date, and defaults to the current day (in UTC).
+    """
+    day = day or _get_today()
+    flush_stats()
+
+    try:
+        num_targets = cache.get(make_cache_key(_make_index_key(day,
+                                                               'count')))
+
+        if not num_targets:
+            return []
+
+        targets = cache.get_many([
+            make_cache_key(_make_index_key(day, i))
+            for i in range(1, num_targets + 1)
+        ])
+    except Exception as e:
+        logging.warning('Unable to load SCM statistics targets: %s', e)
+        return []
+
+    return sorted(targets.values())
+
+
+def parse_target(target):
+    """Returns the type and ID of the object a target is for.
+
+    The type is ``'repository'`` or ``'hosting-account'``.
+    """
+    target_type, pk = target.split(':', 1)
+
+    return target_type, int(pk)
+
+
+def flush_stats():
+    """Adds the counters held by this process to the cache.
+
+    This is called at the end of each request, and before statistics are
+    read. Failures are logged and otherwise ignored, so that recording
+    statistics never breaks the operation itself.
+    """
+    global _last_flush
+
+    with _pending_lock:
+        pending = _pending_counters.copy()
+        _pending_counters.clear()
+        _last_flush = time.time()
+
+    for (day, target), operations in six.iteritems(pending):
+        try:
+            _add_to_index(day, target)
+
+            for operation, counters in six.iteritems(operations):
+                for field, delta in six.iteritems(counters):
+                    _incr(_make_key(day, target, operation, field), delta)
+        except Exception as e:
+            logging.debug('Unable to record SCM statistics for %s: %s',
+                          target, e)
+
+
+def get_stats_days():
+    """Returns the days statistics are available for, most recent first."""
+    today = _get_today()
+
+    return [
+        today - timedelta(days=i)
+        for i in range(STATS_DAYS)
+    ]
+
+
+def _build_operation_stats(counters):
+    """Builds the statistics for an operation from its counters.
+
+    This returns a dictionary with the number of calls to the backend
+    (``count``), the number of ``errors`` and the ``error_rate``, the
+    ``total_ms`` and ``mean_ms`` latency, the ``p50_ms`` and ``p95_ms``
+    percentiles (as the upper bound of the histogram bucket they fall in,
+    or None if they're above the largest bucket), the ``histogram`` as a
+    list of counts per bucket, and the ``cache_hits``, ``cache_misses`` and
+    ``cache_hit_ratio``.
+    """
+    count = counters.get('count', 0)
+    errors = counters.get('errors', 0)
+    total_ms = counters.get('total_ms', 0)
+    cache_hits = counters.get('cache_hits', 0)
+    cache_misses = counters.get('cache_misses', 0)
+    histogram = [
+        counters.get('bucket-%d' % i, 0)
+        for i in range(len(LATENCY_BUCKETS) + 1)
+    ]
+
+    stats = {
+        'count': count,
+        'errors': errors,
+        'error_rate': None,
+        'total_ms': total_ms,
+        'mean_ms': None,
+        'p50_ms': None,
+        'p95_ms': None,
+        'histogram': histogram,
+        'cache_hits': cache_hits,
+        'cache_misses': cache_misses,
+        'cache_hit_ratio': None,
+    }
+
+    if count:
+        stats['error_rate'] = float(errors) / count
+        stats['mean_ms'] = float(total_ms) / count
+        stats['p50_ms'] = _get_percentile(histogram, count, 0.5)
+        stats['p95_ms'] = _get_percentile(histogram, count, 0.95)
+
+    if cache_hits or cache_misses:
+        stats['cache_hit_ratio'] = \
+            float(cache_hits) / (cache_hits + cache_misses)
+
+    return stats
+
+
+def _get_percentile(histogram, count, fraction):
+    needed = count * fraction
+    seen = 0
+
+    for bound, bucket_count in zip(LATENCY_BUCKETS, histogram):
+        seen += bucket_count
+
+        if seen >= needed:
+            return bound
+
+    return None
+
+
+def _increment(target, operation, counters):
+    """Increments counters for an operation.
+
+    The counters are held by the process until the next
+    :py:func:`flush_stats`, which happens right away if the last one was
+    more than FLUSH_INTERVAL seconds ago.
+    """
+    if not target:
+        return
+
+    with _pending_lock:
+        pending = _pending_counters.setdefault(
+            (_get_today(), target), {}).setdefault(operation, {})
+
+        for field, delta in six.iteritems(counters):
+            pending[field] = pending.get(field, 0) + delta
+
+        needs_flush = (time.time() - _last_flush >= FLUSH_INTERVAL)
+
+    if needs_flush:
+        flush_stats()
+
+
+def _incr(key, delta):
+    """Increments a counter in the cache, creating it if needed."""
+    key = make_cache_key(key)
+
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # The counter doesn't exist yet. Another process may create it
+        # first, in which case we increment theirs.
+        if not cache.add(key, delta, _EXPIRATION):
+            cache.incr(key, delta)
+
+
+def _add_to_index(day, target):
+    """Adds a target to the index of targets with statistics on a day.
+
+    The index is a counter of the number of targets, and a key per target
+    numbered from 1, so that it can be added to without a race between
+    processes. A marker key makes sure each target is only added once.
+    """
+    if cache.add(make_cache_key(_make_key(day, target, 'indexed')), True,
+                 _EXPIRATION):
+        count_key = make_cache_key(_make_index_key(day, 'count'))
+
+        try:
+            num_targets = cache.incr(count_key)
+        except ValueError:
+            if cache.add(count_key, 1, _EXPIRATION):
+                num_targets = 1
+            else:
+                num_targets = cache.incr(count_key)
+
+        cache.set(make_cache_key(_make_index_key(day, num_targets)), target,
+                  _EXPIRATION)
+
+
+def _make_key(day, target, *parts):
+    return 'scm-stats:%s:%s:%s' % (day.strftime('%Y%m%d'), target,
+                                   ':'.join(parts))
+
+
+def _make_index_key(day, name):
+    return 'scm-stats:%s:targets:%s' % (day.strftime('%Y%m%d'), name)
+
+
+def _get_today():
+    return timezone.now().date()
+
+
+@receiver(request_finished, dispatch_uid='flush_scm_stats')
+def _on_request_finished(**kwargs):
+    flush_stats()
@@ -0,0 +1,31 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from reviewboard.scmtools.models import Repository
+
+
+class Command(NoArgsCommand):
+    help = _('Updates the local mirrors of CVS repositories. This can be '
+             'run periodically (for instance, from cron) to keep the '
+             'mirrors up to date.')
+
+    def handle_noargs(self, **options):
+        for repository in Repository.objects.filter(archived=False):
+            if not (repository.extra_data or {}).get('cvs_rsync_url'):
+                continue
+
+            mirror = getattr(repository.get_scmtool().client, 'mirror', None)
+
+            if mirror is None:
+                # CVSTOOL_MIRROR_DIR isn't set.
+                continue
+
+            if mirror.sync():
+                self.stdout.write(_('Updated the mirror of %s')
+                                  % repository.name)
+            else:
+                self.stderr.write(_('Unable to update the mirror of %s. '
+                                    'See the log for details.')
+                                  % repository.name)
@@ -0,0 +1,25 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import NoArgsCommand
+from django.utils.translation import ugettext as _
+
+from reviewboard.scmtools.models import Repository
+
+
+class Command(NoArgsCommand):
+    help = _('Updates the local mirrors of Git repositories. This can be '
+             'run periodically (for instance, from cron) to keep the '
+             'mirrors up to date.')
+
+    def handle_noargs(self, **options):
+        for repository in Repository.objects.filter(archived=False):
+            if not repository.extra_data.get('git_use_local_mirror'):
+                continue
+
+            if repository.update_local_mirror():
+                self.stdout.write(_('Updated the mirror of %s')
+                                  % repository.name)
+            else:
+                self.stderr.write(_('Unable to update the mirror of %s. '
+                                    'See the log for details.')
+                                  % repository.name)
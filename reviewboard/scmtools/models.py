@@ -1,13 +1,16 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 import uuid
+from datetime import timedelta
 from time import time
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.db import models
+from django.db import connection, models
 from django.db import IntegrityError
 from django.utils import six, timezone
 from django.utils.encoding import python_2_unicode_compatible
@@ -25,7 +28,9 @@ from reviewboard.scmtools.managers import RepositoryManager, ToolManager
 from reviewboard.scmtools.signals import (checked_file_exists,
                                           checking_file_exists,
                                           fetched_file, fetching_file)
-from reviewboard.scmtools.core import FileNotFoundError
+from reviewboard.scmtools.core import FileNotFoundError, SCMError
+from reviewboard.scmtools import instrumentation
+from reviewboard.scmtools.file_cache import get_file_cache
 from reviewboard.site.models import LocalSite
 
 
@@ -176,6 +181,16 @@ class Repository(models.Model):
     COMMITS_CACHE_PERIOD_SHORT = 60 * 5  # 5 minutes
     COMMITS_CACHE_PERIOD_LONG = 60 * 60 * 24  # 1 day
 
+    # How long a stale list of branches or commits will be served while it's
+    # being refreshed, and how long a refresh may take before another one
+    # can be started.
+    STALE_CACHE_PERIOD = 60 * 60 * 24 * 7  # 1 week
+    REFRESH_LOCK_PERIOD = 60  # 1 minute
+
+    # How long to remember that a file doesn't exist. Unlike a file that
+    # does exist, it may show up in a later push.
+    FILE_NOT_EXISTS_CACHE_PERIOD = 60 * 5  # 5 minutes
+
     def get_scmtool(self):
         cls = self.tool.get_scmtool_class()
         return cls(self)
@@ -302,12 +317,105 @@ class Repository(models.Model):
         #
         # Basically, this fixes the massive regressions introduced by the
         # Django unicode changes.
-        return cache_memoize(
+        cache_misses = []
+
+        def _get_file():
+            cache_misses.append(True)
+
+            return [self._get_file_from_file_cache(path, revision,
+                                                   base_commit_id, request)]
+
+        data = cache_memoize(
             self._make_file_cache_key(path, revision, base_commit_id),
-            lambda: [self._get_file_uncached(path, revision, base_commit_id,
-                                             request)],
+            _get_file,
             large_data=True)[0]
 
+        instrumentation.record_cache_lookup(self._stats_target, 'get_file',
+                                            not cache_misses)
+
+        return data
+
+    def prefetch_files(self, files, base_commit_id=None, request=None):
+        """Fetches several files into the file cache at once.
+
+        This takes a list of ``(path, revision)`` tuples. Any files that
+        aren't already in the cache are fetched from the repository in one
+        batch (see SCMTool.get_files) and stored in the cache, so that
+        subsequent calls to get_file for them don't need to go to the
+        repository.
+
+        Repositories backed by a hosting service are only prefetched from
+        a local mirror (see _get_mirrored_scmtool).
+
+        Errors are logged and otherwise ignored. Files that couldn't be
+        prefetched will be fetched (and any errors reported) by get_file.
+        """
+        if self.hosting_service and not self._get_mirrored_scmtool():
+            return
+
+        file_cache = get_file_cache()
+        to_fetch = []
+
+        for path, revision in files:
+            key = self._make_file_cache_key(path, revision, base_commit_id)
+
+            if make_cache_key(key) in cache:
+                continue
+
+            if file_cache:
+                data = file_cache.get(make_cache_key(key))
+
+                if data is not None:
+                    cache_memoize(key, lambda data=data: [data],
+                                  large_data=True)
+                    continue
+
+            to_fetch.append((path, revision))
+
+        if not to_fetch:
+            return
+
+        for path, revision in to_fetch:
+            fetching_file.send(sender=self,
+                               path=path,
+                               revision=revision,
+                               base_commit_id=base_commit_id,
+                               request=request)
+
+        log_timer = log_timed("Prefetching %d files from %s"
+                              % (len(to_fetch), self),
+                              request=request)
+
+        try:
+            with instrumentation.record_operation(self._stats_target,
+                                                  'get_files'):
+                contents = self.get_scmtool().get_files(to_fetch)
+        except Exception as e:
+            logging.warning('Unable to prefetch files from repository '
+                            '%s: %s',
+                            self.pk, e, exc_info=1)
+            return
+        finally:
+            log_timer.done()
+
+        for (path, revision), data in six.iteritems(contents):
+            fetched_file.send(sender=self,
+                              path=path,
+                              revision=revision,
+                              base_commit_id=base_commit_id,
+                              request=request,
+                              data=data)
+
+            key = self._make_file_cache_key(path, revision, base_commit_id)
+
+            if file_cache:
+                file_cache.set(make_cache_key(key), data)
+
+            # This is stored the same way get_file stores it.
+            cache_memoize(key, lambda data=data: [data], large_data=True)
+
+        self._mark_files_exist(list(contents), base_commit_id)
+
     def get_file_exists(self, path, revision, base_commit_id=None,
                         request=None):
         """Returns whether or not a file exists in the repository.
@@ -317,33 +425,115 @@ class Repository(models.Model):
         repository.
 
         The result of this call will be cached, making future lookups
-        of this path and revision on this repository faster.
+        of this path and revision on this repository faster. Files that
+        don't exist are only remembered for FILE_NOT_EXISTS_CACHE_PERIOD
+        seconds, or until invalidate_cached_lookups is called.
         """
         key = self._make_file_exists_cache_key(path, revision, base_commit_id)
+        not_exists_key = make_cache_key(
+            self._make_file_not_exists_cache_key(path, revision,
+                                                 base_commit_id))
+        cached = cache.get_many([make_cache_key(key), not_exists_key])
+        exists_cached = (cached.get(make_cache_key(key)) == '1' or
+                         not_exists_key in cached)
+
+        instrumentation.record_cache_lookup(self._stats_target, 'file_exists',
+                                            exists_cached)
 
-        if cache.get(make_cache_key(key)) == '1':
+        if cached.get(make_cache_key(key)) == '1':
             return True
+        elif not_exists_key in cached:
+            return False
 
         exists = self._get_file_exists_uncached(path, revision,
                                                 base_commit_id, request)
 
         if exists:
             cache_memoize(key, lambda: '1')
+        else:
+            cache.set(not_exists_key, '1', self.FILE_NOT_EXISTS_CACHE_PERIOD)
 
         return exists
 
+    def invalidate_cached_lookups(self, branches=None):
+        """Invalidates cached lookups that may change after a push.
+
+        This should be called when new commits land in the repository, such
+        as from a post-receive hook. Any files remembered as not existing
+        will be checked again, and the cached lists of branches and of the
+        latest commits (on the default branch and on any of the given
+        branches) are marked stale, so they'll be refreshed in the
+        background on next access.
+
+        If the repository has a local mirror, it's updated in the
+        background, and the lookups are invalidated again once it's been
+        updated.
+        """
+        self._invalidate_cached_lookups(branches)
+
+        if self._get_local_mirror():
+            self._start_refresh(lambda: self.update_local_mirror(branches))
+
+    def update_local_mirror(self, branches=None):
+        """Updates the repository's local mirror, if it has one.
+
+        Once the mirror has been updated, cached lookups are invalidated
+        (see invalidate_cached_lookups), so that they'll be redone against
+        the new commits. This returns whether the mirror was updated.
+        """
+        mirror = self._get_local_mirror()
+
+        if not mirror or not mirror.update():
+            return False
+
+        self._invalidate_cached_lookups(branches)
+
+        return True
+
+    def _invalidate_cached_lookups(self, branches):
+        generation_key = self._make_file_not_exists_generation_key()
+
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            # There's no generation yet, so there's nothing to invalidate.
+            pass
+
+        self._mark_cache_stale(self._make_branches_cache_key())
+
+        for branch in [None] + list(branches or []):
+            self._mark_cache_stale(self._make_commits_cache_key(branch, None))
+
     def get_branches(self):
-        """Returns a list of branches."""
+        """Returns a list of branches.
+
+        The list is cached for BRANCHES_CACHE_PERIOD seconds. After that,
+        the cached list continues to be returned while it's refreshed in
+        the background. See get_branches_cache_info.
+        """
         hosting_service = self.hosting_service
 
-        cache_key = make_cache_key('repository-branches:%s' % self.pk)
         if hosting_service:
-            branches_callable = lambda: hosting_service.get_branches(self)
+            branches_callable = self._with_mirror_fallback(
+                lambda tool: tool.get_branches(),
+                lambda: hosting_service.get_branches(self))
         else:
-            branches_callable = self.get_scmtool().get_branches
+            branches_callable = lambda: self.get_scmtool().get_branches()
+
+        return self._get_cached_with_refresh(
+            self._make_branches_cache_key(),
+            instrumentation.instrument(self._stats_target, 'get_branches',
+                                       branches_callable),
+            self.BRANCHES_CACHE_PERIOD,
+            operation='get_branches')
 
-        return cache_memoize(cache_key, branches_callable,
-                             self.BRANCHES_CACHE_PERIOD)
+    def get_branches_cache_info(self):
+        """Returns information on the cached list of branches.
+
+        See _get_cache_info for the contents.
+        """
+        return self._get_cache_info(self._make_branches_cache_key(),
+                                    self.BRANCHES_CACHE_PERIOD)
 
     def get_commit_cache_key(self, commit):
         return 'repository-commit:%s:%s' % (self.pk, commit)
@@ -353,6 +543,9 @@ class Repository(models.Model):
 
         This is paginated via the 'start' parameter. Any exceptions are
         expected to be handled by the caller.
+
+        Like get_branches, a stale list is returned while it's refreshed in
+        the background. See get_commits_cache_info.
         """
         hosting_service = self.hosting_service
 
@@ -362,32 +555,45 @@ class Repository(models.Model):
         }
 
         if hosting_service:
-            commits_callable = \
-                lambda: hosting_service.get_commits(self, **commits_kwargs)
+            get_commits = self._with_mirror_fallback(
+                lambda tool: tool.get_commits(**commits_kwargs),
+                lambda: hosting_service.get_commits(self, **commits_kwargs))
         else:
-            commits_callable = \
+            get_commits = \
                 lambda: self.get_scmtool().get_commits(**commits_kwargs)
 
-        # We cache both the entire list for 'start', as well as each individual
-        # commit. This allows us to reduce API load when people are looking at
-        # the "new review request" page more frequently than they're pushing
-        # code, and will usually save 1 API request when they go to actually
-        # create a new review request.
-        if branch and start:
-            cache_period = self.COMMITS_CACHE_PERIOD_LONG
-        else:
-            cache_period = self.COMMITS_CACHE_PERIOD_SHORT
+        get_commits = instrumentation.instrument(self._stats_target,
+                                                 'get_commits', get_commits)
+
+        def commits_callable():
+            commits = get_commits()
+
+            # We cache both the entire list for 'start', as well as each
+            # individual commit. This allows us to reduce API load when
+            # people are looking at the "new review request" page more
+            # frequently than they're pushing code, and will usually save 1
+            # API request when they go to actually create a new review
+            # request.
+            for commit in commits:
+                cache.set(self.get_commit_cache_key(commit.id),
+                          commit, self.COMMITS_CACHE_PERIOD_LONG)
 
-        cache_key = make_cache_key('repository-commits:%s:%s:%s'
-                                   % (self.pk, branch, start))
-        commits = cache_memoize(cache_key, commits_callable,
-                                cache_period)
+            return commits
 
-        for commit in commits:
-            cache.set(self.get_commit_cache_key(commit.id),
-                      commit, self.COMMITS_CACHE_PERIOD_LONG)
+        return self._get_cached_with_refresh(
+            self._make_commits_cache_key(branch, start),
+            commits_callable,
+            self._get_commits_cache_period(branch, start),
+            operation='get_commits')
 
-        return commits
+    def get_commits_cache_info(self, branch=None, start=None):
+        """Returns information on a cached list of commits.
+
+        See _get_cache_info for the contents.
+        """
+        return self._get_cache_info(
+            self._make_commits_cache_key(branch, start),
+            self._get_commits_cache_period(branch, start))
 
     def get_change(self, revision):
         """Get an individual change.
@@ -396,10 +602,14 @@ class Repository(models.Model):
         """
         hosting_service = self.hosting_service
 
-        if hosting_service:
-            return hosting_service.get_change(self, revision)
-        else:
-            return self.get_scmtool().get_change(revision)
+        with instrumentation.record_operation(self._stats_target,
+                                              'get_change'):
+            if hosting_service:
+                return self._with_mirror_fallback(
+                    lambda tool: tool.get_change(revision),
+                    lambda: hosting_service.get_change(self, revision))()
+            else:
+                return self.get_scmtool().get_change(revision)
 
     def is_accessible_by(self, user):
         """Returns whether or not the user has access to the repository.
@@ -442,6 +652,119 @@ class Repository(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def _stats_target(self):
+        """The name SCM operation statistics are recorded under."""
+        return instrumentation.get_repository_target(self)
+
+    def _make_branches_cache_key(self):
+        """Makes a cache key for the list of branches."""
+        return make_cache_key('repository-branches:%s' % self.pk)
+
+    def _make_commits_cache_key(self, branch, start):
+        """Makes a cache key for a list of commits."""
+        return make_cache_key('repository-commits:%s:%s:%s'
+                              % (self.pk, branch, start))
+
+    def _get_commits_cache_period(self, branch, start):
+        """Returns how long a list of commits is considered fresh."""
+        if branch and start:
+            return self.COMMITS_CACHE_PERIOD_LONG
+        else:
+            return self.COMMITS_CACHE_PERIOD_SHORT
+
+    def _get_cached_with_refresh(self, cache_key, lookup_callable,
+                                 cache_period, operation=None):
+        """Returns a cached value, refreshing it in the background if stale.
+
+        If there's no cached value, lookup_callable is called and its
+        result is cached and returned. If ``operation`` is given, the cache
+        lookup is recorded as that operation (see
+        :py:mod:`reviewboard.scmtools.instrumentation`).
+
+        Once the value is older than cache_period seconds, it's still
+        returned (for up to STALE_CACHE_PERIOD seconds), but a refresh is
+        started in a background thread. A lock in the cache ensures that
+        only one refresh per key is running at a time, across all
+        processes.
+        """
+        entry = cache.get(cache_key)
+        cached = isinstance(entry, dict) and 'refreshed' in entry
+
+        if operation:
+            instrumentation.record_cache_lookup(self._stats_target, operation,
+                                                cached)
+
+        if not cached:
+            return self._refresh_cached_value(cache_key, lookup_callable)
+
+        age = timezone.now() - entry['refreshed']
+
+        if (age.total_seconds() >= cache_period and
+            cache.add(cache_key + ':refresh-lock', True,
+                      self.REFRESH_LOCK_PERIOD)):
+            def _refresh():
+                try:
+                    self._refresh_cached_value(cache_key, lookup_callable)
+                except Exception as e:
+                    logging.warning('Unable to refresh cached data %s for '
+                                    'repository %s: %s',
+                                    cache_key, self.pk, e, exc_info=1)
+                finally:
+                    cache.delete(cache_key + ':refresh-lock')
+
+            self._start_refresh(_refresh)
+
+        return entry['value']
+
+    def _refresh_cached_value(self, cache_key, lookup_callable):
+        """Looks up a value and caches it for _get_cached_with_refresh."""
+        value = lookup_callable()
+        cache.set(cache_key,
+                  {
+                      'value': value,
+                      'refreshed': timezone.now(),
+                  },
+                  self.STALE_CACHE_PERIOD)
+
+        return value
+
+    def _start_refresh(self, refresh_func):
+        """Starts a background thread for refreshing a cached value."""
+        def _run():
+            try:
+                refresh_func()
+            finally:
+                # The thread has its own database connection, which would
+                # otherwise be left open.
+                connection.close()
+
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+    def _get_cache_info(self, cache_key, cache_period):
+        """Returns information on a value cached by _get_cached_with_refresh.
+
+        This returns a dictionary containing 'last_refreshed', the time the
+        value was last looked up, and 'stale', which indicates whether the
+        value is older than the cache period and is being (or is about to
+        be) refreshed. If there's no cached value, this returns None.
+        """
+        entry = cache.get(cache_key)
+
+        if not isinstance(entry, dict) or 'refreshed' not in entry:
+            return None
+
+        age = timezone.now() - entry['refreshed']
+
+        return {
+            'last_refreshed': entry['refreshed'],
+            'stale': age.total_seconds() >= cache_period,
+        }
+
     def _make_file_cache_key(self, path, revision, base_commit_id):
         """Makes a cache key for fetched files."""
         return "file:%s:%s:%s:%s" % (self.pk, urlquote(path),
@@ -454,10 +777,91 @@ class Repository(models.Model):
                                             urlquote(revision),
                                             urlquote(base_commit_id or ''))
 
+    def _make_file_not_exists_cache_key(self, path, revision,
+                                        base_commit_id):
+        """Makes a cache key for files known not to exist.
+
+        The key includes a generation number, which is changed by
+        invalidate_cached_lookups.
+        """
+        generation_key = self._make_file_not_exists_generation_key()
+        generation = cache.get(generation_key)
+
+        if generation is None:
+            # Start from the current time, so that if the generation is
+            # evicted, old entries won't come back into use.
+            generation = int(time())
+            cache.add(generation_key, generation, self.STALE_CACHE_PERIOD)
+
+        return "file-not-exists:%s:%s:%s:%s:%s" % (
+            self.pk, generation, urlquote(path), urlquote(revision),
+            urlquote(base_commit_id or ''))
+
+    def _make_file_not_exists_generation_key(self):
+        """Makes a cache key for the generation of missing file entries."""
+        return make_cache_key('file-not-exists-generation:%s' % self.pk)
+
+    def _mark_files_exist(self, files, base_commit_id):
+        """Caches the existence of a list of fetched files.
+
+        This takes a list of ``(path, revision)`` tuples, and stores the
+        results for get_file_exists in the cache in one batch.
+        """
+        cache.set_many(
+            dict(
+                (make_cache_key(self._make_file_exists_cache_key(
+                    path, revision, base_commit_id)), '1')
+                for path, revision in files
+            ),
+            settings.CACHE_EXPIRATION_TIME)
+
+    def _mark_cache_stale(self, cache_key):
+        """Marks a value cached by _get_cached_with_refresh as stale."""
+        entry = cache.get(cache_key)
+
+        if isinstance(entry, dict) and 'refreshed' in entry:
+            entry['refreshed'] = (timezone.now() -
+                                  timedelta(seconds=self.STALE_CACHE_PERIOD))
+            cache.set(cache_key, entry, self.STALE_CACHE_PERIOD)
+
+    def _get_file_from_file_cache(self, path, revision, base_commit_id,
+                                  request):
+        """Internal function for fetching a file through the file cache.
+
+        This is called by get_file if the file isn't already in the cache.
+        If the on-disk file cache is enabled, the file will be loaded from
+        there, or fetched and stored there if it's not already cached.
+        """
+        file_cache = get_file_cache()
+        data = None
+
+        if file_cache:
+            key = make_cache_key(self._make_file_cache_key(path, revision,
+                                                           base_commit_id))
+            data = file_cache.get(key)
+
+        if data is None:
+            try:
+                data = self._get_file_uncached(path, revision, base_commit_id,
+                                               request)
+            except FileNotFoundError:
+                cache.set(
+                    make_cache_key(self._make_file_not_exists_cache_key(
+                        path, revision, base_commit_id)),
+                    '1', self.FILE_NOT_EXISTS_CACHE_PERIOD)
+                raise
+
+            if file_cache:
+                file_cache.set(key, data)
+
+        self._mark_files_exist([(path, revision)], base_commit_id)
+
+        return data
+
     def _get_file_uncached(self, path, revision, base_commit_id, request):
         """Internal function for fetching an uncached file.
 
-        This is called by get_file if the file isn't already in the cache.
+        This is called by get_file if the file isn't already in any cache.
         """
         fetching_file.send(sender=self,
                            path=path,
@@ -474,14 +878,42 @@ class Repository(models.Model):
 
         log_timer = log_timed(timer_msg, request=request)
 
+        with instrumentation.record_operation(self._stats_target, 'get_file'):
+            data = self._get_file_from_backend(path, revision,
+                                               base_commit_id)
+
+        log_timer.done()
+
+        fetched_file.send(sender=self,
+                          path=path,
+                          revision=revision,
+                          base_commit_id=base_commit_id,
+                          request=request,
+                          data=data)
+
+        return data
+
+    def _get_file_from_backend(self, path, revision, base_commit_id):
+        """Internal function for fetching a file from the repository."""
         hosting_service = self.hosting_service
 
         if hosting_service:
-            data = hosting_service.get_file(
-                self,
-                path,
-                revision,
-                base_commit_id=base_commit_id)
+            data = None
+            mirrored_tool = self._get_mirrored_scmtool()
+
+            if mirrored_tool:
+                try:
+                    data = mirrored_tool.get_file(path, revision)
+                except FileNotFoundError:
+                    # The mirror may not have caught up yet.
+                    pass
+
+            if data is None:
+                data = hosting_service.get_file(
+                    self,
+                    path,
+                    revision,
+                    base_commit_id=base_commit_id)
         else:
             try:
                 data = self.get_scmtool().get_file(path, revision)
@@ -494,15 +926,6 @@ class Repository(models.Model):
                 else:
                     raise
 
-        log_timer.done()
-
-        fetched_file.send(sender=self,
-                          path=path,
-                          revision=revision,
-                          base_commit_id=base_commit_id,
-                          request=request,
-                          data=data)
-
         return data
 
     def _get_file_exists_uncached(self, path, revision, base_commit_id,
@@ -532,14 +955,21 @@ class Repository(models.Model):
 
             hosting_service = self.hosting_service
 
-            if hosting_service:
-                exists = hosting_service.get_file_exists(
-                    self,
-                    path,
-                    revision,
-                    base_commit_id=base_commit_id)
-            else:
-                exists = self.get_scmtool().file_exists(path, revision)
+            with instrumentation.record_operation(self._stats_target,
+                                                  'file_exists'):
+                if hosting_service:
+                    mirrored_tool = self._get_mirrored_scmtool()
+
+                    exists = (
+                        (mirrored_tool is not None and
+                         mirrored_tool.file_exists(path, revision)) or
+                        hosting_service.get_file_exists(
+                            self,
+                            path,
+                            revision,
+                            base_commit_id=base_commit_id))
+                else:
+                    exists = self.get_scmtool().file_exists(path, revision)
 
             checked_file_exists.send(sender=self,
                                      path=path,
@@ -550,6 +980,73 @@ class Repository(models.Model):
 
         return exists
 
+    def _get_mirror_scmtool_instance(self):
+        """Returns an SCMTool instance shared by the local mirror lookups.
+
+        Mirrored lookups happen several times per request, so the SCMTool
+        is created once and kept on the repository until the tool or paths
+        it was created for change.
+        """
+        key = (self.tool_id, self.path, self.mirror_path)
+        cached = getattr(self, '_mirror_scmtool', None)
+
+        if cached is None or cached[0] != key:
+            cached = (key, self.get_scmtool())
+            self._mirror_scmtool = cached
+
+        return cached[1]
+
+    def _get_local_mirror(self):
+        """Returns the SCMTool's local mirror of the repository, if any."""
+        if not self.extra_data.get('git_use_local_mirror'):
+            return None
+
+        return getattr(self._get_mirror_scmtool_instance(), 'mirror', None)
+
+    def _get_mirrored_scmtool(self):
+        """Returns the SCMTool, if it can look things up in a local mirror.
+
+        Repositories backed by a hosting service normally look up files,
+        branches and commits through the service's API. If the repository
+        is mirrored locally (through "git_use_local_mirror" in its extra
+        data) and the mirror has been fetched, those lookups go to the
+        SCMTool's mirror first instead.
+
+        This returns None if there's no usable mirror.
+        """
+        if not self.extra_data.get('git_use_local_mirror'):
+            return None
+
+        tool = self._get_mirror_scmtool_instance()
+
+        if getattr(tool, 'has_local_mirror', None) and tool.has_local_mirror():
+            return tool
+
+        return None
+
+    def _with_mirror_fallback(self, mirror_func, remote_func):
+        """Returns a callable looking something up in the local mirror.
+
+        ``mirror_func`` is called with the mirrored SCMTool. If there's no
+        usable mirror, or the lookup fails (for instance, because the mirror
+        hasn't caught up with the remote repository), ``remote_func`` is
+        called instead.
+        """
+        def _lookup():
+            mirrored_tool = self._get_mirrored_scmtool()
+
+            if mirrored_tool:
+                try:
+                    return mirror_func(mirrored_tool)
+                except SCMError as e:
+                    logging.warning('Unable to look up information in the '
+                                    'local mirror of repository %s: %s',
+                                    self.pk, e)
+
+            return remote_func()
+
+        return _lookup
+
     def get_encoding_list(self):
         """Returns a list of candidate text encodings for files"""
         encodings = []
@@ -8,15 +8,17 @@ import signal
 import socket
 import subprocess
 import tempfile
+import threading
 import time
 
 from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 from djblets.util.filesystem import is_exe_in_path
 try:
+    import P4
     from P4 import P4Exception
 except ImportError:
-    pass
+    P4 = None
 
 from reviewboard.diffviewer.parser import DiffParser
 from reviewboard.scmtools.certs import Certificate
@@ -87,9 +89,14 @@ class STunnelProxy(object):
                 pass
 
 
-class PerforceClient(object):
-    def __init__(self, p4port, username, password, encoding, use_stunnel=False,
-                 use_ticket_auth=False):
+class PerforceConnection(object):
+    """An authenticated connection to a Perforce server.
+
+    This wraps a P4.P4 instance, along with the stunnel proxy it connects
+    through (if any), so the two can be kept open and reused together.
+    """
+    def __init__(self, p4port, username, password, encoding,
+                 use_stunnel=False, use_ticket_auth=False):
         self.p4port = p4port
         self.username = username
         self.password = password
@@ -97,15 +104,11 @@ class PerforceClient(object):
         self.use_stunnel = use_stunnel
         self.use_ticket_auth = use_ticket_auth
         self.proxy = None
-
-        import P4
+        self.last_used = time.time()
+        self.num_uses = 0
         self.p4 = P4.P4()
 
-        if use_stunnel and not is_exe_in_path('stunnel'):
-            raise AttributeError('stunnel proxy was requested, but stunnel '
-                                 'binary is not in the exec path.')
-
-    def _connect(self):
+    def connect(self):
         """
         Connect to the perforce server.
 
@@ -135,7 +138,7 @@ class PerforceClient(object):
         if self.use_ticket_auth:
             self.p4.run_login()
 
-    def _disconnect(self):
+    def disconnect(self):
         """
         Disconnect from the perforce server, and also shut down the stunnel
         proxy (if it exists).
@@ -153,6 +156,191 @@ class PerforceClient(object):
                 pass
             self.proxy = None
 
+    def is_connected(self):
+        """Returns whether the connection to the server is still open."""
+        try:
+            return self.p4.connected()
+        except AttributeError:
+            return False
+
+
+class PerforceConnectionPool(object):
+    """A pool of authenticated connections to a Perforce server.
+
+    Connecting (and, with stunnel, starting a proxy process) and logging in
+    can take longer than the commands being run, so connections are kept
+    open and reused across requests.
+
+    A connection is checked out by one thread at a time, for the duration
+    of a command. Up to ``max_size`` connections are kept per server and
+    set of credentials. Connections left idle for longer than
+    ``idle_timeout`` seconds are closed the next time the pool is used.
+
+    Pools are shared process-wide, and should be fetched through
+    :py:meth:`get_pool`.
+    """
+    max_size = 4
+    idle_timeout = 5 * 60
+    connection_cls = PerforceConnection
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls, p4port, username, password, encoding,
+                 use_stunnel=False, use_ticket_auth=False):
+        """Returns the shared pool for a server and set of credentials."""
+        key = (p4port, username, password, encoding, use_stunnel,
+               use_ticket_auth)
+
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+
+            if pool is None:
+                pool = cls(*key)
+                cls._pools[key] = pool
+
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        """Closes all idle connections in all shared pools."""
+        with cls._pools_lock:
+            pools = list(six.itervalues(cls._pools))
+            cls._pools = {}
+
+        for pool in pools:
+            pool.close()
+
+    def __init__(self, p4port, username, password, encoding,
+                 use_stunnel=False, use_ticket_auth=False):
+        self.connection_kwargs = {
+            'p4port': p4port,
+            'username': username,
+            'password': password,
+            'encoding': encoding,
+            'use_stunnel': use_stunnel,
+            'use_ticket_auth': use_ticket_auth,
+        }
+        self._condition = threading.Condition()
+        self._idle = []
+        self._num_connections = 0
+
+    def checkout(self):
+        """Checks out a connected connection from the pool.
+
+        The connection must be returned through :py:meth:`checkin` (or
+        :py:meth:`discard`, if it's no longer usable) when done.
+        """
+        with self._condition:
+            self._reap_idle()
+
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._num_connections < self.max_size:
+                    self._num_connections += 1
+                    break
+
+                self._condition.wait()
+
+        try:
+            conn = self.connection_cls(**self.connection_kwargs)
+            conn.connect()
+        except:
+            with self._condition:
+                self._num_connections -= 1
+                self._condition.notify()
+
+            raise
+
+        return conn
+
+    def checkin(self, conn):
+        """Returns a connection to the pool for reuse."""
+        if not conn.is_connected():
+            self.discard(conn)
+            return
+
+        conn.last_used = time.time()
+
+        with self._condition:
+            self._idle.append(conn)
+            self._condition.notify()
+
+    def discard(self, conn):
+        """Disconnects a connection and removes it from the pool."""
+        conn.disconnect()
+
+        with self._condition:
+            self._num_connections -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Disconnects all idle connections in the pool."""
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+            self._num_connections -= len(idle)
+
+        for conn in idle:
+            conn.disconnect()
+
+    def _reap_idle(self):
+        cutoff = time.time() - self.idle_timeout
+
+        for conn in list(self._idle):
+            if conn.last_used < cutoff:
+                self._idle.remove(conn)
+                self._num_connections -= 1
+                conn.disconnect()
+
+
+class PerforceClient(object):
+    #: Parts of P4Exception messages indicating that a connection can no
+    #: longer be used, and that a command should be retried on a new one.
+    STALE_CONNECTION_ERRORS = (
+        'Connect to server failed',
+        'TCP receive failed',
+        'TCP send failed',
+        'Partner exited unexpectedly',
+        'Your session has expired',
+        'Perforce password (P4PASSWD) invalid or unset',
+    )
+
+    def __init__(self, p4port, username, password, encoding, use_stunnel=False,
+                 use_ticket_auth=False):
+        self.p4port = p4port
+        self.username = username
+        self.password = password
+        self.encoding = encoding
+        self.use_stunnel = use_stunnel
+        self.use_ticket_auth = use_ticket_auth
+        self._local = threading.local()
+
+        # Make sure the P4 module is available.
+        if P4 is None:
+            raise ImportError('No module named P4')
+
+        if use_stunnel and not is_exe_in_path('stunnel'):
+            raise AttributeError('stunnel proxy was requested, but stunnel '
+                                 'binary is not in the exec path.')
+
+    @property
+    def p4(self):
+        """The P4 instance for the connection checked out by this thread.
+
+        This is only available while running a worker.
+        """
+        return self._local.connection.p4
+
+    def get_connection_pool(self):
+        """Returns the shared connection pool for this client's server."""
+        return PerforceConnectionPool.get_pool(
+            self.p4port, self.username, self.password, self.encoding,
+            self.use_stunnel, self.use_ticket_auth)
+
     @staticmethod
     def _convert_p4exception_to_scmexception(e):
         error = six.text_type(e)
@@ -175,23 +363,66 @@ class PerforceClient(object):
         else:
             raise SCMError(error)
 
+    def _is_stale_connection_error(self, conn, e):
+        """Returns whether a P4Exception means the connection is unusable.
+
+        This is the case if the connection was dropped, or if the error is
+        a connection error or an expired login ticket.
+        """
+        if not conn.is_connected():
+            return True
+
+        error = six.text_type(e)
+
+        return any(message in error
+                   for message in self.STALE_CONNECTION_ERRORS)
+
     def _run_worker(self, worker):
-        result = None
+        """Runs a worker function on a pooled connection.
 
-        # TODO: Move to using with: when we require a minimum of Python 2.5.
-        #       We should make it auto-disconnect.
-        try:
-            self._connect()
-            result = worker()
-            self._disconnect()
-        except P4Exception as e:
-            self._disconnect()
-            self._convert_p4exception_to_scmexception(e)
-        except:
-            self._disconnect()
-            raise
+        If the worker raises a P4Exception on a connection that was reused
+        from the pool because the connection has gone stale (the server
+        dropped it, or a login ticket expired), the connection is thrown
+        away and the worker is retried once on a fresh connection.
 
-        return result
+        Any other P4Exception is raised as an SCMError, and the connection
+        is returned to the pool.
+        """
+        pool = self.get_connection_pool()
+
+        for attempt in range(2):
+            try:
+                conn = pool.checkout()
+            except P4Exception as e:
+                self._convert_p4exception_to_scmexception(e)
+
+            is_new = (conn.num_uses == 0)
+            conn.num_uses += 1
+            self._local.connection = conn
+
+            try:
+                result = worker()
+            except P4Exception as e:
+                is_stale = self._is_stale_connection_error(conn, e)
+
+                if is_stale:
+                    pool.discard(conn)
+                else:
+                    pool.checkin(conn)
+
+                if not is_stale or is_new or attempt > 0:
+                    self._convert_p4exception_to_scmexception(e)
+
+                continue
+            except:
+                pool.discard(conn)
+                raise
+            finally:
+                self._local.connection = None
+
+            pool.checkin(conn)
+
+            return result
 
     def _get_changeset(self, changesetid):
         return self.p4.run_describe('-s', six.text_type(changesetid))
@@ -203,7 +434,7 @@ class PerforceClient(object):
         return self._run_worker(lambda: self._get_changeset(changesetid))
 
     def get_info(self):
-        return self._run_worker(self.p4.run_info)
+        return self._run_worker(lambda: self.p4.run_info())
 
     def _get_pending_changesets(self, userid):
         changesets = self.p4.run_changes('-s', 'pending', '-u', userid)
@@ -234,6 +465,52 @@ class PerforceClient(object):
         """
         return self._run_worker(lambda: self._get_file(path, revision))
 
+    def _get_files(self, files):
+        result = {}
+        depot_paths = []
+        keys = {}
+
+        for path, revision in files:
+            if revision == PRE_CREATION:
+                result[(path, revision)] = ''
+            elif revision == HEAD:
+                depot_paths.append(path)
+                keys[(path, None)] = (path, revision)
+            else:
+                depot_paths.append('%s#%s' % (path, revision))
+                keys[(path, six.text_type(revision))] = (path, revision)
+
+        if not depot_paths:
+            return result
+
+        # Without -q, 'p4 print' returns a dictionary of information on each
+        # file, followed by the file's contents (which may be split across
+        # several entries).
+        key = None
+
+        for item in self.p4.run_print(*depot_paths):
+            if isinstance(item, dict):
+                depot_file = item.get('depotFile')
+                key = (keys.get((depot_file, item.get('rev'))) or
+                       keys.get((depot_file, None)))
+
+                if key is not None:
+                    result[key] = b''
+            elif key is not None:
+                result[key] += item
+
+        return result
+
+    def get_files(self, files):
+        """
+        Get the contents of several files at once, in a single 'p4 print'.
+
+        This takes a list of (path, revision) tuples, and returns a dictionary
+        mapping each tuple to the file's contents. Files that could not be
+        found are left out of the result.
+        """
+        return self._run_worker(lambda: self._get_files(files))
+
     def _get_files_at_revision(self, revision_str):
         return self.p4.run_files(revision_str)
 
@@ -337,6 +614,25 @@ class PerforceTool(SCMTool):
     def get_file(self, path, revision=HEAD):
         return self.client.get_file(path, revision)
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        All the files are fetched with a single 'p4 print' command. Any
+        files that 'p4 print' reported under a different depot path than
+        the one requested are fetched individually.
+        """
+        files = list(files)
+        result = self.client.get_files(files)
+
+        for path, revision in files:
+            if (path, revision) not in result:
+                contents = self.get_file(path, revision)
+
+                if contents is not None:
+                    result[(path, revision)] = contents
+
+        return result
+
     def parse_diff_revision(self, file_str, revision_str, *args, **kwargs):
         # Perforce has this lovely idiosyncracy that diffs show revision #1
         # both for pre-creation and when there's an actual revision.
@@ -7,8 +7,10 @@ import re
 import weakref
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import six
 from django.utils.translation import ugettext as _
+from djblets.cache.backend import make_cache_key
 
 from reviewboard.diffviewer.parser import DiffParser
 from reviewboard.scmtools.certs import Certificate
@@ -55,6 +57,11 @@ class SVNTool(SCMTool):
 
     COMMITS_PAGE_LIMIT = 31
 
+    # How long fetched log entries are cached, and how many are kept for
+    # each path.
+    LOG_CACHE_PERIOD = 60 * 60 * 24  # 1 day
+    LOG_CACHE_MAX_COMMITS = 5000
+
     def __init__(self, repository):
         self.repopath = repository.path
         if self.repopath[-1] == '/':
@@ -116,6 +123,9 @@ class SVNTool(SCMTool):
     def get_file(self, path, revision=HEAD):
         return self.client.get_file(path, revision)
 
+    def get_files(self, files):
+        return self.client.get_files(files)
+
     def get_keywords(self, path, revision=HEAD):
         return self.client.get_keywords(path, revision)
 
@@ -163,10 +173,9 @@ class SVNTool(SCMTool):
 
     def get_commits(self, branch=None, start=None):
         """Return a list of commits."""
-        commits = self.client.get_log(branch or '/',
-                                      start=start,
-                                      limit=self.COMMITS_PAGE_LIMIT,
-                                      limit_to_path=False)
+        commits = self._get_log(branch or '/',
+                                start=start,
+                                limit=self.COMMITS_PAGE_LIMIT)
 
         results = []
 
@@ -203,7 +212,7 @@ class SVNTool(SCMTool):
         """
         revision = int(revision)
 
-        commits = self.client.get_log('/', start=revision, limit=2)
+        commits = self._get_log('/', start=revision, limit=2)
 
         commit = commits[0]
         message = commit['message'].decode('utf-8', 'replace')
@@ -226,6 +235,109 @@ class SVNTool(SCMTool):
 
         return commit
 
+    def _get_log(self, path, start=None, limit=COMMITS_PAGE_LIMIT):
+        """Returns log entries for a path, using the log cache.
+
+        This returns the same entries as the client's get_log (without
+        limit_to_path). Ranges of log entries that have been fetched before
+        are cached as segments of consecutive history, so paging back
+        through the history only asks the server for the revisions that
+        haven't been seen yet.
+        """
+        cache_key = make_cache_key('svn-log:%s:%s:%s'
+                                   % (self.repopath,
+                                      self.repository.username, path))
+        segments = cache.get(cache_key) or []
+        commits = []
+        fetch_start = start
+
+        if start is not None:
+            start = int(start)
+
+            for segment in segments:
+                if segment['low'] <= start <= segment['high']:
+                    commits = [
+                        commit
+                        for commit in segment['commits']
+                        if int(commit['revision']) <= start
+                    ]
+
+                    if len(commits) >= limit or segment['low'] <= 1:
+                        return commits[:limit]
+
+                    fetch_start = segment['low'] - 1
+                    break
+
+        fetch_limit = limit - len(commits)
+        fetched = self.client.get_log(path, start=fetch_start,
+                                      limit=fetch_limit)
+        commits += fetched
+
+        if not commits:
+            return commits
+
+        if start is None:
+            high = int(commits[0]['revision'])
+        else:
+            high = start
+
+        if len(fetched) < fetch_limit:
+            # We've reached the beginning of the history.
+            low = 1
+        else:
+            low = int(commits[-1]['revision'])
+
+        cache.set(cache_key,
+                  self._merge_log_segment(segments, {
+                      'high': high,
+                      'low': low,
+                      'commits': commits,
+                  }),
+                  self.LOG_CACHE_PERIOD)
+
+        return commits
+
+    def _merge_log_segment(self, segments, new_segment):
+        """Merges a new segment of log entries into the cached segments.
+
+        Segments that overlap or are adjacent to the new segment are
+        combined with it. If there are too many log entries cached, the
+        oldest segments are dropped.
+        """
+        merged = new_segment
+        result = []
+
+        for segment in segments:
+            if (segment['low'] <= merged['high'] + 1 and
+                segment['high'] >= merged['low'] - 1):
+                commits = dict(
+                    (commit['revision'], commit)
+                    for commit in segment['commits'] + merged['commits']
+                )
+                merged = {
+                    'high': max(segment['high'], merged['high']),
+                    'low': min(segment['low'], merged['low']),
+                    'commits': sorted(six.itervalues(commits),
+                                      key=lambda commit:
+                                      int(commit['revision']),
+                                      reverse=True),
+                }
+            else:
+                result.append(segment)
+
+        result.append(merged)
+        result.sort(key=lambda segment: segment['high'], reverse=True)
+
+        num_commits = 0
+
+        for i, segment in enumerate(result):
+            num_commits += len(segment['commits'])
+
+            if num_commits > self.LOG_CACHE_MAX_COMMITS:
+                return result[:max(i, 1)]
+
+        return result
+
     def normalize_patch(self, patch, filename, revision=HEAD):
         """
         If using Subversion, we need not only contract keywords in file, but
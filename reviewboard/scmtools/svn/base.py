@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 import re
 
 from reviewboard.scmtools.core import HEAD
+from reviewboard.scmtools.errors import FileNotFoundError
 
 
 class Client(object):
@@ -47,6 +48,26 @@ class Client(object):
         """Returns the contents of a given file at the given revision."""
         raise NotImplementedError
 
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        This takes a list of ``(path, revision)`` tuples and returns a
+        dictionary mapping each tuple to the file's contents. Files that
+        could not be found are left out of the result.
+
+        By default, this calls get_file for each file. Backends that can
+        fetch many paths over a single connection should override this.
+        """
+        result = {}
+
+        for path, revision in files:
+            try:
+                result[(path, revision)] = self.get_file(path, revision)
+            except FileNotFoundError:
+                pass
+
+        return result
+
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
         raise NotImplementedError
@@ -3,6 +3,8 @@ from __future__ import absolute_import, unicode_literals
 
 import logging
 import os
+import threading
+import time
 from datetime import datetime
 
 try:
@@ -29,6 +31,135 @@ DIFF_UNIFIED = [B('-u')]
 SVN_KEYWORDS = B('svn:keywords')
 
 
+# Error codes from SVN when a path doesn't exist at a revision.
+SVN_ERR_FS_NOT_FOUND = 160013
+SVN_ERR_FS_NOT_FILE = 160017
+SVN_ERR_FS_NO_SUCH_REVISION = 160006
+SVN_ERR_RA_DAV_PATH_NOT_FOUND = 175007
+
+NOT_FOUND_ERRORS = (
+    SVN_ERR_FS_NOT_FOUND,
+    SVN_ERR_FS_NOT_FILE,
+    SVN_ERR_FS_NO_SUCH_REVISION,
+    SVN_ERR_RA_DAV_PATH_NOT_FOUND,
+)
+
+
+class RASessionPool(object):
+    """A pool of open RA sessions to a Subversion repository.
+
+    Opening an RA session means connecting to the server and, for remote
+    repositories, authenticating and negotiating capabilities, which over
+    a WAN can take longer than the requests made on the session. Sessions
+    are kept open and reused across requests instead.
+
+    A session is checked out by one thread at a time. Up to ``max_size``
+    sessions are kept per repository and set of credentials. Sessions left
+    idle for longer than ``idle_timeout`` seconds are dropped the next time
+    the pool is used.
+
+    Pools are shared process-wide, and should be fetched through
+    :py:meth:`get_pool`.
+    """
+    max_size = 4
+    idle_timeout = 5 * 60
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls, repopath, username, password, config_dir):
+        """Returns the shared pool for a repository and set of credentials."""
+        key = (repopath, username, password, config_dir)
+
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+
+            if pool is None:
+                pool = cls(repopath)
+                cls._pools[key] = pool
+
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        """Closes all idle sessions in all shared pools."""
+        with cls._pools_lock:
+            pools = list(six.itervalues(cls._pools))
+            cls._pools = {}
+
+        for pool in pools:
+            pool.close()
+
+    def __init__(self, repopath):
+        self.repopath = repopath
+        self._condition = threading.Condition()
+        self._idle = []
+        self._num_sessions = 0
+
+    def checkout(self, auth):
+        """Checks out an open RA session from the pool.
+
+        New sessions are opened using the given ``ra.Auth``. The session
+        must be returned through :py:meth:`checkin` (or :py:meth:`discard`,
+        if it's no longer usable) when done.
+        """
+        with self._condition:
+            self._reap_idle()
+
+            while True:
+                if self._idle:
+                    return self._idle.pop()[0]
+
+                if self._num_sessions < self.max_size:
+                    self._num_sessions += 1
+                    break
+
+                self._condition.wait()
+
+        try:
+            return ra.RemoteAccess(self.repopath, auth=auth)
+        except:
+            with self._condition:
+                self._num_sessions -= 1
+                self._condition.notify()
+
+            raise
+
+    def checkin(self, session):
+        """Returns a session to the pool for reuse."""
+        with self._condition:
+            self._idle.append((session, time.time()))
+            self._condition.notify()
+
+    def discard(self, session):
+        """Removes a session from the pool.
+
+        subvertpy has no way of explicitly closing a session, so this
+        just drops the reference to it.
+        """
+        with self._condition:
+            self._num_sessions -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Drops all idle sessions in the pool."""
+        with self._condition:
+            self._num_sessions -= len(self._idle)
+            self._idle = []
+
+    def _reap_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        idle = [
+            (session, last_used)
+            for session, last_used in self._idle
+            if last_used >= cutoff
+        ]
+
+        self._num_sessions -= len(self._idle) - len(idle)
+        self._idle = idle
+
+
 class Client(base.Client):
     required_module = 'subvertpy'
 
@@ -62,26 +193,74 @@ class Client(base.Client):
 
         cfg = get_config(self.config_dir)
         self.client = SVNClient(cfg, auth=self.auth)
+        self.session_pool = RASessionPool.get_pool(self.repopath, username,
+                                                   password, self.config_dir)
 
     def set_ssl_server_trust_prompt(self, cb):
         self._ssl_trust_prompt_cb = cb
 
     def get_file(self, path, revision=HEAD):
         """Returns the contents of a given file at the given revision."""
-        if not path:
+        if not path or revision == PRE_CREATION:
             raise FileNotFoundError(path, revision)
-        revnum = self._normalize_revision(revision)
-        path = B(self.normalize_path(path))
-        data = six.StringIO()
+
         try:
-            self.client.cat(path, data, revnum)
+            return self.get_files([(path, revision)])[(path, revision)]
+        except KeyError:
+            raise FileNotFoundError(path, revision)
+
+    def get_files(self, files):
+        """Returns the contents of several files at once.
+
+        All the files are fetched over a single pooled RA session. The file
+        properties come back with the contents, so keywords are collapsed
+        without a separate propget round trip for each file.
+
+        Files that don't exist at the given revision are left out of the
+        result.
+        """
+        result = {}
+        session = self.session_pool.checkout(self.auth)
+
+        try:
+            for path, revision in files:
+                if not path or revision == PRE_CREATION:
+                    continue
+
+                if revision == HEAD:
+                    revnum = -1
+                else:
+                    revnum = self._normalize_revision(revision)
+
+                relpath = B(self.normalize_path(path))[len(self.repopath):]
+                data = six.StringIO()
+
+                try:
+                    fetched_rev, props = session.get_file(
+                        relpath.lstrip(B('/')), data, revnum)
+                except SubversionException as e:
+                    if e.args[1] in NOT_FOUND_ERRORS:
+                        continue
+
+                    raise
+
+                contents = data.getvalue()
+                keywords = props.get(SVN_KEYWORDS)
+
+                if keywords:
+                    contents = self.collapse_keywords(contents, keywords)
+
+                result[(path, revision)] = contents
         except SubversionException as e:
-            raise FileNotFoundError(e)
-        contents = data.getvalue()
-        keywords = self.get_keywords(path, revision)
-        if keywords:
-            contents = self.collapse_keywords(contents, keywords)
-        return contents
+            self.session_pool.discard(session)
+            raise SVNTool.normalize_error(e)
+        except:
+            self.session_pool.discard(session)
+            raise
+
+        self.session_pool.checkin(session)
+
+        return result
 
     def get_keywords(self, path, revision=HEAD):
         """Returns a list of SVN keywords for a given path."""
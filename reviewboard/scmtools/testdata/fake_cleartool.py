@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""A stand-in for cleartool, used to test ClearCaseTool.
+
+This pretends the current directory is a snapshot view of the VOB
+/vobs/test. Any file in the directory is a file element, any directory is
+a directory element, and the OID of an element is its path relative to the
+view. ``get -to`` copies the file, regardless of the requested version,
+and ``cat`` writes a file's raw contents to stdout.
+
+Like cleartool, this runs a single command given on the command line, or
+reads commands from stdin when run without one. With ``-status``, the exit
+status of each command is printed after its output.
+
+If FAKE_CLEARTOOL_LOG is set, each process start and each command is
+appended to that file.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shlex
+import shutil
+import sys
+
+
+VOB_TAG = '/vobs/test'
+VOB_UUID = '12345678.9abcdef0.1234.56:78:9a:bc:de:f0'
+
+
+def log(line):
+    log_path = os.environ.get('FAKE_CLEARTOOL_LOG')
+
+    if log_path:
+        with open(log_path, 'a') as f:
+            f.write('%s\n' % line)
+
+
+def get_element_path(extended_path):
+    return extended_path.split('@@', 1)[0]
+
+
+def run_command(args):
+    """Runs a command, returning the exit status."""
+    log(' '.join(args))
+
+    if args == ['lsview', '-full', '-properties', '-cview']:
+        print('* test_view /views/test_view.vws')
+        print('Properties: snapshot readwrite')
+    elif args == ['describe', '-short', 'vob:.']:
+        print(VOB_TAG)
+    elif args[:2] == ['lsvob', '-long'] and args[2:] == [VOB_TAG]:
+        print('Tag: %s' % VOB_TAG)
+        print('Vob family uuid: %s' % VOB_UUID)
+    elif args[:3] == ['desc', '-fmt', '%m'] and len(args) == 4:
+        path = get_element_path(args[3])
+
+        if os.path.isdir(path):
+            sys.stdout.write('directory element')
+        elif os.path.isfile(path):
+            sys.stdout.write('file element')
+        else:
+            sys.stderr.write('cleartool: Error: Unable to access "%s".\n'
+                             % args[3])
+            return 1
+    elif (args[:3] == ['describe', '-fmt', '%En@@%Vn'] and len(args) == 4 and
+          args[3].startswith('oid:')):
+        path = args[3][len('oid:'):]
+
+        if not os.path.exists(path):
+            sys.stderr.write('cleartool: Error: Not an object in a vob: '
+                             '"%s".\n' % args[3])
+            return 1
+
+        sys.stdout.write('%s@@/main/1'
+                         % os.path.join(os.getcwd(), path))
+    elif args[:2] == ['get', '-to'] and len(args) == 4:
+        path = get_element_path(args[3])
+
+        if os.path.exists(args[2]):
+            sys.stderr.write('cleartool: Error: "%s" already exists.\n'
+                             % args[2])
+            return 1
+
+        if not os.path.isfile(path):
+            sys.stderr.write('cleartool: Error: Unable to access "%s".\n'
+                             % args[3])
+            return 1
+
+        shutil.copyfile(path, args[2])
+    elif args[0] == 'cat' and len(args) == 2:
+        with open(args[1], 'rb') as f:
+            getattr(sys.stdout, 'buffer', sys.stdout).write(f.read())
+    else:
+        sys.stderr.write('cleartool: Error: Unrecognized command: "%s"\n'
+                         % ' '.join(args))
+        return 1
+
+    return 0
+
+
+def main(argv):
+    show_status = False
+
+    if argv and argv[0] == '-status':
+        show_status = True
+        argv = argv[1:]
+
+    if argv:
+        return run_command(argv)
+
+    log('start %s' % os.getpid())
+    num_commands = 0
+
+    while True:
+        line = sys.stdin.readline()
+
+        if not line or line.strip() == 'quit':
+            return 0
+
+        num_commands += 1
+        status = run_command(shlex.split(line))
+        sys.stderr.flush()
+
+        if show_status:
+            print('Command %d returned status %d' % (num_commands, status))
+
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -2,8 +2,12 @@
 from __future__ import unicode_literals
 
 import os
+import shutil
+import sys
+import threading
+from datetime import timedelta
 from errno import ECONNREFUSED
-from hashlib import md5
+from hashlib import md5, sha1
 from socket import error as SocketError
 from tempfile import mkdtemp
 
@@ -11,9 +15,14 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.core.cache import cache
-from django.utils import six
+from django.utils import six, timezone
 from django.utils.six.moves import zip_longest
+from django.utils.six.moves.BaseHTTPServer import (BaseHTTPRequestHandler,
+                                                   HTTPServer)
+from django.utils.six.moves.socketserver import ThreadingMixIn
+from djblets.cache.backend import make_cache_key
 from djblets.util.filesystem import is_exe_in_path
+from kgb import SpyAgency
 import nose
 
 from reviewboard.diffviewer.diffutils import patch
@@ -25,14 +34,24 @@ from reviewboard.hostingsvcs.service import (HostingService,
                                              unregister_hosting_service)
 from reviewboard.reviews.models import Group
 from reviewboard.scmtools.core import (Branch, ChangeSet, Commit, Revision,
-                                       HEAD, PRE_CREATION)
+                                       SCMClient, HEAD, PRE_CREATION)
 from reviewboard.scmtools.errors import (SCMError, FileNotFoundError,
                                          RepositoryNotFoundError,
                                          AuthenticationError)
+from reviewboard.scmtools.bzr import BZRBranchCache
+from reviewboard.scmtools.clearcase import (ClearCaseDiffParser,
+                                            ClearToolSession, run_cleartool)
+from reviewboard.scmtools.cvs import CVSMirror
+from reviewboard.scmtools.file_cache import FileCache
 from reviewboard.scmtools.forms import RepositoryForm
-from reviewboard.scmtools.git import ShortSHA1Error
+from reviewboard.scmtools.git import GitCatFilePool, ShortSHA1Error
+from reviewboard.scmtools.hg import HgCommandServer, HgCommandServerPool
+from reviewboard.scmtools.http_pool import HTTPConnectionPool, get_http_pool
+from reviewboard.scmtools import instrumentation, perforce
 from reviewboard.scmtools.models import Repository, Tool
-from reviewboard.scmtools.perforce import STunnelProxy, STUNNEL_SERVER
+from reviewboard.scmtools.perforce import (PerforceClient,
+                                           PerforceConnectionPool,
+                                           STunnelProxy, STUNNEL_SERVER)
 from reviewboard.scmtools.signals import (checked_file_exists,
                                           checking_file_exists,
                                           fetched_file, fetching_file)
@@ -155,12 +174,314 @@ class CoreTests(TestCase):
         self.assertTrue(len(cs.files) == 0)
 
 
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    pass
+
+
+class _TestHTTPRequestHandler(BaseHTTPRequestHandler):
+    """Serves files for HTTPConnectionPoolTests, with keep-alive support."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.num_connections += 1
+
+    def do_GET(self):
+        data = self.server.files.get(self.path)
+
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', '%d' % len(data))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+
+class HTTPConnectionPoolTests(TestCase):
+    """Unit tests for fetching files over pooled HTTP connections."""
+
+    def setUp(self):
+        super(HTTPConnectionPoolTests, self).setUp()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          _TestHTTPRequestHandler)
+        self.server.daemon_threads = True
+        self.server.num_connections = 0
+        self.server.files = {
+            '/file%d' % i: ('contents %d\n' % i).encode('utf-8')
+            for i in range(10)
+        }
+
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.client = SCMClient(self.base_url)
+
+        get_http_pool().close()
+
+    def tearDown(self):
+        super(HTTPConnectionPoolTests, self).tearDown()
+
+        get_http_pool().close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_file_http_reuses_connection(self):
+        """Testing SCMClient.get_file_http reuses kept-alive connections"""
+        for i in range(5):
+            self.assertEqual(
+                self.client.get_file_http('%s/file%d' % (self.base_url, i),
+                                          'file%d' % i, '1'),
+                ('contents %d\n' % i).encode('utf-8'))
+
+        self.assertEqual(self.server.num_connections, 1)
+
+    def test_get_file_http_not_found(self):
+        """Testing SCMClient.get_file_http with a missing file"""
+        self.assertRaises(
+            FileNotFoundError,
+            lambda: self.client.get_file_http('%s/missing' % self.base_url,
+                                              'missing', '1'))
+
+    def test_get_files_http(self):
+        """Testing SCMClient.get_files_http"""
+        files = [
+            ('%s/file%d' % (self.base_url, i), 'file%d' % i, '1')
+            for i in range(10)
+        ]
+        files.append(('%s/missing' % self.base_url, 'missing', '1'))
+
+        result = self.client.get_files_http(files)
+
+        self.assertEqual(
+            result,
+            dict(
+                ('%s/file%d' % (self.base_url, i),
+                 ('contents %d\n' % i).encode('utf-8'))
+                for i in range(10)
+            ))
+        self.assertTrue(self.server.num_connections <=
+                        HTTPConnectionPool.max_connections_per_host)
+
+
+class FileCacheTests(TestCase):
+    """Unit tests for reviewboard.scmtools.file_cache.FileCache."""
+    def setUp(self):
+        super(FileCacheTests, self).setUp()
+
+        self.tempdir = mkdtemp(prefix='rb-tests-file-cache-')
+        self.file_cache = FileCache(self.tempdir, 100)
+
+    def tearDown(self):
+        super(FileCacheTests, self).tearDown()
+
+        shutil.rmtree(self.tempdir)
+
+    def test_get_and_set(self):
+        """Testing FileCache.get and set"""
+        self.assertEqual(self.file_cache.get('key1'), None)
+
+        self.file_cache.set('key1', b'contents')
+        self.file_cache.set('key2', b'')
+
+        self.assertEqual(self.file_cache.get('key1'), b'contents')
+        self.assertEqual(self.file_cache.get('key2'), b'')
+        self.assertEqual(self.file_cache.get_stats(), {
+            'hits': 2,
+            'misses': 1,
+            'writes': 2,
+            'evictions': 0,
+        })
+
+    def test_set_shares_contents(self):
+        """Testing FileCache.set stores identical contents once"""
+        self.file_cache.set('key1', b'contents')
+        self.file_cache.set('key2', b'contents')
+
+        num_blobs = sum(
+            len(filenames)
+            for dirpath, dirnames, filenames in
+            os.walk(self.file_cache.blobs_path)
+        )
+
+        self.assertEqual(num_blobs, 1)
+        self.assertEqual(self.file_cache.get('key1'), b'contents')
+        self.assertEqual(self.file_cache.get('key2'), b'contents')
+
+    def test_evict(self):
+        """Testing FileCache evicts least recently used contents"""
+        self.file_cache.set('key1', b'1' * 40)
+        self.file_cache.set('key2', b'2' * 40)
+
+        # Make sure key1 is more recently used than key2.
+        blob_path = self.file_cache._get_blob_path(
+            sha1(b'2' * 40).hexdigest())
+        os.utime(blob_path, (0, 0))
+        self.file_cache.get('key1')
+
+        self.file_cache.set('key3', b'3' * 40)
+
+        self.assertEqual(self.file_cache.get('key1'), b'1' * 40)
+        self.assertEqual(self.file_cache.get('key2'), None)
+        self.assertEqual(self.file_cache.get('key3'), b'3' * 40)
+        self.assertEqual(self.file_cache.get_stats()['evictions'], 1)
+
+    def test_delete(self):
+        """Testing FileCache.delete"""
+        self.file_cache.set('key1', b'contents')
+        self.file_cache.delete('key1')
+
+        self.assertEqual(self.file_cache.get('key1'), None)
+
+
+class InstrumentationTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.scmtools.instrumentation."""
+    def setUp(self):
+        super(InstrumentationTests, self).setUp()
+
+        instrumentation.flush_stats()
+        cache.clear()
+
+    def tearDown(self):
+        super(InstrumentationTests, self).tearDown()
+
+        cache.clear()
+
+    def test_record_operation(self):
+        """Testing instrumentation.record_operation"""
+        with instrumentation.record_operation('repository:1', 'get_file'):
+            pass
+
+        try:
+            with instrumentation.record_operation('repository:1',
+                                                  'get_file'):
+                raise FileNotFoundError('/readme')
+        except FileNotFoundError:
+            pass
+
+        stats = instrumentation.get_stats(['repository:1', 'repository:2'])
+
+        self.assertEqual(stats['repository:2'], {})
+        self.assertEqual(list(stats['repository:1'].keys()), ['get_file'])
+
+        op_stats = stats['repository:1']['get_file']
+        self.assertEqual(op_stats['count'], 2)
+        self.assertEqual(op_stats['errors'], 1)
+        self.assertEqual(op_stats['error_rate'], 0.5)
+        self.assertEqual(op_stats['histogram'][0], 2)
+        self.assertEqual(op_stats['p50_ms'], 10)
+        self.assertIsNone(op_stats['cache_hit_ratio'])
+
+    def test_record_latency_percentiles(self):
+        """Testing instrumentation.record_latency and percentiles"""
+        for i in range(18):
+            instrumentation.record_latency('repository:1', 'get_commits',
+                                           0.04)
+
+        instrumentation.record_latency('repository:1', 'get_commits', 0.3)
+        instrumentation.record_latency('repository:1', 'get_commits', 20)
+
+        op_stats = \
+            instrumentation.get_stats(['repository:1'])['repository:1'][
+                'get_commits']
+
+        self.assertEqual(op_stats['count'], 20)
+        self.assertEqual(op_stats['errors'], 0)
+        self.assertEqual(op_stats['total_ms'], 18 * 40 + 300 + 20000)
+        self.assertEqual(op_stats['p50_ms'], 50)
+        self.assertEqual(op_stats['p95_ms'], 500)
+        self.assertEqual(op_stats['histogram'][1], 18)
+        self.assertEqual(op_stats['histogram'][-1], 1)
+
+    def test_record_cache_lookup(self):
+        """Testing instrumentation.record_cache_lookup"""
+        instrumentation.record_cache_lookup('repository:1', 'get_file', True)
+        instrumentation.record_cache_lookup('repository:1', 'get_file', True)
+        instrumentation.record_cache_lookup('repository:1', 'get_file',
+                                            False)
+        instrumentation.record_cache_lookup('repository:1', 'get_file', True)
+
+        op_stats = \
+            instrumentation.get_stats(['repository:1'])['repository:1'][
+                'get_file']
+
+        self.assertEqual(op_stats['count'], 0)
+        self.assertEqual(op_stats['cache_hits'], 3)
+        self.assertEqual(op_stats['cache_misses'], 1)
+        self.assertEqual(op_stats['cache_hit_ratio'], 0.75)
+
+    def test_record_batches_counters(self):
+        """Testing instrumentation only updates the cache when flushing"""
+        self.spy_on(instrumentation._incr)
+
+        instrumentation.record_latency('repository:1', 'get_file', 0.001)
+        instrumentation.record_latency('repository:1', 'get_file', 0.002)
+        instrumentation.record_cache_lookup('repository:1', 'get_file', True)
+        instrumentation.record_cache_lookup('repository:1', 'get_file', True)
+
+        self.assertFalse(instrumentation._incr.spy.called)
+
+        instrumentation.flush_stats()
+
+        # count, total_ms, bucket-0 and cache_hits.
+        self.assertEqual(len(instrumentation._incr.spy.calls), 4)
+
+        op_stats = \
+            instrumentation.get_stats(['repository:1'])['repository:1'][
+                'get_file']
+        self.assertEqual(op_stats['count'], 2)
+        self.assertEqual(op_stats['cache_hits'], 2)
+
+    def test_get_active_targets(self):
+        """Testing instrumentation.get_active_targets"""
+        self.assertEqual(instrumentation.get_active_targets(), [])
+
+        instrumentation.record_latency('repository:2', 'get_file', 0.01)
+        instrumentation.record_latency('hosting-account:1', 'http_request',
+                                       0.01)
+        instrumentation.flush_stats()
+        instrumentation.record_latency('repository:2', 'get_commits', 0.01)
+
+        self.assertEqual(instrumentation.get_active_targets(),
+                         ['hosting-account:1', 'repository:2'])
+
+        stats = instrumentation.get_stats()
+        self.assertEqual(sorted(stats.keys()),
+                         ['hosting-account:1', 'repository:2'])
+        self.assertEqual(sorted(stats['repository:2'].keys()),
+                         ['get_commits', 'get_file'])
+
+        day = instrumentation.get_stats_days()[-1]
+        self.assertEqual(instrumentation.get_active_targets(day), [])
+
+    def test_record_without_target(self):
+        """Testing instrumentation.record_operation without a target"""
+        with instrumentation.record_operation(None, 'get_file'):
+            pass
+
+        instrumentation.record_cache_lookup(None, 'get_file', True)
+
+        self.assertEqual(instrumentation.get_stats([None]), {None: {}})
+
+
 class RepositoryTests(TestCase):
     fixtures = ['test_scmtools']
 
     def setUp(self):
         super(RepositoryTests, self).setUp()
 
+        instrumentation.flush_stats()
+        cache.clear()
+
         self.local_repo_path = os.path.join(os.path.dirname(__file__),
                                             'testdata', 'git_repo')
         self.repository = Repository.objects.create(
@@ -233,6 +554,60 @@ class RepositoryTests(TestCase):
         self.assertEqual(data1, data2)
         self.assertEqual(num_calls['get_file'], 1)
 
+    def test_get_file_records_stats(self):
+        """Testing Repository.get_file records statistics"""
+        def get_file(self, path, revision):
+            return b'file data'
+
+        self.scmtool_cls.get_file = get_file
+
+        self.repository.get_file('readme', 'e965047')
+        self.repository.get_file('readme', 'e965047')
+
+        target = instrumentation.get_repository_target(self.repository)
+        op_stats = instrumentation.get_stats([target])[target]['get_file']
+
+        self.assertEqual(op_stats['count'], 1)
+        self.assertEqual(op_stats['errors'], 0)
+        self.assertEqual(op_stats['cache_hits'], 1)
+        self.assertEqual(op_stats['cache_misses'], 1)
+
+    def test_get_file_with_file_cache(self):
+        """Testing Repository.get_file with the on-disk file cache"""
+        def get_file(self, path, revision):
+            num_calls['get_file'] += 1
+            return b'file data'
+
+        num_calls = {
+            'get_file': 0,
+        }
+
+        path = 'readme'
+        revision = 'e965047'
+        tempdir = mkdtemp(prefix='rb-tests-file-cache-')
+        old_max_size = settings.SCMTOOLS_FILE_CACHE_MAX_SIZE
+        old_dir = settings.SCMTOOLS_FILE_CACHE_DIR
+        settings.SCMTOOLS_FILE_CACHE_MAX_SIZE = 1024
+        settings.SCMTOOLS_FILE_CACHE_DIR = tempdir
+
+        self.scmtool_cls.get_file = get_file
+
+        try:
+            data1 = self.repository.get_file(path, revision)
+
+            # The file should now come from the file cache, rather than
+            # the repository.
+            cache.clear()
+            data2 = self.repository.get_file(path, revision)
+        finally:
+            settings.SCMTOOLS_FILE_CACHE_MAX_SIZE = old_max_size
+            settings.SCMTOOLS_FILE_CACHE_DIR = old_dir
+            shutil.rmtree(tempdir)
+
+        self.assertEqual(data1, b'file data')
+        self.assertEqual(data2, b'file data')
+        self.assertEqual(num_calls['get_file'], 1)
+
     def test_get_file_signals(self):
         """Testing Repository.get_file emits signals"""
         def on_fetching_file(sender, path, revision, request, **kwargs):
@@ -258,6 +633,144 @@ class RepositoryTests(TestCase):
         self.assertEqual(found_signals[1],
                          ('fetched_file', path, revision, request))
 
+    def test_prefetch_files(self):
+        """Testing Repository.prefetch_files populates the file cache"""
+        def get_file(self, path, revision):
+            num_calls['get_file'] += 1
+            return b'file data'
+
+        num_calls = {
+            'get_file': 0,
+        }
+
+        path = 'readme'
+        revision = 'e965047'
+
+        self.repository.prefetch_files([(path, revision)])
+
+        self.scmtool_cls.get_file = get_file
+
+        data = self.repository.get_file(path, revision)
+
+        self.assertEqual(data, b'Hello\n')
+        self.assertEqual(num_calls['get_file'], 0)
+
+    def test_prefetch_files_skips_cached(self):
+        """Testing Repository.prefetch_files skips files already cached"""
+        def get_files(self, files):
+            fetched.extend(files)
+            return {}
+
+        fetched = []
+
+        self.repository.get_file('readme', 'e965047')
+
+        self.scmtool_cls.get_files = get_files
+
+        try:
+            self.repository.prefetch_files([('readme', 'e965047'),
+                                            ('readme', 'd6613f5')])
+        finally:
+            del self.scmtool_cls.get_files
+
+        self.assertEqual(fetched, [('readme', 'd6613f5')])
+
+    def test_get_branches_caching(self):
+        """Testing Repository.get_branches caches result"""
+        def get_branches(self):
+            num_calls['get_branches'] += 1
+            return [Branch(id='master', commit='e965047', default=True)]
+
+        num_calls = {
+            'get_branches': 0,
+        }
+
+        self.scmtool_cls.get_branches = get_branches
+
+        try:
+            branches1 = self.repository.get_branches()
+            branches2 = self.repository.get_branches()
+        finally:
+            del self.scmtool_cls.get_branches
+
+        self.assertEqual(branches1, branches2)
+        self.assertEqual(branches1[0].id, 'master')
+        self.assertEqual(num_calls['get_branches'], 1)
+
+        cache_info = self.repository.get_branches_cache_info()
+        self.assertFalse(cache_info['stale'])
+        self.assertTrue(cache_info['last_refreshed'] <= timezone.now())
+
+    def test_get_branches_stale(self):
+        """Testing Repository.get_branches returns stale results while
+        refreshing them in the background
+        """
+        def get_branches(self):
+            num_calls['get_branches'] += 1
+            return [Branch(id='branch%d' % num_calls['get_branches'],
+                           commit='e965047', default=True)]
+
+        def _start_refresh(refresh_func):
+            thread = Repository._start_refresh(self.repository, refresh_func)
+            threads.append(thread)
+
+            return thread
+
+        num_calls = {
+            'get_branches': 0,
+        }
+        threads = []
+
+        self.scmtool_cls.get_branches = get_branches
+        self.repository._start_refresh = _start_refresh
+
+        try:
+            self.assertEqual(self.repository.get_branches()[0].id, 'branch1')
+
+            # Make the cached list stale.
+            cache_key = self.repository._make_branches_cache_key()
+            entry = cache.get(cache_key)
+            entry['refreshed'] -= timedelta(
+                seconds=Repository.BRANCHES_CACHE_PERIOD + 1)
+            cache.set(cache_key, entry)
+
+            self.assertTrue(self.repository.get_branches_cache_info()['stale'])
+
+            # The stale list is returned, and only one refresh is started.
+            self.assertEqual(self.repository.get_branches()[0].id, 'branch1')
+            self.assertEqual(self.repository.get_branches()[0].id, 'branch1')
+            self.assertEqual(len(threads), 1)
+
+            threads[0].join()
+
+            self.assertEqual(self.repository.get_branches()[0].id, 'branch2')
+        finally:
+            del self.scmtool_cls.get_branches
+
+        self.assertEqual(num_calls['get_branches'], 2)
+        self.assertFalse(self.repository.get_branches_cache_info()['stale'])
+
+    def test_invalidate_cached_lookups_marks_branches_stale(self):
+        """Testing Repository.invalidate_cached_lookups marks cached branches
+        as stale
+        """
+        def get_branches(self):
+            return [Branch(id='master', commit='e965047', default=True)]
+
+        self.scmtool_cls.get_branches = get_branches
+        self.repository._start_refresh = lambda refresh_func: None
+
+        try:
+            self.repository.get_branches()
+            self.assertFalse(
+                self.repository.get_branches_cache_info()['stale'])
+
+            self.repository.invalidate_cached_lookups(branches=['master'])
+            self.assertTrue(
+                self.repository.get_branches_cache_info()['stale'])
+        finally:
+            del self.scmtool_cls.get_branches
+
     def test_get_file_exists_caching_when_exists(self):
         """Testing Repository.get_file_exists caches result when exists"""
         def file_exists(self, path, revision):
@@ -284,8 +797,8 @@ class RepositoryTests(TestCase):
         self.assertEqual(num_calls['get_file_exists'], 1)
 
     def test_get_file_exists_caching_when_not_exists(self):
-        """Testing Repository.get_file_exists doesn't cache result when the
-        file does not exist
+        """Testing Repository.get_file_exists caches result when the file
+        does not exist
         """
         def file_exists(self, path, revision):
             num_calls['get_file_exists'] += 1
@@ -308,8 +821,55 @@ class RepositoryTests(TestCase):
 
         self.assertFalse(exists1)
         self.assertFalse(exists2)
+        self.assertEqual(num_calls['get_file_exists'], 1)
+
+    def test_get_file_exists_after_invalidate_cached_lookups(self):
+        """Testing Repository.get_file_exists checks the repository again
+        for missing files after Repository.invalidate_cached_lookups
+        """
+        def file_exists(self, path, revision):
+            num_calls['get_file_exists'] += 1
+            return num_calls['get_file_exists'] > 1
+
+        num_calls = {
+            'get_file_exists': 0,
+        }
+
+        path = 'readme'
+        revision = 'HEAD'
+
+        self.scmtool_cls.file_exists = file_exists
+
+        self.assertFalse(self.repository.get_file_exists(path, revision))
+        self.assertFalse(self.repository.get_file_exists(path, revision))
+
+        self.repository.invalidate_cached_lookups()
+
+        self.assertTrue(self.repository.get_file_exists(path, revision))
+        self.assertTrue(self.repository.get_file_exists(path, revision))
         self.assertEqual(num_calls['get_file_exists'], 2)
 
+    def test_get_file_caches_existence(self):
+        """Testing Repository.get_file caches the existence of the file"""
+        def file_exists(self, path, revision):
+            num_calls['get_file_exists'] += 1
+            return True
+
+        num_calls = {
+            'get_file_exists': 0,
+        }
+
+        self.scmtool_cls.file_exists = file_exists
+
+        self.repository.get_file('readme', 'e965047')
+
+        # Make sure this doesn't depend on the file data being in the cache.
+        cache.delete(make_cache_key(
+            self.repository._make_file_cache_key('readme', 'e965047', None)))
+
+        self.assertTrue(self.repository.get_file_exists('readme', 'e965047'))
+        self.assertEqual(num_calls['get_file_exists'], 0)
+
     def test_get_file_exists_caching_with_fetched_file(self):
         """Testing Repository.get_file_exists uses get_file's cached result"""
         def get_file(self, path, revision):
@@ -393,6 +953,75 @@ class BZRTests(SCMTestCase):
             self.tool = self.repository.get_scmtool()
             raise nose.SkipTest('bzrlib is not installed')
 
+    def tearDown(self):
+        super(BZRTests, self).tearDown()
+
+        BZRBranchCache.close_all()
+
+    def test_get_file(self):
+        """Testing BZRTool.get_file"""
+        tool = self.repository.get_scmtool()
+
+        self.assertEqual(tool.get_file('README', HEAD), b'This is a test.\n')
+        self.assertEqual(tool.get_file('README2', HEAD), b'')
+
+    def test_get_files(self):
+        """Testing BZRTool.get_files reuses the branch and revision tree"""
+        tool = self.repository.get_scmtool()
+        revision = 'revid:chipx86@chipx86.com-20110202105304-8lkgyb18aqr11b21'
+
+        files = tool.get_files([
+            ('README', revision),
+            ('/README', revision),
+            ('README', HEAD),
+        ])
+
+        self.assertEqual(files, {
+            ('README', revision): b'This is a test.\n',
+            ('/README', revision): b'This is a test.\n',
+            ('README', HEAD): b'This is a test.\n',
+        })
+
+        branch_cache = BZRBranchCache.get_cache()
+        self.assertEqual(len(branch_cache._handles), 1)
+
+        handle = list(branch_cache._handles.values())[0]
+        self.assertEqual(list(handle._trees.keys()), [revision, 'last:1'])
+        self.assertTrue(handle.branch.is_locked())
+
+        BZRBranchCache.close_all()
+        self.assertFalse(handle.branch.is_locked())
+
+    def test_branch_cache_relpath(self):
+        """Testing BZRBranchCache.get_handle returns the same unescaped
+        relative path for cached and uncached branches
+        """
+        branch_cache = BZRBranchCache.get_cache()
+        url = 'file://%s/docs/some%%20file' % self.bzr_repo_path
+
+        handle1, relpath1 = branch_cache.get_handle(url)
+        handle1.release()
+        handle2, relpath2 = branch_cache.get_handle(url)
+        handle2.release()
+
+        self.assertIs(handle1, handle2)
+        self.assertEqual(relpath1, 'docs/some file')
+        self.assertEqual(relpath2, 'docs/some file')
+
+    def test_branch_cache_close_leased_handle(self):
+        """Testing BZRBranchCache keeps a leased handle open when it's
+        evicted
+        """
+        branch_cache = BZRBranchCache.get_cache()
+        handle = branch_cache.get_handle('file://%s/README'
+                                         % self.bzr_repo_path)[0]
+
+        BZRBranchCache.close_all()
+        self.assertTrue(handle.branch.is_locked())
+
+        handle.release()
+        self.assertFalse(handle.branch.is_locked())
+
     def test_ssh(self):
         """Testing a SSH-backed bzr repository"""
         self._test_ssh(self.bzr_ssh_path, 'README')
@@ -406,6 +1035,146 @@ class BZRTests(SCMTestCase):
         self._test_ssh(self.bzr_sftp_path, 'README')
 
 
+class ClearCaseTests(SCMTestCase):
+    """Unit tests for ClearCase, using a stand-in for cleartool."""
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(ClearCaseTests, self).setUp()
+
+        self.clearcase_dir = mkdtemp(prefix='rb-tests-clearcase.')
+        self.view_path = os.path.join(self.clearcase_dir, 'view')
+        self.log_path = os.path.join(self.clearcase_dir, 'cleartool.log')
+
+        os.mkdir(self.view_path)
+        os.mkdir(os.path.join(self.view_path, 'src'))
+
+        with open(os.path.join(self.view_path, 'README'), 'wb') as f:
+            f.write(b'This is a test.\n')
+
+        self._old_command = ClearToolSession.command
+        ClearToolSession.command = [
+            sys.executable,
+            os.path.join(os.path.dirname(__file__), 'testdata',
+                         'fake_cleartool.py'),
+        ]
+        os.environ[str('FAKE_CLEARTOOL_LOG')] = str(self.log_path)
+
+        self.repository = Repository(name='ClearCase',
+                                     path=self.view_path,
+                                     tool=Tool.objects.get(name='ClearCase'))
+        self.tool = self.repository.get_scmtool()
+
+    def tearDown(self):
+        super(ClearCaseTests, self).tearDown()
+
+        ClearToolSession.close_all()
+        ClearToolSession.command = self._old_command
+        del os.environ[str('FAKE_CLEARTOOL_LOG')]
+        shutil.rmtree(self.clearcase_dir)
+
+    def _get_log(self):
+        with open(self.log_path, 'r') as f:
+            return f.read().splitlines()
+
+    def test_get_file(self):
+        """Testing ClearCaseTool.get_file"""
+        self.assertEqual(self.tool.get_file('README@@/main/2', '/main/2'),
+                         b'This is a test.\n')
+        self.assertEqual(self.tool.get_file('README@@/main/2', PRE_CREATION),
+                         '')
+
+    def test_get_file_errors(self):
+        """Testing ClearCaseTool.get_file error conditions"""
+        self.assertRaises(FileNotFoundError,
+                          lambda: self.tool.get_file(''))
+        self.assertRaises(SCMError,
+                          lambda: self.tool.get_file('README2@@/main/2'))
+        self.assertRaises(SCMError,
+                          lambda: self.tool.get_file('src@@/main/1'))
+
+    def test_get_repository_info(self):
+        """Testing ClearCaseTool.get_repository_info"""
+        self.assertEqual(self.tool.get_repository_info(), {
+            'repopath': self.view_path,
+            'uuid': '12345678.9abcdef0.1234.56:78:9a:bc:de:f0',
+        })
+
+    def test_oid2filename(self):
+        """Testing ClearCaseDiffParser._oid2filename"""
+        parser = ClearCaseDiffParser(b'', self.view_path, '/vobs/test')
+
+        self.assertEqual(parser._oid2filename('README'), 'README@@/main/1')
+        self.assertRaises(SCMError,
+                          lambda: parser._oid2filename('README2'))
+
+    def test_persistent_session(self):
+        """Testing ClearCaseTool runs commands in one cleartool session"""
+        for i in range(2):
+            self.tool.get_repository_info()
+            self.tool.get_file('README@@/main/2', '/main/2')
+            self.tool.get_file('README@@/main/3', '/main/3')
+
+        log = self._get_log()
+        self.assertEqual(len([line for line in log
+                              if line.startswith('start ')]),
+                         1)
+
+        # Metadata and element lookups are only performed once.
+        self.assertEqual(len([line for line in log
+                              if line.startswith('lsvob ')]),
+                         1)
+        self.assertEqual(len([line for line in log
+                              if line.startswith('desc ')]),
+                         1)
+        self.assertEqual(len([line for line in log
+                              if line.startswith('get ')]),
+                         4)
+
+    def test_persistent_session_restart(self):
+        """Testing ClearCaseTool restarts a cleartool session that exited"""
+        self.tool.get_file('README@@/main/2', '/main/2')
+
+        session = ClearToolSession.get_session(self.view_path)
+        session._process.kill()
+        session._process.wait()
+
+        self.assertEqual(self.tool.get_file('README@@/main/2', '/main/2'),
+                         b'This is a test.\n')
+        self.assertEqual(len([line for line in self._get_log()
+                              if line.startswith('start ')]),
+                         2)
+
+    def test_run_cleartool_with_invalid_utf8(self):
+        """Testing run_cleartool with output that isn't valid UTF-8"""
+        path = os.path.join(self.view_path, 'latin1.txt')
+
+        with open(path, 'wb') as f:
+            f.write(b'caf\xe9\n')
+
+        # Without a view path, cleartool is run directly rather than in a
+        # session. Both return the same text.
+        self.assertEqual(run_cleartool(['cat', path], cwd=self.view_path),
+                         'caf\ufffd\n')
+        self.assertEqual(run_cleartool(['cat', path]), 'caf\ufffd\n')
+        self.assertEqual(len([line for line in self._get_log()
+                              if line.startswith('start ')]),
+                         1)
+
+    def test_persistent_session_stopped_on_error(self):
+        """Testing ClearToolSession stops the session if a command fails"""
+        session = ClearToolSession.get_session(self.view_path)
+
+        def _read_errors():
+            raise ValueError('Unexpected error')
+
+        session._read_errors = _read_errors
+
+        self.assertRaises(ValueError,
+                          lambda: session.run(['describe', '-short', 'vob:.']))
+        self.assertIsNone(session._process)
+
+
 class CVSTests(SCMTestCase):
     """Unit tests for CVS."""
     fixtures = ['test_scmtools']
@@ -531,6 +1300,62 @@ class CVSTests(SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('hello', PRE_CREATION))
 
+    def test_get_file_keeps_working_directory(self):
+        """Testing CVSTool.get_file doesn't change the working directory"""
+        cwd = os.getcwd()
+
+        self.assertEqual(self.tool.get_file('test/testfile', Revision('1.1')),
+                         b'test content\n')
+        self.assertEqual(os.getcwd(), cwd)
+
+    def test_get_file_remembers_attic(self):
+        """Testing CVSTool.get_file remembers files found in the Attic"""
+        def _cat_specific_file(cvsroot, filename, revision):
+            fetched.append(filename)
+
+            if '/Attic/' not in filename:
+                raise FileNotFoundError(filename, revision)
+
+            return b'attic content\n'
+
+        fetched = []
+        self.tool.client._cat_specific_file = _cat_specific_file
+
+        self.assertEqual(self.tool.get_file('test/atticfile', Revision('1.1')),
+                         b'attic content\n')
+        self.assertEqual(self.tool.get_file('test/atticfile', Revision('1.2')),
+                         b'attic content\n')
+        self.assertEqual(fetched, [
+            'test/atticfile',
+            'test/Attic/atticfile',
+            'test/Attic/atticfile',
+        ])
+
+    def test_get_file_with_mirror(self):
+        """Testing CVSTool.get_file with a local rsync mirror"""
+        if not is_exe_in_path('rsync'):
+            raise nose.SkipTest('rsync is not installed')
+
+        tempdir = mkdtemp(prefix='rb-tests-cvs-mirror-')
+
+        try:
+            mirror = CVSMirror(self.cvs_repo_path,
+                               os.path.join(tempdir, 'mirror'))
+            self.tool.client.mirror = mirror
+            self.assertTrue(mirror.sync())
+
+            self.assertEqual(
+                self.tool.get_file('test/testfile', Revision('1.1')),
+                b'test content\n')
+            self.assertTrue(os.path.exists(
+                os.path.join(tempdir, 'mirror', 'test', 'testfile,v')))
+            self.assertRaises(
+                FileNotFoundError,
+                lambda: self.tool.get_file('test/testfile2',
+                                           Revision('1.1')))
+        finally:
+            shutil.rmtree(tempdir)
+
     def test_revision_parsing(self):
         """Testing CVSTool revision number parsing"""
         self.assertEqual(self.tool.parse_diff_revision('', 'PRE-CREATION')[1],
@@ -726,6 +1551,40 @@ class CVSTests(SCMTestCase):
         self.assertEqual(norm_path, expected_path)
 
 
+class CVSMirrorTests(TestCase):
+    """Unit tests for CVSMirror."""
+    def test_get_cvsroot_syncs_in_background(self):
+        """Testing CVSMirror.get_cvsroot syncs in the background"""
+        tempdir = mkdtemp(prefix='rb-tests-cvs-mirror-')
+        syncs = []
+
+        try:
+            mirror = CVSMirror('rsync://example.com/cvsroot',
+                               os.path.join(tempdir, 'mirror'))
+            mirror.sync = lambda: self.fail('sync() was called inline')
+            mirror.sync_in_background = lambda: syncs.append(True)
+
+            # The mirror was never synced, so the pserver must be used.
+            self.assertIsNone(mirror.get_cvsroot())
+            self.assertEqual(len(syncs), 1)
+
+            # Once synced, the mirror is used right away, and only synced
+            # again once it's out of date.
+            with open(os.path.join(tempdir, 'mirror.synced'), 'w'):
+                pass
+
+            self.assertEqual(mirror.get_cvsroot(),
+                             os.path.join(tempdir, 'mirror'))
+            self.assertEqual(len(syncs), 1)
+
+            mirror.sync_interval = 0
+            self.assertEqual(mirror.get_cvsroot(),
+                             os.path.join(tempdir, 'mirror'))
+            self.assertEqual(len(syncs), 2)
+        finally:
+            shutil.rmtree(tempdir)
+
+
 class CommonSVNTestsBase(SCMTestCase):
     """Common unit tests for Subversion.
 
@@ -815,6 +1674,21 @@ class CommonSVNTestsBase(SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('hello', PRE_CREATION))
 
+    def test_get_files(self):
+        """Testing SVN (<backend>) get_files"""
+        path1 = 'trunk/doc/misc-docs/Makefile'
+        path2 = 'trunk/doc/misc-docs/Makefile2'
+
+        rev = Revision('2')
+
+        files = self.tool.get_files([
+            (path1, rev),
+            (path2, rev),
+        ])
+
+        self.assertEqual(list(files.keys()), [(path1, rev)])
+        self.assertEqual(files[(path1, rev)], self.tool.get_file(path1, rev))
+
     def test_revision_parsing(self):
         """Testing SVN (<backend>) revision number parsing"""
         self.assertEqual(
@@ -1139,6 +2013,36 @@ class CommonSVNTestsBase(SCMTestCase):
         self.assertEqual(md5(commit.diff.encode('utf-8')).hexdigest(),
                          '56e50374056931c03a333f234fa63375')
 
+    def test_get_commits_with_log_cache(self):
+        """Testing SVN (<backend>) get_commits with cached log entries"""
+        cache.clear()
+
+        client = self.tool.client
+        orig_get_log = client.get_log
+        calls = []
+
+        def _get_log(*args, **kwargs):
+            calls.append((args, kwargs))
+            return orig_get_log(*args, **kwargs)
+
+        client.get_log = _get_log
+
+        try:
+            commits = self.tool.get_commits(start='7')
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(len(commits), 7)
+
+            # Everything from revision 7 back has been seen now, so older
+            # pages come straight from the cache.
+            self.assertEqual(self.tool.get_commits(start='5'), commits[2:])
+            self.assertEqual(len(calls), 1)
+
+            commit = self.tool.get_change('5')
+            self.assertEqual(commit.parent, '4')
+            self.assertEqual(len(calls), 1)
+        finally:
+            del client.get_log
+
     def test_utf8_keywords(self):
         """Testing SVN (<backend>) with UTF-8 files with keywords"""
         self.repository.get_file('trunk/utf8-file.txt', '9')
@@ -1153,6 +2057,23 @@ class SubvertpyTests(CommonSVNTestsBase):
     backend = 'reviewboard.scmtools.svn.subvertpy'
     backend_name = 'subvertpy'
 
+    def test_get_file_reuses_session(self):
+        """Testing SVN (subvertpy) get_file reuses pooled RA sessions"""
+        pool = self.tool.client.session_pool
+        pool.close()
+
+        path = 'trunk/doc/misc-docs/Makefile'
+        self.tool.get_file(path, Revision('2'))
+        self.tool.get_file(path, Revision('4'))
+
+        self.assertEqual(pool._num_sessions, 1)
+        self.assertEqual(len(pool._idle), 1)
+
+        self.assertRaises(FileNotFoundError,
+                          lambda: self.tool.get_file(path + '2',
+                                                     Revision('2')))
+        self.assertEqual(pool._num_sessions, 1)
+
     def test_collapse_keywords(self):
         """Testing SVN keyword collapsing"""
         keyword_test_data = [
@@ -1515,6 +2436,195 @@ class PerforceStunnelTests(SCMTestCase):
                          '227bdd87b052fcad9369e65c7bf23fd0')
 
 
+class _FakePerforceConnection(object):
+    """A stand-in for PerforceConnection that doesn't need p4python."""
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.connected = False
+        self.last_used = 0
+        self.num_uses = 0
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+
+class PerforceConnectionPoolTests(TestCase):
+    """Unit tests for PerforceConnectionPool."""
+
+    def setUp(self):
+        super(PerforceConnectionPoolTests, self).setUp()
+
+        self.pool = PerforceConnectionPool('perforce.example.com:1666',
+                                           'user', 'pass', '')
+        self.pool.connection_cls = _FakePerforceConnection
+
+    def test_checkout_reuses_connection(self):
+        """Testing PerforceConnectionPool.checkout reuses connections"""
+        conn = self.pool.checkout()
+        self.assertTrue(conn.connected)
+        self.assertEqual(conn.kwargs['p4port'], 'perforce.example.com:1666')
+        self.pool.checkin(conn)
+
+        self.assertTrue(self.pool.checkout() is conn)
+        self.assertEqual(self.pool._num_connections, 1)
+
+    def test_checkout_concurrent(self):
+        """Testing PerforceConnectionPool.checkout with connections in use"""
+        conn1 = self.pool.checkout()
+        conn2 = self.pool.checkout()
+
+        self.assertFalse(conn1 is conn2)
+        self.assertEqual(self.pool._num_connections, 2)
+
+    def test_checkin_disconnected(self):
+        """Testing PerforceConnectionPool.checkin with a dropped connection"""
+        conn = self.pool.checkout()
+        conn.disconnect()
+        self.pool.checkin(conn)
+
+        self.assertEqual(self.pool._idle, [])
+        self.assertEqual(self.pool._num_connections, 0)
+        self.assertFalse(self.pool.checkout() is conn)
+
+    def test_discard(self):
+        """Testing PerforceConnectionPool.discard"""
+        conn = self.pool.checkout()
+        self.pool.discard(conn)
+
+        self.assertFalse(conn.connected)
+        self.assertEqual(self.pool._num_connections, 0)
+
+    def test_reap_idle(self):
+        """Testing PerforceConnectionPool closes idle connections"""
+        conn = self.pool.checkout()
+        self.pool.checkin(conn)
+        conn.last_used -= self.pool.idle_timeout + 1
+
+        new_conn = self.pool.checkout()
+
+        self.assertFalse(new_conn is conn)
+        self.assertFalse(conn.connected)
+        self.assertEqual(self.pool._num_connections, 1)
+
+    def test_get_pool(self):
+        """Testing PerforceConnectionPool.get_pool"""
+        pool = PerforceConnectionPool.get_pool('perforce.example.com:1666',
+                                               'user', 'pass', '')
+
+        self.assertTrue(
+            PerforceConnectionPool.get_pool('perforce.example.com:1666',
+                                            'user', 'pass', '') is pool)
+        self.assertFalse(
+            PerforceConnectionPool.get_pool('perforce.example.com:1666',
+                                            'user2', 'pass', '') is pool)
+
+        PerforceConnectionPool.close_all()
+
+
+class _FakeP4Exception(Exception):
+    """A stand-in for P4Exception, used if p4python isn't installed."""
+    pass
+
+
+class PerforceClientTests(TestCase):
+    """Unit tests for PerforceClient running commands on pooled connections.
+    """
+
+    def setUp(self):
+        super(PerforceClientTests, self).setUp()
+
+        self._old_p4 = perforce.P4
+
+        if perforce.P4 is None:
+            perforce.P4 = object()
+            perforce.P4Exception = _FakeP4Exception
+
+        self.P4Exception = perforce.P4Exception
+
+        self.client = PerforceClient('perforce.example.com:1666', 'user',
+                                     'pass', '')
+        self.pool = PerforceConnectionPool('perforce.example.com:1666',
+                                           'user', 'pass', '')
+        self.pool.connection_cls = _FakePerforceConnection
+        self.client.get_connection_pool = lambda: self.pool
+
+    def tearDown(self):
+        super(PerforceClientTests, self).tearDown()
+
+        if self._old_p4 is None:
+            perforce.P4 = None
+            del perforce.P4Exception
+
+    def test_run_worker_retries_dropped_connection(self):
+        """Testing PerforceClient._run_worker retries on a dropped connection
+        """
+        self._add_used_connection()
+        conns = []
+
+        def worker():
+            conns.append(self.client._local.connection)
+
+            if len(conns) == 1:
+                conns[0].disconnect()
+                raise self.P4Exception('Something went wrong')
+
+            return 'result'
+
+        self.assertEqual(self.client._run_worker(worker), 'result')
+        self.assertEqual(len(conns), 2)
+        self.assertFalse(conns[0] is conns[1])
+        self.assertEqual(self.pool._idle, [conns[1]])
+
+    def test_run_worker_retries_expired_ticket(self):
+        """Testing PerforceClient._run_worker retries on an expired ticket"""
+        self._add_used_connection()
+        conns = []
+
+        def worker():
+            conns.append(self.client._local.connection)
+
+            if len(conns) == 1:
+                raise self.P4Exception(
+                    'Your session has expired, please login again.')
+
+            return 'result'
+
+        self.assertEqual(self.client._run_worker(worker), 'result')
+        self.assertEqual(len(conns), 2)
+        self.assertFalse(conns[0].connected)
+        self.assertEqual(self.pool._num_connections, 1)
+
+    def test_run_worker_with_command_error(self):
+        """Testing PerforceClient._run_worker with a command error keeps the
+        connection pooled
+        """
+        conn = self._add_used_connection()
+        calls = []
+
+        def worker():
+            calls.append(self.client._local.connection)
+            raise self.P4Exception('//depot/foo - no such file(s).')
+
+        self.assertRaises(SCMError, lambda: self.client._run_worker(worker))
+        self.assertEqual(calls, [conn])
+        self.assertTrue(conn.connected)
+        self.assertEqual(self.pool._idle, [conn])
+
+    def _add_used_connection(self):
+        """Adds a connection to the pool that has already been used."""
+        conn = self.pool.checkout()
+        conn.num_uses = 1
+        self.pool.checkin(conn)
+
+        return conn
+
+
 class MercurialTests(SCMTestCase):
     """Unit tests for mercurial."""
     fixtures = ['test_scmtools']
@@ -1533,6 +2643,11 @@ class MercurialTests(SCMTestCase):
         except ImportError:
             raise nose.SkipTest('Hg is not installed')
 
+    def tearDown(self):
+        super(MercurialTests, self).tearDown()
+
+        HgCommandServerPool.close_all()
+
     def _first_file_in_diff(self, diff):
         return self.tool.get_parser(diff).parse()[0]
 
@@ -1704,6 +2819,88 @@ class MercurialTests(SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file('hello', PRE_CREATION))
 
+    def test_get_files(self):
+        """Testing HgTool.get_files"""
+        rev = Revision('661e5dd3c493')
+
+        files = self.tool.get_files([
+            ('doc/readme', rev),
+            ('doc/readme2', rev),
+        ])
+
+        self.assertEqual(files, {
+            ('doc/readme', rev): b'Hello\n\ngoodbye\n',
+        })
+
+    def test_get_file_reuses_command_server(self):
+        """Testing HgTool.get_file reuses pooled hg command servers"""
+        self.assertEqual(self.tool.get_file('doc/readme',
+                                            Revision('661e5dd3c493')),
+                         b'Hello\n\ngoodbye\n')
+
+        pool = self._get_command_server_pool()
+        self.assertEqual(len(pool._idle), 1)
+        server = pool._idle[0]
+
+        self.assertRaises(
+            FileNotFoundError,
+            lambda: self.tool.get_file('doc/readme2',
+                                       Revision('661e5dd3c493')))
+        self.assertEqual(pool._idle, [server])
+        self.assertTrue(server.is_alive())
+
+        pool.close()
+        self.assertFalse(server.is_alive())
+
+    def test_get_file_restarts_dead_command_server(self):
+        """Testing HgTool.get_file restarts a dead hg command server"""
+        rev = Revision('661e5dd3c493')
+
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+
+        pool = self._get_command_server_pool()
+        server = pool._idle[0]
+        server._process.kill()
+        server._process.wait()
+
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+        self.assertTrue(pool.enabled)
+        self.assertTrue(pool._num_servers <= 1)
+
+    def test_get_file_without_command_server(self):
+        """Testing HgTool.get_file falls back on running hg when the command
+        server can't be started
+        """
+        def start(server):
+            raise IOError('hg command server does not support runcommand')
+
+        rev = Revision('661e5dd3c493')
+        old_start = HgCommandServer.start
+        HgCommandServer.start = start
+
+        try:
+            self.assertEqual(self.tool.get_file('doc/readme', rev),
+                             b'Hello\n\ngoodbye\n')
+        finally:
+            HgCommandServer.start = old_start
+
+        pool = self._get_command_server_pool()
+        self.assertFalse(pool.enabled)
+        self.assertEqual(pool._num_servers, 0)
+
+        # While the pool is disabled, hg is still run directly.
+        self.assertEqual(self.tool.get_file('doc/readme', rev),
+                         b'Hello\n\ngoodbye\n')
+        self.assertEqual(pool._idle, [])
+
+    def _get_command_server_pool(self):
+        client = self.tool.client
+
+        return HgCommandServerPool.get_pool(client.path, client.default_args,
+                                            client.local_site_name)
+
     def test_interface(self):
         """Testing basic HgTool API"""
         self.assertTrue(self.tool.get_diffs_use_absolute_paths())
@@ -1762,6 +2959,42 @@ class GitTests(SCMTestCase):
         except ImportError:
             raise nose.SkipTest('git binary not found')
 
+        self.git_mirror_dir = None
+
+    def tearDown(self):
+        super(GitTests, self).tearDown()
+
+        if self.git_mirror_dir:
+            GitCatFilePool.close_all()
+            settings.GIT_MIRROR_DIR = self._old_git_mirror_dir
+            shutil.rmtree(self.git_mirror_dir)
+
+    def _create_mirrored_repository(self, **kwargs):
+        """Creates a repository with a local mirror.
+
+        The repository's path can't be fetched from, so lookups can only be
+        served from the mirror, which is cloned from the local test
+        repository.
+        """
+        self._old_git_mirror_dir = settings.GIT_MIRROR_DIR
+        self.git_mirror_dir = mkdtemp(prefix='rb-tests-git-mirrors.')
+        settings.GIT_MIRROR_DIR = self.git_mirror_dir
+
+        repository = Repository(name='Mirrored Git test repo',
+                                path='git://example.com/test.git',
+                                tool=Tool.objects.get(name='Git'),
+                                **kwargs)
+        repository.extra_data['git_use_local_mirror'] = True
+        repository.save()
+
+        return repository
+
+    def _get_mirrored_tool(self, repository):
+        tool = repository.get_scmtool()
+        tool.mirror.remote_url = self.local_repo_path
+
+        return tool
+
     def _read_fixture(self, filename):
         return open(
             os.path.join(os.path.dirname(__file__), 'testdata', filename),
@@ -2349,6 +3582,243 @@ class GitTests(SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file("readme", "0000000"))
 
+    def test_get_files(self):
+        """Testing GitTool.get_files"""
+        files = [
+            ('readme', 'e965047'),
+            ('readme', 'd6613f5'),
+            ('readme', PRE_CREATION),
+            ('readme', '0000000'),
+            ('readme', 'a62df6c'),
+        ]
+
+        self.assertEqual(
+            self.tool.get_files(files),
+            {
+                ('readme', 'e965047'): b'Hello\n',
+                ('readme', 'd6613f5'): b'Hello there\n',
+                ('readme', PRE_CREATION): b'',
+            })
+
+    def test_get_file_reuses_cat_file_process(self):
+        """Testing GitTool.get_file reuses pooled git cat-file processes"""
+        pool = GitCatFilePool.get_pool(self.tool.client.git_dir)
+        pool.close()
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        self.assertEqual(len(pool._idle['--batch']), 1)
+        process = pool._idle['--batch'][0]
+
+        self.assertEqual(self.tool.get_file('readme', 'd6613f5'),
+                         b'Hello there\n')
+        self.assertEqual(pool._idle['--batch'], [process])
+        self.assertTrue(process.is_alive())
+
+        pool.close()
+        self.assertFalse(process.is_alive())
+
+    def test_get_file_restarts_dead_cat_file_process(self):
+        """Testing GitTool.get_file restarts a dead git cat-file process"""
+        pool = GitCatFilePool.get_pool(self.tool.client.git_dir)
+        pool.close()
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        process = pool._idle['--batch'][0]
+        process._process.kill()
+        process._process.wait()
+
+        self.assertEqual(self.tool.get_file('readme', 'd6613f5'),
+                         b'Hello there\n')
+        self.assertTrue(pool._num_processes['--batch'] <= 1)
+
+        pool.close()
+
+    def test_cat_file_pool_reaps_idle_processes(self):
+        """Testing GitCatFilePool shuts down idle git cat-file processes"""
+        pool = GitCatFilePool.get_pool(self.tool.client.git_dir)
+        pool.close()
+
+        self.assertTrue(self.tool.file_exists('readme', 'e965047'))
+        process = pool._idle['--batch-check'][0]
+        process.last_used -= pool.idle_timeout + 1
+
+        self.assertEqual(self.tool.get_file('readme', 'e965047'), b'Hello\n')
+        self.assertFalse(process.is_alive())
+        self.assertEqual(pool._idle['--batch-check'], [])
+        self.assertEqual(pool._num_processes['--batch-check'], 0)
+
+        pool.close()
+
+    def test_local_mirror_get_file(self):
+        """Testing GitTool.get_file with a local mirror"""
+        tool = self._get_mirrored_tool(self._create_mirrored_repository())
+
+        self.assertFalse(tool.has_local_mirror())
+        self.assertTrue(tool.mirror.update())
+        self.assertTrue(tool.has_local_mirror())
+
+        self.assertEqual(tool.get_file('readme', 'e965047'), b'Hello\n')
+        self.assertEqual(tool.get_file('readme'), b'Hello there\n')
+        self.assertRaises(FileNotFoundError,
+                          lambda: tool.get_file('readme', '0000000'))
+
+        self.assertTrue(tool.file_exists('readme', 'd6613f5'))
+        self.assertFalse(tool.file_exists('readme', '0000000'))
+        self.assertFalse(tool.file_exists('readme', 'a62df6c'))
+
+        self.assertEqual(
+            tool.get_files([
+                ('readme', 'e965047'),
+                ('readme', '0000000'),
+            ]),
+            {
+                ('readme', 'e965047'): b'Hello\n',
+            })
+
+    def test_local_mirror_falls_back_to_remote(self):
+        """Testing GitTool.get_file with a local mirror falls back on the
+        remote repository for objects not in the mirror
+        """
+        repository = self._create_mirrored_repository(
+            raw_file_url='http://example.com/<revision>')
+        tool = self._get_mirrored_tool(repository)
+        tool.mirror.update()
+
+        fetched_urls = []
+
+        def _get_file_http(url, path, revision):
+            fetched_urls.append(url)
+            return b'Remote contents\n'
+
+        tool.client.get_file_http = _get_file_http
+
+        self.assertEqual(
+            tool.get_file('readme',
+                          'd6613f5f8b58eb6a88ee386ea140364c8645005c'),
+            b'Hello there\n')
+        self.assertEqual(fetched_urls, [])
+
+        self.assertEqual(tool.get_file('readme', '0' * 40),
+                         b'Remote contents\n')
+        self.assertEqual(fetched_urls, ['http://example.com/' + '0' * 40])
+
+    def test_local_mirror_get_branches(self):
+        """Testing GitTool.get_branches with a local mirror"""
+        tool = self._get_mirrored_tool(self._create_mirrored_repository())
+        tool.mirror.update()
+
+        self.assertEqual(tool.get_branches(), [
+            Branch(id='master',
+                   commit='224589cf334e9baafeac1165be5e5c04991fd65e',
+                   default=True),
+        ])
+
+    def test_local_mirror_get_commits(self):
+        """Testing GitTool.get_commits with a local mirror"""
+        tool = self._get_mirrored_tool(self._create_mirrored_repository())
+        tool.mirror.update()
+
+        commits = tool.get_commits(
+            start='e76c016e09c415d7afc4c004a8a290b3c51bff59')
+
+        self.assertEqual(len(commits), 9)
+        self.assertEqual(
+            commits[0],
+            Commit('Steve Sutcliffe',
+                   'e76c016e09c415d7afc4c004a8a290b3c51bff59',
+                   '2011-03-06T01:40:11',
+                   'added tests',
+                   '1baa5285167980271becd922acd77a20a20b916b'))
+        self.assertEqual(commits[-1].id,
+                         'ff0dcb88371177535b7b7ab25e4c0add6dfd8a26')
+        self.assertEqual(commits[-1].parent, '')
+
+        self.assertEqual(tool.get_commits()[0].id,
+                         '224589cf334e9baafeac1165be5e5c04991fd65e')
+
+    def test_local_mirror_get_commits_with_option_as_start(self):
+        """Testing GitTool.get_commits with a local mirror and an option
+        passed as the start revision
+        """
+        tool = self._get_mirrored_tool(self._create_mirrored_repository())
+        tool.mirror.update()
+
+        tempdir = mkdtemp(prefix='rb-tests-')
+        out_path = os.path.join(tempdir, 'out')
+
+        try:
+            self.assertRaises(
+                SCMError,
+                lambda: tool.get_commits(start='--output=%s' % out_path))
+            self.assertRaises(
+                SCMError,
+                lambda: tool.get_change('--output=%s' % out_path))
+            self.assertRaises(
+                SCMError,
+                lambda: tool.get_commits(branch='master --output=x'))
+            self.assertFalse(os.path.exists(out_path))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_local_mirror_get_commits_with_branch_name(self):
+        """Testing GitTool.get_commits with a local mirror and a branch name
+        """
+        tool = self._get_mirrored_tool(self._create_mirrored_repository())
+        tool.mirror.update()
+
+        self.assertEqual(tool.get_commits(branch='master')[0].id,
+                         '224589cf334e9baafeac1165be5e5c04991fd65e')
+
+    def test_local_mirror_scmtool_reused(self):
+        """Testing Repository reuses the SCMTool for local mirror lookups"""
+        repository = self._create_mirrored_repository()
+        tools = []
+
+        def get_scmtool():
+            tools.append(Repository.get_scmtool(repository))
+            return tools[-1]
+
+        repository.get_scmtool = get_scmtool
+
+        mirror = repository._get_local_mirror()
+        self.assertIsNotNone(mirror)
+        self.assertIs(repository._get_local_mirror(), mirror)
+        repository._get_mirrored_scmtool()
+        self.assertEqual(len(tools), 1)
+
+    def test_local_mirror_get_change(self):
+        """Testing GitTool.get_change with a local mirror"""
+        tool = self._get_mirrored_tool(self._create_mirrored_repository())
+        tool.mirror.update()
+
+        commit = tool.get_change('7e7cec6387fc06a5ce2663641c1da2264193cb23')
+
+        self.assertEqual(commit.parent,
+                         'a62df6c28c6c150d671c9947a3d07928c21a07e0')
+        self.assertTrue(commit.diff.startswith(
+            b'diff --git a/models.py b/models.py\n'
+            b'new file mode 100644\n'))
+
+        files = tool.get_parser(commit.diff).parse()
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].newFile, 'models.py')
+
+        self.assertRaises(SCMError, lambda: tool.get_change('0000000'))
+
+    def test_update_local_mirror(self):
+        """Testing Repository.update_local_mirror"""
+        repository = self._create_mirrored_repository()
+        self.assertTrue(repository.supports_post_commit)
+
+        tool = self._get_mirrored_tool(repository)
+        repository.get_scmtool = lambda: tool
+
+        self.assertFalse(tool.has_local_mirror())
+        self.assertTrue(repository.update_local_mirror())
+        self.assertTrue(tool.has_local_mirror())
+
+        self.assertFalse(self.repository.update_local_mirror())
+
     def test_parse_diff_revision_with_remote_and_short_SHA1_error(self):
         """Testing GitTool.parse_diff_revision with remote files and short
         SHA1 error
@@ -272,6 +272,42 @@ SVNTOOL_BACKENDS = [
 ]
 
 
+# The on-disk cache of files fetched from repositories, which sits below the
+# main cache. The maximum size is in bytes. The directory defaults to
+# "file-cache" in the site's data directory. Set the maximum size to 0 to
+# disable the cache.
+SCMTOOLS_FILE_CACHE_DIR = None
+SCMTOOLS_FILE_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+
+# The cache of hosting service API responses, which are revalidated with
+# conditional requests. The backend is either "cache" (the main cache) or
+# "file" (on local disk, limited to the maximum size in bytes). The directory
+# defaults to "hostingsvcs-http-cache" in the site's data directory. Set the
+# backend to None to disable the cache.
+HOSTINGSVCS_HTTP_CACHE_BACKEND = 'cache'
+HOSTINGSVCS_HTTP_CACHE_DIR = None
+HOSTINGSVCS_HTTP_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+
+# The directory containing local mirrors of CVS repositories. A repository
+# is only mirrored if it has an rsync URL set (as "cvs_rsync_url" in its
+# extra data). This defaults to "cvs-mirrors" in the site's data directory.
+CVSTOOL_MIRROR_DIR = None
+
+# The directory containing local bare mirrors of remote Git repositories.
+# A repository is only mirrored if "git_use_local_mirror" is set in its
+# extra data. This defaults to "git-mirrors" in the site's data directory.
+GIT_MIRROR_DIR = None
+
+# Whether rbssh shares SSH connections between the SCM commands it runs.
+# The first command for a LocalSite, user, host and port starts a background
+# process holding the connection open, which exits once it's been unused for
+# the idle timeout, in seconds.
+RBSSH_MULTIPLEX = False
+RBSSH_MULTIPLEX_IDLE_TIMEOUT = 60
+
+
 # Load local settings.  This can override anything in here, but at the very
 # least it needs to define database connectivity.
 try:
@@ -304,6 +340,19 @@ if PRODUCTION:
 else:
     SITE_DATA_DIR = os.path.dirname(LOCAL_ROOT)
 
+if not SCMTOOLS_FILE_CACHE_DIR:
+    SCMTOOLS_FILE_CACHE_DIR = os.path.join(SITE_DATA_DIR, 'file-cache')
+
+if not HOSTINGSVCS_HTTP_CACHE_DIR:
+    HOSTINGSVCS_HTTP_CACHE_DIR = os.path.join(SITE_DATA_DIR,
+                                              'hostingsvcs-http-cache')
+
+if not CVSTOOL_MIRROR_DIR:
+    CVSTOOL_MIRROR_DIR = os.path.join(SITE_DATA_DIR, 'cvs-mirrors')
+
+if not GIT_MIRROR_DIR:
+    GIT_MIRROR_DIR = os.path.join(SITE_DATA_DIR, 'git-mirrors')
+
 HTDOCS_ROOT = os.path.join(LOCAL_ROOT, 'htdocs')
 STATIC_ROOT = os.path.join(HTDOCS_ROOT, 'static')
 MEDIA_ROOT = os.path.join(HTDOCS_ROOT, 'media')
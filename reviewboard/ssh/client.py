@@ -55,6 +55,9 @@ class SSHClient(paramiko.SSHClient):
     DEFAULT_STORAGE = 'reviewboard.ssh.storage.FileSSHStorage'
     SUPPORTED_KEY_TYPES = (paramiko.RSAKey, paramiko.DSSKey)
 
+    # Storage backend classes that have been loaded, keyed by path.
+    _storage_classes = {}
+
     def __init__(self, namespace=None, storage=None):
         super(SSHClient, self).__init__()
 
@@ -82,14 +85,23 @@ class SSHClient(paramiko.SSHClient):
         module, class_name = path[:i], path[i + 1:]
 
         try:
-            mod = __import__(module, {}, {}, [class_name])
-        except ImportError as e:
-            msg = 'Error importing SSH storage backend %s: "%s"' % (module, e)
-            logging.critical(msg)
-            raise ImproperlyConfigured(msg)
+            storage_cls = self._storage_classes[path]
+        except KeyError:
+            try:
+                mod = __import__(module, {}, {}, [class_name])
+            except ImportError as e:
+                msg = 'Error importing SSH storage backend %s: "%s"' % \
+                      (module, e)
+                logging.critical(msg)
+                raise ImproperlyConfigured(msg)
+
+            storage_cls = getattr(mod, class_name, None)
+
+            if storage_cls is not None:
+                self._storage_classes[path] = storage_cls
 
         try:
-            self.storage = getattr(mod, class_name)(namespace=self.namespace)
+            self.storage = storage_cls(namespace=self.namespace)
         except Exception as e:
             msg = 'Error instantiating SSH storage backend %s: "%s"' % \
                   (module, e)
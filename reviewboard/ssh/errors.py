@@ -101,3 +101,11 @@ class UnknownHostKeyError(SSHKeyError):
                         "not be determined.") % {'hostname': hostname}
 
         SSHKeyError.__init__(self, hostname, key, warning)
+
+
+class SSHMultiplexError(SSHError):
+    """An error setting up a multiplexed SSH session.
+
+    rbssh falls back on a direct connection when this is raised.
+    """
+    pass
@@ -0,0 +1,563 @@
+"""Multiplexing of SSH sessions for rbssh.
+
+Each rbssh process normally makes a new SSH connection, with a key exchange
+and authentication, even though SCM tools like Git, Bazaar and CVS run it
+once for every file they fetch. With multiplexing enabled, the first rbssh
+process for a given LocalSite, user, host and port starts a background
+server that keeps an authenticated connection open. Later rbssh processes
+talk to that server over a control socket (a UNIX domain socket) and run
+their commands on new channels of the shared connection.
+
+The control sockets live in a directory that only the current user can
+access. Each server only uses the SSH keys of the LocalSite it was started
+for, and the LocalSite is part of the control socket's name, so LocalSites
+never share connections. A server exits once no sessions have used it for
+its idle timeout.
+
+Messages on the control socket are framed as a one-byte type, a four-byte
+length, and the payload.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import time
+
+from django.utils import six
+
+from reviewboard.ssh.errors import SSHMultiplexError
+
+
+#: A request for a session, sent by the client. The payload is a JSON
+#: object containing either a ``command`` or a ``subsystem``.
+FRAME_REQUEST = b'Q'
+
+#: Sent by the server once the session's channel is open.
+FRAME_READY = b'K'
+
+#: Sent by the server if the session's channel couldn't be opened.
+FRAME_ERROR = b'F'
+
+#: Data for the remote command's stdin, sent by the client.
+FRAME_STDIN = b'I'
+
+#: The end of the remote command's stdin, sent by the client.
+FRAME_STDIN_EOF = b'E'
+
+#: Data from the remote command's stdout, sent by the server.
+FRAME_STDOUT = b'O'
+
+#: Data from the remote command's stderr, sent by the server.
+FRAME_STDERR = b'R'
+
+#: The exit status of the remote command, sent by the server.
+FRAME_EXIT = b'X'
+
+DEFAULT_IDLE_TIMEOUT = 60
+
+BUFFER_SIZE = 32 * 1024
+
+_FRAME_HEADER = struct.Struct(b'!cI')
+_EXIT_STATUS = struct.Struct(b'!i')
+
+
+def can_multiplex():
+    """Returns whether SSH sessions can be multiplexed on this platform."""
+    return hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork')
+
+
+def get_control_dir():
+    """Returns the directory containing the control sockets.
+
+    This is the directory in the ``RBSSH_CONTROL_DIR`` environment variable,
+    or a directory for the current user in the system's temp directory. It's
+    created if needed, and must only be accessible by the current user.
+    """
+    path = (os.getenv('RBSSH_CONTROL_DIR') or
+            os.path.join(tempfile.gettempdir(), 'rbssh-%s' % os.getuid()))
+
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise SSHMultiplexError('Unable to create %s: %s' % (path, e))
+
+    st = os.lstat(path)
+
+    if (not stat.S_ISDIR(st.st_mode) or
+        st.st_uid != os.getuid() or
+        st.st_mode & 0o077):
+        raise SSHMultiplexError(
+            '%s must be a directory that only the current user can access'
+            % path)
+
+    return path
+
+
+def get_control_path(hostname, port, username, namespace=None,
+                     allow_agent=True):
+    """Returns the path to the control socket for a connection.
+
+    Connections are only shared between sessions for the same LocalSite
+    (``namespace``), user, host and port, and with the same use of the SSH
+    agent.
+    """
+    key = '\0'.join([
+        namespace or '',
+        username,
+        hostname,
+        six.text_type(port),
+        six.text_type(int(bool(allow_agent))),
+    ])
+
+    return os.path.join(
+        get_control_dir(),
+        '%s.sock' % hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def send_frame(sock, frame_type, payload=b''):
+    """Sends a message over a control socket."""
+    sock.sendall(_FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """Receives a message from a control socket.
+
+    This returns a tuple of the message's type and payload, or
+    ``(None, None)`` if the socket was closed.
+    """
+    header = _recv_exactly(sock, _FRAME_HEADER.size)
+
+    if header is None:
+        return None, None
+
+    frame_type, length = _FRAME_HEADER.unpack(header)
+
+    if length:
+        payload = _recv_exactly(sock, length)
+
+        if payload is None:
+            return None, None
+    else:
+        payload = b''
+
+    return frame_type, payload
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+
+    while size:
+        data = sock.recv(size)
+
+        if not data:
+            return None
+
+        chunks.append(data)
+        size -= len(data)
+
+    return b''.join(chunks)
+
+
+class MultiplexServer(object):
+    """Serves sessions on a shared SSH connection to rbssh clients.
+
+    ``client`` is a connected SSHClient. Each session accepted on the
+    control socket gets a new channel on the client's transport. The server
+    stops once the transport dies, or once there have been no sessions for
+    ``idle_timeout`` seconds.
+    """
+    poll_interval = 1.0
+
+    def __init__(self, client, control_path,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.client = client
+        self.transport = client.get_transport()
+        self.control_path = control_path
+        self.idle_timeout = idle_timeout
+
+        self._sock = None
+        self._lock = threading.Lock()
+        self._num_sessions = 0
+        self._last_activity = time.time()
+
+    def listen(self):
+        """Starts listening on the control socket."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            sock.bind(self.control_path)
+            os.chmod(self.control_path, 0o600)
+            sock.listen(16)
+        except:
+            sock.close()
+            raise
+
+        sock.settimeout(self.poll_interval)
+        self._sock = sock
+
+    def serve_forever(self):
+        """Serves sessions until the server is idle or disconnected."""
+        try:
+            while self._should_run():
+                try:
+                    conn, addr = self._sock.accept()
+                except socket.timeout:
+                    continue
+                except socket.error as e:
+                    if e.errno == errno.EINTR:
+                        continue
+
+                    raise
+
+                conn.settimeout(None)
+
+                with self._lock:
+                    self._num_sessions += 1
+
+                thread = threading.Thread(target=self._handle_session,
+                                          args=(conn,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops listening, and closes the SSH connection."""
+        # Remove the control socket first, so that new clients start a new
+        # server instead of connecting to this one.
+        try:
+            os.unlink(self.control_path)
+        except OSError:
+            pass
+
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+        self.client.close()
+
+    def _should_run(self):
+        if not self.transport.is_active():
+            logging.debug('Multiplexed SSH connection for %s was closed',
+                          self.control_path)
+            return False
+
+        with self._lock:
+            return (self._num_sessions > 0 or
+                    time.time() - self._last_activity < self.idle_timeout)
+
+    def _handle_session(self, conn):
+        channel = None
+
+        try:
+            frame_type, payload = recv_frame(conn)
+
+            if frame_type != FRAME_REQUEST:
+                return
+
+            request = json.loads(payload.decode('utf-8'))
+
+            try:
+                channel = self.transport.open_session()
+
+                if request.get('subsystem'):
+                    channel.invoke_subsystem(request['subsystem'])
+                else:
+                    channel.exec_command(request['command'])
+            except Exception as e:
+                logging.error('Unable to open a multiplexed SSH session: %s',
+                              e)
+                send_frame(conn, FRAME_ERROR,
+                           six.text_type(e).encode('utf-8'))
+                return
+
+            send_frame(conn, FRAME_READY)
+
+            stdin_thread = threading.Thread(target=self._relay_stdin,
+                                            args=(conn, channel))
+            stdin_thread.daemon = True
+            stdin_thread.start()
+
+            self._relay_output(conn, channel)
+        except Exception as e:
+            logging.error('Error in multiplexed SSH session: %s', e,
+                          exc_info=1)
+        finally:
+            if channel is not None:
+                channel.close()
+
+            conn.close()
+
+            with self._lock:
+                self._num_sessions -= 1
+                self._last_activity = time.time()
+
+    def _relay_stdin(self, conn, channel):
+        try:
+            while True:
+                frame_type, payload = recv_frame(conn)
+
+                if frame_type == FRAME_STDIN:
+                    channel.sendall(payload)
+                elif frame_type == FRAME_STDIN_EOF:
+                    channel.shutdown_write()
+                elif frame_type is None:
+                    break
+        except (IOError, socket.error):
+            pass
+
+        # The client has gone away, so the remote command won't be able to
+        # send it anything else.
+        channel.close()
+
+    def _relay_output(self, conn, channel):
+        while True:
+            select.select([channel], [], [], self.poll_interval)
+
+            if channel.recv_ready():
+                data = channel.recv(BUFFER_SIZE)
+
+                if data:
+                    send_frame(conn, FRAME_STDOUT, data)
+
+            if channel.recv_stderr_ready():
+                data = channel.recv_stderr(BUFFER_SIZE)
+
+                if data:
+                    send_frame(conn, FRAME_STDERR, data)
+
+            if ((channel.exit_status_ready() or channel.closed) and
+                not channel.recv_ready() and
+                not channel.recv_stderr_ready()):
+                break
+
+        if channel.exit_status_ready():
+            status = channel.recv_exit_status()
+        else:
+            status = -1
+
+        send_frame(conn, FRAME_EXIT, _EXIT_STATUS.pack(status))
+
+
+def open_session(control_path, connect, command=None, subsystem=None,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Opens a session on a shared SSH connection.
+
+    If there's no server for the control path, one is started in the
+    background, using ``connect`` to make the SSH connection. ``connect``
+    is called in the server's process, and must return a connected
+    SSHClient.
+
+    This returns the control socket once the session's channel is open, to
+    be passed to :py:func:`run_session`. SSHMultiplexError is raised if the
+    session couldn't be opened, in which case the caller should connect
+    directly instead.
+    """
+    sock = _connect_control_socket(control_path)
+
+    if sock is None:
+        with _ControlLock(control_path):
+            # Another process may have started a server while we waited
+            # for the lock.
+            sock = _connect_control_socket(control_path)
+
+            if sock is None:
+                if os.path.exists(control_path):
+                    # This was left behind by a server that died.
+                    os.unlink(control_path)
+
+                _spawn_server(control_path, connect, idle_timeout)
+                sock = _connect_control_socket(control_path)
+
+                if sock is None:
+                    raise SSHMultiplexError(
+                        'Unable to connect to %s' % control_path)
+
+    try:
+        send_frame(sock, FRAME_REQUEST, json.dumps({
+            'command': command,
+            'subsystem': subsystem,
+        }).encode('utf-8'))
+
+        frame_type, payload = recv_frame(sock)
+    except socket.error as e:
+        sock.close()
+        raise SSHMultiplexError(six.text_type(e))
+
+    if frame_type != FRAME_READY:
+        sock.close()
+
+        if frame_type == FRAME_ERROR:
+            raise SSHMultiplexError(payload.decode('utf-8'))
+        else:
+            # The server may have been shutting down.
+            raise SSHMultiplexError('The multiplexed connection was closed')
+
+    return sock
+
+
+def run_session(sock, stdin_fd, stdout, stderr):
+    """Relays a session's stdin, stdout and stderr over a control socket.
+
+    This returns the remote command's exit status once it has finished.
+    """
+    stdin_open = True
+
+    while True:
+        if stdin_open:
+            rlist = [sock, stdin_fd]
+        else:
+            rlist = [sock]
+
+        try:
+            rl, wl, el = select.select(rlist, [], [])
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+
+            raise
+
+        if sock in rl:
+            frame_type, payload = recv_frame(sock)
+
+            if frame_type == FRAME_STDOUT:
+                stdout.write(payload)
+                stdout.flush()
+            elif frame_type == FRAME_STDERR:
+                stderr.write(payload)
+                stderr.flush()
+            elif frame_type == FRAME_EXIT:
+                return _EXIT_STATUS.unpack(payload)[0]
+            elif frame_type is None:
+                logging.error('The multiplexed SSH connection was lost')
+                return 255
+
+        if stdin_open and stdin_fd in rl:
+            try:
+                data = os.read(stdin_fd, BUFFER_SIZE)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+
+                data = None
+
+            if data:
+                send_frame(sock, FRAME_STDIN, data)
+            else:
+                send_frame(sock, FRAME_STDIN_EOF)
+                stdin_open = False
+
+
+def _connect_control_socket(control_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(control_path)
+    except socket.error as e:
+        sock.close()
+
+        if e.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+
+        raise SSHMultiplexError('Unable to connect to %s: %s'
+                                % (control_path, e))
+
+    return sock
+
+
+def _spawn_server(control_path, connect, idle_timeout):
+    """Starts a MultiplexServer in a detached process.
+
+    This waits until the server is listening, and raises SSHMultiplexError
+    if it couldn't be started.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            os.close(read_fd)
+
+            # Detach from the SCM tool running us, so it doesn't wait for
+            # the server to exit.
+            os.setsid()
+
+            if os.fork() != 0:
+                os._exit(0)
+
+            devnull = os.open(os.devnull, os.O_RDWR)
+
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+
+            os.close(devnull)
+
+            try:
+                server = MultiplexServer(connect(), control_path,
+                                         idle_timeout)
+                server.listen()
+            except Exception as e:
+                os.write(write_fd,
+                         (six.text_type(e) or 'error').encode('utf-8'))
+                os._exit(1)
+
+            os.write(write_fd, b'OK')
+            os.close(write_fd)
+
+            server.serve_forever()
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+
+    chunks = []
+
+    while True:
+        data = os.read(read_fd, 4096)
+
+        if not data:
+            break
+
+        chunks.append(data)
+
+    os.close(read_fd)
+    result = b''.join(chunks)
+
+    if result != b'OK':
+        raise SSHMultiplexError(
+            'Unable to start a multiplexed SSH connection: %s'
+            % result.decode('utf-8', 'replace'))
+
+
+class _ControlLock(object):
+    """Serializes the starting of servers for a control path."""
+    def __init__(self, control_path):
+        self.path = control_path + '.lock'
+        self._fd = None
+
+    def __enter__(self):
+        import fcntl
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, *args):
+        import fcntl
+
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
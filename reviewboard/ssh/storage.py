@@ -2,6 +2,8 @@ from __future__ import unicode_literals
 
 import logging
 import os
+import tempfile
+import threading
 
 from django.utils.translation import ugettext_lazy as _
 import paramiko
@@ -9,6 +11,20 @@ import paramiko
 from reviewboard.ssh.errors import MakeSSHDirError, UnsupportedSSHKeyError
 
 
+def _read_host_keys_file(filename):
+    """Returns the host key lines from a known hosts file."""
+    lines = []
+
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+
+            if line and line[0] != '#':
+                lines.append(line)
+
+    return lines
+
+
 class SSHStorage(object):
     def __init__(self, namespace=None):
         self.namespace = namespace
@@ -86,6 +102,21 @@ class FileSSHStorage(SSHStorage):
 
     _ssh_dir = None
 
+    # A process-wide cache of the contents of key files, keyed by path.
+    # Each entry is stored along with the modification time, size and inode
+    # of the file it was read from, so that changes made by other processes
+    # are picked up. The generation is bumped whenever a file is written,
+    # so that a read racing with the write can't cache the old contents.
+    _file_cache = {}
+    _file_cache_generation = 0
+    _file_cache_lock = threading.Lock()
+
+    @classmethod
+    def clear_cache(cls):
+        """Clears the cache of key files for this process."""
+        with cls._file_cache_lock:
+            cls._file_cache.clear()
+
     def get_user_key_info(self):
         for cls, filename in self.DEFAULT_KEY_FILES:
             # Paramiko looks in ~/.ssh and ~/ssh, depending on the platform,
@@ -102,7 +133,7 @@ class FileSSHStorage(SSHStorage):
         cls, path = self.get_user_key_info()
 
         if path:
-            return cls.from_private_key_file(path)
+            return self._read_cached(path, cls.from_private_key_file)
 
         return None
 
@@ -118,14 +149,21 @@ class FileSSHStorage(SSHStorage):
 
         sshdir = self.ensure_ssh_dir()
         filename = os.path.join(sshdir, key_filename)
-        key.write_private_key_file(filename)
+
+        try:
+            key.write_private_key_file(filename)
+        finally:
+            self._invalidate_cache(filename)
 
     def delete_user_key(self):
         cls, path = self.get_user_key_info()
 
         if path:
-            # Allow any exceptions to bubble up.
-            os.unlink(path)
+            try:
+                # Allow any exceptions to bubble up.
+                os.unlink(path)
+            finally:
+                self._invalidate_cache(path)
 
     def read_authorized_keys(self):
         filename = os.path.join(self.get_ssh_dir(), 'authorized_keys')
@@ -143,21 +181,15 @@ class FileSSHStorage(SSHStorage):
 
     def read_host_keys(self):
         filename = self.get_host_keys_filename()
-        lines = []
-
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r') as f:
-                    for line in f:
-                        line = line.strip()
+        lines = None
 
-                        if line and line[0] != '#':
-                            lines.append(line)
-            except IOError as e:
-                logging.error('Unable to read host keys file %s: %s'
-                              % (filename, e))
+        try:
+            lines = self._read_cached(filename, _read_host_keys_file)
+        except IOError as e:
+            logging.error('Unable to read host keys file %s: %s'
+                          % (filename, e))
 
-        return lines
+        return list(lines or [])
 
     def add_host_key(self, hostname, key):
         self.ensure_ssh_dir()
@@ -173,6 +205,8 @@ class FileSSHStorage(SSHStorage):
                     'filename': filename,
                     'error': e,
                 })
+        finally:
+            self._invalidate_cache(filename)
 
     def replace_host_key(self, hostname, old_key, new_key):
         filename = self.get_host_keys_filename()
@@ -193,22 +227,70 @@ class FileSSHStorage(SSHStorage):
                     'error': e,
                 })
 
+        # Write the new file alongside the old one and move it into place,
+        # so that nothing ever reads a partially written file.
         try:
-            with open(filename, 'w') as fp:
-                for line in lines:
-                    parts = line.strip().split(" ")
-
-                    if parts[-1] == old_key_base64:
-                        parts[1] = new_key.get_name()
-                        parts[-1] = new_key.get_base64()
+            fd, temp_filename = tempfile.mkstemp(
+                prefix='known_hosts.', dir=os.path.dirname(filename))
 
-                    fp.write(' '.join(parts) + '\n')
-        except IOError as e:
+            try:
+                with os.fdopen(fd, 'w') as fp:
+                    for line in lines:
+                        parts = line.strip().split(" ")
+
+                        if parts[-1] == old_key_base64:
+                            parts[1] = new_key.get_name()
+                            parts[-1] = new_key.get_base64()
+
+                        fp.write(' '.join(parts) + '\n')
+
+                os.chmod(temp_filename, os.stat(filename).st_mode & 0o777)
+                os.rename(temp_filename, filename)
+            except:
+                os.unlink(temp_filename)
+                raise
+        except (IOError, OSError) as e:
             raise IOError(
                 _('Unable to write host keys file %(filename)s: %(error)s') % {
                     'filename': filename,
                     'error': e,
                 })
+        finally:
+            self._invalidate_cache(filename)
+
+    def _read_cached(self, filename, read_func):
+        """Reads a file through the cache.
+
+        ``read_func`` is called with the filename to read and parse the file,
+        unless the cache has its result for the current version of the file.
+        If the file doesn't exist, this returns None.
+        """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+
+        stamp = (st.st_mtime, st.st_size, st.st_ino)
+
+        with self._file_cache_lock:
+            entry = self._file_cache.get(filename)
+            generation = FileSSHStorage._file_cache_generation
+
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        value = read_func(filename)
+
+        with self._file_cache_lock:
+            if FileSSHStorage._file_cache_generation == generation:
+                self._file_cache[filename] = (stamp, value)
+
+        return value
+
+    def _invalidate_cache(self, filename):
+        with self._file_cache_lock:
+            self._file_cache.pop(filename, None)
+            FileSSHStorage._file_cache_generation += 1
 
     def get_host_keys_filename(self):
         """Returns the path to the known host keys file."""
@@ -2,12 +2,19 @@ from __future__ import unicode_literals
 
 import os
 import shutil
+import socket
 import tempfile
+import threading
+import time
 
+import nose
 import paramiko
+from django.utils.six.moves import cStringIO as StringIO
+from kgb import SpyAgency
 
+from reviewboard.ssh import multiplex, storage as storage_module
 from reviewboard.ssh.client import SSHClient
-from reviewboard.ssh.errors import UnsupportedSSHKeyError
+from reviewboard.ssh.errors import SSHMultiplexError, UnsupportedSSHKeyError
 from reviewboard.ssh.storage import FileSSHStorage
 from reviewboard.testing.testcase import TestCase
 
@@ -20,6 +27,7 @@ class SSHTestCase(TestCase):
         self.tempdir = None
         os.environ['RBSSH_ALLOW_AGENT'] = '0'
         FileSSHStorage._ssh_dir = None
+        FileSSHStorage.clear_cache()
 
         if not hasattr(SSHTestCase, 'key1'):
             SSHTestCase.key1 = paramiko.RSAKey.generate(1024)
@@ -39,7 +47,7 @@ class SSHTestCase(TestCase):
         os.environ['HOME'] = homedir
 
 
-class FileSSHStorageTests(SSHTestCase):
+class FileSSHStorageTests(SpyAgency, SSHTestCase):
     """Unit tests for FileSSHStorage."""
     def setUp(self):
         super(FileSSHStorageTests, self).setUp()
@@ -107,6 +115,64 @@ class FileSSHStorageTests(SSHTestCase):
         self.assertEqual(lines[0], line1)
         self.assertEqual(lines[1], line2)
 
+    def test_read_host_keys_cached(self):
+        """Testing FileSSHStorage.read_host_keys caches the file"""
+        storage = FileSSHStorage()
+        storage.ensure_ssh_dir()
+
+        line1 = 'host1 ssh-rsa %s' % self.key1_b64
+        line2 = 'host2 ssh-dss %s' % self.key2_b64
+
+        filename = storage.get_host_keys_filename()
+        with open(filename, 'w') as fp:
+            fp.write('%s\n' % line1)
+
+        self.spy_on(storage_module._read_host_keys_file)
+
+        self.assertEqual(storage.read_host_keys(), [line1])
+        self.assertEqual(FileSSHStorage().read_host_keys(), [line1])
+        self.assertEqual(len(storage_module._read_host_keys_file.spy.calls), 1)
+
+        # Changes made by other processes should be picked up.
+        with open(filename, 'a') as fp:
+            fp.write('%s\n' % line2)
+
+        self.assertEqual(storage.read_host_keys(), [line1, line2])
+        self.assertEqual(len(storage_module._read_host_keys_file.spy.calls), 2)
+
+    def test_add_host_key_invalidates_cache(self):
+        """Testing FileSSHStorage.add_host_key and replace_host_key
+        invalidate cached host keys
+        """
+        storage = FileSSHStorage()
+        self.assertEqual(storage.read_host_keys(), [])
+
+        storage.add_host_key('host1', self.key1)
+        self.assertEqual(storage.read_host_keys(),
+                         ['host1 ssh-rsa %s' % self.key1_b64])
+
+        storage.replace_host_key('host1', self.key1, self.key2)
+        self.assertEqual(storage.read_host_keys(),
+                         ['host1 ssh-dss %s' % self.key2_b64])
+
+    def test_read_user_key_cached(self):
+        """Testing FileSSHStorage.read_user_key caches the key"""
+        storage = FileSSHStorage()
+        storage.write_user_key(self.key1)
+
+        key = storage.read_user_key()
+        self.assertEqual(key, self.key1)
+        self.assertIs(storage.read_user_key(), key)
+
+        # Writing a new key must replace the cached one, even if the file's
+        # modification time and size haven't changed.
+        new_key = paramiko.RSAKey.generate(1024)
+        storage.write_user_key(new_key)
+        self.assertEqual(storage.read_user_key(), new_key)
+
+        storage.delete_user_key()
+        self.assertEqual(storage.read_user_key(), None)
+
     def test_add_host_key(self):
         """Testing FileSSHStorage.add_host_key"""
         storage = FileSSHStorage()
@@ -239,3 +305,270 @@ class SSHClientTests(SSHTestCase):
     def test_import_user_key_with_localsite(self):
         """Testing SSHClient.import_user_key with localsite"""
         self.test_import_user_key('site-1')
+
+
+class FakeMultiplexChannel(object):
+    """A channel that upper-cases stdin into stdout.
+
+    The command is echoed to stderr, and the exit status is 3.
+    """
+    def __init__(self):
+        self.closed = False
+        self.command = None
+        self.stdout = b''
+        self.stderr = b''
+        self.exit_status = None
+
+        self._lock = threading.Lock()
+
+        # select() should always find the channel readable.
+        self._read_fd, self._write_fd = os.pipe()
+        os.write(self._write_fd, b'x')
+
+    def fileno(self):
+        return self._read_fd
+
+    def exec_command(self, command):
+        self.command = command
+        self.stderr = command.encode('utf-8')
+
+    def sendall(self, data):
+        with self._lock:
+            self.stdout += data.upper()
+
+    def shutdown_write(self):
+        self.exit_status = 3
+
+    def recv_ready(self):
+        with self._lock:
+            return bool(self.stdout)
+
+    def recv(self, size):
+        with self._lock:
+            data = self.stdout[:size]
+            self.stdout = self.stdout[size:]
+
+        return data
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        data = self.stderr[:size]
+        self.stderr = self.stderr[size:]
+
+        return data
+
+    def exit_status_ready(self):
+        return self.exit_status is not None
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        with self._lock:
+            if not self.closed:
+                self.closed = True
+                os.close(self._read_fd)
+                os.close(self._write_fd)
+
+
+class FakeMultiplexClient(object):
+    def __init__(self):
+        self.closed = False
+        self.channels = []
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return not self.closed
+
+    def open_session(self):
+        channel = FakeMultiplexChannel()
+        self.channels.append(channel)
+
+        return channel
+
+    def close(self):
+        self.closed = True
+
+
+class MultiplexTests(SSHTestCase):
+    """Unit tests for reviewboard.ssh.multiplex."""
+    def setUp(self):
+        super(MultiplexTests, self).setUp()
+
+        if not multiplex.can_multiplex():
+            raise nose.SkipTest('SSH multiplexing is not supported on this '
+                           'platform')
+
+        self.tempdir = tempfile.mkdtemp(prefix='rb-tests-rbssh-')
+        self.control_dir = os.path.join(self.tempdir, 'control')
+
+        self.old_control_dir = os.getenv('RBSSH_CONTROL_DIR')
+        os.environ['RBSSH_CONTROL_DIR'] = self.control_dir
+
+    def tearDown(self):
+        super(MultiplexTests, self).tearDown()
+
+        if self.old_control_dir is None:
+            del os.environ['RBSSH_CONTROL_DIR']
+        else:
+            os.environ['RBSSH_CONTROL_DIR'] = self.old_control_dir
+
+    def test_get_control_path(self):
+        """Testing multiplex.get_control_path"""
+        path = multiplex.get_control_path('example.com', 22, 'myuser')
+
+        self.assertEqual(os.path.dirname(path), self.control_dir)
+        self.assertEqual(os.stat(self.control_dir).st_mode & 0o777, 0o700)
+        self.assertEqual(
+            multiplex.get_control_path('example.com', 22, 'myuser'),
+            path)
+        self.assertNotEqual(
+            multiplex.get_control_path('example.com', 2222, 'myuser'),
+            path)
+        self.assertNotEqual(
+            multiplex.get_control_path('example.com', 22, 'otheruser'),
+            path)
+
+    def test_get_control_path_with_localsite(self):
+        """Testing multiplex.get_control_path isolates LocalSites"""
+        path = multiplex.get_control_path('example.com', 22, 'myuser')
+        site_path = multiplex.get_control_path('example.com', 22, 'myuser',
+                                               namespace='site-1')
+
+        self.assertNotEqual(site_path, path)
+        self.assertNotEqual(
+            multiplex.get_control_path('example.com', 22, 'myuser',
+                                       namespace='site-2'),
+            site_path)
+
+    def test_get_control_path_with_shared_dir(self):
+        """Testing multiplex.get_control_path with a directory other users
+        can access
+        """
+        os.mkdir(self.control_dir, 0o755)
+
+        self.assertRaises(SSHMultiplexError,
+                          lambda: multiplex.get_control_path('example.com',
+                                                             22, 'myuser'))
+
+    def test_frames(self):
+        """Testing multiplex.send_frame and recv_frame"""
+        sock1, sock2 = socket.socketpair()
+
+        try:
+            multiplex.send_frame(sock1, multiplex.FRAME_STDOUT, b'abc')
+            multiplex.send_frame(sock1, multiplex.FRAME_STDIN_EOF)
+            sock1.close()
+
+            self.assertEqual(multiplex.recv_frame(sock2),
+                             (multiplex.FRAME_STDOUT, b'abc'))
+            self.assertEqual(multiplex.recv_frame(sock2),
+                             (multiplex.FRAME_STDIN_EOF, b''))
+            self.assertEqual(multiplex.recv_frame(sock2), (None, None))
+        finally:
+            sock2.close()
+
+    def test_session(self):
+        """Testing multiplexed sessions sharing a connection"""
+        client = FakeMultiplexClient()
+        control_path = multiplex.get_control_path('example.com', 22,
+                                                  'myuser')
+
+        server = multiplex.MultiplexServer(client, control_path,
+                                           idle_timeout=0.5)
+        server.poll_interval = 0.05
+        server.listen()
+
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.start()
+
+        try:
+            for i in range(2):
+                read_fd, write_fd = os.pipe()
+                os.write(write_fd, b'input %d' % i)
+                os.close(write_fd)
+
+                stdout = StringIO()
+                stderr = StringIO()
+
+                sock = multiplex.open_session(
+                    control_path,
+                    connect=None,
+                    command='cat file%d' % i)
+
+                try:
+                    status = multiplex.run_session(sock, read_fd, stdout,
+                                                   stderr)
+                finally:
+                    sock.close()
+                    os.close(read_fd)
+
+                self.assertEqual(status, 3)
+                self.assertEqual(stdout.getvalue(), b'INPUT %d' % i)
+                self.assertEqual(stderr.getvalue(), b'cat file%d' % i)
+        finally:
+            server_thread.join(5)
+
+        # Both sessions used the same connection, which was closed once it
+        # became idle.
+        self.assertFalse(server_thread.is_alive())
+        self.assertEqual([channel.command for channel in client.channels],
+                         ['cat file0', 'cat file1'])
+        self.assertTrue(client.closed)
+        self.assertFalse(os.path.exists(control_path))
+
+    def test_open_session_starts_server(self):
+        """Testing multiplex.open_session starts a server in the background"""
+        control_path = multiplex.get_control_path('example.com', 22,
+                                                  'myuser')
+        read_fd, write_fd = os.pipe()
+        os.close(write_fd)
+
+        stdout = StringIO()
+        stderr = StringIO()
+
+        sock = multiplex.open_session(control_path,
+                                      connect=FakeMultiplexClient,
+                                      command='ls',
+                                      idle_timeout=0.5)
+
+        try:
+            self.assertTrue(os.path.exists(control_path))
+
+            status = multiplex.run_session(sock, read_fd, stdout, stderr)
+        finally:
+            sock.close()
+            os.close(read_fd)
+
+        self.assertEqual(status, 3)
+        self.assertEqual(stdout.getvalue(), b'')
+        self.assertEqual(stderr.getvalue(), b'ls')
+
+        # The server should exit once it's idle.
+        for i in range(50):
+            if not os.path.exists(control_path):
+                break
+
+            time.sleep(0.1)
+
+        self.assertFalse(os.path.exists(control_path))
+
+    def test_open_session_with_failed_connect(self):
+        """Testing multiplex.open_session with a connection that can't be
+        made
+        """
+        def _connect():
+            raise paramiko.AuthenticationException('Authentication failed.')
+
+        control_path = multiplex.get_control_path('example.com', 22,
+                                                  'myuser')
+
+        self.assertRaises(SSHMultiplexError,
+                          lambda: multiplex.open_session(control_path,
+                                                         connect=_connect,
+                                                         command='ls'))
+        self.assertFalse(os.path.exists(control_path))
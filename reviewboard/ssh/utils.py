@@ -98,6 +98,21 @@ def register_rbssh(envvar):
     in the environment for different tools. In some cases, we need to
     specifically place it in the system environment using ``os.putenv``,
     while in others (Mercurial, Bazaar), we need to place it in ``os.environ``.
+
+    This also passes on the ``RBSSH_MULTIPLEX`` and
+    ``RBSSH_MULTIPLEX_IDLE_TIMEOUT`` settings, which control whether rbssh
+    shares connections between processes.
     """
-    os.putenv(envvar, 'rbssh')
-    os.environ[envvar] = 'rbssh'
+    from django.conf import settings
+
+    _set_env(envvar, 'rbssh')
+
+    if getattr(settings, 'RBSSH_MULTIPLEX', False):
+        _set_env('RBSSH_MULTIPLEX', '1')
+        _set_env('RBSSH_MULTIPLEX_IDLE_TIMEOUT',
+                 six.text_type(settings.RBSSH_MULTIPLEX_IDLE_TIMEOUT))
+
+
+def _set_env(envvar, value):
+    os.putenv(envvar, value)
+    os.environ[envvar] = value
@@ -211,6 +211,9 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
      *
      * This will replace the displayed files with a set of pending entries,
      * queue loads for each file, and start the queue.
+     *
+     * Files are queued in priority order (see _getFileLoadOrder), so the
+     * files the user is looking at are loaded before the rest of the page.
      */
     _setFiles: function() {
         var files = this.model.get('files'),
@@ -219,12 +222,15 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
         this._highlightedChunk = null;
 
         files.each(function(file) {
-            var filediff = file.get('filediff'),
+            $diffs.append(this._fileEntryTemplate(file.attributes));
+        }, this);
+
+        _.each(this._getFileLoadOrder(files), function(position) {
+            var file = files.at(position),
+                filediff = file.get('filediff'),
                 interfilediff = file.get('interfilediff'),
                 interdiffRevision = null;
 
-            $diffs.append(this._fileEntryTemplate(file.attributes));
-
             if (interfilediff) {
                 interdiffRevision = interfilediff.revision;
             } else if (file.get('forceInterdiff')) {
@@ -236,22 +242,83 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
                                interfilediff ? interfilediff.id : null,
                                interdiffRevision,
                                file.get('index'),
-                               file.get('commentCounts'));
+                               file.get('commentCounts'),
+                               position);
         }, this);
 
         $.funcQueue('diff_files').start();
     },
 
+    /*
+     * Returns the order in which the files on the page should be loaded.
+     *
+     * This returns a list of positions within the files collection. Files
+     * are loaded in the following order:
+     *
+     *   1. The file targeted by the URL's anchor, and any files whose
+     *      placeholders are currently visible in the viewport.
+     *   2. Files that have comments on them.
+     *   3. Everything else.
+     *
+     * Within each group, files keep the order they appear on the page.
+     */
+    _getFileLoadOrder: function(files) {
+        var viewportTop = $(window).scrollTop(),
+            viewportBottom = viewportTop + $(window).height(),
+            startAtFileID = null,
+            priorities;
+
+        if (this._startAtAnchorName) {
+            startAtFileID = this._startAtAnchorName.split(',')[0];
+        }
+
+        priorities = files.map(function(file, position) {
+            var fileDiffID = file.get('filediff').id,
+                $container = $('#file_container_' + fileDiffID),
+                commentCounts = file.get('commentCounts'),
+                top,
+                priority;
+
+            if ($container.length === 1) {
+                top = $container.offset().top;
+            }
+
+            if (startAtFileID === 'file' + fileDiffID ||
+                startAtFileID === String(file.get('index')) ||
+                (top !== undefined &&
+                 top < viewportBottom &&
+                 top + $container.outerHeight() > viewportTop)) {
+                priority = 0;
+            } else if (commentCounts && commentCounts.length > 0) {
+                priority = 1;
+            } else {
+                priority = 2;
+            }
+
+            return {
+                position: position,
+                priority: priority
+            };
+        });
+
+        return _.pluck(_.sortBy(priorities, function(item) {
+            return item.priority * files.length + item.position;
+        }), 'position');
+    },
+
     /*
      * Queues loading of a diff.
      *
      * When the diff is loaded, it will be placed into the appropriate location
      * in the diff viewer. The anchors on the page will be rebuilt. This will
      * then trigger the loading of the next file.
+     *
+     * The position is the file's position within the page's list of files,
+     * which may differ from the order in which files are loaded.
      */
     queueLoadDiff: function(fileDiffID, fileDiffRevision,
                             interFileDiffID, interdiffRevision,
-                            fileIndex, serializedCommentBlocks) {
+                            fileIndex, serializedCommentBlocks, position) {
         var diffReviewable = new RB.DiffReviewable({
             reviewRequest: this.reviewRequest,
             fileIndex: fileIndex,
@@ -267,13 +334,13 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
                 /*
                  * We already have this one. This is probably a pre-loaded file.
                  */
-                this._renderFileDiff(diffReviewable);
+                this._renderFileDiff(diffReviewable, position);
             } else {
                 diffReviewable.getRenderedDiff({
                     complete: function(xhr) {
                         $('#file_container_' + fileDiffID)
                             .replaceWith(xhr.responseText);
-                        this._renderFileDiff(diffReviewable);
+                        this._renderFileDiff(diffReviewable, position);
                     }
                 }, this);
             }
@@ -289,7 +356,7 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
      * Once rendered and set up, the next diff in the load queue will be
      * pulled from the server.
      */
-    _renderFileDiff: function(diffReviewable) {
+    _renderFileDiff: function(diffReviewable, position) {
         var elementName = 'file' + diffReviewable.get('fileDiffID'),
             $el = $('#' + elementName),
             diffReviewableView,
@@ -310,8 +377,11 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
             model: diffReviewable
         });
 
-        this._diffFileIndexView.addDiff(this._diffReviewableViews.length,
-                                        diffReviewableView);
+        if (position === undefined) {
+            position = this._diffReviewableViews.length;
+        }
+
+        this._diffFileIndexView.addDiff(position, diffReviewableView);
 
         this._diffReviewableViews.push(diffReviewableView);
         diffReviewableView.render();
@@ -424,10 +494,21 @@ RB.DiffViewerPageView = RB.ReviewablePageView.extend({
      * If no anchor is selected, we'll try to select the first one.
      */
     _updateAnchors: function($table) {
+        var selectedAnchor = (this._selectedAnchorIndex === -1
+                              ? null
+                              : this._$anchors[this._selectedAnchorIndex]);
+
         this._$anchors = this._$anchors.add($table.find('a[name]'));
 
-        /* Skip over the change index to the first item. */
-        if (this._selectedAnchorIndex === -1 && this._$anchors.length > 0) {
+        if (selectedAnchor) {
+            /*
+             * Files aren't always loaded in the order they appear on the
+             * page, and the anchors are kept in page order, so the selected
+             * anchor may have moved.
+             */
+            this._selectedAnchorIndex = this._$anchors.index(selectedAnchor);
+        } else if (this._$anchors.length > 0) {
+            /* Skip over the change index to the first item. */
             this._selectedAnchorIndex = 0;
             this._highlightAnchor($(this._$anchors[this._selectedAnchorIndex]));
         }
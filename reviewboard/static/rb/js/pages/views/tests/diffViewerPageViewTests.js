@@ -0,0 +1,100 @@
+suite('rb/pages/views/DiffViewerPageView', function() {
+    var tableTemplate = _.template([
+            '<table class="sidebyside">',
+            ' <thead>',
+            '  <tr>',
+            '   <th><a name="<%- fileIndex %>" class="file-anchor"></a>',
+            '   <%- filename %></th>',
+            '  </tr>',
+            ' </thead>',
+            ' <tbody>',
+            '  <tr>',
+            '   <th><a name="<%- fileIndex %>.1" class="chunk-anchor"></a>',
+            '   1</th>',
+            '  </tr>',
+            ' </tbody>',
+            '</table>'
+        ].join('')),
+        $file1,
+        $file2,
+        pageView;
+
+    beforeEach(function() {
+        var $container = $('<div/>').appendTo($testsScratch);
+
+        $file1 = $(tableTemplate({
+                fileIndex: 'file1',
+                filename: 'foo.c'
+            }))
+            .appendTo($container);
+        $file2 = $(tableTemplate({
+                fileIndex: 'file2',
+                filename: 'bar.c'
+            }))
+            .appendTo($container);
+
+        pageView = new RB.DiffViewerPageView({
+            el: $container,
+            model: new RB.DiffViewerPageModel({
+                files: new RB.DiffFileCollection()
+            }),
+            reviewRequestData: {
+                id: 123,
+                loaded: true,
+                state: RB.ReviewRequest.PENDING,
+                reviewURL: '/r/123/'
+            },
+            editorData: {
+                mutableByUser: true,
+                statusMutableByUser: true
+            }
+        });
+
+        spyOn(RB.ChunkHighlighterView, 'highlight');
+        spyOn($.fn, 'scrollTop');
+    });
+
+    afterEach(function() {
+        Backbone.history.stop();
+    });
+
+    describe('Anchor navigation', function() {
+        function getSelectedAnchorName() {
+            return $(pageView._$anchors[pageView._selectedAnchorIndex])
+                .attr('name');
+        }
+
+        it('Files loaded in order', function() {
+            pageView._updateAnchors($file1);
+            pageView._updateAnchors($file2);
+
+            expect(getSelectedAnchorName()).toBe('file1');
+
+            pageView._selectNextFile();
+            expect(getSelectedAnchorName()).toBe('file2');
+
+            pageView._selectPreviousDiff();
+            expect(getSelectedAnchorName()).toBe('file1.1');
+        });
+
+        it('Files loaded out of order', function() {
+            pageView._updateAnchors($file2);
+            expect(getSelectedAnchorName()).toBe('file2');
+
+            pageView._selectNextDiff();
+            expect(getSelectedAnchorName()).toBe('file2.1');
+
+            pageView._updateAnchors($file1);
+            expect(getSelectedAnchorName()).toBe('file2.1');
+
+            pageView._selectPreviousFile();
+            expect(getSelectedAnchorName()).toBe('file2');
+
+            pageView._selectPreviousFile();
+            expect(getSelectedAnchorName()).toBe('file1');
+
+            pageView._selectNextDiff();
+            expect(getSelectedAnchorName()).toBe('file1.1');
+        });
+    });
+});
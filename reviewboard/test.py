@@ -69,6 +69,10 @@ class RBTestRunner(DjangoTestSuiteRunner):
         )
         settings.RUNNING_TEST = True
 
+        # The on-disk file cache outlives the main cache between tests, so
+        # it's only enabled by the tests that need it.
+        settings.SCMTOOLS_FILE_CACHE_MAX_SIZE = 0
+
         self._setup_media_dirs()
 
     def teardown_test_environment(self, *args, **kwargs):
@@ -32,6 +32,11 @@ class RepositoryBranchesResource(WebAPIResource):
         all the others. This represents whichever branch is considered the tip
         (such as "master" for git repositories, or "trunk" for subversion).
 
+    The list of branches is cached. The response also contains
+    'last_refreshed', the date and time the list was fetched from the
+    repository, and 'stale', which is true if the list is out of date and
+    is being refreshed in the background.
+
     This is not available for all types of repositories.
     """
     name = 'branches'
@@ -54,7 +59,10 @@ class RepositoryBranchesResource(WebAPIResource):
 
         try:
             branches = []
-            for branch in repository.get_branches():
+            items = repository.get_branches()
+            cache_info = repository.get_branches_cache_info() or {}
+
+            for branch in items:
                 branches.append({
                     'id': branch.id,
                     'name': branch.name,
@@ -64,6 +72,8 @@ class RepositoryBranchesResource(WebAPIResource):
 
             return 200, {
                 self.item_result_key: branches,
+                'last_refreshed': cache_info.get('last_refreshed'),
+                'stale': cache_info.get('stale', False),
             }
         except SCMError as e:
             return REPO_INFO_ERROR.with_message(six.text_type(e))
@@ -43,6 +43,11 @@ class RepositoryCommitsResource(WebAPIResource):
         the empty string for the first revision in the commit history. The
         parent
 
+    The list of commits is cached. The response also contains
+    'last_refreshed', the date and time the list was fetched from the
+    repository, and 'stale', which is true if the list is out of date and
+    is being refreshed in the background.
+
     This is not available for all types of repositories.
     """
     name = 'commits'
@@ -85,6 +90,8 @@ class RepositoryCommitsResource(WebAPIResource):
 
         try:
             items = repository.get_commits(branch=branch, start=start)
+            cache_info = repository.get_commits_cache_info(
+                branch=branch, start=start) or {}
         except SCMError as e:
             return REPO_INFO_ERROR.with_message(six.text_type(e))
         except NotImplementedError:
@@ -117,6 +124,8 @@ class RepositoryCommitsResource(WebAPIResource):
 
         return 200, {
             self.item_result_key: commits,
+            'last_refreshed': cache_info.get('last_refreshed'),
+            'stale': cache_info.get('stale', False),
         }
 
 
@@ -45,6 +45,8 @@ class ResourceTests(BaseWebAPITestCase):
         self.assertEqual(len(rsp['commits']), 5)
         self.assertEqual(rsp['commits'][0]['message'], 'Commit 5')
         self.assertEqual(rsp['commits'][3]['author_name'], 'user2')
+        self.assertFalse(rsp['stale'])
+        self.assertTrue(rsp['last_refreshed'])
 
     @add_fixtures(['test_site'])
     def test_get_with_site(self):